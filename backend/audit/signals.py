@@ -4,6 +4,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.forms.models import model_to_dict
 
 from core.middleware import get_current_user
+from core.signals import current_deletion_batch
 from .models import AuditLog
 # Import models we want to track
 from vaults.models import FamilyVault, Membership, Invite
@@ -57,7 +58,7 @@ def log_delete(sender, instance, **kwargs):
     user = get_current_user()
     actor = user if user and getattr(user, 'is_authenticated', False) else None
 
-    AuditLog.objects.create(
+    log = AuditLog(
         actor=actor,
         vault_id=get_vault_id(instance),
         content_type=ContentType.objects.get_for_model(sender),
@@ -65,3 +66,9 @@ def log_delete(sender, instance, **kwargs):
         action=AuditLog.Action.DELETE,
         changes={'info': f'Record deleted: {str(instance)}'}
     )
+    batch = current_deletion_batch()
+    if batch is not None:
+        # Written in one INSERT when the bulk delete finishes.
+        batch.audit_logs.append(log)
+        return
+    log.save()
@@ -1,6 +1,8 @@
+import logging
 import os
 
 from celery import Celery
+from celery.signals import celeryd_after_setup, task_postrun, task_revoked, worker_process_init
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -9,3 +11,56 @@ app = Celery('legacykeeper')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+logger = logging.getLogger(__name__)
+_worker_concurrency = 1
+
+
+@celeryd_after_setup.connect
+def prefetch_media_models(sender, instance, **kwargs):
+    """Fetch and verify model files once in the parent worker, before any child starts loading them."""
+    global _worker_concurrency
+    from django.conf import settings
+
+    _worker_concurrency = max(int(getattr(instance, 'concurrency', 1) or 1), 1)
+    if not settings.MEDIA_WORKER_WARMUP:
+        return
+
+    from media.vision import ensure_model_assets, get_required_model_groups
+
+    for report in ensure_model_assets(get_required_model_groups()):
+        if report['status'] in ('missing', 'mismatch'):
+            logger.warning(
+                'Model file %s is %s: %s', report['path'], report['status'], report.get('error', 'not downloaded')
+            )
+
+
+@worker_process_init.connect
+def warm_media_worker_process(**kwargs):
+    """Tune OpenCV threads and load the models in each pool process before it takes its first task."""
+    from django.conf import settings
+    from media.vision import configure_opencv_threads, warm_media_models
+
+    threads = configure_opencv_threads(_worker_concurrency)
+    if settings.MEDIA_WORKER_WARMUP:
+        logger.info('Worker process %s warmed up (opencv threads=%s): %s', os.getpid(), threads, warm_media_models())
+
+
+@task_postrun.connect
+def release_scheduled_media_task(sender=None, task_id=None, state=None, retval=None, **kwargs):
+    """Give a finished upload-analysis task's vault slot to the next pending task."""
+    from media.scheduler import SCHEDULED_TASK_NAMES, release_media_task
+
+    if getattr(sender, 'name', '') not in SCHEDULED_TASK_NAMES:
+        return
+    # Autoretry re-runs the same task id, and fanned-out work is released by its chord callback.
+    if state == 'RETRY' or (isinstance(retval, dict) and retval.get('status') == 'fanned-out'):
+        return
+    release_media_task(task_id)
+
+
+@task_revoked.connect
+def release_revoked_media_task(sender=None, request=None, **kwargs):
+    from media.scheduler import SCHEDULED_TASK_NAMES, release_media_task
+
+    if getattr(sender, 'name', '') in SCHEDULED_TASK_NAMES:
+        release_media_task(getattr(request, 'id', ''))
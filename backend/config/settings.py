@@ -123,13 +123,42 @@ CELERY_TASK_REJECT_ON_WORKER_LOST = True
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
 CELERY_RESULT_EXPIRES = config('CELERY_RESULT_EXPIRES', default=86400, cast=int)
+# Pool processes load and warm models at startup; allow that to finish before the parent gives up on them.
+CELERY_WORKER_PROC_ALIVE_TIMEOUT = config('CELERY_WORKER_PROC_ALIVE_TIMEOUT', default=60, cast=float)
+# Queues are split by latency class so slow work never sits in front of fast work:
+#   media.priority  restoration previews (interactive, ~1 s)
+#   media.fast      EXIF-only extraction (milliseconds)
+#   media.vision    combined analysis and face detection (seconds)
+#   media.restore   full-resolution restoration (tens of seconds)
+#   media.documents PDF text extraction
+# Redis consumes lower priority numbers first within a queue; background reprocessing yields to uploads.
+# Call sites do not pass queue=, so these routes are the single place that decides placement.
 CELERY_TASK_ROUTES = {
-    'media.tasks.extract_media_exif_task': {'queue': 'media'},
-    'media.tasks.detect_media_faces_task': {'queue': 'media'},
-    'media.tasks.restore_media_photo_task': {'queue': 'media'},
+    'media.tasks.restore_media_preview_task': {'queue': 'media.priority', 'priority': 0},
+    'media.tasks.extract_media_exif_task': {'queue': 'media.fast', 'priority': 2},
+    'media.tasks.extract_media_file_exif_task': {'queue': 'media.fast', 'priority': 2},
+    'media.tasks.finish_media_exif_fanout_task': {'queue': 'media.fast', 'priority': 2},
+    'media.tasks.analyze_media_task': {'queue': 'media.vision', 'priority': 4},
+    'media.tasks.analyze_media_file_task': {'queue': 'media.vision', 'priority': 4},
+    'media.tasks.finish_media_analysis_fanout_task': {'queue': 'media.vision', 'priority': 4},
+    'media.tasks.detect_media_faces_task': {'queue': 'media.vision', 'priority': 4},
+    'media.tasks.detect_media_file_faces_task': {'queue': 'media.vision', 'priority': 4},
+    'media.tasks.finish_media_faces_fanout_task': {'queue': 'media.vision', 'priority': 4},
+    'media.tasks.reprocess_media_batch_task': {'queue': 'media.vision', 'priority': 8},
+    'media.tasks.backfill_media_hashes_task': {'queue': 'media.vision', 'priority': 8},
+    'media.tasks.restore_media_photo_task': {'queue': 'media.restore', 'priority': 4},
+    'media.tasks.extract_media_document_task': {'queue': 'media.documents', 'priority': 6},
+    'media.tasks.dispatch_media_reprocess_task': {'queue': 'default'},
+    'media.tasks.dispatch_media_tasks_task': {'queue': 'default'},
+    'media.tasks.cleanup_duplicate_groups_task': {'queue': 'default', 'priority': 8},
+    'core.tasks.drain_storage_deletions_task': {'queue': 'default', 'priority': 6},
 }
+CELERY_TASK_DEFAULT_PRIORITY = 4
 CELERY_BROKER_TRANSPORT_OPTIONS = {
     'visibility_timeout': config('CELERY_VISIBILITY_TIMEOUT', default=3600, cast=int),
+    'priority_steps': list(range(10)),
+    'sep': ':',
+    'queue_order_strategy': 'priority',
 }
 
 # --- DRF Configuration ---
@@ -252,3 +281,88 @@ MEDIA_RESTORATION_AUTO_DOWNLOAD = config(
     default=True,
     cast=bool,
 )
+# Denoise runs over halo-padded tiles; the budget caps tile size and how many tiles are in flight.
+MEDIA_RESTORATION_TILE_SIZE = config('MEDIA_RESTORATION_TILE_SIZE', default=1024, cast=int)
+MEDIA_RESTORATION_TILE_WORKERS = config('MEDIA_RESTORATION_TILE_WORKERS', default=0, cast=int)
+MEDIA_RESTORATION_MEMORY_BUDGET_MB = config('MEDIA_RESTORATION_MEMORY_BUDGET_MB', default=768, cast=int)
+# Previews run the same pipeline on a downscaled copy (routed to the media.priority queue).
+MEDIA_RESTORATION_PREVIEW_MAX_SIDE = config('MEDIA_RESTORATION_PREVIEW_MAX_SIDE', default=800, cast=int)
+# Rotation: "pixels" re-encodes the file, "metadata" stores a display rotation and leaves the bytes alone.
+MEDIA_ROTATION_MODE = config('MEDIA_ROTATION_MODE', default='pixels')
+# In metadata mode, patch the EXIF Orientation of locally stored JPEGs instead of storing a rotation.
+MEDIA_ROTATION_EXIF_REWRITE = config('MEDIA_ROTATION_EXIF_REWRITE', default=False, cast=bool)
+# Promoting an attachment to primary repoints the item at its key; True copies it server-side instead.
+MEDIA_PROMOTE_BY_COPY = config('MEDIA_PROMOTE_BY_COPY', default=False, cast=bool)
+# Deletion outbox: failed storage deletes retry after 60 s, doubling each time, up to this many attempts.
+STORAGE_DELETION_RETRY_SECONDS = config('STORAGE_DELETION_RETRY_SECONDS', default=60, cast=int)
+STORAGE_DELETION_MAX_ATTEMPTS = config('STORAGE_DELETION_MAX_ATTEMPTS', default=8, cast=int)
+# collect_orphaned_media leaves objects younger than this alone; their rows may not have committed yet.
+MEDIA_STORAGE_GC_GRACE_HOURS = config('MEDIA_STORAGE_GC_GRACE_HOURS', default=24, cast=float)
+# Worker startup: fetch/verify model files once, then load and warm them in every pool process.
+MEDIA_WORKER_WARMUP = config('MEDIA_WORKER_WARMUP', default=True, cast=bool)
+# OpenCV threads per pool process; 0 = CPU count divided by worker concurrency.
+MEDIA_OPENCV_THREADS = config('MEDIA_OPENCV_THREADS', default=0, cast=int)
+# Optional pins, e.g. "colorization_release_v2.caffemodel=<sha256>,..."; they override checksums.sha256.
+MEDIA_MODEL_SHA256 = config('MEDIA_MODEL_SHA256', default='')
+
+# --- Face detection backend ("haar" cascade or "yunet" DNN loaded from MEDIA_RESTORATION_MODEL_DIR) ---
+MEDIA_FACE_DETECTOR_BACKEND = config('MEDIA_FACE_DETECTOR_BACKEND', default='haar')
+MEDIA_FACE_DETECTION_MAX_SIDE = config('MEDIA_FACE_DETECTION_MAX_SIDE', default=1280, cast=int)
+MEDIA_FACE_DETECTION_PYRAMID_LEVELS = config('MEDIA_FACE_DETECTION_PYRAMID_LEVELS', default=2, cast=int)
+MEDIA_FACE_DETECTION_SCORE_THRESHOLD = config('MEDIA_FACE_DETECTION_SCORE_THRESHOLD', default=0.7, cast=float)
+# Pack all face crops of a detection run into one sprite object (faces carry their box in it).
+MEDIA_FACE_THUMBNAIL_SPRITES = config('MEDIA_FACE_THUMBNAIL_SPRITES', default=False, cast=bool)
+
+# --- Face embeddings (SFace) and per-vault similarity index for "who is this?" suggestions ---
+# Embeddings need YuNet landmarks for an aligned crop, so they only run with MEDIA_FACE_DETECTOR_BACKEND=yunet.
+MEDIA_FACE_EMBEDDINGS_ENABLED = config('MEDIA_FACE_EMBEDDINGS_ENABLED', default=True, cast=bool)
+MEDIA_FACE_INDEX_DIR = config('MEDIA_FACE_INDEX_DIR', default='')
+MEDIA_FACE_SUGGESTION_MIN_SCORE = config('MEDIA_FACE_SUGGESTION_MIN_SCORE', default=0.3, cast=float)
+
+# Items with at least this many files run upload analysis, face detection and EXIF as one subtask per file,
+# merged by a chord callback (needs CELERY_RESULT_BACKEND); 0 keeps the serial loop.
+MEDIA_FANOUT_MIN_FILES = config('MEDIA_FANOUT_MIN_FILES', default=2, cast=int)
+
+# --- Worker-local storage cache (LRU, keyed by storage path + content hash) ---
+MEDIA_STORAGE_CACHE_ENABLED = config('MEDIA_STORAGE_CACHE_ENABLED', default=True, cast=bool)
+MEDIA_STORAGE_CACHE_DIR = config('MEDIA_STORAGE_CACHE_DIR', default='')
+MEDIA_STORAGE_CACHE_MAX_BYTES = config('MEDIA_STORAGE_CACHE_MAX_BYTES', default=2 * 1024 * 1024 * 1024, cast=int)
+# Seconds between re-reading the cache's size from disk; in between, workers track it in memory.
+MEDIA_STORAGE_CACHE_RESYNC_SECONDS = config('MEDIA_STORAGE_CACHE_RESYNC_SECONDS', default=300, cast=int)
+
+# --- Header-only EXIF reads from remote storage (range requests, window doubles up to the max) ---
+MEDIA_EXIF_RANGE_READS = config('MEDIA_EXIF_RANGE_READS', default=True, cast=bool)
+MEDIA_EXIF_RANGE_INITIAL_BYTES = config('MEDIA_EXIF_RANGE_INITIAL_BYTES', default=64 * 1024, cast=int)
+MEDIA_EXIF_RANGE_MAX_BYTES = config('MEDIA_EXIF_RANGE_MAX_BYTES', default=4 * 1024 * 1024, cast=int)
+
+# --- Near-duplicate photos (64-bit dHash, multi-index lookup; each extra bit adds one hash chunk to scan) ---
+MEDIA_NEAR_DUPLICATE_MAX_DISTANCE = config('MEDIA_NEAR_DUPLICATE_MAX_DISTANCE', default=4, cast=int)
+
+# --- Vault-wide reprocessing (batched EXIF + face detection reruns) ---
+MEDIA_REPROCESS_BATCH_SIZE = config('MEDIA_REPROCESS_BATCH_SIZE', default=25, cast=int)
+MEDIA_REPROCESS_RATE_LIMIT_PER_MINUTE = config('MEDIA_REPROCESS_RATE_LIMIT_PER_MINUTE', default=120, cast=int)
+MEDIA_REPROCESS_MAX_IN_FLIGHT = config('MEDIA_REPROCESS_MAX_IN_FLIGHT', default=2, cast=int)
+# Seconds a dispatched batch may go without progress before it is re-dispatched once, then failed.
+MEDIA_REPROCESS_BATCH_TIMEOUT_SECONDS = config('MEDIA_REPROCESS_BATCH_TIMEOUT_SECONDS', default=1800, cast=int)
+
+# --- Supersession (cancel obsolete media tasks when a newer run takes over) ---
+# Redis URL for cancellation tokens, stat counters and task locks; blank = CELERY_BROKER_URL, "locmem://" = in-process.
+MEDIA_TASK_CANCELLATION_URL = config('MEDIA_TASK_CANCELLATION_URL', default='')
+MEDIA_TASK_CANCELLATION_TTL = config('MEDIA_TASK_CANCELLATION_TTL', default=86400, cast=int)
+MEDIA_TASK_REVOKE_SUPERSEDED = config('MEDIA_TASK_REVOKE_SUPERSEDED', default=True, cast=bool)
+
+# --- Per-vault fair scheduling of upload analysis (round-robin across vaults, with backpressure) ---
+MEDIA_SCHEDULER_VAULT_MAX_IN_FLIGHT = config('MEDIA_SCHEDULER_VAULT_MAX_IN_FLIGHT', default=4, cast=int)
+# Stop publishing while this many messages wait in the scheduled queues; 0 disables backpressure.
+MEDIA_SCHEDULER_MAX_BROKER_DEPTH = config('MEDIA_SCHEDULER_MAX_BROKER_DEPTH', default=200, cast=int)
+MEDIA_SCHEDULER_DISPATCH_BATCH = config('MEDIA_SCHEDULER_DISPATCH_BATCH', default=50, cast=int)
+MEDIA_SCHEDULER_RETRY_SECONDS = config('MEDIA_SCHEDULER_RETRY_SECONDS', default=15, cast=int)
+# A dispatched task that never reports back stops holding its vault's slot after this many seconds.
+MEDIA_SCHEDULER_DISPATCH_TIMEOUT = config('MEDIA_SCHEDULER_DISPATCH_TIMEOUT', default=1800, cast=int)
+# Completions in this window drive the ETA shown in status endpoints.
+MEDIA_SCHEDULER_THROUGHPUT_WINDOW = config('MEDIA_SCHEDULER_THROUGHPUT_WINDOW', default=600, cast=int)
+
+# --- Document Processing (PDF text + preview) ---
+MEDIA_DOCUMENT_MAX_PAGES = config('MEDIA_DOCUMENT_MAX_PAGES', default=50, cast=int)
+MEDIA_DOCUMENT_MAX_TEXT_CHARS = config('MEDIA_DOCUMENT_MAX_TEXT_CHARS', default=200000, cast=int)
+MEDIA_DOCUMENT_PREVIEW_MAX_SIDE = config('MEDIA_DOCUMENT_PREVIEW_MAX_SIDE', default=768, cast=int)
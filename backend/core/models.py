@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 import uuid
 
 class TimeStampedModel(models.Model):
@@ -12,3 +13,25 @@ class TimeStampedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class StorageDeletion(TimeStampedModel):
+    """
+    Deletion outbox: a storage key queued in the same transaction that deleted (or replaced)
+    the row referencing it, removed later in batches by ``core.tasks.drain_storage_deletions_task``.
+    """
+    file_name = models.CharField(max_length=1024)
+    # The field the key was stored in; it names the storage and the rows that may still reference the key.
+    model_label = models.CharField(max_length=100)
+    field_name = models.CharField(max_length=100)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['next_attempt_at'], name='core_storage_deletion_due'),
+        ]
+
+    def __str__(self):
+        return self.file_name
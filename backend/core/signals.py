@@ -1,67 +1,131 @@
+from contextlib import contextmanager
+from functools import partial
+import threading
+
 from django.db.models.signals import post_delete, pre_save
 from django.dispatch import receiver
-from django.db import models
-import logging
+from django.db import models, transaction
 
-logger = logging.getLogger(__name__)
+from .storage_deletion import queue_storage_deletions
 
+_deletion_batches = threading.local()
+_shared_storage_fields = {}
 
-def delete_file_if_unused(model, field_name, file_field, instance_pk=None):
-    """Delete a file only when no other rows reference the same storage key."""
-    if not file_field:
-        return
 
-    file_name = str(getattr(file_field, 'name', '') or '').strip()
-    if not file_name:
-        return
+def share_storage_keys(*model_fields):
+    """Declare ``(model, field_name)`` pairs whose rows may point at the same storage key.
 
-    lookup = {field_name: file_name}
-    existing_rows = model._default_manager.filter(**lookup)
-    if instance_pk is not None:
-        existing_rows = existing_rows.exclude(pk=instance_pk)
+    A key is then only removed once none of the declared fields reference it, so a row can be
+    repointed at another row's file instead of copying it.
+    """
+    group = frozenset(model_fields)
+    for model_field in model_fields:
+        _shared_storage_fields[model_field] = _shared_storage_fields.get(model_field, frozenset()) | group
 
-    if existing_rows.exists():
-        return
 
-    storage = getattr(file_field, 'storage', None)
-    if not storage:
+def storage_key_referrers(model, field_name):
+    """The ``(model, field_name)`` pairs whose rows must all be checked before a key of this field is removed."""
+    return _shared_storage_fields.get((model, field_name)) or frozenset({(model, field_name)})
+
+
+class RowDeletionBatch:
+    """Per-row delete side effects collected while a bulk delete runs on this thread."""
+
+    def __init__(self):
+        self.files = []
+        self.audit_logs = []
+        self.deferred = {}
+
+    def defer(self, callback, *values):
+        """Call ``callback(values)`` once after commit, with every value deferred to it in this batch."""
+        self.deferred.setdefault(callback, set()).update(values)
+
+
+def current_deletion_batch():
+    return getattr(_deletion_batches, 'current', None)
+
+
+def _detach_deleted_relations(rows):
+    # Deferred rows may point at an object deleted later in the same batch (e.g. the actor of an
+    # account deletion); nullable links get the SET_NULL the database would have applied.
+    for row in rows:
+        for field in row._meta.concrete_fields:
+            if not (field.is_relation and field.null and field.is_cached(row)):
+                continue
+            related = getattr(row, field.name)
+            if related is not None and related.pk is None:
+                setattr(row, field.name, None)
+
+
+@contextmanager
+def batched_row_deletion():
+    """Defer the per-row delete receivers of a bulk delete and settle them in one pass.
+
+    Audit rows and deletion-outbox rows are each written with a single INSERT when the block exits,
+    and each deferred callback is queued once for everything gathered under it.
+    """
+    if current_deletion_batch() is not None:
+        yield current_deletion_batch()
         return
 
+    batch = RowDeletionBatch()
+    _deletion_batches.current = batch
     try:
-        if storage.exists(file_name):
-            storage.delete(file_name)
-    except Exception as exc:
-        logger.warning("Unable to delete file %s: %s", file_name, exc)
+        yield batch
+    finally:
+        _deletion_batches.current = None
+
+    if batch.audit_logs:
+        _detach_deleted_relations(batch.audit_logs)
+        type(batch.audit_logs[0]).objects.bulk_create(batch.audit_logs)
+    queue_storage_deletions(batch.files)
+    for callback, values in batch.deferred.items():
+        transaction.on_commit(partial(callback, values))
+
+
+def _queue_file_deletion(sender, field_name, file_field):
+    if not file_field:
+        return
+    batch = current_deletion_batch()
+    if batch is not None:
+        batch.files.append((sender, field_name, file_field))
+        return
+    queue_storage_deletions([(sender, field_name, file_field)])
+
 
 @receiver(post_delete)
 def delete_files_when_row_deleted(sender, instance, **kwargs):
     """
-    Signal to delete files from filesystem when the database record is deleted.
-    Iterates over all fields of the sender model.
+    Queue the files of a deleted row in the deletion outbox (same transaction as the delete).
+    The drainer removes them from storage later, unless another row references the key by then.
     """
     for field in sender._meta.fields:
         if isinstance(field, (models.FileField, models.ImageField)):
-            file_field = getattr(instance, field.name)
-            delete_file_if_unused(sender, field.name, file_field)
+            _queue_file_deletion(sender, field.name, getattr(instance, field.name))
 
 @receiver(pre_save)
 def delete_old_file_when_image_updated(sender, instance, **kwargs):
     """
-    Signal to delete the old file when a new file is uploaded (update).
+    Queue the old file for deletion when a new file is uploaded (update).
     """
     if not instance.pk:
         return  # New object, nothing to delete
 
+    file_fields = [
+        field for field in sender._meta.fields if isinstance(field, (models.FileField, models.ImageField))
+    ]
+    if not file_fields:
+        return
+
     try:
         old_instance = sender.objects.get(pk=instance.pk)
     except sender.DoesNotExist:
         return
 
-    for field in sender._meta.fields:
-        if isinstance(field, (models.FileField, models.ImageField)):
-            old_file = getattr(old_instance, field.name)
-            new_file = getattr(instance, field.name)
+    for field in file_fields:
+        old_file = getattr(old_instance, field.name)
+        new_file = getattr(instance, field.name)
 
-            # If the file has changed and the old file exists
-            if old_file and old_file != new_file:
-                delete_file_if_unused(sender, field.name, old_file, instance_pk=instance.pk)
+        # If the file has changed and the old file exists
+        if old_file and old_file != new_file:
+            _queue_file_deletion(sender, field.name, old_file)
@@ -0,0 +1,183 @@
+import logging
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Any
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StorageDeletion
+
+
+logger = logging.getLogger(__name__)
+
+# S3 DeleteObjects accepts at most 1000 keys per request.
+STORAGE_DELETION_BATCH_SIZE = 1000
+LOCAL_UNLINK_WORKERS = 8
+
+
+def queue_storage_deletions(files):
+    """Record ``(model, field_name, file_field)`` entries in the outbox and wake the drainer after commit."""
+    rows = []
+    for model, field_name, file_field in files:
+        file_name = str(getattr(file_field, 'name', '') or '').strip()
+        if file_name:
+            rows.append(StorageDeletion(file_name=file_name, model_label=model._meta.label, field_name=field_name))
+    if not rows:
+        return
+    StorageDeletion.objects.bulk_create(rows)
+    transaction.on_commit(schedule_storage_deletion_drain)
+
+
+def schedule_storage_deletion_drain(countdown: float | None = None):
+    from .tasks import drain_storage_deletions_task
+
+    try:
+        drain_storage_deletions_task.apply_async(countdown=countdown)
+    except Exception:
+        # The rows stay queued; the next deletion or retry wakes the drainer again.
+        logger.exception('Failed to schedule the storage deletion drainer.')
+
+
+def _max_attempts() -> int:
+    return max(int(getattr(settings, 'STORAGE_DELETION_MAX_ATTEMPTS', 8) or 8), 1)
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    base_seconds = max(float(getattr(settings, 'STORAGE_DELETION_RETRY_SECONDS', 60) or 60), 1.0)
+    return timedelta(seconds=min(base_seconds * (2 ** max(attempts - 1, 0)), 24 * 3600))
+
+
+def _referenced_names(model, field_name: str, names: list[str]) -> set[str]:
+    from .signals import storage_key_referrers
+
+    referenced = set()
+    for referrer_model, referrer_field in storage_key_referrers(model, field_name):
+        referenced.update(
+            referrer_model._default_manager.filter(**{f'{referrer_field}__in': names}).values_list(
+                referrer_field, flat=True
+            )
+        )
+    return referenced
+
+
+def _delete_s3_keys(storage: Any, names: list[str]) -> dict[str, str]:
+    from storages.utils import clean_name
+
+    names_by_key = {storage._normalize_name(clean_name(name)): name for name in names}
+    response = storage.bucket.delete_objects(
+        Delete={'Objects': [{'Key': key} for key in names_by_key], 'Quiet': True},
+    )
+    return {
+        names_by_key.get(error.get('Key'), error.get('Key')): f'{error.get("Code")}: {error.get("Message")}'
+        for error in response.get('Errors') or []
+    }
+
+
+def _unlink(path: str) -> str:
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as exc:
+        return str(exc)
+    return ''
+
+
+def delete_storage_keys(storage: Any, names: list[str]) -> dict[str, str]:
+    """Remove keys from one storage in bulk; returns the error message of every key that failed."""
+    if not names:
+        return {}
+    try:
+        if getattr(storage, 'bucket', None) is not None and hasattr(storage, '_normalize_name'):
+            return _delete_s3_keys(storage, names)
+
+        try:
+            paths = [storage.path(name) for name in names]
+        except NotImplementedError:
+            paths = None
+        if paths is not None:
+            with ThreadPoolExecutor(max_workers=min(LOCAL_UNLINK_WORKERS, len(paths))) as executor:
+                errors = list(executor.map(_unlink, paths))
+            return {name: error for name, error in zip(names, errors) if error}
+    except Exception as exc:
+        return {name: str(exc) for name in names}
+
+    errors = {}
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception as exc:
+            errors[name] = str(exc)
+    return errors
+
+
+def drain_storage_deletions(limit: int = STORAGE_DELETION_BATCH_SIZE) -> dict[str, int]:
+    """Delete one batch of due outbox keys that no row references any more.
+
+    Keys a row still (or again) references are dropped from the outbox without touching storage.
+    Failed keys are retried with exponential backoff until ``STORAGE_DELETION_MAX_ATTEMPTS``; after
+    that their rows stay in the table for inspection.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = list(
+            StorageDeletion.objects.select_for_update(skip_locked=True)
+            .filter(next_attempt_at__lte=now, attempts__lt=_max_attempts())
+            .order_by('next_attempt_at', 'created_at')[:limit]
+        )
+        if not rows:
+            return {'rows': 0, 'deleted': 0, 'kept': 0, 'failed': 0}
+
+        rows_by_field = defaultdict(list)
+        for row in rows:
+            rows_by_field[(row.model_label, row.field_name)].append(row)
+
+        deleted, kept = 0, 0
+        failed_rows = []
+        for (model_label, field_name), field_rows in rows_by_field.items():
+            try:
+                model = apps.get_model(model_label)
+                storage = model._meta.get_field(field_name).storage
+            except (LookupError, FieldDoesNotExist):
+                logger.warning('Dropping queued deletions for unknown field %s.%s.', model_label, field_name)
+                continue
+            names = sorted({row.file_name for row in field_rows})
+            referenced = _referenced_names(model, field_name, names)
+            unreferenced = [name for name in names if name not in referenced]
+            errors = delete_storage_keys(storage, unreferenced)
+            kept += len(names) - len(unreferenced)
+            deleted += len(unreferenced) - len(errors)
+            for row in field_rows:
+                if row.file_name in errors:
+                    row.attempts += 1
+                    row.next_attempt_at = now + _retry_delay(row.attempts)
+                    row.last_error = errors[row.file_name][:2000]
+                    failed_rows.append(row)
+
+        failed_ids = {row.pk for row in failed_rows}
+        StorageDeletion.objects.filter(pk__in=[row.pk for row in rows if row.pk not in failed_ids]).delete()
+        StorageDeletion.objects.bulk_update(failed_rows, ['attempts', 'next_attempt_at', 'last_error'])
+
+    if failed_rows:
+        logger.warning('Failed to delete %s storage key(s); they will be retried.', len(failed_rows))
+    return {'rows': len(rows), 'deleted': deleted, 'kept': kept, 'failed': len(failed_rows)}
+
+
+def next_storage_deletion_retry() -> timedelta | None:
+    """Time until the earliest failed key is due again (at most ten minutes), or None when none waits."""
+    next_attempt_at = (
+        StorageDeletion.objects.filter(attempts__gt=0, attempts__lt=_max_attempts())
+        .order_by('next_attempt_at')
+        .values_list('next_attempt_at', flat=True)
+        .first()
+    )
+    if next_attempt_at is None:
+        return None
+    # Capped so a far-off retry never sits in the broker past its visibility timeout.
+    return min(max(next_attempt_at - timezone.now(), timedelta(0)), timedelta(minutes=10))
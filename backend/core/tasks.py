@@ -0,0 +1,31 @@
+from celery import shared_task
+
+from .storage_deletion import (
+    STORAGE_DELETION_BATCH_SIZE,
+    drain_storage_deletions,
+    next_storage_deletion_retry,
+    schedule_storage_deletion_drain,
+)
+
+# Batches per task run; a fuller outbox continues in a fresh task so one run never hits the time limit.
+STORAGE_DELETION_BATCHES_PER_TASK = 20
+
+
+@shared_task
+def drain_storage_deletions_task():
+    """Work the deletion outbox down in batches, then sleep until the earliest failed key is due."""
+    totals = {'rows': 0, 'deleted': 0, 'kept': 0, 'failed': 0}
+    for _batch in range(STORAGE_DELETION_BATCHES_PER_TASK):
+        result = drain_storage_deletions()
+        for key, value in result.items():
+            totals[key] += value
+        if result['rows'] < STORAGE_DELETION_BATCH_SIZE:
+            break
+    else:
+        schedule_storage_deletion_drain()
+        return {**totals, 'status': 'continued'}
+
+    retry_in = next_storage_deletion_retry()
+    if retry_in is not None:
+        schedule_storage_deletion_drain(countdown=retry_in.total_seconds())
+    return {**totals, 'status': 'drained'}
@@ -0,0 +1,94 @@
+from typing import Any
+from uuid import UUID
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Subquery
+
+from media.face_index import rank_labels, sync_vault_face_index
+from media.models import FaceEmbedding, MediaItem
+from media.vision import FACE_EMBEDDING_MODEL
+from .models import MediaTag, PersonProfile
+
+
+def suggest_people_for_faces(media_item: MediaItem, *, face_ids: list[str] | None = None, limit: int = 5) -> list[dict[str, Any]]:
+    """Rank the vault's people for each detected face of a media item by face-embedding similarity."""
+    index = sync_vault_face_index(media_item.vault_id)
+
+    query_embeddings = FaceEmbedding.objects.filter(media_item=media_item, model=FACE_EMBEDDING_MODEL)
+    if face_ids:
+        query_embeddings = query_embeddings.filter(face_id__in=face_ids)
+    query_embeddings = list(query_embeddings.values_list('id', 'face_id'))
+
+    face_tags = MediaTag.objects.filter(
+        media_item_id=OuterRef('media_item_id'),
+        detected_face_id=OuterRef('face_id'),
+    )
+    tagged_embeddings = list(
+        FaceEmbedding.objects.filter(vault_id=media_item.vault_id, model=FACE_EMBEDDING_MODEL)
+        .filter(Exists(face_tags))
+        .annotate(person_id=Subquery(face_tags.values('person_id')[:1]))
+        .values_list('id', 'person_id')
+    )
+
+    query_rows = index.rows_for(embedding_id for embedding_id, _face_id in query_embeddings)
+    labeled_rows = index.rows_for(embedding_id for embedding_id, _person_id in tagged_embeddings)
+    # Subquery annotations come back as raw column values (hex on SQLite), so normalize to UUID strings.
+    labels = np.asarray([str(UUID(str(person_id))) for _embedding_id, person_id in tagged_embeddings], dtype=str)
+    known_labels = labeled_rows >= 0
+
+    current_tags = dict(
+        MediaTag.objects.filter(media_item=media_item)
+        .exclude(detected_face_id='')
+        .values_list('detected_face_id', 'person_id')
+    )
+    tagged_people_in_media = {str(person_id) for person_id in current_tags.values()}
+
+    known_queries = [position for position, row in enumerate(query_rows) if row >= 0]
+    ranked = rank_labels(
+        index,
+        query_rows[known_queries],
+        labeled_rows[known_labels],
+        labels[known_labels],
+        # Over-fetch so people already tagged elsewhere in this photo can be dropped.
+        limit=limit + len(tagged_people_in_media),
+        min_score=float(getattr(settings, 'MEDIA_FACE_SUGGESTION_MIN_SCORE', 0.3)),
+    )
+    ranked_by_face = {query_embeddings[position][1]: ranked[offset] for offset, position in enumerate(known_queries)}
+
+    person_names = dict(
+        PersonProfile.objects.filter(
+            vault_id=media_item.vault_id,
+            id__in={candidate['label'] for candidates in ranked for candidate in candidates},
+        ).values_list('id', 'full_name')
+    )
+    person_names = {str(person_id): full_name for person_id, full_name in person_names.items()}
+
+    results = []
+    for _embedding_id, face_id in query_embeddings:
+        tagged_person_id = str(current_tags[face_id]) if face_id in current_tags else None
+        suggestions = []
+        for candidate in ranked_by_face.get(face_id, []):
+            person_id = candidate['label']
+            if person_id in tagged_people_in_media and person_id != tagged_person_id:
+                continue
+            if person_id not in person_names:
+                continue
+            suggestions.append(
+                {
+                    'person_id': person_id,
+                    'person_name': person_names[person_id],
+                    'score': candidate['score'],
+                    'matched_faces': candidate['matched_faces'],
+                }
+            )
+            if len(suggestions) >= limit:
+                break
+        results.append(
+            {
+                'face_id': face_id,
+                'tagged_person_id': tagged_person_id,
+                'suggestions': suggestions,
+            }
+        )
+    return results
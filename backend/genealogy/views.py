@@ -1,9 +1,13 @@
 from rest_framework import viewsets, permissions, status, decorators
 from rest_framework.response import Response
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 
 from .models import PersonProfile, Relationship, MediaTag
 from .serializers import PersonProfileSerializer, RelationshipSerializer, MediaTagSerializer
+from .suggestions import suggest_people_for_faces
+from media.models import MediaItem
 from vaults.models import FamilyVault, Membership
 from vaults.permissions import IsVaultMember
 
@@ -176,3 +180,64 @@ class MediaTagViewSet(viewsets.ModelViewSet):
             raise permissions.PermissionDenied("Not a member of this vault")
 
         serializer.save(created_by=self.request.user)
+
+    @decorators.action(detail=False, methods=['get'])
+    def suggestions(self, request):
+        """
+        Ranks people for each detected face of a photo by face similarity to already tagged faces.
+        Usage: /api/genealogy/tags/suggestions/?media={uuid}&faceId={faceId}
+        """
+        media_id = request.query_params.get('media')
+        if not media_id:
+            return Response({"error": "Media ID required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        media_item = get_object_or_404(
+            MediaItem.objects.filter(
+                vault__members__user=request.user,
+                vault__members__is_active=True,
+            ).distinct(),
+            id=media_id,
+        )
+        face_id = str(request.query_params.get('faceId', request.query_params.get('face_id')) or '').strip()
+        try:
+            limit = max(1, min(int(request.query_params.get('limit') or 5), 20))
+        except (TypeError, ValueError):
+            limit = 5
+
+        return Response({
+            "media_item": str(media_item.id),
+            "faces": suggest_people_for_faces(media_item, face_ids=[face_id] if face_id else None, limit=limit),
+        })
+
+    @decorators.action(detail=False, methods=['post'], url_path='apply-suggestions')
+    def apply_suggestions(self, request):
+        """
+        Applies several face-to-person links in one request; each item is validated like a single tag.
+        Body: {"items": [{"mediaItem": uuid, "detectedFaceId": str, "person": uuid}, ...]}
+        """
+        items = request.data.get('items')
+        if not isinstance(items, list) or not items:
+            return Response({"error": "items must be a non-empty list"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > 200:
+            return Response({"error": "At most 200 items can be applied at once"}, status=status.HTTP_400_BAD_REQUEST)
+
+        applied = []
+        errors = []
+        for position, item in enumerate(items):
+            serializer = self.get_serializer(data=item)
+            if not serializer.is_valid():
+                errors.append({"index": position, "errors": serializer.errors})
+                continue
+            media_item = serializer.validated_data['media_item']
+            if not media_item.vault.members.filter(user=request.user, is_active=True).exists():
+                errors.append({"index": position, "errors": {"detail": "Not a member of this vault"}})
+                continue
+            try:
+                with transaction.atomic():
+                    media_tag = serializer.save(created_by=request.user)
+            except DjangoValidationError as exc:
+                errors.append({"index": position, "errors": {"detail": exc.messages}})
+                continue
+            applied.append(self.get_serializer(media_tag).data)
+
+        return Response({"applied": applied, "errors": errors})
@@ -1,5 +1,15 @@
 from django.contrib import admin
-from .models import MediaAttachment, MediaFavorite, MediaItem, MediaItemLockTarget
+from .models import (
+    FaceEmbedding,
+    MediaAttachment,
+    MediaDocumentText,
+    MediaFavorite,
+    MediaItem,
+    MediaItemLockTarget,
+    MediaReprocessRun,
+    MediaRestorationOutput,
+    MediaTaskTicket,
+)
 
 @admin.register(MediaItem)
 class MediaItemAdmin(admin.ModelAdmin):
@@ -15,6 +25,7 @@ class MediaItemAdmin(admin.ModelAdmin):
         'exif_status',
         'face_detection_status',
         'restoration_status',
+        'document_status',
         'created_at',
     )
     search_fields = ('title', 'description', 'uploader__email', 'uploader__full_name')
@@ -25,6 +36,7 @@ class MediaItemAdmin(admin.ModelAdmin):
         'exif_status',
         'face_detection_status',
         'restoration_status',
+        'document_status',
         'created_at',
     )
 
@@ -42,7 +54,44 @@ class MediaAttachmentAdmin(admin.ModelAdmin):
     list_filter = ('file_type', 'created_at')
 
 
+@admin.register(MediaDocumentText)
+class MediaDocumentTextAdmin(admin.ModelAdmin):
+    list_display = ('id', 'media_item', 'original_name', 'page_count', 'is_truncated', 'updated_at')
+    search_fields = ('media_item__title', 'original_name', 'content_hash')
+    list_filter = ('is_truncated', 'extractor_version')
+
+
 @admin.register(MediaItemLockTarget)
 class MediaItemLockTargetAdmin(admin.ModelAdmin):
     list_display = ('id', 'media_item', 'user', 'created_at')
     search_fields = ('media_item__title', 'user__email', 'user__full_name')
+
+
+@admin.register(MediaReprocessRun)
+class MediaReprocessRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'vault', 'status', 'total_items', 'processed_items', 'failed_items', 'started_at', 'finished_at')
+    search_fields = ('id', 'vault__name', 'requested_by__email')
+    list_filter = ('status', 'created_at')
+    readonly_fields = ('pending_batches', 'batch_progress', 'checkpoint_created_at', 'checkpoint_item_id', 'dispatcher_task_id')
+
+
+@admin.register(MediaTaskTicket)
+class MediaTaskTicketAdmin(admin.ModelAdmin):
+    list_display = ('task_id', 'vault', 'media_item', 'task_name', 'status', 'created_at', 'dispatched_at', 'finished_at')
+    search_fields = ('task_id', 'vault__name', 'media_item__title')
+    list_filter = ('status', 'task_name')
+
+
+@admin.register(FaceEmbedding)
+class FaceEmbeddingAdmin(admin.ModelAdmin):
+    list_display = ('id', 'vault', 'media_item', 'face_id', 'model', 'created_at')
+    search_fields = ('media_item__title', 'face_id')
+    list_filter = ('model',)
+    exclude = ('vector',)
+
+
+@admin.register(MediaRestorationOutput)
+class MediaRestorationOutputAdmin(admin.ModelAdmin):
+    list_display = ('id', 'media_item', 'file_id', 'options_key', 'pipeline_version', 'colorization_method', 'updated_at')
+    search_fields = ('media_item__title', 'file_id', 'content_hash', 'output')
+    list_filter = ('options_key', 'pipeline_version', 'colorization_method')
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MediaConfig(AppConfig):
     name = 'media'
+
+    def ready(self):
+        import media.signals  # noqa: F401
@@ -0,0 +1,226 @@
+import re
+import struct
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from pathlib import Path
+from typing import Any
+
+import mutagen
+from django.utils import timezone
+
+from .exif import _empty_exif_payload, _iter_boxes, _to_json_safe
+from .ranged_storage import read_stored_header
+
+
+AV_EXTENSIONS = {
+    '.mp4', '.m4v', '.mov', '.3gp', '.m4a', '.aac', '.mp3', '.flac', '.ogg', '.oga', '.opus', '.wav',
+}
+AV_MIME_PREFIXES = ('video/', 'audio/')
+# QuickTime/MP4 timestamps count seconds from 1904-01-01 UTC.
+QUICKTIME_EPOCH = datetime(1904, 1, 1, tzinfo=dt_timezone.utc)
+QUICKTIME_UNIX_OFFSET = 2082844800
+ISO6709_PATTERN = re.compile(r'^([+-]\d+(?:\.\d+)?)([+-]\d+(?:\.\d+)?)')
+TAG_DATETIME_PATTERN = re.compile(
+    r'^(\d{4}-\d{2}-\d{2})(?:[T ](\d{2}:\d{2}(?::\d{2})?(?:\.\d+)?))?\s*(Z|[+-]\d{2}:?\d{2})?$'
+)
+# mutagen tag keys that hold a recording date: MP4 ilst, ID3 and Vorbis comments (FLAC/Ogg).
+DATE_TAG_KEYS = ('\xa9day', 'TDRC', 'TDOR', 'date')
+MOOV_CHILD_CONTAINERS = {b'trak', b'mdia', b'minf', b'stbl', b'udta'}
+MAX_MOOV_LEAF_BYTES = 1024 * 1024
+
+
+def is_av_source(file_name: str = '', mime_type: str = '') -> bool:
+    normalized_mime = str(mime_type or '').strip().lower()
+    if normalized_mime.startswith(AV_MIME_PREFIXES):
+        return True
+    return Path(str(file_name or '').strip().lower()).suffix in AV_EXTENSIONS
+
+
+def _parse_tag_datetime(raw_value: Any) -> datetime | None:
+    match = TAG_DATETIME_PATTERN.match(str(raw_value or '').strip())
+    if not match:
+        # Year-only tags ("1987") are too coarse to offer as a capture date.
+        return None
+    date_token, time_token, offset_token = match.groups()
+    try:
+        parsed = datetime.fromisoformat(f'{date_token}T{time_token or "00:00:00"}')
+    except ValueError:
+        return None
+    if offset_token is None:
+        return timezone.make_aware(parsed, timezone.get_current_timezone())
+    if offset_token == 'Z':
+        return parsed.replace(tzinfo=dt_timezone.utc)
+    digits = offset_token[1:].replace(':', '')
+    minutes = int(digits[:2]) * 60 + int(digits[2:])
+    return parsed.replace(tzinfo=timezone.get_fixed_timezone(minutes if offset_token[0] == '+' else -minutes))
+
+
+def _parse_iso6709(raw_value: Any) -> dict[str, float] | None:
+    match = ISO6709_PATTERN.match(str(raw_value or '').strip())
+    if not match:
+        return None
+    latitude, longitude = float(match.group(1)), float(match.group(2))
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180) or (latitude == 0 and longitude == 0):
+        return None
+    return {'latitude': round(latitude, 7), 'longitude': round(longitude, 7)}
+
+
+def _read_leaf(handle, start: int, end: int) -> bytes:
+    if end - start > MAX_MOOV_LEAF_BYTES:
+        return b''
+    handle.seek(start)
+    return handle.read(end - start)
+
+
+def _parse_apple_keys(handle, meta_start: int, meta_end: int) -> dict[str, Any]:
+    # QuickTime "mdta" metadata: ``keys`` names the entries, ``ilst`` items are indexed 1..n. QuickTime
+    # writes meta as a plain box; ISO files make it a full box with 4 bytes of version/flags first.
+    handle.seek(meta_start)
+    if handle.read(8)[4:8] != b'hdlr':
+        meta_start += 4
+    children = {box_type: (start, end) for box_type, start, end in _iter_boxes(handle, meta_start, meta_end)}
+    if b'keys' not in children or b'ilst' not in children:
+        return {}
+    keys_data = _read_leaf(handle, *children[b'keys'])
+    names = []
+    position = 8
+    while position + 8 <= len(keys_data):
+        size = struct.unpack_from('>I', keys_data, position)[0]
+        if size < 8:
+            break
+        names.append(keys_data[position + 8 : position + size].decode('utf-8', errors='ignore'))
+        position += size
+
+    values = {}
+    for item_type, item_start, item_end in _iter_boxes(handle, *children[b'ilst']):
+        index = struct.unpack('>I', item_type)[0]
+        if not 1 <= index <= len(names):
+            continue
+        for data_type, data_start, data_end in _iter_boxes(handle, item_start, item_end):
+            if data_type == b'data':
+                # data box: 4-byte type indicator and 4-byte locale precede the value.
+                value = _read_leaf(handle, data_start + 8, data_end)
+                values[names[index - 1]] = value.decode('utf-8', errors='ignore')
+                break
+    return values
+
+
+def _handler_and_codec(handle, trak_start: int, trak_end: int) -> tuple[str, str]:
+    handler_type = ''
+    codec = ''
+    stack = [(trak_start, trak_end)]
+    while stack:
+        start, end = stack.pop()
+        for box_type, child_start, child_end in _iter_boxes(handle, start, end):
+            if box_type in MOOV_CHILD_CONTAINERS:
+                stack.append((child_start, child_end))
+            elif box_type == b'hdlr' and not handler_type:
+                # mdia's handler comes first; QuickTime repeats hdlr in minf for the data reference.
+                header = _read_leaf(handle, child_start, min(child_end, child_start + 12))
+                handler_type = header[8:12].decode('latin-1')
+            elif box_type == b'stsd':
+                # Full box + entry count, then the first sample entry's size and format.
+                codec = _read_leaf(handle, child_start, min(child_end, child_start + 16))[12:16].decode('latin-1')
+    return handler_type, codec.strip()
+
+
+def _read_quicktime_atoms(handle) -> dict[str, Any]:
+    """Creation time, duration, codecs and location from the ``moov`` atom of an MP4/MOV file."""
+    moov = next(((start, end) for box_type, start, end in _iter_boxes(handle, 0, None) if box_type == b'moov'), None)
+    if moov is None:
+        return {}
+
+    atoms = {}
+    for box_type, start, end in _iter_boxes(handle, *moov):
+        if box_type == b'mvhd':
+            data = _read_leaf(handle, start, end)
+            if data[:1] == b'\x01':
+                created, _modified, timescale, duration = struct.unpack_from('>QQIQ', data, 4)
+            else:
+                created, _modified, timescale, duration = struct.unpack_from('>IIII', data, 4)
+            # Zero (and anything before 1970) means the recorder never set its clock.
+            if created > QUICKTIME_UNIX_OFFSET:
+                atoms['creation_time'] = (QUICKTIME_EPOCH + timedelta(seconds=created)).isoformat()
+            if timescale:
+                atoms['duration'] = round(duration / timescale, 3)
+        elif box_type == b'trak':
+            handler_type, codec = _handler_and_codec(handle, start, end)
+            if handler_type == 'vide' and codec:
+                atoms.setdefault('video_codec', codec)
+            elif handler_type == 'soun' and codec:
+                atoms.setdefault('audio_codec', codec)
+        elif box_type == b'udta':
+            for child_type, child_start, child_end in _iter_boxes(handle, start, end):
+                if child_type == b'\xa9xyz':
+                    # 16-bit length and language code, then an ISO 6709 string.
+                    location = _read_leaf(handle, child_start + 4, child_end)
+                    atoms['location'] = location.decode('utf-8', errors='ignore')
+        elif box_type == b'meta':
+            atoms.update(_parse_apple_keys(handle, start, end))
+    return atoms
+
+
+def _first_tag_value(tags: Any, key: str) -> str:
+    try:
+        value = tags.get(key) if tags is not None else None
+    except (KeyError, ValueError):
+        return ''
+    if isinstance(value, (list, tuple)):
+        value = value[0] if value else ''
+    text = getattr(value, 'text', None)
+    if isinstance(text, (list, tuple)):
+        value = text[0] if text else ''
+    return str(value or '').strip()
+
+
+def _extract_av_metadata_from_handle(handle) -> dict[str, Any]:
+    prefix = handle.read(12)
+    handle.seek(0)
+    atoms = _read_quicktime_atoms(handle) if prefix[4:8] in {b'ftyp', b'moov', b'mdat', b'wide', b'free'} else {}
+    handle.seek(0)
+    try:
+        audio = mutagen.File(handle)
+    except (mutagen.MutagenError, ValueError, struct.error):
+        # mutagen reads QuickTime-style meta atoms as ISO full boxes and trips over them; the atom
+        # walker above already has what those files carry.
+        audio = None
+    if audio is None and not atoms:
+        return _empty_exif_payload()
+
+    tags = getattr(audio, 'tags', None)
+    info = getattr(audio, 'info', None)
+    raw_metadata = {
+        'Container': type(audio).__name__ if audio is not None else 'QuickTime',
+        'VideoCodec': atoms.get('video_codec'),
+        'AudioCodec': atoms.get('audio_codec') or str(getattr(info, 'codec', '') or ''),
+        'DurationSeconds': atoms.get('duration') or round(float(getattr(info, 'length', 0) or 0), 3),
+        'Make': atoms.get('com.apple.quicktime.make') or _first_tag_value(tags, '\xa9mak'),
+        'Model': atoms.get('com.apple.quicktime.model') or _first_tag_value(tags, '\xa9mod'),
+        'Software': atoms.get('com.apple.quicktime.software') or _first_tag_value(tags, '\xa9too'),
+    }
+
+    # Apple's creation date keeps the local UTC offset; mvhd is UTC; editable tags come last.
+    date_sources = [atoms.get('com.apple.quicktime.creationdate'), atoms.get('creation_time')]
+    date_sources.extend(_first_tag_value(tags, key) for key in DATE_TAG_KEYS)
+    date_taken = None
+    for raw_value in date_sources:
+        date_taken = _parse_tag_datetime(raw_value)
+        if date_taken:
+            raw_metadata['CreationDate'] = raw_value
+            break
+
+    location = atoms.get('com.apple.quicktime.location.ISO6709') or atoms.get('location')
+    return {
+        'raw_exif': {key: value for key, value in _to_json_safe(raw_metadata).items() if value not in ('', 0, 0.0)},
+        'date_taken': date_taken.isoformat() if date_taken else None,
+        'gps': _parse_iso6709(location),
+        'extracted_at': timezone.now().isoformat(),
+    }
+
+
+def extract_av_metadata_payload(file_obj: Any) -> dict[str, Any]:
+    """Recording date, duration, codecs and location of a video/audio file, in the EXIF payload shape."""
+    try:
+        return read_stored_header(file_obj, _extract_av_metadata_from_handle)
+    except (mutagen.MutagenError, OSError, ValueError, struct.error):
+        return _empty_exif_payload()
@@ -0,0 +1,162 @@
+import io
+import logging
+from pathlib import Path
+from typing import Any
+
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .storage_cache import open_cached_file
+
+try:
+    from PyPDF2 import PasswordType, PdfReader
+    from PyPDF2.errors import PyPdfError
+except Exception:  # pragma: no cover - import safety
+    PasswordType = None
+    PdfReader = None
+    PyPdfError = Exception
+
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_EXTRACTOR_VERSION = 'pypdf2-v1'
+PDF_EXTENSIONS = {'.pdf'}
+PDF_MIME_TYPES = {'application/pdf', 'application/x-pdf'}
+DEFAULT_MAX_PAGES = 50
+DEFAULT_MAX_TEXT_CHARS = 200_000
+DEFAULT_PREVIEW_MAX_SIDE = 768
+
+
+def is_pdf_source(file_name: str = '', mime_type: str = '') -> bool:
+    normalized_mime = str(mime_type or '').strip().lower()
+    if normalized_mime in PDF_MIME_TYPES:
+        return True
+    return Path(str(file_name or '').strip().lower()).suffix in PDF_EXTENSIONS
+
+
+def _normalize_page_text(raw_text: Any) -> str:
+    token = str(raw_text or '')
+    lines = [' '.join(line.split()) for line in token.splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+
+def _render_first_page_preview(reader: Any, *, max_side: int) -> bytes | None:
+    # PyPDF2 cannot rasterize vector pages, but scanned letters and certificates are
+    # stored as one embedded image per page, which is exactly what we want to show.
+    try:
+        first_page = reader.pages[0]
+        embedded_images = list(getattr(first_page, 'images', []) or [])
+    except Exception:
+        return None
+    if not embedded_images:
+        return None
+
+    largest_image = max(embedded_images, key=lambda image_file: len(getattr(image_file, 'data', b'') or b''))
+    image_bytes = getattr(largest_image, 'data', b'') or b''
+    if not image_bytes:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as source:
+            preview = ImageOps.exif_transpose(source).convert('RGB')
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+
+    preview.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    preview.save(buffer, format='JPEG', quality=82, optimize=True)
+    return buffer.getvalue()
+
+
+def _extract_from_handle(
+    handle: Any,
+    *,
+    empty_payload: dict[str, Any],
+    max_pages: int,
+    max_text_chars: int,
+    preview_max_side: int,
+) -> dict[str, Any]:
+    reader = PdfReader(handle, strict=False)
+    if reader.is_encrypted:
+        # A wrong password is reported through the return value; only broken encryption raises.
+        try:
+            decrypted = reader.decrypt('') != PasswordType.NOT_DECRYPTED
+        except Exception:
+            decrypted = False
+        if not decrypted:
+            return {**empty_payload, 'warnings': ['Document is password protected.']}
+
+    page_count = len(reader.pages)
+    page_limit = max(int(max_pages or 0), 0)
+    char_limit = max(int(max_text_chars or 0), 0)
+    warnings = []
+    text_parts = []
+    collected_chars = 0
+    extracted_pages = 0
+    is_truncated = page_count > page_limit
+
+    # Pages are parsed lazily by PyPDF2, so stopping early also stops decoding content streams.
+    for page_index in range(min(page_count, page_limit)):
+        try:
+            page_text = _normalize_page_text(reader.pages[page_index].extract_text())
+        except Exception as exc:
+            warnings.append(f'Page {page_index + 1}: {exc}')
+            continue
+        extracted_pages += 1
+        if not page_text:
+            continue
+
+        remaining_chars = char_limit - collected_chars
+        if remaining_chars <= 0:
+            is_truncated = True
+            break
+        if len(page_text) > remaining_chars:
+            page_text = page_text[:remaining_chars]
+            is_truncated = True
+        text_parts.append(page_text)
+        collected_chars += len(page_text) + 1
+
+    preview_bytes = _render_first_page_preview(reader, max_side=preview_max_side) if page_count else None
+    return {
+        'is_document': True,
+        'page_count': page_count,
+        'extracted_page_count': extracted_pages,
+        'text': '\n'.join(text_parts)[:char_limit],
+        'is_truncated': is_truncated,
+        'preview_bytes': preview_bytes,
+        'warnings': warnings,
+        'extractor_version': DOCUMENT_EXTRACTOR_VERSION,
+    }
+
+
+def extract_document_payload(
+    file_obj: Any,
+    *,
+    max_pages: int = DEFAULT_MAX_PAGES,
+    max_text_chars: int = DEFAULT_MAX_TEXT_CHARS,
+    preview_max_side: int = DEFAULT_PREVIEW_MAX_SIDE,
+) -> dict[str, Any]:
+    empty_payload = {
+        'is_document': False,
+        'page_count': 0,
+        'extracted_page_count': 0,
+        'text': '',
+        'is_truncated': False,
+        'preview_bytes': None,
+        'warnings': [],
+        'extractor_version': DOCUMENT_EXTRACTOR_VERSION,
+    }
+    if PdfReader is None:
+        raise RuntimeError('PyPDF2 is not installed. Install PyPDF2 to enable document processing.')
+
+    try:
+        with open_cached_file(file_obj) as handle:
+            return _extract_from_handle(
+                handle,
+                empty_payload=empty_payload,
+                max_pages=max_pages,
+                max_text_chars=max_text_chars,
+                preview_max_side=preview_max_side,
+            )
+    except (PyPdfError, ValueError, OSError) as exc:
+        logger.info('Unable to parse document: %s', exc)
+        return empty_payload
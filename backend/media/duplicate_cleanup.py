@@ -0,0 +1,66 @@
+from typing import Any
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import DuplicateCleanupRun, DuplicateGroup
+from .tasks import start_duplicate_cleanup_worker
+
+
+def start_duplicate_cleanup(*, vault, requested_by=None, signatures=None) -> DuplicateCleanupRun:
+    with transaction.atomic():
+        if DuplicateCleanupRun.objects.filter(vault=vault, status=DuplicateCleanupRun.Status.RUNNING).exists():
+            raise ValueError('A duplicate cleanup is already running for this vault. Resume it or wait for it.')
+
+        groups = DuplicateGroup.objects.filter(vault=vault)
+        if signatures:
+            groups = groups.filter(signature__in=signatures)
+        now = timezone.now()
+        run = DuplicateCleanupRun.objects.create(
+            vault=vault,
+            requested_by=requested_by,
+            status=DuplicateCleanupRun.Status.RUNNING,
+            signatures=sorted(signatures or []),
+            total_groups=groups.count(),
+            started_at=now,
+            last_progress_at=now,
+        )
+        start_duplicate_cleanup_worker(run)
+    return run
+
+
+def resume_duplicate_cleanup(run: DuplicateCleanupRun) -> DuplicateCleanupRun:
+    """Continue after the checkpoint with a new worker chain, e.g. after a worker died or failed."""
+    if run.status == DuplicateCleanupRun.Status.COMPLETED:
+        raise ValueError('Completed cleanups cannot be resumed.')
+
+    with transaction.atomic():
+        locked_run = DuplicateCleanupRun.objects.select_for_update().get(pk=run.pk)
+        locked_run.status = DuplicateCleanupRun.Status.RUNNING
+        locked_run.finished_at = None
+        locked_run.error = ''
+        locked_run.save(update_fields=['status', 'finished_at', 'error', 'updated_at'])
+        start_duplicate_cleanup_worker(locked_run)
+
+    run.refresh_from_db()
+    return run
+
+
+def serialize_duplicate_cleanup_run(run: DuplicateCleanupRun) -> dict[str, Any]:
+    total_groups = int(run.total_groups or 0)
+    processed_groups = min(int(run.processed_groups or 0), total_groups)
+    return {
+        'id': str(run.id),
+        'vault_id': str(run.vault_id),
+        'dry_run': False,
+        'status': run.status,
+        'groups_selected': total_groups,
+        'groups_processed': processed_groups,
+        'deleted_items_count': int(run.deleted_items or 0),
+        'recovered_bytes': int(run.recovered_bytes or 0),
+        'progress_percent': round(processed_groups / total_groups * 100.0, 2) if total_groups else 100.0,
+        'started_at': run.started_at,
+        'finished_at': run.finished_at,
+        'last_progress_at': run.last_progress_at,
+        'error': run.error or '',
+    }
@@ -0,0 +1,203 @@
+import hashlib
+from collections import defaultdict
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from core.signals import batched_row_deletion
+from .models import DuplicateGroup, MediaAttachment, MediaItem
+
+
+def build_duplicate_signature(component_hashes: Iterable[str]) -> str:
+    """One token for an item's files: items with the same primary and attachment bytes share it."""
+    normalized_hashes = sorted(token for token in component_hashes if token)
+    if not normalized_hashes:
+        return ''
+    return hashlib.sha256('|'.join(normalized_hashes).encode('utf-8')).hexdigest()
+
+
+def refresh_item_signatures(media_item_ids: Iterable) -> dict:
+    """Recompute stored signatures from the current content hashes.
+
+    Returns ``{vault_id: signatures}`` for every signature an item left or joined, i.e. the groups
+    that need refreshing.
+    """
+    media_item_ids = list(media_item_ids)
+    attachment_hashes = defaultdict(list)
+    for media_item_id, content_hash in MediaAttachment.objects.filter(media_item_id__in=media_item_ids).values_list(
+        'media_item_id', 'content_hash'
+    ):
+        attachment_hashes[media_item_id].append(content_hash)
+
+    touched = defaultdict(set)
+    for media_item_id, vault_id, content_hash, stored_signature in MediaItem.objects.filter(
+        pk__in=media_item_ids
+    ).values_list('id', 'vault_id', 'content_hash', 'duplicate_signature'):
+        signature = build_duplicate_signature([content_hash, *attachment_hashes[media_item_id]])
+        if signature == stored_signature:
+            continue
+        MediaItem.objects.filter(pk=media_item_id).update(duplicate_signature=signature)
+        touched[vault_id].update(token for token in (stored_signature, signature) if token)
+    return touched
+
+
+def refresh_duplicate_groups(vault_id, signatures: Iterable[str] | None = None) -> int:
+    """Rebuild the vault's ``DuplicateGroup`` rows for ``signatures`` (all of them when None).
+
+    One ``GROUP BY duplicate_signature`` query counts members and bytes; the earliest item of each
+    group is its primary, and everything else is reclaimable. Returns the number of groups kept.
+    """
+    items = MediaItem.objects.filter(vault_id=vault_id).exclude(duplicate_signature='')
+    existing_groups = DuplicateGroup.objects.filter(vault_id=vault_id)
+    if signatures is not None:
+        signatures = {token for token in signatures if token}
+        if not signatures:
+            return 0
+        items = items.filter(duplicate_signature__in=signatures)
+        existing_groups = existing_groups.filter(signature__in=signatures)
+
+    first_item = MediaItem.objects.filter(
+        vault_id=vault_id,
+        duplicate_signature=OuterRef('duplicate_signature'),
+    ).order_by('created_at', 'id')
+    rows = (
+        items.order_by()
+        .values('duplicate_signature')
+        .annotate(
+            item_count=Count('id'),
+            total_bytes=Coalesce(Sum('file_size'), Value(0)),
+            primary_id=Subquery(first_item.values('id')[:1]),
+            primary_bytes=Subquery(first_item.values('file_size')[:1]),
+        )
+        .filter(item_count__gt=1)
+    )
+    groups = [
+        DuplicateGroup(
+            vault_id=vault_id,
+            signature=row['duplicate_signature'],
+            primary_id=row['primary_id'],
+            item_count=row['item_count'],
+            reclaimable_bytes=int(row['total_bytes'] or 0) - int(row['primary_bytes'] or 0),
+        )
+        for row in rows
+    ]
+
+    with transaction.atomic():
+        existing_groups.exclude(signature__in=[group.signature for group in groups]).delete()
+        DuplicateGroup.objects.bulk_create(
+            groups,
+            update_conflicts=True,
+            unique_fields=['vault', 'signature'],
+            update_fields=['primary', 'item_count', 'reclaimable_bytes', 'updated_at'],
+        )
+    return len(groups)
+
+
+def sync_duplicate_groups(media_item_ids: Iterable):
+    """Bring signatures and the groups they touch up to date after content hashes changed."""
+    for vault_id, signatures in refresh_item_signatures(media_item_ids).items():
+        refresh_duplicate_groups(vault_id, signatures)
+
+
+def items_missing_hashes(*, perceptual: bool = True):
+    """Items the hash backfill still has to visit: no duplicate signature, or a photo without a dHash.
+
+    ``perceptual=False`` leaves out the dHash condition; files that are not decodable images never
+    get one, so only the signature is a reliable "still pending" marker.
+    """
+    missing = Q(duplicate_signature='')
+    if perceptual:
+        missing |= Q(media_type=MediaItem.MediaType.PHOTO, perceptual_hash__isnull=True)
+    return MediaItem.objects.exclude(file='').filter(missing)
+
+
+def _normalize_metadata_tags(raw_tags) -> list[str]:
+    if isinstance(raw_tags, str):
+        raw_tags = [tag.strip() for tag in raw_tags.split(',') if tag.strip()]
+    if not isinstance(raw_tags, list):
+        return []
+    return [str(tag).strip() for tag in raw_tags if str(tag).strip()]
+
+
+def _merge_duplicate_metadata(primary: MediaItem, duplicates: list[MediaItem]) -> list[str]:
+    """Fold the copies' descriptive fields into ``primary`` in memory; returns the changed fields.
+
+    Copies are applied oldest first, so the earliest copy wins wherever the primary has a gap.
+    """
+    primary_metadata = primary.metadata if isinstance(primary.metadata, dict) else {}
+    updated_metadata = dict(primary_metadata)
+    merged_tags = set(_normalize_metadata_tags(primary_metadata.get('tags')))
+    changed_fields = set()
+
+    for duplicate in duplicates:
+        duplicate_metadata = duplicate.metadata if isinstance(duplicate.metadata, dict) else {}
+        merged_tags.update(_normalize_metadata_tags(duplicate_metadata.get('tags')))
+
+        primary_location = str(updated_metadata.get('location') or '').strip()
+        duplicate_location = str(duplicate_metadata.get('location') or '').strip()
+        if not primary_location and duplicate_location:
+            updated_metadata['location'] = duplicate_location
+
+        if (not primary.title or primary.title.lower().startswith('untitled')) and duplicate.title:
+            primary.title = duplicate.title
+            changed_fields.add('title')
+        if not primary.description and duplicate.description:
+            primary.description = duplicate.description
+            changed_fields.add('description')
+        if primary.date_taken is None and duplicate.date_taken is not None:
+            primary.date_taken = duplicate.date_taken
+            changed_fields.add('date_taken')
+
+    if merged_tags:
+        updated_metadata['tags'] = sorted(merged_tags)
+    if updated_metadata != primary_metadata:
+        primary.metadata = updated_metadata
+        changed_fields.add('metadata')
+    return sorted(changed_fields)
+
+
+def merge_duplicate_group(vault_id, signature: str) -> tuple[int, int]:
+    """Fold a group's copies into its primary and delete them; returns ``(deleted items, bytes)``.
+
+    Callers own the transaction. Metadata is merged once and saved in one UPDATE, face tags move
+    with one ``UPDATE ... WHERE NOT EXISTS`` and the copies go in a single batched delete.
+    """
+    from genealogy.models import MediaTag
+
+    group = DuplicateGroup.objects.filter(vault_id=vault_id, signature=signature).first()
+    if group is None:
+        return 0, 0
+    primary = MediaItem.objects.select_for_update().filter(pk=group.primary_id).first()
+    if primary is None:
+        return 0, 0
+    duplicates = list(
+        MediaItem.objects.filter(vault_id=vault_id, duplicate_signature=signature)
+        .exclude(pk=primary.pk)
+        .only('id', 'title', 'description', 'date_taken', 'metadata', 'file_size')
+        .order_by('created_at', 'id')
+    )
+    if not duplicates:
+        return 0, 0
+
+    changed_fields = _merge_duplicate_metadata(primary, duplicates)
+    if changed_fields:
+        primary.save(update_fields=changed_fields)
+
+    duplicate_ids = [duplicate.pk for duplicate in duplicates]
+    # One tag per person moves across: the oldest among the copies, and only when the primary has
+    # no tag for that person yet. The rest are removed with their items.
+    first_tag_per_person = MediaTag.objects.filter(
+        media_item_id__in=duplicate_ids,
+        person_id=OuterRef('person_id'),
+    ).order_by('created_at', 'id')
+    (
+        MediaTag.objects.filter(media_item_id__in=duplicate_ids, pk=Subquery(first_tag_per_person.values('id')[:1]))
+        .exclude(Exists(MediaTag.objects.filter(media_item_id=primary.pk, person_id=OuterRef('person_id'))))
+        .update(media_item_id=primary.pk)
+    )
+
+    with batched_row_deletion():
+        MediaItem.objects.filter(pk__in=duplicate_ids).delete()
+    return len(duplicate_ids), sum(int(duplicate.file_size or 0) for duplicate in duplicates)
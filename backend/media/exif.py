@@ -1,10 +1,15 @@
+import io
 import re
+import struct
+import zlib
 from datetime import datetime
 from typing import Any
 
 from django.utils import timezone
 from PIL import ExifTags, Image, UnidentifiedImageError
 
+from .ranged_storage import read_stored_header
+
 
 EXIF_DATETIME_FORMATS = (
     '%Y:%m:%d %H:%M:%S.%f',
@@ -24,6 +29,11 @@ EXIF_METADATA_KEYS = (
     'Software',
     'LensModel',
 )
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_TAIL_SCAN_BYTES = 64 * 1024
+HEIF_BRANDS = frozenset({b'heic', b'heix', b'heim', b'heis', b'hevc', b'hevx', b'mif1', b'msf1', b'avif', b'avis'})
+# Header boxes (iinf/iloc) are a few KB; anything larger is a malformed file.
+MAX_HEIF_HEADER_BOX_BYTES = 1024 * 1024
 
 
 def _to_json_safe(value: Any, depth: int = 0) -> Any:
@@ -209,64 +219,344 @@ def _extract_datetime(raw_exif: dict[str, Any]) -> datetime | None:
     return timezone.make_aware(parsed, timezone.get_current_timezone())
 
 
+def _empty_exif_payload() -> dict[str, Any]:
+    return {
+        'raw_exif': {},
+        'date_taken': None,
+        'gps': None,
+    }
+
+
+def _build_exif_payload(exif: Image.Exif) -> dict[str, Any]:
+    if not exif:
+        return _empty_exif_payload()
+
+    raw_exif = {}
+    for tag_id, value in exif.items():
+        tag_name = ExifTags.TAGS.get(tag_id, str(tag_id))
+        raw_exif[tag_name] = value
+
+    normalized_exif = _to_json_safe(raw_exif)
+    metadata_exif = {
+        key: normalized_exif[key]
+        for key in EXIF_METADATA_KEYS
+        if key in normalized_exif
+    }
+
+    gps_info = None
+    if hasattr(exif, 'get_ifd'):
+        ifd_class = getattr(ExifTags, 'IFD', None)
+        gps_ifd_tag = getattr(ifd_class, 'GPSInfo', None) if ifd_class else None
+        if gps_ifd_tag is not None:
+            gps_info = exif.get_ifd(gps_ifd_tag)
+    if gps_info is None:
+        gps_info = raw_exif.get('GPSInfo')
+
+    normalized_gps = _normalize_gps_info(gps_info)
+    gps_coordinates = _extract_gps(normalized_gps)
+    extracted_datetime = _extract_datetime(raw_exif)
+    extracted_at = timezone.now().isoformat()
+    return {
+        'raw_exif': metadata_exif,
+        'date_taken': extracted_datetime.isoformat() if extracted_datetime else None,
+        'gps': gps_coordinates,
+        'extracted_at': extracted_at,
+    }
+
+
+def extract_exif_from_image(image: Image.Image) -> dict[str, Any]:
+    # getexif only parses the header segment, so callers can reuse the same opened image for decoding.
+    return _build_exif_payload(image.getexif())
+
+
+def _build_exif_payload_from_bytes(data: bytes | None) -> dict[str, Any]:
+    if not data:
+        return _empty_exif_payload()
+    exif = Image.Exif()
+    exif.load(data)
+    return _build_exif_payload(exif)
+
+
+def _read_png_chunk(handle, position: int) -> tuple[bytes, bytes] | None:
+    handle.seek(position)
+    header = handle.read(8)
+    if len(header) < 8:
+        return None
+    length, chunk_type = struct.unpack('>I4s', header)
+    data = handle.read(length)
+    if chunk_type == b'eXIf' and handle.read(4) != struct.pack('>I', zlib.crc32(chunk_type + data)):
+        return None
+    return chunk_type, data
+
+
+def _find_png_exif(handle) -> bytes | None:
+    handle.seek(len(PNG_SIGNATURE))
+    while True:
+        header = handle.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'eXIf':
+            return handle.read(length)
+        if chunk_type == b'IEND':
+            return None
+        if chunk_type == b'IDAT':
+            break
+        handle.seek(length + 4, io.SEEK_CUR)
+
+    # Writers that place eXIf after the image data put it next to IEND, so look at the tail before
+    # walking every IDAT chunk header; a matching CRC rules out pixel bytes that look like a chunk.
+    image_data_start = handle.tell() - 8
+    handle.seek(0, io.SEEK_END)
+    tail_start = max(handle.tell() - PNG_TAIL_SCAN_BYTES, image_data_start)
+    handle.seek(tail_start)
+    tail = handle.read()
+    marker = tail.rfind(b'eXIf')
+    while marker >= 4:
+        chunk = _read_png_chunk(handle, tail_start + marker - 4)
+        if chunk is not None and chunk[0] == b'eXIf':
+            return chunk[1]
+        marker = tail.rfind(b'eXIf', 0, marker)
+
+    position = image_data_start
+    while True:
+        handle.seek(position)
+        header = handle.read(8)
+        if len(header) < 8:
+            return None
+        length, chunk_type = struct.unpack('>I4s', header)
+        if chunk_type == b'eXIf':
+            return handle.read(length)
+        if chunk_type == b'IEND':
+            return None
+        position += length + 12
+
+
+def _find_webp_exif(handle) -> bytes | None:
+    handle.seek(12)
+    header = handle.read(9)
+    # Only the extended (VP8X) layout carries EXIF, and its flags say whether a chunk is present.
+    if len(header) < 9 or header[:4] != b'VP8X' or not header[8] & 0x08:
+        return None
+    handle.seek(12)
+    while True:
+        header = handle.read(8)
+        if len(header) < 8:
+            return None
+        chunk_type, length = struct.unpack('<4sI', header)
+        if chunk_type == b'EXIF':
+            return handle.read(length)
+        handle.seek(length + (length & 1), io.SEEK_CUR)
+
+
+def _iter_boxes(handle, start: int, end: int | None):
+    position = start
+    while end is None or position + 8 <= end:
+        handle.seek(position)
+        header = handle.read(8)
+        if len(header) < 8:
+            return
+        size, box_type = struct.unpack('>I4s', header)
+        header_size = 8
+        if size == 1:
+            large_size = handle.read(8)
+            if len(large_size) < 8:
+                return
+            size = struct.unpack('>Q', large_size)[0]
+            header_size = 16
+        elif size == 0:
+            if end is None:
+                handle.seek(0, io.SEEK_END)
+                end = handle.tell()
+            size = end - position
+        if size < header_size:
+            return
+        yield box_type, position + header_size, position + size
+        position += size
+
+
+def _read_box(handle, start: int, end: int) -> bytes:
+    if end - start > MAX_HEIF_HEADER_BOX_BYTES:
+        raise ValueError('HEIF header box is too large.')
+    handle.seek(start)
+    return handle.read(end - start)
+
+
+def _find_heif_exif_item(iinf: bytes) -> int | None:
+    version = iinf[0]
+    position = 6 if version == 0 else 8
+    while position + 8 <= len(iinf):
+        size, box_type = struct.unpack_from('>I4s', iinf, position)
+        if size < 8:
+            return None
+        if box_type == b'infe':
+            entry_version = iinf[position + 8]
+            if entry_version >= 2:
+                item_offset = position + 12
+                if entry_version == 2:
+                    item_id = struct.unpack_from('>H', iinf, item_offset)[0]
+                    item_offset += 2
+                else:
+                    item_id = struct.unpack_from('>I', iinf, item_offset)[0]
+                    item_offset += 4
+                if iinf[item_offset + 2 : item_offset + 6] == b'Exif':
+                    return item_id
+        position += size
+    return None
+
+
+def _find_heif_item_location(iloc: bytes, item_id: int) -> tuple[int, int, list[tuple[int, int]]] | None:
+    version = iloc[0]
+    offset_size, length_size = iloc[4] >> 4, iloc[4] & 0x0F
+    base_offset_size = iloc[5] >> 4
+    index_size = iloc[5] & 0x0F if version in (1, 2) else 0
+    position = 6
+
+    def read_int(size: int) -> int:
+        nonlocal position
+        value = int.from_bytes(iloc[position : position + size], 'big')
+        position += size
+        return value
+
+    item_count = read_int(2 if version < 2 else 4)
+    for _index in range(item_count):
+        current_id = read_int(2 if version < 2 else 4)
+        construction_method = read_int(2) & 0x0F if version in (1, 2) else 0
+        read_int(2)  # data_reference_index
+        base_offset = read_int(base_offset_size)
+        extents = []
+        for _extent in range(read_int(2)):
+            read_int(index_size)
+            extents.append((read_int(offset_size), read_int(length_size)))
+        if position > len(iloc):
+            return None
+        if current_id == item_id:
+            return construction_method, base_offset, extents
+    return None
+
+
+def _find_heif_exif(handle) -> bytes | None:
+    meta = next(((start, end) for box_type, start, end in _iter_boxes(handle, 0, None) if box_type == b'meta'), None)
+    if meta is None:
+        return None
+    # meta is a full box: 4 bytes of version/flags precede its children.
+    children = {box_type: (start, end) for box_type, start, end in _iter_boxes(handle, meta[0] + 4, meta[1])}
+    if b'iinf' not in children or b'iloc' not in children:
+        return None
+    item_id = _find_heif_exif_item(_read_box(handle, *children[b'iinf']))
+    if item_id is None:
+        return None
+    location = _find_heif_item_location(_read_box(handle, *children[b'iloc']), item_id)
+    if location is None:
+        return None
+
+    construction_method, base_offset, extents = location
+    if construction_method == 1 and b'idat' in children:
+        base_offset += children[b'idat'][0]
+    elif construction_method != 0:
+        return None
+    data = b''
+    for extent_offset, extent_length in extents:
+        handle.seek(base_offset + extent_offset)
+        data += handle.read(extent_length) if extent_length else handle.read()
+    # The item starts with the offset of the TIFF header inside it (usually past an "Exif\0\0" prefix).
+    if len(data) < 4:
+        return None
+    return data[4 + struct.unpack('>I', data[:4])[0] :]
+
+
+def _is_heif(prefix: bytes) -> bool:
+    if prefix[4:8] != b'ftyp':
+        return False
+    brands = {prefix[index : index + 4] for index in range(8, len(prefix) - 3, 4)}
+    return bool(brands & HEIF_BRANDS)
+
+
+def _extract_exif_from_handle(handle) -> dict[str, Any]:
+    """EXIF payload of a seekable binary stream, reading only the bytes that hold the metadata."""
+    prefix = handle.read(32)
+    handle.seek(0)
+    if prefix.startswith(PNG_SIGNATURE):
+        return _build_exif_payload_from_bytes(_find_png_exif(handle))
+    if prefix[:4] == b'RIFF' and prefix[8:12] == b'WEBP':
+        return _build_exif_payload_from_bytes(_find_webp_exif(handle))
+    if _is_heif(prefix):
+        return _build_exif_payload_from_bytes(_find_heif_exif(handle))
+    # JPEG (APP1) and TIFF (IFD0) metadata is parsed by Pillow while it reads the header.
+    with Image.open(handle) as image:
+        return extract_exif_from_image(image)
+
+
 def extract_exif_payload(file_obj: Any) -> dict[str, Any]:
-    opened_here = False
     try:
-        if hasattr(file_obj, 'open'):
-            file_obj.open('rb')
-            opened_here = True
-        if hasattr(file_obj, 'seek'):
-            file_obj.seek(0)
-
-        with Image.open(file_obj) as image:
-            exif = image.getexif()
-            if not exif:
-                return {
-                    'raw_exif': {},
-                    'date_taken': None,
-                    'gps': None,
-                }
-
-            raw_exif = {}
-            for tag_id, value in exif.items():
-                tag_name = ExifTags.TAGS.get(tag_id, str(tag_id))
-                raw_exif[tag_name] = value
-
-            normalized_exif = _to_json_safe(raw_exif)
-            metadata_exif = {
-                key: normalized_exif[key]
-                for key in EXIF_METADATA_KEYS
-                if key in normalized_exif
-            }
-
-            gps_info = None
-            if hasattr(exif, 'get_ifd'):
-                ifd_class = getattr(ExifTags, 'IFD', None)
-                gps_ifd_tag = getattr(ifd_class, 'GPSInfo', None) if ifd_class else None
-                if gps_ifd_tag is not None:
-                    gps_info = exif.get_ifd(gps_ifd_tag)
-            if gps_info is None:
-                gps_info = raw_exif.get('GPSInfo')
-
-            normalized_gps = _normalize_gps_info(gps_info)
-            gps_coordinates = _extract_gps(normalized_gps)
-            extracted_datetime = _extract_datetime(raw_exif)
-            extracted_at = timezone.now().isoformat()
-            return {
-                'raw_exif': metadata_exif,
-                'date_taken': extracted_datetime.isoformat() if extracted_datetime else None,
-                'gps': gps_coordinates,
-                'extracted_at': extracted_at,
-            }
-    except (UnidentifiedImageError, OSError):
-        return {
-            'raw_exif': {},
-            'date_taken': None,
-            'gps': None,
-        }
-    finally:
-        if opened_here and hasattr(file_obj, 'close'):
-            try:
-                file_obj.close()
-            except Exception:
-                pass
+        return read_stored_header(file_obj, _extract_exif_from_handle, final_errors=(UnidentifiedImageError,))
+    except (UnidentifiedImageError, OSError, SyntaxError, ValueError, struct.error):
+        return _empty_exif_payload()
+
+
+EXIF_ORIENTATION_TAG = 0x0112
+# APP1 segments are at most 64 KB and come before the image data.
+JPEG_ORIENTATION_SCAN_BYTES = 128 * 1024
+# Orientation values without mirroring, keyed by the clockwise rotation a viewer applies.
+_ORIENTATION_BY_ROTATION = {0: 1, 90: 6, 180: 3, 270: 8}
+_ROTATION_BY_ORIENTATION = {value: rotation for rotation, value in _ORIENTATION_BY_ROTATION.items()}
+
+
+def _locate_tiff_orientation(data: bytes, tiff_start: int) -> tuple[int, int, str] | None:
+    byte_order = {b'II': '<', b'MM': '>'}.get(data[tiff_start:tiff_start + 2])
+    if byte_order is None:
+        return None
+    (ifd_offset,) = struct.unpack(f'{byte_order}I', data[tiff_start + 4:tiff_start + 8])
+    ifd_start = tiff_start + ifd_offset
+    (entry_count,) = struct.unpack(f'{byte_order}H', data[ifd_start:ifd_start + 2])
+    for index in range(entry_count):
+        entry = ifd_start + 2 + index * 12
+        tag, field_type, value_count = struct.unpack(f'{byte_order}HHI', data[entry:entry + 8])
+        if tag == EXIF_ORIENTATION_TAG and field_type == 3 and value_count == 1:
+            (value,) = struct.unpack(f'{byte_order}H', data[entry + 8:entry + 10])
+            return entry + 8, value, byte_order
+    return None
+
+
+def locate_jpeg_orientation(header: bytes) -> tuple[int, int, str] | None:
+    """``(offset, value, byte order)`` of the IFD0 Orientation entry in a JPEG header, if it has one."""
+    if header[:2] != b'\xff\xd8':
+        return None
+    position = 2
+    try:
+        while position + 4 <= len(header):
+            if header[position] != 0xFF:
+                return None
+            marker = header[position + 1]
+            if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+                position += 2
+                continue
+            if marker in (0xD9, 0xDA):
+                return None
+            (segment_length,) = struct.unpack('>H', header[position + 2:position + 4])
+            segment_start = position + 4
+            if marker == 0xE1 and header[segment_start:segment_start + 6] == b'Exif\x00\x00':
+                return _locate_tiff_orientation(header, segment_start + 6)
+            position = segment_start + segment_length - 2
+    except struct.error:
+        return None
+    return None
+
+
+def rotate_jpeg_orientation_in_place(path: str, degrees: int) -> bool:
+    """Turn a local JPEG by rewriting the two bytes of its EXIF Orientation value.
+
+    Pixel data is untouched. Returns False, leaving the file as it was, when there is no Orientation
+    entry to patch or it describes a mirrored image.
+    """
+    with open(path, 'r+b') as handle:
+        located = locate_jpeg_orientation(handle.read(JPEG_ORIENTATION_SCAN_BYTES))
+        if located is None:
+            return False
+        offset, orientation, byte_order = located
+        current_rotation = _ROTATION_BY_ORIENTATION.get(orientation)
+        if current_rotation is None:
+            return False
+        handle.seek(offset)
+        handle.write(struct.pack(f'{byte_order}H', _ORIENTATION_BY_ROTATION[(current_rotation + degrees) % 360]))
+    return True
@@ -0,0 +1,260 @@
+import fcntl
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Any, Iterable
+from uuid import UUID
+
+import numpy as np
+from django.conf import settings
+
+from .models import FaceEmbedding
+from .vision import FACE_EMBEDDING_DIM, FACE_EMBEDDING_MODEL
+
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+_KEY_BYTES = 16
+# Rows committed by slow transactions can carry a created_at slightly older than the last sync.
+_SYNC_OVERLAP = timedelta(minutes=10)
+_SYNC_FETCH_CHUNK = 2000
+
+
+def get_face_index_dir() -> str:
+    configured = str(getattr(settings, 'MEDIA_FACE_INDEX_DIR', '') or '').strip()
+    if configured:
+        return configured
+    return os.path.join(tempfile.gettempdir(), 'legacykeeper-face-index')
+
+
+class FaceVectorIndex:
+    """Append-only float16 matrix on disk, memory-mapped for reads, with one 16-byte key per row.
+
+    Vectors are stored unit-length so cosine similarity is a plain dot product. Appends take an
+    exclusive file lock, so several processes on one host can share the same index directory.
+    """
+
+    def __init__(self, directory: str, dim: int = FACE_EMBEDDING_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, 'vectors.f16')
+        self.keys_path = os.path.join(directory, 'keys.bin')
+        self.lock_path = os.path.join(directory, '.lock')
+        self.synced_at = None
+        self._matrix = np.zeros((0, dim), dtype=np.float16)
+        self._keys = []
+        self._row_by_key = {}
+        self._lock = threading.Lock()
+
+    @property
+    def row_bytes(self) -> int:
+        return self.dim * np.dtype(np.float16).itemsize
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Pick up rows appended by this or any other process since the last refresh."""
+        try:
+            key_count = os.path.getsize(self.keys_path) // _KEY_BYTES
+            vector_count = os.path.getsize(self.vectors_path) // self.row_bytes
+        except FileNotFoundError:
+            return
+        # Vectors are written before keys, so a row only becomes visible once both halves exist.
+        row_count = min(key_count, vector_count)
+        with self._lock:
+            loaded_rows = len(self._keys)
+            if row_count == loaded_rows:
+                return
+            if row_count < loaded_rows:
+                # The files were rebuilt underneath us; start over.
+                self._keys = []
+                self._row_by_key = {}
+                loaded_rows = 0
+            with open(self.keys_path, 'rb') as keys_file:
+                keys_file.seek(loaded_rows * _KEY_BYTES)
+                raw_keys = keys_file.read((row_count - loaded_rows) * _KEY_BYTES)
+            for offset in range(0, len(raw_keys), _KEY_BYTES):
+                key = raw_keys[offset:offset + _KEY_BYTES]
+                self._row_by_key[key] = len(self._keys)
+                self._keys.append(key)
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(row_count, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: Any) -> bool:
+        return _key_bytes(key) in self._row_by_key
+
+    def append(self, keys: Iterable[Any], vectors: np.ndarray) -> int:
+        key_list = [_key_bytes(key) for key in keys]
+        matrix = np.ascontiguousarray(vectors, dtype=np.float16).reshape(-1, self.dim)
+        if len(key_list) != matrix.shape[0]:
+            raise ValueError('Each appended vector needs exactly one key.')
+        if not key_list:
+            return 0
+
+        with self._file_lock():
+            self.refresh()
+            fresh = [index for index, key in enumerate(key_list) if key not in self._row_by_key]
+            if fresh:
+                # Truncate any half-written tail left behind by a crashed writer before appending.
+                self._truncate_to(len(self._keys))
+                with open(self.vectors_path, 'ab') as vectors_file:
+                    vectors_file.write(matrix[fresh].tobytes())
+                with open(self.keys_path, 'ab') as keys_file:
+                    keys_file.write(b''.join(key_list[index] for index in fresh))
+        self.refresh()
+        return len(fresh)
+
+    def _truncate_to(self, row_count: int):
+        for path, unit in ((self.vectors_path, self.row_bytes), (self.keys_path, _KEY_BYTES)):
+            if os.path.exists(path) and os.path.getsize(path) > row_count * unit:
+                with open(path, 'r+b') as handle:
+                    handle.truncate(row_count * unit)
+
+    def rebuild(self, keys: Iterable[Any], vectors: np.ndarray):
+        """Rewrite the index with only the given rows (drops vectors of deleted faces)."""
+        key_list = [_key_bytes(key) for key in keys]
+        matrix = np.ascontiguousarray(vectors, dtype=np.float16).reshape(-1, self.dim)
+        with self._file_lock():
+            for path, payload in ((self.vectors_path, matrix.tobytes()), (self.keys_path, b''.join(key_list))):
+                temp_path = f'{path}.tmp'
+                with open(temp_path, 'wb') as handle:
+                    handle.write(payload)
+                os.replace(temp_path, path)
+            with self._lock:
+                self._keys = []
+                self._row_by_key = {}
+                self._matrix = np.zeros((0, self.dim), dtype=np.float16)
+        self.refresh()
+
+    def rows_for(self, keys: Iterable[Any]) -> np.ndarray:
+        rows = [self._row_by_key.get(_key_bytes(key), -1) for key in keys]
+        return np.asarray(rows, dtype=np.int64)
+
+    def take(self, rows: np.ndarray) -> np.ndarray:
+        if len(rows) == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.asarray(self._matrix[np.asarray(rows, dtype=np.int64)], dtype=np.float32)
+
+
+def _key_bytes(key: Any) -> bytes:
+    if isinstance(key, bytes) and len(key) == _KEY_BYTES:
+        return key
+    if isinstance(key, UUID):
+        return key.bytes
+    return UUID(str(key)).bytes
+
+
+def get_vault_face_index(vault_id: Any) -> FaceVectorIndex:
+    directory = os.path.join(get_face_index_dir(), FACE_EMBEDDING_MODEL, str(vault_id))
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(directory)
+        if index is None:
+            index = FaceVectorIndex(directory)
+            _INDEXES[directory] = index
+    index.refresh()
+    return index
+
+
+def sync_vault_face_index(vault_id: Any) -> FaceVectorIndex:
+    """Append embeddings stored since the last sync; the database stays the source of truth."""
+    index = get_vault_face_index(vault_id)
+    queryset = FaceEmbedding.objects.filter(vault_id=vault_id, model=FACE_EMBEDDING_MODEL)
+    if index.synced_at is not None:
+        queryset = queryset.filter(created_at__gte=index.synced_at - _SYNC_OVERLAP)
+
+    latest_created_at = index.synced_at
+    missing_ids = []
+    for embedding_id, created_at in queryset.order_by('created_at').values_list('id', 'created_at').iterator():
+        latest_created_at = created_at if latest_created_at is None else max(latest_created_at, created_at)
+        if embedding_id not in index:
+            missing_ids.append(embedding_id)
+
+    for start in range(0, len(missing_ids), _SYNC_FETCH_CHUNK):
+        chunk = FaceEmbedding.objects.filter(pk__in=missing_ids[start:start + _SYNC_FETCH_CHUNK]).values_list(
+            'id', 'vector'
+        )
+        keys = []
+        vectors = []
+        for embedding_id, vector in chunk:
+            keys.append(embedding_id)
+            vectors.append(np.frombuffer(bytes(vector), dtype=np.float16))
+        if keys:
+            index.append(keys, np.vstack(vectors))
+
+    index.synced_at = latest_created_at
+    stored_count = FaceEmbedding.objects.filter(vault_id=vault_id, model=FACE_EMBEDDING_MODEL).count()
+    if len(index) > 2 * stored_count + 1000:
+        compact_vault_face_index(vault_id)
+    return index
+
+
+def compact_vault_face_index(vault_id: Any) -> FaceVectorIndex:
+    index = get_vault_face_index(vault_id)
+    keys = []
+    vectors = []
+    for embedding_id, vector in FaceEmbedding.objects.filter(vault_id=vault_id, model=FACE_EMBEDDING_MODEL).values_list(
+        'id', 'vector'
+    ).iterator():
+        keys.append(embedding_id)
+        vectors.append(np.frombuffer(bytes(vector), dtype=np.float16))
+    index.rebuild(keys, np.vstack(vectors) if vectors else np.zeros((0, index.dim), dtype=np.float16))
+    return index
+
+
+def rank_labels(
+    index: FaceVectorIndex,
+    query_rows: np.ndarray,
+    labeled_rows: np.ndarray,
+    labels: np.ndarray,
+    *,
+    limit: int = 5,
+    min_score: float = 0.0,
+) -> list[list[dict[str, Any]]]:
+    """Rank labels for each query row by their best cosine similarity among labeled rows."""
+    query_rows = np.asarray(query_rows, dtype=np.int64)
+    labeled_rows = np.asarray(labeled_rows, dtype=np.int64)
+    labels = np.asarray(labels)
+    if len(query_rows) == 0:
+        return []
+    if len(labeled_rows) == 0:
+        return [[] for _row in query_rows]
+
+    order = np.argsort(labels, kind='stable')
+    labeled_rows = labeled_rows[order]
+    labels = labels[order]
+    unique_labels, starts, counts = np.unique(labels, return_index=True, return_counts=True)
+
+    similarities = index.take(query_rows) @ index.take(labeled_rows).T
+    # A tagged query face must not vote for itself.
+    similarities[query_rows[:, None] == labeled_rows[None, :]] = -1.0
+    best_per_label = np.maximum.reduceat(similarities, starts, axis=1)
+
+    ranked = []
+    top_k = min(max(int(limit), 1), len(unique_labels))
+    for scores in best_per_label:
+        candidate_indexes = np.argpartition(-scores, top_k - 1)[:top_k]
+        candidate_indexes = candidate_indexes[np.argsort(-scores[candidate_indexes], kind='stable')]
+        ranked.append(
+            [
+                {
+                    'label': unique_labels[label_index].item(),
+                    'score': round(float(scores[label_index]), 4),
+                    'matched_faces': int(counts[label_index]),
+                }
+                for label_index in candidate_indexes
+                if scores[label_index] >= min_score
+            ]
+        )
+    return ranked
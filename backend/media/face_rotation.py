@@ -0,0 +1,166 @@
+import io
+from functools import partial
+from typing import Any
+from uuid import uuid4
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+from .models import MediaItem
+from .tasks import _safe_delete_storage_file
+from .vision import apply_display_rotation, pack_thumbnail_sprite
+
+
+PENDING_FACE_DETECTION_STATUSES = (MediaItem.FaceDetectionStatus.QUEUED, MediaItem.FaceDetectionStatus.PROCESSING)
+
+
+def rotate_normalized_box(box: dict[str, Any], degrees: int) -> dict[str, Any]:
+    """Map a normalized ``{x, y, w, h}`` box through a clockwise quarter-turn rotation of its image."""
+    rotation = int(degrees) % 360
+    x, y = float(box.get('x', 0.0)), float(box.get('y', 0.0))
+    w, h = float(box.get('w', 0.0)), float(box.get('h', 0.0))
+    if rotation == 90:
+        x, y, w, h = 1.0 - (y + h), x, h, w
+    elif rotation == 180:
+        x, y = 1.0 - (x + w), 1.0 - (y + h)
+    elif rotation == 270:
+        x, y, w, h = y, 1.0 - (x + w), h, w
+    return {
+        **box,
+        'x': round(max(0.0, min(1.0, x)), 6),
+        'y': round(max(0.0, min(1.0, y)), 6),
+        'w': round(max(0.0, min(1.0, w)), 6),
+        'h': round(max(0.0, min(1.0, h)), 6),
+    }
+
+
+def _read_image(path: str) -> Image.Image | None:
+    try:
+        with default_storage.open(path, 'rb') as handle, Image.open(handle) as opened:
+            return opened.convert('RGB')
+    except (FileNotFoundError, UnidentifiedImageError, OSError):
+        return None
+
+
+def _encode(image: Image.Image, image_format: str = 'JPEG') -> bytes:
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.save(buffer, format='JPEG', quality=88, optimize=True)
+    else:
+        image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def _rotate_thumbnails(media_item_id, faces: list, rotated_face_ids: set, degrees: int, written_paths: list):
+    """Turn the stored crops of ``rotated_face_ids``; single files are re-cut and sprites re-packed."""
+    prefix = f'face-thumbnails/{media_item_id}/rotated-{uuid4().hex}'
+    faces_by_path = {}
+    for face in faces:
+        path = str(face.get('thumbnail_path') or '').strip()
+        if path:
+            faces_by_path.setdefault(path, []).append(face)
+
+    for path, path_faces in faces_by_path.items():
+        if not any(face['face_id'] in rotated_face_ids for face in path_faces):
+            continue
+        source = _read_image(path)
+        if source is None:
+            continue
+
+        if not any(isinstance(face.get('thumbnail_sprite'), dict) for face in path_faces):
+            new_path = default_storage.save(
+                f'{prefix}/{path_faces[0]["face_id"]}.jpg',
+                ContentFile(_encode(apply_display_rotation(source, degrees))),
+            )
+            written_paths.append(new_path)
+            for face in path_faces:
+                face['thumbnail_path'] = new_path
+            continue
+
+        # A sprite mixes faces of several files; cut every box out, turn the affected crops, re-pack.
+        packed_faces = [face for face in path_faces if isinstance(face.get('thumbnail_sprite'), dict)]
+        crops = []
+        for face in packed_faces:
+            box = face['thumbnail_sprite']
+            crop = source.crop((box['x'], box['y'], box['x'] + box['w'], box['y'] + box['h']))
+            if face['face_id'] in rotated_face_ids:
+                crop = apply_display_rotation(crop, degrees)
+            crops.append(_encode(crop, 'PNG'))
+        source.close()
+        sprite_bytes, boxes = pack_thumbnail_sprite(crops)
+        if not sprite_bytes:
+            continue
+        new_path = default_storage.save(f'{prefix}/sprite.jpg', ContentFile(sprite_bytes))
+        written_paths.append(new_path)
+        for face, box in zip(packed_faces, boxes):
+            face['thumbnail_path'] = new_path if box is not None else ''
+            face['thumbnail_sprite'] = box
+
+
+def _delete_paths(paths):
+    for path in paths:
+        _safe_delete_storage_file(path)
+
+
+def rotate_detected_faces(media_item: MediaItem, file_id: str, degrees: int) -> bool:
+    """Carry detected faces and face tags of one file through a quarter-turn rotation.
+
+    Must run inside the caller's transaction. Returns False, changing nothing, while a detection run
+    is still pending for the item; its results would describe the old orientation, so the caller
+    falls back to detecting again.
+    """
+    from genealogy.models import MediaTag
+
+    locked = (
+        MediaItem.objects.select_for_update()
+        .filter(pk=media_item.pk)
+        .values('face_detection_status', 'face_detection_data')
+        .first()
+    )
+    if not locked or locked['face_detection_status'] in PENDING_FACE_DETECTION_STATUSES:
+        return False
+
+    primary_file_id = f'primary-{media_item.pk}'
+    if file_id in ('', primary_file_id, f'fallback-{media_item.pk}'):
+        # Faces and tags of the primary file predate explicit file ids in some rows.
+        file_ids = {'', primary_file_id}
+    else:
+        file_ids = {file_id}
+
+    payload = dict(locked['face_detection_data']) if isinstance(locked['face_detection_data'], dict) else {}
+    faces = [dict(face) for face in payload.get('faces') or [] if isinstance(face, dict)]
+    rotated_face_ids = set()
+    for face in faces:
+        if str(face.get('file_id') or '') not in file_ids or not isinstance(face.get('face_coordinates'), dict):
+            continue
+        face['face_coordinates'] = rotate_normalized_box(face['face_coordinates'], degrees)
+        rotated_face_ids.add(face.get('face_id'))
+
+    previous_paths = {str(face.get('thumbnail_path') or '').strip() for face in faces}
+    written_paths = []
+    try:
+        _rotate_thumbnails(media_item.pk, faces, rotated_face_ids, degrees, written_paths)
+
+        if rotated_face_ids:
+            payload['faces'] = faces
+            MediaItem.objects.filter(pk=media_item.pk).update(face_detection_data=payload)
+            media_item.face_detection_data = payload
+
+        tags = list(
+            MediaTag.objects.filter(media_item=media_item, tagged_file_id__in=file_ids, face_coordinates__isnull=False)
+        )
+        for tag in tags:
+            if isinstance(tag.face_coordinates, dict):
+                tag.face_coordinates = rotate_normalized_box(tag.face_coordinates, degrees)
+        MediaTag.objects.bulk_update(tags, ['face_coordinates'])
+    except Exception:
+        _delete_paths(written_paths)
+        raise
+
+    current_paths = {str(face.get('thumbnail_path') or '').strip() for face in faces}
+    replaced_paths = sorted(path for path in previous_paths - current_paths if path)
+    if replaced_paths:
+        transaction.on_commit(partial(_delete_paths, replaced_paths))
+    return True
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from media.duplicates import items_missing_hashes, refresh_duplicate_groups
+from media.tasks import schedule_hash_backfill
+from vaults.models import FamilyVault
+
+
+class Command(BaseCommand):
+    help = "Queue background jobs that fill in missing content hashes, duplicate signatures and photo dHashes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vault", help="Vault id to backfill. Omit to backfill every vault with missing hashes.")
+        parser.add_argument(
+            "--rebuild-groups",
+            action="store_true",
+            help="Also rebuild the vault's duplicate groups from the stored signatures right away.",
+        )
+
+    def handle(self, *args, **options):
+        vaults = FamilyVault.objects.all()
+        if options.get("vault"):
+            vaults = vaults.filter(pk=options["vault"])
+            if not vaults.exists():
+                raise CommandError(f'Vault "{options["vault"]}" was not found.')
+
+        for vault in vaults:
+            if options.get("rebuild_groups"):
+                group_count = refresh_duplicate_groups(vault.id)
+                self.stdout.write(f"{vault.id}: {group_count} duplicate group(s) rebuilt")
+            pending = items_missing_hashes().filter(vault=vault).count()
+            if not pending:
+                continue
+            queued = schedule_hash_backfill(vault.id)
+            state = "queued" if queued else "already running"
+            self.stdout.write(f"{vault.id}: {pending} item(s) missing hashes, backfill {state}")
@@ -0,0 +1,145 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, UnidentifiedImageError
+
+from media.vision import (
+    FACE_DETECTOR_HAAR,
+    FACE_DETECTOR_MODELS,
+    FACE_DETECTOR_YUNET,
+    decode_rgb_image,
+    detect_faces_in_image,
+)
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.tif', '.tiff'}
+
+
+def _box_iou(first, second):
+    first_x, first_y, first_w, first_h = first
+    second_x, second_y, second_w, second_h = second
+    overlap_w = max(0.0, min(first_x + first_w, second_x + second_w) - max(first_x, second_x))
+    overlap_h = max(0.0, min(first_y + first_h, second_y + second_h) - max(first_y, second_y))
+    intersection = overlap_w * overlap_h
+    union = first_w * first_h + second_w * second_h - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def _count_matches(expected_boxes, detected_boxes, iou_threshold):
+    unmatched = list(detected_boxes)
+    matched = 0
+    for expected in expected_boxes:
+        best_index = None
+        best_iou = iou_threshold
+        for index, detected in enumerate(unmatched):
+            overlap = _box_iou(expected, detected)
+            if overlap >= best_iou:
+                best_index, best_iou = index, overlap
+        if best_index is not None:
+            unmatched.pop(best_index)
+            matched += 1
+    return matched
+
+
+class Command(BaseCommand):
+    help = "Compare face detector backends on a folder of photos: time per image and, with annotations, recall."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Image files or directories to benchmark.")
+        parser.add_argument(
+            "--annotations",
+            help='JSON file mapping image file names to ground-truth face boxes: {"a.jpg": [[x, y, w, h], ...]}.',
+        )
+        parser.add_argument(
+            "--backends",
+            default=f"{FACE_DETECTOR_HAAR},{FACE_DETECTOR_YUNET}",
+            help="Comma-separated backends to compare.",
+        )
+        parser.add_argument("--iou", type=float, default=0.4, help="IoU needed to count a detection as a hit.")
+        parser.add_argument("--repeat", type=int, default=1, help="Timed runs per image (best run is reported).")
+
+    def _collect_images(self, paths):
+        image_paths = []
+        for raw_path in paths:
+            if os.path.isdir(raw_path):
+                for root, _dirs, files in os.walk(raw_path):
+                    image_paths.extend(
+                        os.path.join(root, file_name)
+                        for file_name in sorted(files)
+                        if os.path.splitext(file_name)[1].lower() in IMAGE_EXTENSIONS
+                    )
+            elif os.path.isfile(raw_path):
+                image_paths.append(raw_path)
+            else:
+                raise CommandError(f'Path "{raw_path}" does not exist.')
+        return image_paths
+
+    def handle(self, *args, **options):
+        backends = [token.strip().lower() for token in options["backends"].split(",") if token.strip()]
+        unknown = sorted(set(backends) - set(FACE_DETECTOR_MODELS))
+        if unknown:
+            raise CommandError(f'Unknown backends: {", ".join(unknown)}.')
+
+        annotations = {}
+        if options.get("annotations"):
+            with open(options["annotations"], "r", encoding="utf-8") as annotation_file:
+                annotations = {os.path.basename(key): value for key, value in json.load(annotation_file).items()}
+
+        image_paths = self._collect_images(options["paths"])
+        if not image_paths:
+            raise CommandError("No images found.")
+
+        repeat = max(int(options.get("repeat") or 1), 1)
+        for backend in backends:
+            elapsed_seconds = 0.0
+            detected_count = 0
+            expected_count = 0
+            matched_count = 0
+            measured_images = 0
+            for image_path in image_paths:
+                try:
+                    with Image.open(image_path) as source:
+                        image = decode_rgb_image(source)
+                except (UnidentifiedImageError, OSError):
+                    self.stderr.write(f"Skipping unreadable image {image_path}")
+                    continue
+
+                best_run = None
+                payload = None
+                for _attempt in range(repeat):
+                    started = time.perf_counter()
+                    payload = detect_faces_in_image(image, backend=backend)
+                    duration = time.perf_counter() - started
+                    best_run = duration if best_run is None else min(best_run, duration)
+                elapsed_seconds += best_run
+                measured_images += 1
+
+                width, height = image.size
+                detected_boxes = [
+                    (
+                        face["face_coordinates"]["x"] * width,
+                        face["face_coordinates"]["y"] * height,
+                        face["face_coordinates"]["w"] * width,
+                        face["face_coordinates"]["h"] * height,
+                    )
+                    for face in payload["faces"]
+                ]
+                detected_count += len(detected_boxes)
+                expected_boxes = annotations.get(os.path.basename(image_path))
+                if expected_boxes is not None:
+                    expected_count += len(expected_boxes)
+                    matched_count += _count_matches(expected_boxes, detected_boxes, options["iou"])
+                image.close()
+
+            average_ms = (elapsed_seconds / measured_images * 1000.0) if measured_images else 0.0
+            summary = (
+                f"{backend} ({FACE_DETECTOR_MODELS[backend]}): {measured_images} images, "
+                f"{average_ms:.1f} ms/image, {detected_count} faces"
+            )
+            if expected_count:
+                recall = matched_count / expected_count
+                precision = matched_count / detected_count if detected_count else 0.0
+                summary += f", recall={recall:.3f}, precision={precision:.3f}"
+            self.stdout.write(summary)
@@ -0,0 +1,75 @@
+import tempfile
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from media.face_index import FaceVectorIndex, rank_labels
+from media.vision import FACE_EMBEDDING_DIM
+
+
+class Command(BaseCommand):
+    help = "Benchmark the memory-mapped face index: append, reopen and suggestion ranking on synthetic embeddings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--faces", type=int, default=100_000, help="Number of indexed faces.")
+        parser.add_argument("--people", type=int, default=2_000, help="Number of distinct tagged people.")
+        parser.add_argument("--tagged-ratio", type=float, default=0.5, help="Share of faces that are already tagged.")
+        parser.add_argument("--queries", type=int, default=20, help="Faces ranked per suggestion request.")
+        parser.add_argument("--requests", type=int, default=20, help="Suggestion requests to time.")
+        parser.add_argument("--append-chunk", type=int, default=5_000, help="Rows per incremental append.")
+        parser.add_argument("--seed", type=int, default=7)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        face_count = max(int(options["faces"]), 1)
+        people_count = max(int(options["people"]), 1)
+
+        # Faces of the same person cluster around a shared centroid, like real embeddings do.
+        centroids = rng.standard_normal((people_count, FACE_EMBEDDING_DIM)).astype(np.float32)
+        face_people = rng.integers(0, people_count, size=face_count)
+        vectors = centroids[face_people] + 0.6 * rng.standard_normal((face_count, FACE_EMBEDDING_DIM)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        keys = [rng.bytes(16) for _face in range(face_count)]
+
+        with tempfile.TemporaryDirectory(prefix="face-index-bench-") as directory:
+            index = FaceVectorIndex(directory)
+            started = time.perf_counter()
+            chunk = max(int(options["append_chunk"]), 1)
+            for start in range(0, face_count, chunk):
+                index.append(keys[start:start + chunk], vectors[start:start + chunk])
+            append_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            reopened = FaceVectorIndex(directory)
+            reopened.refresh()
+            reopen_seconds = time.perf_counter() - started
+
+            tagged_count = max(int(face_count * float(options["tagged_ratio"])), 1)
+            tagged_rows = np.arange(tagged_count)
+            labels = face_people[:tagged_count]
+            query_pool = np.arange(tagged_count, face_count) if tagged_count < face_count else np.arange(face_count)
+
+            timings = []
+            hits = 0
+            ranked_faces = 0
+            for _request in range(max(int(options["requests"]), 1)):
+                query_rows = rng.choice(query_pool, size=min(int(options["queries"]), len(query_pool)), replace=False)
+                started = time.perf_counter()
+                ranked = rank_labels(reopened, query_rows, tagged_rows, labels, limit=5)
+                timings.append(time.perf_counter() - started)
+                for query_row, candidates in zip(query_rows, ranked):
+                    ranked_faces += 1
+                    if candidates and candidates[0]["label"] == face_people[query_row]:
+                        hits += 1
+
+        timings_ms = np.asarray(timings) * 1000.0
+        self.stdout.write(f"faces={face_count} people={people_count} tagged={tagged_count} dim={FACE_EMBEDDING_DIM}")
+        self.stdout.write(
+            f"append: {append_seconds:.2f}s total ({face_count / max(append_seconds, 1e-9):,.0f} faces/s); "
+            f"reopen: {reopen_seconds * 1000.0:.1f} ms; on-disk matrix: {face_count * reopened.row_bytes / 1e6:.1f} MB"
+        )
+        self.stdout.write(
+            f"suggest ({options['queries']} faces/request): p50={np.percentile(timings_ms, 50):.1f} ms "
+            f"p95={np.percentile(timings_ms, 95):.1f} ms; top-1 accuracy={hits / max(ranked_faces, 1):.3f}"
+        )
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from media.storage_gc import collect_orphaned_objects
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the media storage listing and delete objects no row references (face thumbnails, "
+        "restoration outputs, leftovers of failed uploads). Dry run unless --delete is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--delete", action="store_true", help="Delete the orphaned objects instead of listing them.")
+        parser.add_argument("--prefix", default="", help="Only scan keys under this prefix, e.g. face-thumbnails.")
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=None,
+            help="Skip objects modified within this many hours (default: MEDIA_STORAGE_GC_GRACE_HOURS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000, help="Keys checked per query batch (max 1000).")
+        parser.add_argument("--quiet", action="store_true", help="Print only the summary, not every orphaned key.")
+
+    def handle(self, *args, **options):
+        grace_hours = options.get("grace_hours")
+        if grace_hours is not None and grace_hours < 0:
+            raise CommandError("--grace-hours must not be negative.")
+        dry_run = not options.get("delete")
+
+        def report_orphan(stored):
+            if not options.get("quiet"):
+                self.stdout.write(f"{'orphan' if dry_run else 'deleting'} {stored.name} ({stored.size} bytes)")
+
+        report = collect_orphaned_objects(
+            prefix=options.get("prefix") or "",
+            dry_run=dry_run,
+            grace=timedelta(hours=grace_hours) if grace_hours is not None else None,
+            batch_size=options.get("batch_size") or 1000,
+            on_orphan=report_orphan,
+        )
+        self.stdout.write(
+            f"{'Dry run: ' if dry_run else ''}scanned {report['scanned']}, skipped {report['recent']} recent, "
+            f"{report['referenced']} referenced, {report['orphaned']} orphaned ({report['orphaned_bytes']} bytes), "
+            f"deleted {report['deleted']}, failed {report['failed']}"
+        )
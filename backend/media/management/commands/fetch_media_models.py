@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from media.vision import MODEL_ASSET_GROUPS, ensure_model_assets, record_model_checksums
+
+
+class Command(BaseCommand):
+    help = "Download and verify the colorization and face model files so workers never fetch them inside a task."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--groups",
+            default="",
+            help=f'Comma-separated model groups: {", ".join(MODEL_ASSET_GROUPS)} (default: all).',
+        )
+        parser.add_argument("--verify-only", action="store_true", help="Check files and checksums without downloading.")
+        parser.add_argument(
+            "--record",
+            action="store_true",
+            help="Write the hashes of the present files to checksums.sha256 in the model directory.",
+        )
+
+    def handle(self, *args, **options):
+        groups = [group.strip() for group in str(options["groups"] or "").split(",") if group.strip()]
+        unknown = sorted(set(groups) - set(MODEL_ASSET_GROUPS))
+        if unknown:
+            raise CommandError(f'Unknown model groups: {", ".join(unknown)}.')
+
+        reports = ensure_model_assets(groups or None, download=not options["verify_only"])
+        for report in reports:
+            line = f"{report['group']:<13} {report['file_name']:<40} {report['status']:<9} {report['size'] / 1e6:8.1f} MB"
+            if report.get("error"):
+                line = f"{line}  {report['error']}"
+            self.stdout.write(line)
+
+        if options["record"]:
+            manifest_path = record_model_checksums(
+                [report["file_name"] for report in reports if report["status"] in ("ok", "unpinned")]
+            )
+            self.stdout.write(f"Recorded checksums in {manifest_path}")
+
+        failed = [report["file_name"] for report in reports if report["status"] in ("missing", "mismatch")]
+        if failed:
+            raise CommandError(f'Model files missing or corrupt: {", ".join(failed)}.')
+        unpinned = [report["file_name"] for report in reports if report["status"] == "unpinned"]
+        if unpinned and not options["record"]:
+            self.stdout.write(self.style.WARNING(f'No checksum recorded for: {", ".join(unpinned)} (use --record).'))
@@ -0,0 +1,95 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from media.models import MediaReprocessRun
+from media.reprocessing import (
+    cancel_reprocess_run,
+    normalize_reprocess_options,
+    pause_reprocess_run,
+    resume_reprocess_run,
+    serialize_reprocess_run,
+    start_reprocess_run,
+)
+from vaults.models import FamilyVault
+
+
+class Command(BaseCommand):
+    help = "Re-run EXIF extraction and/or face detection across existing photos in batched, rate-limited tasks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--vault", help="Vault id to reprocess. Omit to reprocess every vault.")
+        parser.add_argument("--stages", default="", help='Comma-separated stages: "exif", "faces" (default: both).')
+        parser.add_argument(
+            "--statuses",
+            default="",
+            help="Only include items whose EXIF or face detection status is one of these (e.g. FAILED,NOT_AVAILABLE).",
+        )
+        parser.add_argument("--batch-size", type=int, help="Items processed per worker task.")
+        parser.add_argument("--rate-limit", type=int, help="Maximum items dispatched per minute.")
+        parser.add_argument("--max-in-flight", type=int, help="Maximum batches queued or running at once.")
+        parser.add_argument("--resume", metavar="RUN_ID", help="Resume a paused or interrupted run from its checkpoint.")
+        parser.add_argument("--pause", metavar="RUN_ID", help="Pause a running run.")
+        parser.add_argument("--cancel", metavar="RUN_ID", help="Cancel an active run.")
+        parser.add_argument("--status", metavar="RUN_ID", help="Print progress for a run.")
+        parser.add_argument("--list", action="store_true", help="List the most recent runs.")
+        parser.add_argument("--watch", action="store_true", help="Keep printing progress until the run stops.")
+        parser.add_argument("--interval", type=float, default=10.0, help="Seconds between --watch updates.")
+
+    def _get_run(self, run_id):
+        run = MediaReprocessRun.objects.filter(pk=run_id).first()
+        if not run:
+            raise CommandError(f'Reprocessing run "{run_id}" was not found.')
+        return run
+
+    def _write_progress(self, run):
+        payload = serialize_reprocess_run(run)
+        eta = f'{payload["eta_seconds"]}s' if payload["eta_seconds"] is not None else "-"
+        rate = payload["items_per_minute"] if payload["items_per_minute"] is not None else "-"
+        self.stdout.write(
+            f'{payload["id"]} {payload["status"]}: '
+            f'{payload["processed_items"] + payload["failed_items"]}/{payload["total_items"]} '
+            f'({payload["progress_percent"]}%), failed={payload["failed_items"]}, '
+            f'in_flight={payload["in_flight_batches"]}, rate={rate}/min, eta={eta}'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            if options.get("list"):
+                for run in MediaReprocessRun.objects.order_by("-created_at")[:20]:
+                    self._write_progress(run)
+                return
+
+            if options.get("status"):
+                run = self._get_run(options["status"])
+            elif options.get("pause"):
+                run = pause_reprocess_run(self._get_run(options["pause"]))
+            elif options.get("cancel"):
+                run = cancel_reprocess_run(self._get_run(options["cancel"]))
+            elif options.get("resume"):
+                run = resume_reprocess_run(self._get_run(options["resume"]))
+            else:
+                vault = None
+                if options.get("vault"):
+                    vault = FamilyVault.objects.filter(pk=options["vault"]).first()
+                    if not vault:
+                        raise CommandError(f'Vault "{options["vault"]}" was not found.')
+                run_options = normalize_reprocess_options(
+                    {
+                        "stages": options.get("stages"),
+                        "statuses": options.get("statuses"),
+                        "batch_size": options.get("batch_size"),
+                        "rate_limit_per_minute": options.get("rate_limit"),
+                        "max_in_flight": options.get("max_in_flight"),
+                    }
+                )
+                run = start_reprocess_run(vault=vault, options=run_options)
+                self.stdout.write(self.style.SUCCESS(f"Started reprocessing run {run.id} for {run.total_items} items."))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        self._write_progress(run)
+        while options.get("watch") and run.status == MediaReprocessRun.Status.RUNNING:
+            time.sleep(max(float(options.get("interval") or 10.0), 1.0))
+            run.refresh_from_db()
+            self._write_progress(run)
@@ -0,0 +1,80 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0010_mediaitem_time_locking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='document_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='document_processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='document_status',
+            field=models.CharField(
+                choices=[
+                    ('NOT_STARTED', 'Not Started'),
+                    ('QUEUED', 'Queued'),
+                    ('PROCESSING', 'Processing'),
+                    ('COMPLETED', 'Completed'),
+                    ('NOT_AVAILABLE', 'Not Available'),
+                    ('FAILED', 'Failed'),
+                ],
+                db_index=True,
+                default='NOT_STARTED',
+                max_length=32,
+            ),
+        ),
+        migrations.AddField(
+            model_name='mediaitem',
+            name='document_task_id',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='MediaDocumentText',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('file_id', models.CharField(max_length=64)),
+                ('original_name', models.CharField(blank=True, default='', max_length=255)),
+                ('content_hash', models.CharField(blank=True, db_index=True, default='', max_length=64)),
+                ('extractor_version', models.CharField(blank=True, default='', max_length=32)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('extracted_page_count', models.PositiveIntegerField(default=0)),
+                ('text', models.TextField(blank=True, default='')),
+                ('is_truncated', models.BooleanField(default=False)),
+                ('preview', models.FileField(blank=True, default='', upload_to='document-previews/')),
+                (
+                    'media_item',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='document_texts',
+                        to='media.mediaitem',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('created_at', 'id'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='mediadocumenttext',
+            constraint=models.UniqueConstraint(
+                fields=('media_item', 'file_id'),
+                name='uniq_media_document_text_file',
+            ),
+        ),
+    ]
@@ -0,0 +1,82 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0011_mediaitem_document_workflow'),
+        ('vaults', '0005_invite_invite_type_invite_successful_joins'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaReprocessRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[
+                            ('RUNNING', 'Running'),
+                            ('PAUSED', 'Paused'),
+                            ('COMPLETED', 'Completed'),
+                            ('CANCELLED', 'Cancelled'),
+                            ('FAILED', 'Failed'),
+                        ],
+                        db_index=True,
+                        default='RUNNING',
+                        max_length=20,
+                    ),
+                ),
+                ('stages', models.JSONField(blank=True, default=list)),
+                ('status_filter', models.JSONField(blank=True, default=list)),
+                ('batch_size', models.PositiveIntegerField(default=25)),
+                ('rate_limit_per_minute', models.PositiveIntegerField(default=120)),
+                ('max_in_flight', models.PositiveIntegerField(default=2)),
+                ('checkpoint_created_at', models.DateTimeField(blank=True, null=True)),
+                ('checkpoint_item_id', models.UUIDField(blank=True, null=True)),
+                ('pending_batches', models.JSONField(blank=True, default=dict)),
+                ('dispatcher_task_id', models.CharField(blank=True, default='', max_length=64)),
+                ('total_items', models.PositiveIntegerField(default=0)),
+                ('dispatched_items', models.PositiveIntegerField(default=0)),
+                ('processed_items', models.PositiveIntegerField(default=0)),
+                ('failed_items', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_progress_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                (
+                    'requested_by',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='media_reprocess_runs',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    'vault',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='media_reprocess_runs',
+                        to='vaults.familyvault',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('-created_at', 'id'),
+                'indexes': [
+                    models.Index(fields=['vault', 'status'], name='media_reprocess_vault_status'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0012_mediareprocessrun'),
+        ('vaults', '0005_invite_invite_type_invite_successful_joins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FaceEmbedding',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('face_id', models.CharField(max_length=64)),
+                ('file_id', models.CharField(blank=True, default='', max_length=64)),
+                ('model', models.CharField(max_length=64)),
+                ('vector', models.BinaryField()),
+                (
+                    'media_item',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='face_embeddings',
+                        to='media.mediaitem',
+                    ),
+                ),
+                (
+                    'vault',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='face_embeddings',
+                        to='vaults.familyvault',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('created_at', 'id'),
+                'indexes': [models.Index(fields=['vault', 'created_at'], name='media_face_emb_vault_created')],
+                'constraints': [
+                    models.UniqueConstraint(fields=('media_item', 'face_id'), name='uniq_media_face_embedding'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0013_faceembedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaRestorationOutput',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('file_id', models.CharField(max_length=64)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('options_key', models.CharField(max_length=32)),
+                ('pipeline_version', models.CharField(max_length=32)),
+                ('colorization_method', models.CharField(blank=True, default='', max_length=32)),
+                ('output', models.FileField(max_length=255, upload_to='restored-media/')),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('detected_black_and_white', models.BooleanField(default=False)),
+                ('applied_options', models.JSONField(blank=True, default=dict)),
+                ('warnings', models.JSONField(blank=True, default=list)),
+                (
+                    'media_item',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='restoration_outputs',
+                        to='media.mediaitem',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('created_at', 'id'),
+                'indexes': [
+                    models.Index(
+                        fields=['content_hash', 'options_key', 'pipeline_version'],
+                        name='media_restore_out_cache_key',
+                    ),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=('media_item', 'file_id'), name='uniq_media_restoration_output_file'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0014_mediarestorationoutput'),
+        ('vaults', '0005_invite_invite_type_invite_successful_joins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaTaskTicket',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('task_name', models.CharField(max_length=200)),
+                ('task_id', models.CharField(max_length=64, unique=True)),
+                ('args', models.JSONField(blank=True, default=list)),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[('PENDING', 'Pending'), ('DISPATCHED', 'Dispatched'), ('DONE', 'Done')],
+                        db_index=True,
+                        default='PENDING',
+                        max_length=20,
+                    ),
+                ),
+                ('dispatched_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                (
+                    'media_item',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='task_tickets',
+                        to='media.mediaitem',
+                    ),
+                ),
+                (
+                    'vault',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='media_task_tickets',
+                        to='vaults.familyvault',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('created_at', 'id'),
+                'indexes': [
+                    models.Index(fields=['vault', 'status', 'created_at'], name='media_ticket_vault_status'),
+                    models.Index(fields=['status', 'finished_at'], name='media_ticket_finished'),
+                ],
+            },
+        ),
+    ]
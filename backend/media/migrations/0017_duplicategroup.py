@@ -0,0 +1,59 @@
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0016_mediaitem_perceptual_hash'),
+        ('vaults', '0005_invite_invite_type_invite_successful_joins'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaitem',
+            name='duplicate_signature',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='mediaitem',
+            index=models.Index(fields=['vault', 'duplicate_signature'], name='media_item_vault_dup_sig'),
+        ),
+        migrations.CreateModel(
+            name='DuplicateGroup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('signature', models.CharField(max_length=64)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('reclaimable_bytes', models.BigIntegerField(default=0)),
+                (
+                    'primary',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='+',
+                        to='media.mediaitem',
+                    ),
+                ),
+                (
+                    'vault',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='duplicate_groups',
+                        to='vaults.familyvault',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('-reclaimable_bytes', 'signature'),
+                'indexes': [
+                    models.Index(fields=['vault', '-reclaimable_bytes'], name='media_dup_group_reclaimable'),
+                ],
+                'constraints': [
+                    models.UniqueConstraint(fields=['vault', 'signature'], name='media_duplicate_group_unique'),
+                ],
+            },
+        ),
+    ]
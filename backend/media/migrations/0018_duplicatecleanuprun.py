@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('media', '0017_duplicategroup'),
+        ('vaults', '0005_invite_invite_type_invite_successful_joins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DuplicateCleanupRun',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                (
+                    'status',
+                    models.CharField(
+                        choices=[('RUNNING', 'Running'), ('COMPLETED', 'Completed'), ('FAILED', 'Failed')],
+                        db_index=True,
+                        default='RUNNING',
+                        max_length=20,
+                    ),
+                ),
+                ('signatures', models.JSONField(blank=True, default=list)),
+                ('checkpoint_signature', models.CharField(blank=True, default='', max_length=64)),
+                ('worker_task_id', models.CharField(blank=True, default='', max_length=64)),
+                ('total_groups', models.PositiveIntegerField(default=0)),
+                ('processed_groups', models.PositiveIntegerField(default=0)),
+                ('deleted_items', models.PositiveIntegerField(default=0)),
+                ('recovered_bytes', models.BigIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('last_progress_at', models.DateTimeField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, default='')),
+                (
+                    'requested_by',
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name='duplicate_cleanup_runs',
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    'vault',
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name='duplicate_cleanup_runs',
+                        to='vaults.familyvault',
+                    ),
+                ),
+            ],
+            options={
+                'ordering': ('-created_at', 'id'),
+                'indexes': [
+                    models.Index(fields=['vault', 'status'], name='media_dup_cleanup_status'),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('media', '0019_display_rotation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediareprocessrun',
+            name='batch_progress',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -3,6 +3,7 @@ from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from vaults.models import FamilyVault
 from core.models import TimeStampedModel
+from core.signals import share_storage_keys
 from core.utils import get_upload_path
 import hashlib
 from django.core.files.uploadedfile import UploadedFile
@@ -109,6 +110,14 @@ class MediaItem(TimeStampedModel):
         NOT_AVAILABLE = 'NOT_AVAILABLE', _('Not Available')
         FAILED = 'FAILED', _('Failed')
 
+    class DocumentStatus(models.TextChoices):
+        NOT_STARTED = 'NOT_STARTED', _('Not Started')
+        QUEUED = 'QUEUED', _('Queued')
+        PROCESSING = 'PROCESSING', _('Processing')
+        COMPLETED = 'COMPLETED', _('Completed')
+        NOT_AVAILABLE = 'NOT_AVAILABLE', _('Not Available')
+        FAILED = 'FAILED', _('Failed')
+
     # Relationships
     vault = models.ForeignKey(FamilyVault, on_delete=models.CASCADE, related_name='media_items')
     uploader = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, related_name='uploaded_media')
@@ -117,6 +126,12 @@ class MediaItem(TimeStampedModel):
     file = models.FileField(upload_to=get_upload_path)
     file_size = models.BigIntegerField(editable=False, help_text="Size in bytes")
     content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    # 64-bit dHash of the primary photo, stored signed; see media.perceptual_hash.
+    perceptual_hash = models.BigIntegerField(null=True, blank=True)
+    # SHA-256 over the sorted content hashes of the primary file and attachments; see media.duplicates.
+    duplicate_signature = models.CharField(max_length=64, blank=True, default='')
+    # Clockwise quarter turns shown on top of the stored pixels and their EXIF orientation.
+    display_rotation = models.PositiveSmallIntegerField(default=0)
     media_type = models.CharField(max_length=20, choices=MediaType.choices, default=MediaType.PHOTO)
     
     # Metadata
@@ -172,6 +187,21 @@ class MediaItem(TimeStampedModel):
     restoration_data = models.JSONField(default=dict, blank=True)
     restoration_task_id = models.CharField(max_length=64, blank=True, default='')
     restoration_processed_at = models.DateTimeField(null=True, blank=True)
+    document_status = models.CharField(
+        max_length=32,
+        choices=DocumentStatus.choices,
+        default=DocumentStatus.NOT_STARTED,
+        db_index=True,
+    )
+    document_error = models.TextField(blank=True, default='')
+    document_task_id = models.CharField(max_length=64, blank=True, default='')
+    document_processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['vault', 'perceptual_hash'], name='media_item_vault_phash'),
+            models.Index(fields=['vault', 'duplicate_signature'], name='media_item_vault_dup_sig'),
+        ]
 
     def _calculate_content_hash(self):
         return compute_storage_file_hash(self.file)
@@ -244,6 +274,7 @@ class MediaAttachment(TimeStampedModel):
     mime_type = models.CharField(max_length=120, blank=True, default='')
     file_type = models.CharField(max_length=20, choices=FileType.choices, default=FileType.DOCUMENT)
     original_name = models.CharField(max_length=255, blank=True, default='')
+    display_rotation = models.PositiveSmallIntegerField(default=0)
 
     class Meta:
         ordering = ('created_at', 'id')
@@ -291,6 +322,257 @@ class MediaAttachment(TimeStampedModel):
         return self.original_name or f'Attachment {self.id}'
 
 
+# Promoting an attachment repoints the primary file at the attachment's key instead of copying it.
+share_storage_keys((MediaItem, 'file'), (MediaAttachment, 'file'))
+
+
+class MediaDocumentText(TimeStampedModel):
+    media_item = models.ForeignKey(
+        MediaItem,
+        on_delete=models.CASCADE,
+        related_name='document_texts',
+    )
+    file_id = models.CharField(max_length=64)
+    original_name = models.CharField(max_length=255, blank=True, default='')
+    content_hash = models.CharField(max_length=64, blank=True, default='', db_index=True)
+    extractor_version = models.CharField(max_length=32, blank=True, default='')
+    page_count = models.PositiveIntegerField(default=0)
+    extracted_page_count = models.PositiveIntegerField(default=0)
+    text = models.TextField(blank=True, default='')
+    is_truncated = models.BooleanField(default=False)
+    preview = models.FileField(upload_to='document-previews/', blank=True, default='')
+
+    class Meta:
+        ordering = ('created_at', 'id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['media_item', 'file_id'],
+                name='uniq_media_document_text_file',
+            ),
+        ]
+
+    def __str__(self):
+        return self.original_name or f'Document text {self.id}'
+
+
+class FaceEmbedding(TimeStampedModel):
+    """Unit-length float16 face vector for one detected face; per-vault search matrices are built from these rows."""
+
+    vault = models.ForeignKey(FamilyVault, on_delete=models.CASCADE, related_name='face_embeddings')
+    media_item = models.ForeignKey(MediaItem, on_delete=models.CASCADE, related_name='face_embeddings')
+    face_id = models.CharField(max_length=64)
+    file_id = models.CharField(max_length=64, blank=True, default='')
+    model = models.CharField(max_length=64)
+    vector = models.BinaryField()
+
+    class Meta:
+        ordering = ('created_at', 'id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['media_item', 'face_id'],
+                name='uniq_media_face_embedding',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['vault', 'created_at'], name='media_face_emb_vault_created'),
+        ]
+
+    def __str__(self):
+        return f'Face {self.face_id} ({self.media_item_id})'
+
+
+class MediaRestorationOutput(TimeStampedModel):
+    """Restored image for one media file; rows with the same source hash and options share one output key."""
+
+    media_item = models.ForeignKey(
+        MediaItem,
+        on_delete=models.CASCADE,
+        related_name='restoration_outputs',
+    )
+    file_id = models.CharField(max_length=64)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
+    options_key = models.CharField(max_length=32)
+    pipeline_version = models.CharField(max_length=32)
+    colorization_method = models.CharField(max_length=32, blank=True, default='')
+    output = models.FileField(upload_to='restored-media/', max_length=255)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    detected_black_and_white = models.BooleanField(default=False)
+    applied_options = models.JSONField(default=dict, blank=True)
+    warnings = models.JSONField(default=list, blank=True)
+
+    class Meta:
+        ordering = ('created_at', 'id')
+        constraints = [
+            models.UniqueConstraint(
+                fields=['media_item', 'file_id'],
+                name='uniq_media_restoration_output_file',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['content_hash', 'options_key', 'pipeline_version'],
+                name='media_restore_out_cache_key',
+            ),
+        ]
+
+    def __str__(self):
+        return f'Restoration {self.file_id} ({self.media_item_id})'
+
+
+class MediaReprocessRun(TimeStampedModel):
+    class Stage(models.TextChoices):
+        EXIF = 'exif', _('EXIF')
+        FACES = 'faces', _('Faces')
+
+    class Status(models.TextChoices):
+        RUNNING = 'RUNNING', _('Running')
+        PAUSED = 'PAUSED', _('Paused')
+        COMPLETED = 'COMPLETED', _('Completed')
+        CANCELLED = 'CANCELLED', _('Cancelled')
+        FAILED = 'FAILED', _('Failed')
+
+    vault = models.ForeignKey(
+        FamilyVault,
+        on_delete=models.CASCADE,
+        related_name='media_reprocess_runs',
+        null=True,
+        blank=True,
+    )
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='media_reprocess_runs',
+    )
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.RUNNING, db_index=True)
+    stages = models.JSONField(default=list, blank=True)
+    status_filter = models.JSONField(default=list, blank=True)
+    batch_size = models.PositiveIntegerField(default=25)
+    rate_limit_per_minute = models.PositiveIntegerField(default=120)
+    max_in_flight = models.PositiveIntegerField(default=2)
+
+    # Keyset checkpoint over (created_at, id); everything at or before it has been dispatched.
+    checkpoint_created_at = models.DateTimeField(null=True, blank=True)
+    checkpoint_item_id = models.UUIDField(null=True, blank=True)
+    pending_batches = models.JSONField(default=dict, blank=True)
+    # Per pending batch: when it last made progress and which dispatch attempt it is.
+    batch_progress = models.JSONField(default=dict, blank=True)
+    dispatcher_task_id = models.CharField(max_length=64, blank=True, default='')
+
+    total_items = models.PositiveIntegerField(default=0)
+    dispatched_items = models.PositiveIntegerField(default=0)
+    processed_items = models.PositiveIntegerField(default=0)
+    failed_items = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_progress_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ('-created_at', 'id')
+        indexes = [
+            models.Index(fields=['vault', 'status'], name='media_reprocess_vault_status'),
+        ]
+
+    def __str__(self):
+        return f'Reprocess {self.id} ({self.status})'
+
+
+class MediaTaskTicket(TimeStampedModel):
+    """A media task admitted to the per-vault scheduler, from admission until a worker finishes it."""
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', _('Pending')
+        DISPATCHED = 'DISPATCHED', _('Dispatched')
+        DONE = 'DONE', _('Done')
+
+    vault = models.ForeignKey(FamilyVault, on_delete=models.CASCADE, related_name='media_task_tickets')
+    media_item = models.ForeignKey(MediaItem, on_delete=models.CASCADE, related_name='task_tickets')
+    task_name = models.CharField(max_length=200)
+    task_id = models.CharField(max_length=64, unique=True)
+    args = models.JSONField(default=list, blank=True)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING, db_index=True)
+    dispatched_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ('created_at', 'id')
+        indexes = [
+            models.Index(fields=['vault', 'status', 'created_at'], name='media_ticket_vault_status'),
+            models.Index(fields=['status', 'finished_at'], name='media_ticket_finished'),
+        ]
+
+    def __str__(self):
+        return f'{self.task_name} {self.task_id} ({self.status})'
+
+
+class DuplicateGroup(TimeStampedModel):
+    """Items of a vault sharing one duplicate signature, kept current as content hashes change."""
+
+    vault = models.ForeignKey(FamilyVault, on_delete=models.CASCADE, related_name='duplicate_groups')
+    signature = models.CharField(max_length=64)
+    primary = models.ForeignKey(MediaItem, on_delete=models.CASCADE, related_name='+')
+    item_count = models.PositiveIntegerField(default=0)
+    reclaimable_bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ('-reclaimable_bytes', 'signature')
+        constraints = [
+            models.UniqueConstraint(fields=['vault', 'signature'], name='media_duplicate_group_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['vault', '-reclaimable_bytes'], name='media_dup_group_reclaimable'),
+        ]
+
+    def __str__(self):
+        return f'{self.signature[:12]} x{self.item_count}'
+
+
+class DuplicateCleanupRun(TimeStampedModel):
+    """A background merge of duplicate groups into their primaries, one group per transaction."""
+
+    class Status(models.TextChoices):
+        RUNNING = 'RUNNING', _('Running')
+        COMPLETED = 'COMPLETED', _('Completed')
+        FAILED = 'FAILED', _('Failed')
+
+    vault = models.ForeignKey(FamilyVault, on_delete=models.CASCADE, related_name='duplicate_cleanup_runs')
+    requested_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='duplicate_cleanup_runs',
+    )
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.RUNNING, db_index=True)
+    # Selected group signatures; empty means every group of the vault.
+    signatures = models.JSONField(default=list, blank=True)
+
+    # Keyset checkpoint over signatures; every group at or before it has been merged.
+    checkpoint_signature = models.CharField(max_length=64, blank=True, default='')
+    worker_task_id = models.CharField(max_length=64, blank=True, default='')
+
+    total_groups = models.PositiveIntegerField(default=0)
+    processed_groups = models.PositiveIntegerField(default=0)
+    deleted_items = models.PositiveIntegerField(default=0)
+    recovered_bytes = models.BigIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_progress_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ('-created_at', 'id')
+        indexes = [
+            models.Index(fields=['vault', 'status'], name='media_dup_cleanup_status'),
+        ]
+
+    def __str__(self):
+        return f'Duplicate cleanup {self.id} ({self.status})'
+
+
 class MediaItemLockTarget(TimeStampedModel):
     media_item = models.ForeignKey(
         MediaItem,
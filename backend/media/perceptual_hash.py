@@ -0,0 +1,190 @@
+import logging
+from typing import Any, Sequence
+
+import numpy as np
+from PIL import Image
+
+
+HASH_BITS = 64
+_SIGN_BIT = 1 << (HASH_BITS - 1)
+# Distinct hashes sharing one chunk value beyond this are not compared through that chunk; a bucket
+# of m hashes costs m²/2 comparisons, and such buckets only arise from degenerate (e.g. blank) scans.
+MAX_BUCKET_SIZE = 2048
+logger = logging.getLogger(__name__)
+
+
+def compute_dhash(image: Image.Image) -> int:
+    """64-bit difference hash: one bit per horizontal brightness step on a 9x8 grayscale thumbnail.
+
+    Resizing, re-encoding and light retouching keep most bits, so copies land a few bits apart.
+    """
+    thumbnail = image.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = np.asarray(thumbnail, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def to_stored_hash(value: int | None) -> int | None:
+    """Map an unsigned 64-bit hash onto the signed range of a ``BigIntegerField``."""
+    if value is None:
+        return None
+    return value - (1 << HASH_BITS) if value & _SIGN_BIT else value
+
+
+def from_stored_hash(value: int | None) -> int | None:
+    if value is None:
+        return None
+    return value + (1 << HASH_BITS) if value < 0 else value
+
+
+def hamming_distance(left: int, right: int) -> int:
+    return (int(left) ^ int(right)).bit_count()
+
+
+def hash_similarity(distance: int) -> float:
+    return round(1 - distance / HASH_BITS, 4)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values).astype(np.int64)
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1).astype(np.int64)
+
+
+def _chunk_layout(max_distance: int) -> list[tuple[int, int]]:
+    # Pigeonhole: two hashes within ``max_distance`` bits agree exactly on at least one of
+    # ``max_distance + 1`` disjoint chunks, so equal chunks are the only candidates worth comparing.
+    chunk_count = max_distance + 1
+    base_width, wider_chunks = divmod(HASH_BITS, chunk_count)
+    layout = []
+    shift = 0
+    for index in range(chunk_count):
+        width = base_width + (1 if index < wider_chunks else 0)
+        layout.append((shift, width))
+        shift += width
+    return layout
+
+
+def find_near_duplicate_pairs(hashes: Sequence[int], max_distance: int) -> list[tuple[int, int, int]]:
+    """``(left, right, distance)`` index pairs of hashes at most ``max_distance`` bits apart.
+
+    A multi-index hash lookup: hashes are bucketed by each chunk of the pigeonhole layout and only
+    bucket mates are compared, so the work follows the number of candidate pairs rather than n².
+    Identical hashes are collapsed first: a repeated hash is paired with its first index only (at
+    distance 0), and pairs between different hashes are reported on those first indices.
+    """
+    max_distance = max(0, min(int(max_distance), HASH_BITS - 1))
+    values, first_positions, inverse = np.unique(
+        np.asarray(hashes, dtype=np.uint64),
+        return_index=True,
+        return_inverse=True,
+    )
+    inverse = inverse.reshape(-1)
+    repeated = np.flatnonzero(first_positions[inverse] != np.arange(inverse.size))
+    pairs = [(int(first_positions[inverse[index]]), int(index), 0) for index in repeated]
+
+    total = values.size
+    if total < 2:
+        return sorted(pairs)
+
+    left_parts = []
+    right_parts = []
+    positions = np.arange(total)
+    for shift, width in _chunk_layout(max_distance):
+        chunk = (values >> np.uint64(shift)) & np.uint64((1 << width) - 1)
+        order = np.argsort(chunk, kind='stable')
+        sorted_chunk = chunk[order]
+        run_starts = np.flatnonzero(np.r_[True, sorted_chunk[1:] != sorted_chunk[:-1]])
+        run_lengths = np.diff(np.r_[run_starts, total])
+        run_ids = np.repeat(np.arange(run_starts.size), run_lengths)
+        offset_in_run = positions - run_starts[run_ids]
+        length_of_run = run_lengths[run_ids]
+
+        oversized = run_lengths > MAX_BUCKET_SIZE
+        if oversized.any():
+            logger.warning(
+                'Skipping %s perceptual hash bucket(s) of up to %s hashes on bits %s-%s.',
+                int(oversized.sum()),
+                int(run_lengths.max()),
+                shift,
+                shift + width - 1,
+            )
+
+        # Pair every bucket member with the ones d places after it, for growing d; the active set
+        # shrinks as buckets run out, so the loop costs one pass per emitted pair.
+        active = np.flatnonzero((length_of_run > 1) & (length_of_run <= MAX_BUCKET_SIZE))
+        step = 1
+        while active.size:
+            active = active[offset_in_run[active] + step < length_of_run[active]]
+            if not active.size:
+                break
+            left_parts.append(order[active])
+            right_parts.append(order[active + step])
+            step += 1
+
+    if left_parts:
+        left = np.concatenate(left_parts)
+        right = np.concatenate(right_parts)
+        distances = _popcount(values[left] ^ values[right])
+        close = distances <= max_distance
+        left = first_positions[left[close]]
+        right = first_positions[right[close]]
+        left, right = np.minimum(left, right), np.maximum(left, right)
+        pair_keys, first_index = np.unique(left * inverse.size + right, return_index=True)
+        close_distances = distances[close][first_index]
+        pairs.extend(
+            (int(pair_key // inverse.size), int(pair_key % inverse.size), int(distance))
+            for pair_key, distance in zip(pair_keys, close_distances)
+        )
+    return sorted(pairs)
+
+
+def find_near_duplicate_clusters(
+    keys: Sequence[Any],
+    hashes: Sequence[int],
+    *,
+    max_distance: int,
+) -> list[dict[str, Any]]:
+    """Group keys whose hashes are within ``max_distance`` bits of their cluster's first member.
+
+    Leader clustering: walking keys in input order, each key not yet grouped starts a cluster and
+    claims every ungrouped key close to it. Unlike linking pairs transitively, this never chains
+    members further than ``max_distance`` from the first one. Clusters keep the input order, so the
+    first member is the earliest when callers pass keys oldest first. ``distances`` maps each member
+    to its distance from that first member.
+    """
+    # Only paired indices can share a cluster; most items have no near duplicate at all. Distance-0
+    # pairs tie a repeated hash to the first index carrying it; the others link those first indices.
+    copies = {}
+    neighbours = {}
+    for left, right, distance in find_near_duplicate_pairs(hashes, max_distance):
+        if distance == 0:
+            copies.setdefault(left, []).append(right)
+            continue
+        neighbours.setdefault(left, {})[right] = distance
+        neighbours.setdefault(right, {})[left] = distance
+
+    grouped = set()
+    clusters = []
+    for leader in sorted(copies.keys() | neighbours.keys()):
+        if leader in grouped:
+            continue
+        near = [index for index in sorted(neighbours.get(leader, {})) if index > leader and index not in grouped]
+        distances = {index: 0 for index in copies.get(leader, [])}
+        for index in near:
+            distances.update({member: neighbours[leader][index] for member in [index, *copies.get(index, [])]})
+        if not distances:
+            continue
+        grouped.add(leader)
+        grouped.update(near)
+        members = sorted(distances)
+        clusters.append(
+            {
+                'keys': [keys[leader]] + [keys[index] for index in members],
+                'distances': {
+                    keys[leader]: 0,
+                    **{keys[index]: distances[index] for index in members},
+                },
+            }
+        )
+    return clusters
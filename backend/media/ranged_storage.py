@@ -0,0 +1,226 @@
+import io
+import logging
+import re
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, TypeVar
+
+from django.conf import settings
+
+from .storage_cache import get_local_copy_path, open_cached_file
+
+
+logger = logging.getLogger(__name__)
+ParsedHeader = TypeVar('ParsedHeader')
+
+
+_BLOCK_SIZE = 16 * 1024
+_CONTENT_RANGE_PATTERN = re.compile(r'bytes\s+\d+-\d+/(\d+)')
+_STATS_LOCK = threading.Lock()
+_STATS = {
+    'header_reads': 0,
+    'range_requests': 0,
+    'bytes_fetched': 0,
+    'budget_exceeded': 0,
+    'full_read_fallbacks': 0,
+}
+
+
+class RangeBudgetExceeded(Exception):
+    """The header did not fit in ``MEDIA_EXIF_RANGE_MAX_BYTES``; callers fall back to a full read."""
+
+
+def _bump_stat(key: str, amount: int = 1):
+    with _STATS_LOCK:
+        _STATS[key] = _STATS.get(key, 0) + amount
+
+
+def _fetch_range(storage: Any, name: str, start: int, end: int) -> tuple[bytes, int | None]:
+    """Bytes ``[start, end)`` of a stored object and, when the backend reports it, the object size."""
+    bucket = getattr(storage, 'bucket', None)
+    if bucket is not None and hasattr(storage, '_normalize_name'):
+        from storages.utils import clean_name
+
+        response = bucket.Object(storage._normalize_name(clean_name(name))).get(Range=f'bytes={start}-{end - 1}')
+        match = _CONTENT_RANGE_PATTERN.match(str(response.get('ContentRange') or ''))
+        return response['Body'].read(), int(match.group(1)) if match else None
+
+    # Other backends: their file objects seek without reading everything in front of the range.
+    with storage.open(name, 'rb') as handle:
+        handle.seek(start)
+        return handle.read(end - start), None
+
+
+class RangedStorageFile(io.RawIOBase):
+    """Seekable, read-only view of a stored object that fetches byte ranges on demand.
+
+    Each miss fetches at least the current window, which doubles after every request, so header
+    parsers that walk forward need only a few round trips. Fetched blocks are kept, so parsers may
+    seek back and forth freely.
+    """
+
+    def __init__(self, storage: Any, name: str, *, initial_window: int, max_bytes: int):
+        super().__init__()
+        self.storage = storage
+        self.name = name
+        self.max_bytes = max_bytes
+        self.fetched_bytes = 0
+        self.range_requests = 0
+        self._window = max(initial_window, _BLOCK_SIZE)
+        self._blocks = {}
+        self._position = 0
+        self._size = None
+
+    @property
+    def size(self) -> int:
+        if self._size is None:
+            self._size = int(self.storage.size(self.name))
+        return self._size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f'Invalid whence: {whence}')
+        if position < 0:
+            raise OSError('Negative seek position.')
+        self._position = position
+        return position
+
+    def _ensure(self, start: int, end: int):
+        first_block = start // _BLOCK_SIZE
+        last_block = (end - 1) // _BLOCK_SIZE
+        missing = [index for index in range(first_block, last_block + 1) if index not in self._blocks]
+        if not missing:
+            return
+        fetch_start = missing[0] * _BLOCK_SIZE
+        fetch_end = max((missing[-1] + 1) * _BLOCK_SIZE, fetch_start + self._window)
+        if self._size is not None:
+            fetch_end = min(fetch_end, self._size)
+        if self.fetched_bytes + (fetch_end - fetch_start) > self.max_bytes:
+            _bump_stat('budget_exceeded')
+            raise RangeBudgetExceeded(f'Header of "{self.name}" exceeds {self.max_bytes} bytes.')
+
+        data, total_size = _fetch_range(self.storage, self.name, fetch_start, fetch_end)
+        self.range_requests += 1
+        self.fetched_bytes += len(data)
+        self._window = min(self._window * 2, self.max_bytes)
+        _bump_stat('range_requests')
+        _bump_stat('bytes_fetched', len(data))
+        if total_size is not None:
+            self._size = total_size
+        elif len(data) < fetch_end - fetch_start:
+            self._size = fetch_start + len(data)
+        for offset in range(0, len(data), _BLOCK_SIZE):
+            self._blocks[(fetch_start + offset) // _BLOCK_SIZE] = data[offset : offset + _BLOCK_SIZE]
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.size - self._position
+        if self._size is not None:
+            size = min(size, self._size - self._position)
+        if size <= 0:
+            return b''
+        start = self._position
+        self._ensure(start, start + size)
+
+        chunks = []
+        position = start
+        remaining = size
+        while remaining > 0:
+            block = self._blocks.get(position // _BLOCK_SIZE)
+            if not block:
+                break
+            offset = position % _BLOCK_SIZE
+            chunk = block[offset : offset + remaining]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            position += len(chunk)
+            remaining -= len(chunk)
+        self._position = position
+        return b''.join(chunks)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+@contextmanager
+def open_ranged_file(file_obj: Any):
+    """Yield a ranged reader for a remote stored file, or None when a local copy (or no storage) exists."""
+    storage = getattr(file_obj, 'storage', None)
+    name = str(getattr(file_obj, 'name', '') or '').strip()
+    if (
+        storage is None
+        or not name
+        or not bool(getattr(settings, 'MEDIA_EXIF_RANGE_READS', True))
+        or get_local_copy_path(file_obj)
+    ):
+        yield None
+        return
+
+    _bump_stat('header_reads')
+    reader = RangedStorageFile(
+        storage,
+        name,
+        initial_window=max(int(getattr(settings, 'MEDIA_EXIF_RANGE_INITIAL_BYTES', 65536) or 65536), 1024),
+        max_bytes=max(int(getattr(settings, 'MEDIA_EXIF_RANGE_MAX_BYTES', 4 * 1024 * 1024) or 0), _BLOCK_SIZE),
+    )
+    try:
+        yield reader
+    finally:
+        reader.close()
+
+
+def read_stored_header(
+    file_obj: Any,
+    parse: Callable[[Any], ParsedHeader],
+    *,
+    final_errors: tuple[type[Exception], ...] = (),
+) -> ParsedHeader:
+    """Run a header parser on a remote file through range requests, or on a full (cached) read.
+
+    The full read is the fallback when the header does not fit the range budget or a ranged read
+    fails. ``final_errors`` (e.g. "not an image") propagate right away, since a full read would
+    only raise them again.
+    """
+    try:
+        with open_ranged_file(file_obj) as ranged_file:
+            if ranged_file is not None:
+                return parse(ranged_file)
+    except final_errors:
+        raise
+    except RangeBudgetExceeded:
+        _bump_stat('full_read_fallbacks')
+    except Exception:
+        logger.warning('Ranged header read failed for "%s"; reading the whole file.', file_obj, exc_info=True)
+        _bump_stat('full_read_fallbacks')
+
+    with open_cached_file(file_obj) as handle:
+        return parse(handle)
+
+
+def get_ranged_read_stats() -> dict[str, Any]:
+    with _STATS_LOCK:
+        return dict(_STATS)
+
+
+def reset_ranged_read_stats():
+    with _STATS_LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
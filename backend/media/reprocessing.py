@@ -0,0 +1,195 @@
+from typing import Any
+from uuid import uuid4
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MediaItem, MediaReprocessRun
+from .tasks import build_reprocess_queryset, dispatch_reprocess_batch, start_reprocess_dispatcher
+
+
+ACTIVE_REPROCESS_STATUSES = (MediaReprocessRun.Status.RUNNING, MediaReprocessRun.Status.PAUSED)
+MAX_REPROCESS_BATCH_SIZE = 200
+
+
+def _parse_positive_int(raw_value: Any, *, default: int, field_name: str, maximum: int | None = None) -> int:
+    if raw_value in (None, ''):
+        return default
+    try:
+        parsed = int(raw_value)
+    except (TypeError, ValueError):
+        raise ValueError(f'{field_name} must be a positive integer.')
+    if parsed <= 0:
+        raise ValueError(f'{field_name} must be a positive integer.')
+    if maximum is not None and parsed > maximum:
+        raise ValueError(f'{field_name} must be at most {maximum}.')
+    return parsed
+
+
+def _parse_token_list(raw_value: Any) -> list[str]:
+    if raw_value in (None, ''):
+        return []
+    if isinstance(raw_value, str):
+        raw_value = raw_value.split(',')
+    if not isinstance(raw_value, (list, tuple, set)):
+        raise ValueError('Expected a list or a comma-separated string.')
+    return [str(value).strip() for value in raw_value if str(value).strip()]
+
+
+def normalize_reprocess_options(raw_options: dict[str, Any]) -> dict[str, Any]:
+    """Validate user supplied run options; raises ValueError with a user-facing message."""
+    valid_stages = {choice[0] for choice in MediaReprocessRun.Stage.choices}
+    stages = [stage.lower() for stage in _parse_token_list(raw_options.get('stages'))]
+    unknown_stages = sorted(set(stages) - valid_stages)
+    if unknown_stages:
+        raise ValueError(f'Unknown stages: {", ".join(unknown_stages)}.')
+
+    valid_statuses = {choice[0] for choice in MediaItem.FaceDetectionStatus.choices} | {
+        choice[0] for choice in MediaItem.ExifStatus.choices
+    }
+    statuses = [status_value.upper() for status_value in _parse_token_list(raw_options.get('statuses'))]
+    unknown_statuses = sorted(set(statuses) - valid_statuses)
+    if unknown_statuses:
+        raise ValueError(f'Unknown statuses: {", ".join(unknown_statuses)}.')
+
+    return {
+        'stages': sorted(set(stages)) or sorted(valid_stages),
+        'status_filter': sorted(set(statuses)),
+        'batch_size': _parse_positive_int(
+            raw_options.get('batch_size'),
+            default=int(getattr(settings, 'MEDIA_REPROCESS_BATCH_SIZE', 25) or 25),
+            field_name='batch_size',
+            maximum=MAX_REPROCESS_BATCH_SIZE,
+        ),
+        'rate_limit_per_minute': _parse_positive_int(
+            raw_options.get('rate_limit_per_minute'),
+            default=int(getattr(settings, 'MEDIA_REPROCESS_RATE_LIMIT_PER_MINUTE', 120) or 120),
+            field_name='rate_limit_per_minute',
+        ),
+        'max_in_flight': _parse_positive_int(
+            raw_options.get('max_in_flight'),
+            default=int(getattr(settings, 'MEDIA_REPROCESS_MAX_IN_FLIGHT', 2) or 2),
+            field_name='max_in_flight',
+        ),
+    }
+
+
+def start_reprocess_run(*, vault=None, requested_by=None, options: dict[str, Any]) -> MediaReprocessRun:
+    with transaction.atomic():
+        active_runs = MediaReprocessRun.objects.filter(vault=vault, status__in=ACTIVE_REPROCESS_STATUSES)
+        if active_runs.exists():
+            raise ValueError('A reprocessing run is already active for this scope. Resume or cancel it first.')
+
+        now = timezone.now()
+        run = MediaReprocessRun(
+            vault=vault,
+            requested_by=requested_by,
+            status=MediaReprocessRun.Status.RUNNING,
+            started_at=now,
+            last_progress_at=now,
+            **options,
+        )
+        run.total_items = build_reprocess_queryset(run).count()
+        run.save()
+        start_reprocess_dispatcher(run)
+    return run
+
+
+def pause_reprocess_run(run: MediaReprocessRun) -> MediaReprocessRun:
+    if run.status != MediaReprocessRun.Status.RUNNING:
+        raise ValueError('Only running reprocessing runs can be paused.')
+    MediaReprocessRun.objects.filter(pk=run.pk).update(status=MediaReprocessRun.Status.PAUSED)
+    run.refresh_from_db()
+    return run
+
+
+def resume_reprocess_run(run: MediaReprocessRun) -> MediaReprocessRun:
+    """Continue from the keyset checkpoint, re-dispatching batches that never finished."""
+    if run.status in (MediaReprocessRun.Status.COMPLETED, MediaReprocessRun.Status.CANCELLED):
+        raise ValueError('Finished reprocessing runs cannot be resumed.')
+
+    with transaction.atomic():
+        locked_run = MediaReprocessRun.objects.select_for_update().get(pk=run.pk)
+        redispatched_batches = {
+            uuid4().hex: list(item_ids)
+            for item_ids in (locked_run.pending_batches or {}).values()
+            if item_ids
+        }
+        progress_at = timezone.now().isoformat()
+        locked_run.pending_batches = redispatched_batches
+        locked_run.batch_progress = {
+            batch_id: {'progress_at': progress_at, 'attempt': 1} for batch_id in redispatched_batches
+        }
+        locked_run.status = MediaReprocessRun.Status.RUNNING
+        locked_run.finished_at = None
+        locked_run.error = ''
+        locked_run.save(
+            update_fields=['pending_batches', 'batch_progress', 'status', 'finished_at', 'error', 'updated_at']
+        )
+
+        run_id = str(locked_run.pk)
+        for batch_id, item_ids in redispatched_batches.items():
+            transaction.on_commit(
+                lambda batch_id=batch_id, item_ids=item_ids: dispatch_reprocess_batch(run_id, batch_id, item_ids)
+            )
+        start_reprocess_dispatcher(locked_run)
+
+    run.refresh_from_db()
+    return run
+
+
+def cancel_reprocess_run(run: MediaReprocessRun) -> MediaReprocessRun:
+    if run.status not in ACTIVE_REPROCESS_STATUSES:
+        raise ValueError('Only active reprocessing runs can be cancelled.')
+    MediaReprocessRun.objects.filter(pk=run.pk).update(
+        status=MediaReprocessRun.Status.CANCELLED,
+        finished_at=timezone.now(),
+        pending_batches={},
+        batch_progress={},
+    )
+    run.refresh_from_db()
+    return run
+
+
+def serialize_reprocess_run(run: MediaReprocessRun) -> dict[str, Any]:
+    total_items = int(run.total_items or 0)
+    finished_items = min(int(run.processed_items or 0) + int(run.failed_items or 0), max(total_items, 0))
+    remaining_items = max(total_items - finished_items, 0)
+    reference_time = run.finished_at or timezone.now()
+    elapsed_seconds = (reference_time - run.started_at).total_seconds() if run.started_at else 0.0
+
+    items_per_minute = None
+    eta_seconds = None
+    if elapsed_seconds > 0 and finished_items:
+        items_per_minute = round(finished_items / elapsed_seconds * 60.0, 2)
+        if run.status == MediaReprocessRun.Status.RUNNING and remaining_items:
+            # Observed throughput already reflects the rate limit and in-flight cap.
+            eta_seconds = int(remaining_items / (finished_items / elapsed_seconds))
+
+    return {
+        'id': str(run.id),
+        'vault_id': str(run.vault_id) if run.vault_id else None,
+        'status': run.status,
+        'stages': list(run.stages or []),
+        'status_filter': list(run.status_filter or []),
+        'batch_size': run.batch_size,
+        'rate_limit_per_minute': run.rate_limit_per_minute,
+        'max_in_flight': run.max_in_flight,
+        'total_items': total_items,
+        'dispatched_items': int(run.dispatched_items or 0),
+        'processed_items': int(run.processed_items or 0),
+        'failed_items': int(run.failed_items or 0),
+        'in_flight_batches': len(run.pending_batches or {}),
+        'progress_percent': round(finished_items / total_items * 100.0, 2) if total_items else 100.0,
+        'items_per_minute': items_per_minute,
+        'eta_seconds': eta_seconds,
+        'checkpoint': {
+            'created_at': run.checkpoint_created_at,
+            'item_id': str(run.checkpoint_item_id) if run.checkpoint_item_id else None,
+        },
+        'started_at': run.started_at,
+        'finished_at': run.finished_at,
+        'last_progress_at': run.last_progress_at,
+        'error': run.error or '',
+    }
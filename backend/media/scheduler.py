@@ -0,0 +1,255 @@
+import logging
+import threading
+from datetime import timedelta
+from typing import Any
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import MediaItem, MediaTaskTicket
+from .supersession import acquire_task_lock, is_task_superseded, release_task_lock
+
+
+logger = logging.getLogger(__name__)
+
+# Upload-pipeline tasks that go through the per-vault scheduler. Restorations and previews are explicit
+# single-item requests and keep publishing straight to their own queues.
+SCHEDULED_TASK_NAMES = frozenset(
+    {
+        'media.tasks.analyze_media_task',
+        'media.tasks.extract_media_exif_task',
+        'media.tasks.detect_media_faces_task',
+        'media.tasks.extract_media_document_task',
+    }
+)
+_RETRY_LOCK_NAME = 'media-scheduler:retry-scheduled'
+_BROKER_CLIENT_LOCK = threading.Lock()
+_BROKER_CLIENT = None
+_BROKER_CLIENT_URL = None
+
+
+def admit_media_task(media_item: MediaItem, task, task_id: str, args: list) -> MediaTaskTicket:
+    """Record a task in its vault's pending queue; call inside the transaction that marks the stage QUEUED."""
+    return MediaTaskTicket.objects.create(
+        vault_id=media_item.vault_id,
+        media_item_id=media_item.pk,
+        task_name=task.name,
+        task_id=task_id,
+        args=list(args),
+    )
+
+
+def _get_broker_client():
+    global _BROKER_CLIENT, _BROKER_CLIENT_URL
+    url = str(getattr(settings, 'CELERY_BROKER_URL', '') or '')
+    with _BROKER_CLIENT_LOCK:
+        if _BROKER_CLIENT_URL != url:
+            _BROKER_CLIENT = None
+            if url.startswith(('redis://', 'rediss://')):
+                import redis
+
+                _BROKER_CLIENT = redis.Redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=0.5)
+            _BROKER_CLIENT_URL = url
+        return _BROKER_CLIENT
+
+
+def _scheduled_queue_names() -> set[str]:
+    routes = getattr(settings, 'CELERY_TASK_ROUTES', {}) or {}
+    default_queue = str(getattr(settings, 'CELERY_TASK_DEFAULT_QUEUE', 'default') or 'default')
+    return {str((routes.get(name) or {}).get('queue') or default_queue) for name in SCHEDULED_TASK_NAMES}
+
+
+def get_broker_depth() -> int | None:
+    """Messages waiting in the scheduled queues, or None when the broker cannot be inspected."""
+    client = _get_broker_client()
+    if client is None:
+        return None
+    transport_options = getattr(settings, 'CELERY_BROKER_TRANSPORT_OPTIONS', {}) or {}
+    separator = str(transport_options.get('sep', '\x06\x16'))
+    priority_steps = transport_options.get('priority_steps') or [0]
+    # Kombu keeps one Redis list per queue and priority step; step 0 uses the bare queue name.
+    keys = [
+        queue if not step else f'{queue}{separator}{step}'
+        for queue in sorted(_scheduled_queue_names())
+        for step in priority_steps
+    ]
+    try:
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.llen(key)
+        return int(sum(pipeline.execute()))
+    except Exception:
+        logger.warning('Unable to read broker queue depth; dispatching without backpressure.', exc_info=True)
+        return None
+
+
+def _schedule_retry():
+    retry_seconds = max(float(getattr(settings, 'MEDIA_SCHEDULER_RETRY_SECONDS', 15) or 15), 1.0)
+    # One pending retry across all processes; admissions and completions dispatch in between anyway.
+    if not acquire_task_lock(_RETRY_LOCK_NAME, retry_seconds):
+        return
+    from .tasks import dispatch_media_tasks_task
+
+    try:
+        dispatch_media_tasks_task.apply_async(countdown=retry_seconds)
+    except Exception:
+        release_task_lock(_RETRY_LOCK_NAME)
+        logger.exception('Failed to schedule media task dispatch retry.')
+
+
+def _in_flight_cutoff():
+    # Tickets of workers that died without reporting back stop holding a slot after this long.
+    timeout = max(int(getattr(settings, 'MEDIA_SCHEDULER_DISPATCH_TIMEOUT', 1800) or 1800), 60)
+    return timezone.now() - timedelta(seconds=timeout)
+
+
+def _publish(ticket: MediaTaskTicket) -> bool:
+    from celery import current_app
+
+    try:
+        current_app.tasks[ticket.task_name].apply_async(args=ticket.args, task_id=ticket.task_id)
+    except Exception:
+        logger.exception('Failed to publish media task %s; it stays pending.', ticket.task_id)
+        MediaTaskTicket.objects.filter(pk=ticket.pk, status=MediaTaskTicket.Status.DISPATCHED).update(
+            status=MediaTaskTicket.Status.PENDING,
+            dispatched_at=None,
+        )
+        return False
+    return True
+
+
+def dispatch_pending_media_tasks() -> dict[str, Any]:
+    """Publish pending tasks round-robin across vaults, within the per-vault cap and broker depth limit."""
+    max_depth = int(getattr(settings, 'MEDIA_SCHEDULER_MAX_BROKER_DEPTH', 200) or 0)
+    vault_cap = max(int(getattr(settings, 'MEDIA_SCHEDULER_VAULT_MAX_IN_FLIGHT', 4) or 1), 1)
+    budget = max(int(getattr(settings, 'MEDIA_SCHEDULER_DISPATCH_BATCH', 50) or 1), 1)
+    pending = MediaTaskTicket.objects.filter(status=MediaTaskTicket.Status.PENDING)
+    if not pending.exists():
+        return {'dispatched': 0, 'deferred': False}
+
+    if max_depth > 0:
+        depth = get_broker_depth()
+        if depth is not None:
+            budget = min(budget, max_depth - depth)
+    if budget <= 0:
+        _schedule_retry()
+        return {'dispatched': 0, 'deferred': True}
+
+    now = timezone.now()
+    cutoff = _in_flight_cutoff()
+    in_flight = dict(
+        MediaTaskTicket.objects.filter(status=MediaTaskTicket.Status.DISPATCHED, dispatched_at__gte=cutoff)
+        .values('vault_id')
+        .annotate(count=Count('id'))
+        .values_list('vault_id', 'count')
+    )
+    # Least recently served vault goes first, so each pass is one fair round.
+    pending_vault_ids = set(pending.values_list('vault_id', flat=True).distinct())
+    last_served = dict(
+        MediaTaskTicket.objects.filter(vault_id__in=pending_vault_ids, dispatched_at__isnull=False)
+        .values('vault_id')
+        .annotate(last_dispatched_at=Max('dispatched_at'))
+        .values_list('vault_id', 'last_dispatched_at')
+    )
+    vault_order = sorted(
+        pending_vault_ids,
+        key=lambda vault_id: (vault_id in last_served, last_served.get(vault_id) or now, str(vault_id)),
+    )
+
+    dispatched = 0
+    skipped = 0
+    active_vaults = [vault_id for vault_id in vault_order if in_flight.get(vault_id, 0) < vault_cap]
+    while budget > 0 and active_vaults:
+        next_round = []
+        for vault_id in active_vaults:
+            if budget <= 0:
+                break
+            ticket = pending.filter(vault_id=vault_id).order_by('created_at', 'id').first()
+            if ticket is None:
+                continue
+            now = timezone.now()
+            if is_task_superseded(ticket.task_id):
+                MediaTaskTicket.objects.filter(pk=ticket.pk).update(status=MediaTaskTicket.Status.DONE, finished_at=now)
+                skipped += 1
+                next_round.append(vault_id)
+                continue
+            claimed = MediaTaskTicket.objects.filter(pk=ticket.pk, status=MediaTaskTicket.Status.PENDING).update(
+                status=MediaTaskTicket.Status.DISPATCHED,
+                dispatched_at=now,
+            )
+            if not claimed:
+                # Another dispatcher took it; look at this vault again next round.
+                next_round.append(vault_id)
+                continue
+            if not _publish(ticket):
+                _schedule_retry()
+                return {'dispatched': dispatched, 'deferred': True, 'superseded': skipped}
+            dispatched += 1
+            budget -= 1
+            in_flight[vault_id] = in_flight.get(vault_id, 0) + 1
+            if in_flight[vault_id] < vault_cap:
+                next_round.append(vault_id)
+        active_vaults = next_round
+
+    deferred = pending.exists()
+    if deferred and budget <= 0:
+        _schedule_retry()
+    return {'dispatched': dispatched, 'deferred': deferred, 'superseded': skipped}
+
+
+def release_media_task(task_id: str) -> bool:
+    """Free the vault slot held by a finished (or revoked) task and hand it to the next pending one."""
+    released = MediaTaskTicket.objects.filter(
+        task_id=str(task_id or ''),
+        status__in=[MediaTaskTicket.Status.DISPATCHED, MediaTaskTicket.Status.PENDING],
+    ).update(status=MediaTaskTicket.Status.DONE, finished_at=timezone.now())
+    if released:
+        retention = max(int(getattr(settings, 'MEDIA_SCHEDULER_THROUGHPUT_WINDOW', 600) or 600), 60)
+        MediaTaskTicket.objects.filter(
+            status=MediaTaskTicket.Status.DONE,
+            finished_at__lt=timezone.now() - timedelta(seconds=retention),
+        ).delete()
+        dispatch_pending_media_tasks()
+    return bool(released)
+
+
+def _recent_throughput_per_second() -> float:
+    window = max(int(getattr(settings, 'MEDIA_SCHEDULER_THROUGHPUT_WINDOW', 600) or 600), 60)
+    finished = MediaTaskTicket.objects.filter(
+        status=MediaTaskTicket.Status.DONE,
+        finished_at__gte=timezone.now() - timedelta(seconds=window),
+    ).count()
+    return finished / window
+
+
+def get_task_queue_state(task_id: str) -> dict[str, Any] | None:
+    """Scheduler position and ETA for a task, or None once it has finished (or was never scheduled)."""
+    ticket = MediaTaskTicket.objects.filter(task_id=str(task_id or '')).first() if task_id else None
+    if ticket is None or ticket.status == MediaTaskTicket.Status.DONE:
+        return None
+    if ticket.status == MediaTaskTicket.Status.DISPATCHED:
+        return {'state': ticket.status, 'position': 0, 'vault_position': 0, 'eta_seconds': 0}
+
+    pending = MediaTaskTicket.objects.filter(status=MediaTaskTicket.Status.PENDING)
+    vault_position = (
+        pending.filter(vault_id=ticket.vault_id)
+        .filter(Q(created_at__lt=ticket.created_at) | Q(created_at=ticket.created_at, id__lt=ticket.id))
+        .count()
+        + 1
+    )
+    # Round-robin serves every other vault at most once per round until this ticket's turn.
+    other_vault_counts = (
+        pending.exclude(vault_id=ticket.vault_id)
+        .values('vault_id')
+        .annotate(count=Count('id'))
+        .values_list('count', flat=True)
+    )
+    position = vault_position + sum(min(count, vault_position) for count in other_vault_counts)
+    throughput = _recent_throughput_per_second()
+    return {
+        'state': ticket.status,
+        'position': position,
+        'vault_position': vault_position,
+        'eta_seconds': round(position / throughput) if throughput > 0 else None,
+    }
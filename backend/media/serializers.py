@@ -58,6 +58,26 @@ def resolve_attachment_file_type(mime_type, file_name=None, fallback_file_type=N
     return MediaAttachment.FileType.DOCUMENT
 
 
+def normalize_face_thumbnail_sprite(raw_value):
+    """Pixel box of a face inside a packed thumbnail sprite, or None for a standalone thumbnail."""
+    if not isinstance(raw_value, dict):
+        return None
+    try:
+        box = {key: int(raw_value[key]) for key in ('x', 'y', 'w', 'h', 'sprite_w', 'sprite_h')}
+    except (KeyError, TypeError, ValueError):
+        return None
+    if min(box.values()) < 0 or box['x'] + box['w'] > box['sprite_w'] or box['y'] + box['h'] > box['sprite_h']:
+        return None
+    return {
+        'x': box['x'],
+        'y': box['y'],
+        'width': box['w'],
+        'height': box['h'],
+        'sprite_width': box['sprite_w'],
+        'sprite_height': box['sprite_h'],
+    }
+
+
 class MediaAttachmentSerializer(serializers.ModelSerializer):
     file_url = serializers.SerializerMethodField()
     is_primary = serializers.SerializerMethodField()
@@ -73,6 +93,7 @@ class MediaAttachmentSerializer(serializers.ModelSerializer):
             'file_type',
             'original_name',
             'is_primary',
+            'display_rotation',
             'created_at',
         )
         read_only_fields = fields
@@ -121,6 +142,9 @@ class MediaItemSerializer(serializers.ModelSerializer):
             'restoration_status',
             'restoration_error',
             'restoration_processed_at',
+            'document_status',
+            'document_error',
+            'document_processed_at',
             'created_at',
             'is_time_locked',
             'metadata',
@@ -144,6 +168,9 @@ class MediaItemSerializer(serializers.ModelSerializer):
             'restoration_status',
             'restoration_error',
             'restoration_processed_at',
+            'document_status',
+            'document_error',
+            'document_processed_at',
             'created_at',
         )
 
@@ -196,6 +223,7 @@ class MediaItemSerializer(serializers.ModelSerializer):
                     ),
                     'original_name': original_name,
                     'is_primary': True,
+                    'display_rotation': int(obj.display_rotation or 0),
                     'created_at': obj.created_at,
                 }
             )
@@ -274,6 +302,8 @@ class MediaItemSerializer(serializers.ModelSerializer):
                 continue
             tags_by_face_id.setdefault(detected_face_id, media_tag)
 
+        # Packed faces share one sprite, so sign each storage path once.
+        thumbnail_urls = {}
         faces = []
         for raw_face in raw_faces:
             if not isinstance(raw_face, dict):
@@ -296,15 +326,17 @@ class MediaItemSerializer(serializers.ModelSerializer):
 
             matched_tag = tags_by_face_id.get(face_id)
             person = getattr(matched_tag, 'person', None) if matched_tag else None
+            thumbnail_path = raw_face.get('thumbnail_path') or raw_face.get('thumbnailPath')
+            if thumbnail_path not in thumbnail_urls:
+                thumbnail_urls[thumbnail_path] = self._absolute_storage_url(thumbnail_path)
 
             faces.append(
                 {
                     'id': face_id,
                     'file_id': file_id,
                     'confidence': round(max(0.0, min(1.0, confidence)), 3),
-                    'thumbnail_url': self._absolute_storage_url(
-                        raw_face.get('thumbnail_path') or raw_face.get('thumbnailPath')
-                    ),
+                    'thumbnail_url': thumbnail_urls[thumbnail_path],
+                    'thumbnail_sprite': normalize_face_thumbnail_sprite(raw_face.get('thumbnail_sprite')),
                     'bounding_box': {
                         'x': face_coordinates['x'],
                         'y': face_coordinates['y'],
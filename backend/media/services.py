@@ -4,12 +4,22 @@ from uuid import uuid4
 from django.db import transaction
 from django.utils import timezone
 
-from .models import MediaItem
+from .av_metadata import is_av_source
+from .documents import is_pdf_source
+from .models import MediaAttachment, MediaDocumentText, MediaItem
 from .tasks import (
+    _resolve_primary_original_name,
+    analyze_media_task,
     detect_media_faces_task,
+    extract_media_document_task,
     extract_media_exif_task,
+    release_restoration_output_path,
     restore_media_photo_task,
+    restore_media_preview_task,
+    update_restoration_preview,
 )
+from .scheduler import admit_media_task, dispatch_pending_media_tasks
+from .supersession import get_stage_task_ids, supersede_replaced_stage_tasks, supersede_tasks
 
 
 logger = logging.getLogger(__name__)
@@ -60,6 +70,29 @@ class AIProcessingService:
             restoration_task_id='',
         )
 
+    @staticmethod
+    def _mark_av_metadata_queued(media_item_id: str, exif_task_id: str):
+        now = timezone.now()
+        MediaItem.objects.filter(pk=media_item_id).update(
+            ai_status=MediaItem.AIStatus.PENDING,
+            exif_status=MediaItem.ExifStatus.QUEUED,
+            exif_error='',
+            exif_extracted_data={},
+            exif_task_id=exif_task_id,
+            exif_processed_at=None,
+            exif_confirmed_at=None,
+            face_detection_status=MediaItem.FaceDetectionStatus.NOT_AVAILABLE,
+            face_detection_error='',
+            face_detection_data={},
+            face_detection_processed_at=now,
+            face_detection_task_id='',
+            restoration_status=MediaItem.RestorationStatus.NOT_AVAILABLE,
+            restoration_error='',
+            restoration_data={},
+            restoration_processed_at=now,
+            restoration_task_id='',
+        )
+
     @staticmethod
     def _mark_face_detection_queued(media_item_id: str, face_task_id: str):
         MediaItem.objects.filter(pk=media_item_id).update(
@@ -94,62 +127,98 @@ class AIProcessingService:
             restoration_data=next_payload,
         )
 
-    def enqueue_media_processing(self, media_item):
+    @staticmethod
+    def _supersede_replaced_tasks_on_commit(media_item_id: str, previous_task_ids: set[str]):
+        # Revoke queued predecessors and flag running ones only once the new claim is committed.
+        if previous_task_ids:
+            transaction.on_commit(lambda: supersede_replaced_stage_tasks(media_item_id, previous_task_ids))
+
+    @staticmethod
+    def _dispatch_on_commit():
+        def _dispatch():
+            try:
+                dispatch_pending_media_tasks()
+            except Exception:
+                # Tickets stay pending; the next admission or finished task dispatches them.
+                logger.exception('Failed to dispatch scheduled media tasks')
+
+        transaction.on_commit(_dispatch)
+
+    @staticmethod
+    def _has_document_source(media_item) -> bool:
+        if media_item.file and is_pdf_source(_resolve_primary_original_name(media_item)):
+            return True
+        attachments = MediaAttachment.objects.filter(media_item=media_item).only('file', 'mime_type', 'original_name')
+        return any(
+            is_pdf_source(attachment.original_name or attachment.file.name, attachment.mime_type)
+            for attachment in attachments
+            if attachment.file
+        )
+
+    @staticmethod
+    def _has_av_source(media_item) -> bool:
+        if media_item.file and is_av_source(_resolve_primary_original_name(media_item)):
+            return True
+        attachments = MediaAttachment.objects.filter(media_item=media_item).only('file', 'mime_type', 'original_name')
+        return any(
+            is_av_source(attachment.original_name or attachment.file.name, attachment.mime_type)
+            for attachment in attachments
+            if attachment.file
+        )
+
+    def enqueue_document_processing(self, media_item):
         media_item_id = str(media_item.pk)
-        if media_item.media_type != MediaItem.MediaType.PHOTO:
-            self._mark_non_photo_complete(media_item_id)
+        previous_task_ids = get_stage_task_ids(media_item_id)
+        has_indexed_text = MediaDocumentText.objects.filter(media_item_id=media_item_id).exists()
+        if not self._has_document_source(media_item) and not has_indexed_text:
+            MediaItem.objects.filter(pk=media_item_id).update(
+                document_status=MediaItem.DocumentStatus.NOT_AVAILABLE,
+                document_error='',
+                document_processed_at=timezone.now(),
+                document_task_id='',
+            )
+            self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
             return
 
-        exif_task_id = uuid4().hex
-        face_task_id = uuid4().hex
-        self._mark_photo_queued(media_item_id, exif_task_id, face_task_id)
-
-        def _enqueue():
-            exif_enqueue_error = None
-            face_enqueue_error = None
-            try:
-                extract_media_exif_task.apply_async(
-                    args=[media_item_id],
-                    queue='media',
-                    task_id=exif_task_id,
-                )
-            except Exception as exc:
-                exif_enqueue_error = exc
-                logger.exception('Failed to enqueue EXIF extraction for media item %s', media_item_id)
+        # Still run when PDFs were removed so the task can drop their indexed text.
+        task_id = uuid4().hex
+        MediaItem.objects.filter(pk=media_item_id).update(
+            document_status=MediaItem.DocumentStatus.QUEUED,
+            document_error='',
+            document_task_id=task_id,
+            document_processed_at=None,
+        )
+        self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
+        admit_media_task(media_item, extract_media_document_task, task_id, [media_item_id])
+        self._dispatch_on_commit()
 
-            try:
-                detect_media_faces_task.apply_async(
-                    args=[media_item_id],
-                    queue='media',
-                    task_id=face_task_id,
-                )
-            except Exception as exc:
-                face_enqueue_error = exc
-                logger.exception('Failed to enqueue face detection for media item %s', media_item_id)
-
-            if exif_enqueue_error is not None:
-                MediaItem.objects.filter(pk=media_item_id, exif_task_id=exif_task_id).update(
-                    ai_status=MediaItem.AIStatus.FAILED,
-                    exif_status=MediaItem.ExifStatus.FAILED,
-                    exif_error=f'Unable to queue EXIF extraction: {exif_enqueue_error}',
-                    exif_extracted_data={},
-                    exif_processed_at=timezone.now(),
-                    exif_confirmed_at=None,
-                    exif_task_id='',
-                )
-            if face_enqueue_error is not None:
-                MediaItem.objects.filter(pk=media_item_id, face_detection_task_id=face_task_id).update(
-                    face_detection_status=MediaItem.FaceDetectionStatus.FAILED,
-                    face_detection_error=f'Unable to queue face detection: {face_enqueue_error}',
-                    face_detection_data={},
-                    face_detection_processed_at=timezone.now(),
-                    face_detection_task_id='',
-                )
+    def enqueue_media_processing(self, media_item):
+        media_item_id = str(media_item.pk)
+        self.enqueue_document_processing(media_item)
+        previous_task_ids = get_stage_task_ids(media_item_id)
+        if media_item.media_type != MediaItem.MediaType.PHOTO:
+            if not self._has_av_source(media_item):
+                self._mark_non_photo_complete(media_item_id)
+                self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
+                return
+            # Videos and voice memos only get the metadata stage (recording date, location, duration).
+            exif_task_id = uuid4().hex
+            self._mark_av_metadata_queued(media_item_id, exif_task_id)
+            self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
+            admit_media_task(media_item, extract_media_exif_task, exif_task_id, [media_item_id])
+            self._dispatch_on_commit()
+            return
 
-        transaction.on_commit(_enqueue)
+        # One analysis task serves both stages, so both task id fields point at it.
+        analysis_task_id = uuid4().hex
+        self._mark_photo_queued(media_item_id, analysis_task_id, analysis_task_id)
+        self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
+        admit_media_task(media_item, analyze_media_task, analysis_task_id, [media_item_id])
+        self._dispatch_on_commit()
 
     def enqueue_face_detection_only(self, media_item):
         media_item_id = str(media_item.pk)
+        previous_task_ids = get_stage_task_ids(media_item_id)
         if media_item.media_type != MediaItem.MediaType.PHOTO:
             MediaItem.objects.filter(pk=media_item_id).update(
                 face_detection_status=MediaItem.FaceDetectionStatus.NOT_AVAILABLE,
@@ -158,32 +227,18 @@ class AIProcessingService:
                 face_detection_processed_at=timezone.now(),
                 face_detection_task_id='',
             )
+            self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
             return
 
         face_task_id = uuid4().hex
         self._mark_face_detection_queued(media_item_id, face_task_id)
-
-        def _enqueue():
-            try:
-                detect_media_faces_task.apply_async(
-                    args=[media_item_id],
-                    queue='media',
-                    task_id=face_task_id,
-                )
-            except Exception as exc:
-                logger.exception('Failed to enqueue face detection for media item %s', media_item_id)
-                MediaItem.objects.filter(pk=media_item_id, face_detection_task_id=face_task_id).update(
-                    face_detection_status=MediaItem.FaceDetectionStatus.FAILED,
-                    face_detection_error=f'Unable to queue face detection: {exc}',
-                    face_detection_data={},
-                    face_detection_processed_at=timezone.now(),
-                    face_detection_task_id='',
-                )
-
-        transaction.on_commit(_enqueue)
+        self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
+        admit_media_task(media_item, detect_media_faces_task, face_task_id, [media_item_id])
+        self._dispatch_on_commit()
 
     def enqueue_media_restoration(self, media_item, *, file_id: str, options: dict):
         media_item_id = str(media_item.pk)
+        previous_task_ids = get_stage_task_ids(media_item_id)
         if media_item.media_type != MediaItem.MediaType.PHOTO:
             MediaItem.objects.filter(pk=media_item_id).update(
                 restoration_status=MediaItem.RestorationStatus.NOT_AVAILABLE,
@@ -191,6 +246,7 @@ class AIProcessingService:
                 restoration_processed_at=timezone.now(),
                 restoration_task_id='',
             )
+            self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
             return
 
         task_id = uuid4().hex
@@ -199,12 +255,12 @@ class AIProcessingService:
             'denoise': bool(options.get('denoise', True)),
         }
         self._mark_restoration_queued(media_item_id, task_id, file_id, normalized_options)
+        self._supersede_replaced_tasks_on_commit(media_item_id, previous_task_ids)
 
         def _enqueue():
             try:
                 restore_media_photo_task.apply_async(
                     args=[media_item_id, file_id, normalized_options],
-                    queue='media',
                     task_id=task_id,
                 )
             except Exception as exc:
@@ -217,3 +273,66 @@ class AIProcessingService:
                 )
 
         transaction.on_commit(_enqueue)
+        return task_id
+
+    def enqueue_media_restoration_preview(self, media_item, *, file_id: str, options: dict):
+        media_item_id = str(media_item.pk)
+        task_id = uuid4().hex
+        normalized_options = {
+            'colorize': bool(options.get('colorize', True)),
+            'denoise': bool(options.get('denoise', True)),
+        }
+        with transaction.atomic():
+            current_payload = (
+                MediaItem.objects.select_for_update()
+                .filter(pk=media_item_id)
+                .values_list('restoration_data', flat=True)
+                .first()
+            )
+            next_payload = dict(current_payload) if isinstance(current_payload, dict) else {}
+            previous_preview = next_payload.get('preview') if isinstance(next_payload.get('preview'), dict) else {}
+            # Replacing the entry also makes any preview still in flight stale.
+            next_payload['preview'] = {
+                'task_id': task_id,
+                'file_id': str(file_id),
+                'options': normalized_options,
+                'status': MediaItem.RestorationStatus.QUEUED,
+                'requested_at': timezone.now().isoformat(),
+            }
+            MediaItem.objects.filter(pk=media_item_id).update(restoration_data=next_payload)
+
+        def _enqueue():
+            release_restoration_output_path(previous_preview.get('restored_path'))
+            supersede_tasks([previous_preview.get('task_id')])
+            try:
+                restore_media_preview_task.apply_async(
+                    args=[media_item_id, file_id, normalized_options],
+                    task_id=task_id,
+                )
+            except Exception as exc:
+                logger.exception('Failed to enqueue restoration preview for media item %s', media_item_id)
+                update_restoration_preview(
+                    media_item_id,
+                    task_id,
+                    status=MediaItem.RestorationStatus.FAILED,
+                    error=f'Unable to queue restoration preview: {exc}',
+                    processed_at=timezone.now().isoformat(),
+                )
+
+        transaction.on_commit(_enqueue)
+        return task_id
+
+    def confirm_media_restoration_preview(self, media_item, preview: dict):
+        """Start the full-resolution job for the file and options of a completed preview."""
+        task_id = self.enqueue_media_restoration(
+            media_item,
+            file_id=str(preview.get('file_id') or ''),
+            options=preview.get('options') if isinstance(preview.get('options'), dict) else {},
+        )
+        update_restoration_preview(
+            str(media_item.pk),
+            str(preview.get('task_id') or ''),
+            confirmed_at=timezone.now().isoformat(),
+            confirmed_task_id=task_id or '',
+        )
+        return task_id
@@ -0,0 +1,58 @@
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from core.signals import current_deletion_batch
+from vaults.models import FamilyVault
+from .duplicates import refresh_duplicate_groups, sync_duplicate_groups
+from .models import MediaAttachment, MediaItem
+
+
+# Refreshes run after commit: a cascade delete removes attachments before their item, and the
+# intermediate signature must not be grouped while the item is on its way out.
+HASH_FIELDS = {'file', 'content_hash'}
+
+
+@receiver(post_save, sender=MediaItem)
+def refresh_duplicates_after_item_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not HASH_FIELDS.intersection(update_fields):
+        return
+    transaction.on_commit(partial(sync_duplicate_groups, [instance.pk]))
+
+
+def refresh_deleted_signatures(vault_signatures):
+    """Refresh the groups a batch of deleted items left, once per vault; deleted vaults are skipped."""
+    signatures_by_vault = defaultdict(set)
+    for vault_id, signature in vault_signatures:
+        signatures_by_vault[vault_id].add(signature)
+    # A vault deleted in the same batch took its groups with it.
+    for vault_id in FamilyVault.objects.filter(pk__in=signatures_by_vault).values_list('pk', flat=True):
+        refresh_duplicate_groups(vault_id, signatures_by_vault[vault_id])
+
+
+@receiver(pre_delete, sender=MediaItem)
+def refresh_duplicates_after_item_delete(sender, instance, **kwargs):
+    batch = current_deletion_batch()
+    if batch is not None:
+        # Bulk and cascade deletes load each row fresh, so the instance carries its stored signature.
+        if instance.duplicate_signature:
+            batch.defer(refresh_deleted_signatures, (instance.vault_id, instance.duplicate_signature))
+        return
+    # Signatures are written with update(), so the in-memory instance may not carry the stored one.
+    stored = MediaItem.objects.filter(pk=instance.pk).values_list('vault_id', 'duplicate_signature').first()
+    if stored and stored[1]:
+        transaction.on_commit(partial(refresh_duplicate_groups, stored[0], [stored[1]]))
+
+
+@receiver(post_save, sender=MediaAttachment)
+@receiver(post_delete, sender=MediaAttachment)
+def refresh_duplicates_after_attachment_change(sender, instance, **kwargs):
+    batch = current_deletion_batch()
+    if batch is not None:
+        # Items deleted in the same batch are gone by then; sync only looks at the ones still there.
+        batch.defer(sync_duplicate_groups, instance.media_item_id)
+        return
+    transaction.on_commit(partial(sync_duplicate_groups, [instance.media_item_id]))
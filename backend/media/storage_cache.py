@@ -0,0 +1,269 @@
+import hashlib
+import io
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+_STATS_LOCK = threading.Lock()
+_STATS = {
+    'hits': 0,
+    'misses': 0,
+    'local_reads': 0,
+    'bypassed': 0,
+    'evictions': 0,
+    'bytes_downloaded': 0,
+    'bytes_evicted': 0,
+}
+_COPY_CHUNK_SIZE = 1024 * 1024
+# Running estimate of the cache's size, so a miss does not walk the whole directory. Other worker
+# processes share the directory, so the estimate is re-read from disk every few minutes.
+_USAGE_LOCK = threading.Lock()
+_USAGE = {'cache_dir': '', 'bytes': 0, 'synced_at': None}
+
+
+def _bump_stat(key: str, amount: int = 1):
+    with _STATS_LOCK:
+        _STATS[key] = _STATS.get(key, 0) + amount
+
+
+def is_storage_cache_enabled() -> bool:
+    return bool(getattr(settings, 'MEDIA_STORAGE_CACHE_ENABLED', True))
+
+
+def get_storage_cache_dir() -> str:
+    configured = str(getattr(settings, 'MEDIA_STORAGE_CACHE_DIR', '') or '').strip()
+    if configured:
+        return configured
+    return os.path.join(tempfile.gettempdir(), 'legacykeeper-storage-cache')
+
+
+def get_storage_cache_max_bytes() -> int:
+    return max(int(getattr(settings, 'MEDIA_STORAGE_CACHE_MAX_BYTES', 0) or 0), 0)
+
+
+def get_storage_cache_resync_seconds() -> float:
+    return max(float(getattr(settings, 'MEDIA_STORAGE_CACHE_RESYNC_SECONDS', 300) or 0), 0.0)
+
+
+def build_cache_key(storage_name: str, content_hash: str = '') -> str:
+    token = f'{str(storage_name or "").strip()}|{str(content_hash or "").strip()}'
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _cache_entry_path(cache_key: str) -> str:
+    return os.path.join(get_storage_cache_dir(), cache_key[:2], cache_key)
+
+
+def _resolve_local_path(storage: Any, name: str) -> str:
+    try:
+        local_path = storage.path(name)
+    except (NotImplementedError, AttributeError):
+        return ''
+    except Exception:
+        return ''
+    return local_path if local_path and os.path.isfile(local_path) else ''
+
+
+def _iter_cache_entries() -> Iterator[tuple[str, int, float]]:
+    cache_dir = get_storage_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return
+    for root, _dirs, files in os.walk(cache_dir):
+        for file_name in files:
+            if file_name.startswith('.tmp-'):
+                continue
+            entry_path = os.path.join(root, file_name)
+            try:
+                entry_stat = os.stat(entry_path)
+            except FileNotFoundError:
+                continue
+            yield entry_path, entry_stat.st_size, entry_stat.st_mtime
+
+
+def _store_usage(cache_dir: str, total_bytes: int):
+    with _USAGE_LOCK:
+        _USAGE.update(cache_dir=cache_dir, bytes=total_bytes, synced_at=time.monotonic())
+
+
+def _record_cache_write(size: int) -> int:
+    """Add a new entry to the running size estimate and return it, re-reading the disk when it is stale."""
+    cache_dir = get_storage_cache_dir()
+    with _USAGE_LOCK:
+        synced_at = _USAGE['synced_at']
+        if (
+            _USAGE['cache_dir'] == cache_dir
+            and synced_at is not None
+            and time.monotonic() - synced_at < get_storage_cache_resync_seconds()
+        ):
+            _USAGE['bytes'] += size
+            return _USAGE['bytes']
+    # The walk already sees the entry just written.
+    total_bytes = sum(entry_size for _path, entry_size, _mtime in _iter_cache_entries())
+    _store_usage(cache_dir, total_bytes)
+    return total_bytes
+
+
+def evict_storage_cache(*, keep_path: str = '', max_bytes: int | None = None) -> int:
+    """Drop least recently used entries until the cache fits in its byte budget."""
+    budget = get_storage_cache_max_bytes() if max_bytes is None else max(int(max_bytes), 0)
+    entries = list(_iter_cache_entries())
+    total_bytes = sum(size for _path, size, _mtime in entries)
+    if total_bytes <= budget:
+        _store_usage(get_storage_cache_dir(), total_bytes)
+        return 0
+
+    evicted = 0
+    entries.sort(key=lambda entry: entry[2])
+    for entry_path, size, _mtime in entries:
+        if total_bytes <= budget:
+            break
+        if entry_path == keep_path:
+            continue
+        try:
+            # Readers that already mapped the file keep their pages; unlink only drops the name.
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+        except OSError:
+            logger.warning('Unable to evict storage cache entry "%s".', entry_path, exc_info=True)
+            continue
+        total_bytes -= size
+        evicted += 1
+        _bump_stat('evictions')
+        _bump_stat('bytes_evicted', size)
+    _store_usage(get_storage_cache_dir(), total_bytes)
+    return evicted
+
+
+def _download_to_cache(storage: Any, name: str, entry_path: str) -> int:
+    os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+    file_descriptor, temp_path = tempfile.mkstemp(prefix='.tmp-', dir=os.path.dirname(entry_path))
+    written = 0
+    try:
+        with os.fdopen(file_descriptor, 'wb') as target, storage.open(name, 'rb') as source:
+            while True:
+                chunk = source.read(_COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                target.write(chunk)
+                written += len(chunk)
+        # Atomic rename keeps concurrent worker processes from ever seeing a partial entry.
+        os.replace(temp_path, entry_path)
+    except Exception:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return written
+
+
+def _resolve_cached_path(file_obj: Any, *, download: bool = True) -> str:
+    storage = getattr(file_obj, 'storage', None)
+    name = str(getattr(file_obj, 'name', '') or '').strip()
+    if storage is None or not name:
+        return ''
+
+    local_path = _resolve_local_path(storage, name)
+    if local_path:
+        _bump_stat('local_reads')
+        return local_path
+
+    if not is_storage_cache_enabled():
+        return ''
+
+    content_hash = str(getattr(getattr(file_obj, 'instance', None), 'content_hash', '') or '')
+    entry_path = _cache_entry_path(build_cache_key(name, content_hash))
+    if os.path.isfile(entry_path):
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        _bump_stat('hits')
+        return entry_path
+    if not download:
+        return ''
+
+    _bump_stat('misses')
+    try:
+        written = _download_to_cache(storage, name, entry_path)
+    except Exception:
+        logger.warning('Unable to cache storage object "%s"; reading it directly.', name, exc_info=True)
+        return ''
+    _bump_stat('bytes_downloaded', written)
+    if _record_cache_write(written) > get_storage_cache_max_bytes():
+        evict_storage_cache(keep_path=entry_path)
+    return entry_path
+
+
+def get_local_copy_path(file_obj: Any) -> str:
+    """Local path of a stored file (filesystem storage or an existing cache entry), without downloading it."""
+    return _resolve_cached_path(file_obj, download=False)
+
+
+@contextmanager
+def open_cached_file(file_obj: Any):
+    """Yield a seekable binary handle for a stored file, memory-mapped from local disk when possible.
+
+    Storage-backed files are downloaded once per worker into an LRU cache keyed by storage
+    name and content hash; plain file objects (uploads, buffers) are yielded as they are.
+    """
+    cached_path = _resolve_cached_path(file_obj)
+    if not cached_path:
+        if getattr(file_obj, 'storage', None) is not None:
+            _bump_stat('bypassed')
+        opened_here = False
+        try:
+            if hasattr(file_obj, 'open'):
+                file_obj.open('rb')
+                opened_here = True
+            if hasattr(file_obj, 'seek'):
+                file_obj.seek(0)
+            yield file_obj
+        finally:
+            if opened_here and hasattr(file_obj, 'close'):
+                try:
+                    file_obj.close()
+                except Exception:
+                    pass
+        return
+
+    with open(cached_path, 'rb') as local_file:
+        if os.fstat(local_file.fileno()).st_size == 0:
+            yield io.BytesIO(b'')
+            return
+        mapped = mmap.mmap(local_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+def get_storage_cache_stats(*, include_disk_usage: bool = False) -> dict[str, Any]:
+    with _STATS_LOCK:
+        snapshot = dict(_STATS)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_ratio'] = round(snapshot['hits'] / lookups, 4) if lookups else 0.0
+    snapshot['enabled'] = is_storage_cache_enabled()
+    snapshot['max_bytes'] = get_storage_cache_max_bytes()
+    if include_disk_usage:
+        snapshot['cached_bytes'] = sum(size for _path, size, _mtime in _iter_cache_entries())
+    return snapshot
+
+
+def reset_storage_cache_stats():
+    with _STATS_LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
+    with _USAGE_LOCK:
+        _USAGE['synced_at'] = None
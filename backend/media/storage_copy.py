@@ -0,0 +1,73 @@
+import logging
+import os
+import shutil
+from typing import Any
+
+from django.core.files import File
+
+
+logger = logging.getLogger(__name__)
+
+# Objects above this size are copied with UploadPartCopy in parallel parts; CopyObject caps out at 5 GB.
+MULTIPART_COPY_THRESHOLD = 64 * 1024 * 1024
+
+
+def _local_path(storage: Any, name: str) -> str:
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return ''
+
+
+def _copy_s3_object(storage: Any, source_name: str, target_name: str):
+    from boto3.s3.transfer import TransferConfig
+    from storages.utils import clean_name
+
+    bucket = storage.bucket
+    extra_args = {}
+    default_acl = getattr(storage, 'default_acl', None)
+    if default_acl:
+        extra_args['ACL'] = default_acl
+    # Managed copy issues one CopyObject, or a multipart copy for large objects; no bytes pass through us.
+    bucket.copy(
+        {'Bucket': bucket.name, 'Key': storage._normalize_name(clean_name(source_name))},
+        storage._normalize_name(clean_name(target_name)),
+        ExtraArgs=extra_args or None,
+        Config=TransferConfig(multipart_threshold=MULTIPART_COPY_THRESHOLD, multipart_chunksize=MULTIPART_COPY_THRESHOLD),
+    )
+
+
+def _copy_local_file(source_path: str, target_path: str):
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    try:
+        # Stored media is written once and replaced rather than edited, so both keys can share an inode.
+        os.link(source_path, target_path)
+        return
+    except OSError:
+        logger.debug('Hardlink from "%s" failed; copying instead.', source_path, exc_info=True)
+    # copyfile lets the kernel move the bytes (copy_file_range/sendfile) without reading them into Python.
+    shutil.copyfile(source_path, target_path)
+
+
+def copy_stored_file(storage: Any, source_name: str, target_name: str) -> str:
+    """Copy a stored object to a new key inside the same storage and return the key actually used.
+
+    S3 copies server-side, the filesystem hardlinks (or copies in the kernel), and any other backend
+    streams the object through in chunks.
+    """
+    target_name = storage.get_available_name(target_name)
+
+    if getattr(storage, 'bucket', None) is not None and hasattr(storage, '_normalize_name'):
+        _copy_s3_object(storage, source_name, target_name)
+        return target_name
+
+    source_path = _local_path(storage, source_name)
+    target_path = _local_path(storage, target_name)
+    if source_path and target_path:
+        if not os.path.isfile(source_path):
+            raise FileNotFoundError(source_path)
+        _copy_local_file(source_path, target_path)
+        return target_name
+
+    with storage.open(source_name, 'rb') as handle:
+        return storage.save(target_name, File(handle, name=target_name))
@@ -0,0 +1,208 @@
+import logging
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Any, Callable, Iterator
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models
+from django.utils import timezone
+
+from core.storage_deletion import STORAGE_DELETION_BATCH_SIZE, delete_storage_keys
+from .models import MediaItem
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class StoredObject:
+    name: str
+    size: int
+    modified_at: datetime | None
+
+
+def _iter_s3_objects(storage: Any, prefix: str) -> Iterator[StoredObject]:
+    from storages.utils import clean_name
+
+    location = str(getattr(storage, 'location', '') or '').strip('/')
+    key_prefix = f'{storage._normalize_name(clean_name(prefix))}/' if prefix else (f'{location}/' if location else '')
+    paginator = storage.bucket.meta.client.get_paginator('list_objects_v2')
+    pages = paginator.paginate(
+        Bucket=storage.bucket.name,
+        Prefix=key_prefix,
+        PaginationConfig={'PageSize': STORAGE_DELETION_BATCH_SIZE},
+    )
+    for page in pages:
+        for entry in page.get('Contents') or []:
+            key = str(entry['Key'])
+            name = key[len(location) + 1:] if location and key.startswith(f'{location}/') else key
+            yield StoredObject(name=name, size=int(entry.get('Size') or 0), modified_at=entry.get('LastModified'))
+
+
+def _iter_local_objects(root: str, start: str) -> Iterator[StoredObject]:
+    for directory, _subdirectories, file_names in os.walk(start):
+        for file_name in file_names:
+            path = os.path.join(directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield StoredObject(
+                name=os.path.relpath(path, root).replace(os.sep, '/'),
+                size=stat.st_size,
+                modified_at=datetime.fromtimestamp(stat.st_mtime, tz=dt_timezone.utc),
+            )
+
+
+def _iter_listed_objects(storage: Any, prefix: str) -> Iterator[StoredObject]:
+    directories, file_names = storage.listdir(prefix)
+    for file_name in file_names:
+        name = f'{prefix.rstrip("/")}/{file_name}' if prefix else file_name
+        yield StoredObject(name=name, size=int(storage.size(name) or 0), modified_at=storage.get_modified_time(name))
+    for directory in directories:
+        yield from _iter_listed_objects(storage, f'{prefix.rstrip("/")}/{directory}' if prefix else directory)
+
+
+def iter_stored_objects(storage: Any, prefix: str = '') -> Iterator[StoredObject]:
+    """Stream every object under ``prefix``; S3 is read one listing page at a time, disks one directory at a time."""
+    prefix = str(prefix or '').strip('/')
+    if getattr(storage, 'bucket', None) is not None and hasattr(storage, '_normalize_name'):
+        yield from _iter_s3_objects(storage, prefix)
+        return
+    try:
+        root = storage.path('')
+        start = storage.path(prefix) if prefix else root
+    except NotImplementedError:
+        yield from _iter_listed_objects(storage, prefix)
+        return
+    yield from _iter_local_objects(root, start)
+
+
+def _file_columns() -> list[tuple[type[models.Model], str]]:
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def _json_paths(face_detection_data: Any, restoration_data: Any) -> set[str]:
+    paths = set()
+    faces = face_detection_data.get('faces') if isinstance(face_detection_data, dict) else None
+    for face in faces if isinstance(faces, list) else []:
+        if isinstance(face, dict):
+            paths.add(str(face.get('thumbnail_path') or '').strip())
+
+    entries = []
+    if isinstance(restoration_data, dict):
+        results = restoration_data.get('results')
+        if isinstance(results, dict):
+            entries.extend(results.values())
+        entries.append(restoration_data.get('preview'))
+    for entry in entries:
+        if isinstance(entry, dict):
+            paths.add(str(entry.get('restored_path') or entry.get('restoredPath') or '').strip().lstrip('/'))
+    paths.discard('')
+    return paths
+
+
+def _media_ids_in(names: list[str]) -> set[str]:
+    media_ids = set()
+    for name in names:
+        for segment in name.split('/'):
+            try:
+                media_ids.add(str(uuid.UUID(segment)))
+            except ValueError:
+                continue
+    return media_ids
+
+
+def referenced_names(names: list[str]) -> set[str]:
+    """The subset of ``names`` some row references, through a file column or a media JSON path.
+
+    Face thumbnails and restoration outputs are written under their media item's id, so only the
+    items named by a path segment are read for JSON references. Restored files shared across items
+    are also held by a ``MediaRestorationOutput`` row, which the column check covers.
+    """
+    referenced = set()
+    for model, field_name in _file_columns():
+        referenced.update(
+            model._default_manager.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True)
+        )
+
+    pending = set(names) - referenced
+    media_ids = _media_ids_in(sorted(pending))
+    if pending and media_ids:
+        json_rows = MediaItem.objects.filter(pk__in=media_ids).values_list('face_detection_data', 'restoration_data')
+        for face_detection_data, restoration_data in json_rows.iterator():
+            referenced.update(_json_paths(face_detection_data, restoration_data) & pending)
+    return referenced
+
+
+def _grace_period() -> timedelta:
+    return timedelta(hours=max(float(getattr(settings, 'MEDIA_STORAGE_GC_GRACE_HOURS', 24) or 0), 0.0))
+
+
+def collect_orphaned_objects(
+    *,
+    storage: Any = None,
+    prefix: str = '',
+    dry_run: bool = True,
+    grace: timedelta | None = None,
+    batch_size: int = STORAGE_DELETION_BATCH_SIZE,
+    on_orphan: Callable[[StoredObject], None] | None = None,
+) -> dict[str, int]:
+    """Find (and unless ``dry_run``, delete) stored objects that no row references.
+
+    The listing is streamed and checked ``batch_size`` keys at a time, so memory stays flat for any
+    number of objects. Objects newer than the grace period are skipped: their rows may not have
+    committed yet.
+    """
+    storage = storage or default_storage
+    cutoff = timezone.now() - (_grace_period() if grace is None else grace)
+    batch_size = max(min(int(batch_size), STORAGE_DELETION_BATCH_SIZE), 1)
+    report = {
+        'scanned': 0,
+        'recent': 0,
+        'referenced': 0,
+        'orphaned': 0,
+        'orphaned_bytes': 0,
+        'deleted': 0,
+        'failed': 0,
+    }
+
+    def settle(batch: list[StoredObject]):
+        referenced = referenced_names([stored.name for stored in batch])
+        orphans = [stored for stored in batch if stored.name not in referenced]
+        report['referenced'] += len(batch) - len(orphans)
+        report['orphaned'] += len(orphans)
+        report['orphaned_bytes'] += sum(stored.size for stored in orphans)
+        for stored in orphans:
+            if on_orphan is not None:
+                on_orphan(stored)
+        if dry_run or not orphans:
+            return
+        errors = delete_storage_keys(storage, [stored.name for stored in orphans])
+        for name, error in errors.items():
+            logger.warning('Failed to delete orphaned object "%s": %s', name, error)
+        report['failed'] += len(errors)
+        report['deleted'] += len(orphans) - len(errors)
+
+    batch = []
+    for stored in iter_stored_objects(storage, prefix):
+        report['scanned'] += 1
+        if stored.modified_at is None or stored.modified_at > cutoff:
+            report['recent'] += 1
+            continue
+        batch.append(stored)
+        if len(batch) >= batch_size:
+            settle(batch)
+            batch = []
+    if batch:
+        settle(batch)
+    return report
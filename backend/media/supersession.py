@@ -0,0 +1,258 @@
+import logging
+import math
+import threading
+import time
+from typing import Any, Iterable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import MediaItem
+
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_PREFIX = 'legacykeeper:media:superseded:'
+_STATS_KEY = 'legacykeeper:media:supersession-stats'
+_LOCK_PREFIX = 'legacykeeper:media:lock:'
+_STAGE_TASK_FIELDS = ('exif_task_id', 'face_detection_task_id', 'restoration_task_id', 'document_task_id')
+
+_STATS_LOCK = threading.Lock()
+_STATS = {
+    'superseded_tasks': 0,
+    'revoke_requests': 0,
+    'cancelled_runs': 0,
+    'files_skipped': 0,
+    'stages_skipped': 0,
+}
+_CLIENT_LOCK = threading.Lock()
+_CLIENT = None
+_CLIENT_URL = None
+
+
+class TaskSuperseded(Exception):
+    """Raised at a checkpoint when a newer task has taken over this task's work."""
+
+
+class _LocalTokenStore:
+    """In-process stand-in for Redis (``locmem://``), for tests and single-process setups."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        value = self._values.get(key)
+        if value and value[1] is not None and value[1] < time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            self._values[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def exists(self, key):
+        with self._lock:
+            return int(self._live(key) is not None)
+
+    def expire(self, key, seconds):
+        with self._lock:
+            value = self._live(key)
+            if value is None:
+                return False
+            self._values[key] = (value[0], time.monotonic() + seconds)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return int(self._values.pop(key, None) is not None)
+
+    def hincrby(self, name, key, amount=1):
+        with self._lock:
+            stats, _expires = self._values.get(name, ({}, None))
+            stats[key] = int(stats.get(key, 0)) + int(amount)
+            self._values[name] = (stats, None)
+
+    def hgetall(self, name):
+        with self._lock:
+            stats, _expires = self._values.get(name, ({}, None))
+            return dict(stats)
+
+
+def _get_cancellation_url() -> str:
+    configured = str(getattr(settings, 'MEDIA_TASK_CANCELLATION_URL', '') or '').strip()
+    return configured or str(getattr(settings, 'CELERY_BROKER_URL', '') or '')
+
+
+def _get_client():
+    global _CLIENT, _CLIENT_URL
+    url = _get_cancellation_url()
+    with _CLIENT_LOCK:
+        if _CLIENT is not None and _CLIENT_URL == url:
+            return _CLIENT
+        if url.startswith('locmem://'):
+            client = _LocalTokenStore()
+        elif url.startswith(('redis://', 'rediss://')):
+            import redis
+
+            # Checkpoints run inside hot loops; a broker hiccup must cost milliseconds, not a task.
+            client = redis.Redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        else:
+            client = None
+        _CLIENT, _CLIENT_URL = client, url
+        return client
+
+
+def _bump_stat(key: str, amount: int = 1):
+    if amount <= 0:
+        return
+    with _STATS_LOCK:
+        _STATS[key] = _STATS.get(key, 0) + amount
+    client = _get_client()
+    if client is None:
+        return
+    try:
+        client.hincrby(_STATS_KEY, key, amount)
+    except Exception:
+        logger.debug('Unable to record supersession stat %s.', key, exc_info=True)
+
+
+def _revoke_queued(task_ids: list[str]):
+    """Ask workers to drop these tasks if they are still waiting in a queue (running ones are not killed)."""
+    from celery import current_app
+
+    current_app.control.revoke(task_ids)
+
+
+def supersede_tasks(task_ids: Iterable[str]) -> int:
+    """Mark tasks as superseded so running ones stop at their next checkpoint and queued ones are revoked."""
+    stale_ids = sorted({str(task_id) for task_id in task_ids if str(task_id or '').strip()})
+    if not stale_ids:
+        return 0
+
+    client = _get_client()
+    if client is not None:
+        ttl = max(int(getattr(settings, 'MEDIA_TASK_CANCELLATION_TTL', 86400) or 86400), 60)
+        try:
+            for task_id in stale_ids:
+                client.set(f'{_TOKEN_PREFIX}{task_id}', '1', ex=ttl)
+        except Exception:
+            logger.warning('Unable to store cancellation tokens for %s.', stale_ids, exc_info=True)
+
+    if bool(getattr(settings, 'MEDIA_TASK_REVOKE_SUPERSEDED', True)):
+        try:
+            _revoke_queued(stale_ids)
+            _bump_stat('revoke_requests', len(stale_ids))
+        except Exception:
+            logger.warning('Unable to revoke superseded tasks %s.', stale_ids, exc_info=True)
+
+    _bump_stat('superseded_tasks', len(stale_ids))
+    return len(stale_ids)
+
+
+def get_stage_task_ids(media_item_id: str) -> set[str]:
+    row = MediaItem.objects.filter(pk=media_item_id).values_list(*_STAGE_TASK_FIELDS).first() or ()
+    return {str(task_id) for task_id in row if task_id}
+
+
+def supersede_replaced_stage_tasks(media_item_id: str, previous_task_ids: Iterable[str]) -> int:
+    """Supersede earlier task ids that no longer own any stage of the item.
+
+    A combined analysis task keeps running while it still owns its EXIF stage, even if a newer face-only
+    task took over face detection; the stage-level ``_is_current_task`` checks handle that case.
+    """
+    return supersede_tasks(set(previous_task_ids) - get_stage_task_ids(media_item_id))
+
+
+def is_task_superseded(task_id: str) -> bool:
+    if not task_id:
+        return False
+    client = _get_client()
+    if client is None:
+        return False
+    try:
+        return bool(client.exists(f'{_TOKEN_PREFIX}{task_id}'))
+    except Exception:
+        # The end-of-task database check still catches stale results.
+        return False
+
+
+def raise_if_superseded(task_id: str):
+    if is_task_superseded(task_id):
+        raise TaskSuperseded(task_id)
+
+
+def record_cancelled_run(*, files_skipped: int = 0, stages_skipped: int = 0):
+    _bump_stat('cancelled_runs')
+    _bump_stat('files_skipped', files_skipped)
+    _bump_stat('stages_skipped', stages_skipped)
+
+
+def get_supersession_stats() -> dict[str, Any]:
+    """Work saved by supersession: this process's counters, plus totals across workers when Redis is used."""
+    with _STATS_LOCK:
+        snapshot = {'process': dict(_STATS)}
+    client = _get_client()
+    if client is not None:
+        try:
+            snapshot['total'] = {
+                (key.decode() if isinstance(key, bytes) else str(key)): int(value)
+                for key, value in client.hgetall(_STATS_KEY).items()
+            }
+        except Exception:
+            logger.debug('Unable to read supersession totals.', exc_info=True)
+    return snapshot
+
+
+def _lock_ttl(seconds: float) -> int:
+    return max(int(math.ceil(seconds)), 1)
+
+
+def acquire_task_lock(name: str, seconds: float) -> bool:
+    """Take a lock every worker and web process sees (Redis ``SET NX EX``); True when the caller got it.
+
+    Any process may renew or release it, so a lock taken by a request can be let go by the task chain it
+    started. Without a Redis URL the lock falls back to Django's cache, which only dedups within a process.
+    """
+    client = _get_client()
+    if client is None:
+        return cache.add(f'{_LOCK_PREFIX}{name}', True, timeout=seconds)
+    try:
+        return bool(client.set(f'{_LOCK_PREFIX}{name}', '1', nx=True, ex=_lock_ttl(seconds)))
+    except Exception:
+        # Failing open costs a duplicate run at worst; failing closed could stall the work for good.
+        logger.warning('Unable to take task lock %s; continuing without it.', name, exc_info=True)
+        return True
+
+
+def renew_task_lock(name: str, seconds: float):
+    client = _get_client()
+    if client is None:
+        cache.touch(f'{_LOCK_PREFIX}{name}', seconds)
+        return
+    try:
+        client.expire(f'{_LOCK_PREFIX}{name}', _lock_ttl(seconds))
+    except Exception:
+        logger.warning('Unable to renew task lock %s.', name, exc_info=True)
+
+
+def release_task_lock(name: str):
+    client = _get_client()
+    if client is None:
+        cache.delete(f'{_LOCK_PREFIX}{name}')
+        return
+    try:
+        client.delete(f'{_LOCK_PREFIX}{name}')
+    except Exception:
+        # The lock still expires on its own.
+        logger.warning('Unable to release task lock %s.', name, exc_info=True)
+
+
+def reset_supersession_stats():
+    with _STATS_LOCK:
+        for key in _STATS:
+            _STATS[key] = 0
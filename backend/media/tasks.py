@@ -1,17 +1,65 @@
+import base64
 import hashlib
 import logging
-from datetime import datetime
+import mimetypes
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any
 
-from celery import shared_task
+from uuid import uuid4
+
+from celery import chord, shared_task
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
-
-from .exif import extract_exif_payload
-from .models import MediaAttachment, MediaItem
-from .vision import detect_faces, restore_legacy_photo
+from PIL import Image, UnidentifiedImageError
+
+from .av_metadata import extract_av_metadata_payload, is_av_source
+from .documents import DOCUMENT_EXTRACTOR_VERSION, extract_document_payload, is_pdf_source
+from .duplicates import items_missing_hashes, merge_duplicate_group, sync_duplicate_groups
+from .exif import extract_exif_from_image, extract_exif_payload
+from .models import (
+    DuplicateCleanupRun,
+    DuplicateGroup,
+    FaceEmbedding,
+    MediaAttachment,
+    MediaDocumentText,
+    MediaItem,
+    MediaReprocessRun,
+    MediaRestorationOutput,
+)
+from .perceptual_hash import compute_dhash, to_stored_hash
+from .ranged_storage import get_ranged_read_stats
+from .scheduler import release_media_task
+from .storage_cache import get_storage_cache_stats, open_cached_file
+from .supersession import (
+    TaskSuperseded,
+    acquire_task_lock,
+    get_stage_task_ids,
+    get_supersession_stats,
+    is_task_superseded,
+    raise_if_superseded,
+    record_cancelled_run,
+    release_task_lock,
+    renew_task_lock,
+    supersede_replaced_stage_tasks,
+)
+from .vision import (
+    FACE_EMBEDDING_MODEL,
+    RESTORATION_PIPELINE_VERSION,
+    apply_display_rotation,
+    decode_rgb_image,
+    detect_faces,
+    detect_faces_in_image,
+    get_face_detector_model_name,
+    pack_thumbnail_sprite,
+    restore_legacy_photo,
+    warm_face_detector,
+)
 
 
 logger = logging.getLogger(__name__)
@@ -49,11 +97,15 @@ def _resolve_primary_original_name(media_item: MediaItem) -> str:
 
 def _iter_media_files(media_item: MediaItem):
     if media_item.file:
+        primary_name = _resolve_primary_original_name(media_item)
         yield {
             'file_id': f'primary-{media_item.id}',
             'file_obj': media_item.file,
-            'original_name': _resolve_primary_original_name(media_item),
+            'original_name': primary_name,
             'is_primary': True,
+            'mime_type': mimetypes.guess_type(primary_name)[0] or '',
+            'content_hash': str(media_item.content_hash or ''),
+            'display_rotation': int(media_item.display_rotation or 0),
         }
 
     attachments = MediaAttachment.objects.filter(media_item=media_item).order_by('created_at', 'id')
@@ -66,6 +118,9 @@ def _iter_media_files(media_item: MediaItem):
             'file_obj': attachment.file,
             'original_name': original_name,
             'is_primary': False,
+            'mime_type': str(attachment.mime_type or ''),
+            'content_hash': str(attachment.content_hash or ''),
+            'display_rotation': int(attachment.display_rotation or 0),
         }
 
 
@@ -94,6 +149,43 @@ def _normalize_result_path(raw_value: Any) -> str:
     return str(raw_value or '').strip().lstrip('/')
 
 
+def _restoration_options_key(options: dict[str, bool], rotation: int = 0) -> str:
+    key = '+'.join(name for name in ('colorize', 'denoise') if options.get(name)) or 'none'
+    # Outputs are rendered in display orientation, so each rotation of the same bytes caches separately.
+    return f'{key}@{rotation}' if rotation else key
+
+
+def _find_cached_restoration(content_hash: str, options_key: str) -> MediaRestorationOutput | None:
+    if not content_hash:
+        return None
+    candidates = (
+        MediaRestorationOutput.objects.filter(
+            content_hash=content_hash,
+            options_key=options_key,
+            pipeline_version=RESTORATION_PIPELINE_VERSION,
+        )
+        .exclude(output='')
+        # Fallback colorization only stands in for a missing model; recompute once the model is back.
+        .exclude(colorization_method='fallback-warmtone')
+        .order_by('-created_at')
+    )
+    for candidate in candidates[:3]:
+        try:
+            if default_storage.exists(candidate.output.name):
+                return candidate
+        except Exception:
+            logger.warning('Unable to check cached restoration output "%s".', candidate.output.name, exc_info=True)
+    return None
+
+
+def release_restoration_output_path(raw_path: Any):
+    """Delete a restored file unless a restoration output row still references its storage key."""
+    path = _normalize_result_path(raw_path)
+    if not path or MediaRestorationOutput.objects.filter(output=path).exists():
+        return
+    _safe_delete_storage_file(path)
+
+
 def _normalize_restoration_results(raw_payload: Any) -> dict[str, dict[str, Any]]:
     if not isinstance(raw_payload, dict):
         return {}
@@ -122,10 +214,32 @@ def _cleanup_face_thumbnails(payload: Any):
     raw_faces = payload.get('faces')
     if not isinstance(raw_faces, list):
         return
-    for raw_face in raw_faces:
-        if not isinstance(raw_face, dict):
-            continue
-        _safe_delete_storage_file(str(raw_face.get('thumbnail_path') or '').strip())
+    # Packed faces share one sprite object, so each path is deleted once.
+    thumbnail_paths = {
+        str(raw_face.get('thumbnail_path') or '').strip() for raw_face in raw_faces if isinstance(raw_face, dict)
+    }
+    for thumbnail_path in sorted(thumbnail_paths):
+        _safe_delete_storage_file(thumbnail_path)
+
+
+def _abandon_superseded_run(
+    remaining_files,
+    generated_paths: list,
+    *,
+    stages_skipped: int,
+    files_skipped: int = 1,
+) -> dict[str, Any]:
+    """Drop the partial work of a superseded run; the file being processed counts as skipped."""
+    for path in generated_paths:
+        _safe_delete_storage_file(path)
+    files_skipped += sum(1 for _ in remaining_files)
+    record_cancelled_run(files_skipped=files_skipped, stages_skipped=stages_skipped)
+    return {
+        'status': 'skipped',
+        'reason': 'superseded',
+        'files_skipped': files_skipped,
+        'supersession': get_supersession_stats(),
+    }
 
 
 def _build_face_identifier(file_id: str, face_coordinates: dict[str, Any], index: int) -> str:
@@ -142,6 +256,218 @@ def _build_face_identifier(file_id: str, face_coordinates: dict[str, Any], index
     return f'face-{hashlib.sha1(token.encode("utf-8")).hexdigest()[:16]}'
 
 
+def _build_exif_candidate(source_file: dict[str, Any], payload: dict[str, Any]) -> dict[str, Any] | None:
+    raw_exif = payload.get('raw_exif') if isinstance(payload.get('raw_exif'), dict) else {}
+    gps = payload.get('gps') if isinstance(payload.get('gps'), dict) else None
+    date_taken = _parse_iso_datetime(payload.get('date_taken'))
+
+    if not date_taken and not gps:
+        return None
+
+    return {
+        'file_id': str(source_file['file_id']),
+        'original_name': str(source_file['original_name']),
+        'is_primary': bool(source_file['is_primary']),
+        'date_taken': date_taken.isoformat() if date_taken else None,
+        'gps': gps,
+        'raw_exif': raw_exif,
+        'extracted_at': str(payload.get('extracted_at') or timezone.now().isoformat()),
+    }
+
+
+def _build_exif_stage_update(candidate_items: list, total_files: int, warnings: list, now: datetime) -> dict[str, Any]:
+    exif_payload = {
+        'candidates': candidate_items,
+        'selected_file_id': str(candidate_items[0].get('file_id') or '') if candidate_items else '',
+        'total_files': total_files,
+        'files_with_exif': len(candidate_items),
+        'warnings': warnings,
+        'extracted_at': now.isoformat(),
+    }
+    if not candidate_items:
+        return {
+            'ai_status': MediaItem.AIStatus.COMPLETED,
+            'exif_status': MediaItem.ExifStatus.NOT_AVAILABLE,
+            'exif_error': '',
+            'exif_extracted_data': exif_payload,
+            'exif_processed_at': now,
+        }
+    return {
+        'ai_status': MediaItem.AIStatus.COMPLETED,
+        'exif_status': MediaItem.ExifStatus.AWAITING_CONFIRMATION,
+        'exif_error': '',
+        'exif_extracted_data': exif_payload,
+        'exif_processed_at': now,
+        'exif_confirmed_at': None,
+    }
+
+
+def _collect_detected_faces(
+    media_item_id: str,
+    task_id: str,
+    source_file: dict[str, Any],
+    payload: dict[str, Any],
+    generated_thumbnail_paths: list,
+    face_embeddings: dict | None = None,
+    thumbnail_crops: dict | None = None,
+) -> list[dict[str, Any]]:
+    """Build face entries for one file; with ``thumbnail_crops`` the crops are kept for one sprite."""
+    detected_faces = []
+    raw_faces = payload.get('faces') if isinstance(payload.get('faces'), list) else []
+    for index, raw_face in enumerate(raw_faces):
+        if not isinstance(raw_face, dict):
+            continue
+        face_coordinates = raw_face.get('face_coordinates')
+        if not isinstance(face_coordinates, dict):
+            continue
+
+        face_id = _build_face_identifier(str(source_file['file_id']), face_coordinates, index)
+        thumbnail_path = ''
+        thumbnail_bytes = raw_face.get('thumbnail_bytes')
+        if isinstance(thumbnail_bytes, (bytes, bytearray)) and thumbnail_bytes and thumbnail_crops is not None:
+            thumbnail_crops[face_id] = bytes(thumbnail_bytes)
+        elif isinstance(thumbnail_bytes, (bytes, bytearray)) and thumbnail_bytes:
+            candidate_path = f'face-thumbnails/{media_item_id}/{task_id}/{face_id}.jpg'
+            thumbnail_path = default_storage.save(candidate_path, ContentFile(bytes(thumbnail_bytes)))
+            generated_thumbnail_paths.append(thumbnail_path)
+
+        embedding = raw_face.get('embedding')
+        if face_embeddings is not None and isinstance(embedding, (bytes, bytearray)) and embedding:
+            face_embeddings[face_id] = (str(source_file['file_id']), bytes(embedding))
+
+        detected_faces.append(
+            {
+                'face_id': face_id,
+                'file_id': str(source_file['file_id']),
+                'original_name': str(source_file['original_name']),
+                'is_primary': bool(source_file['is_primary']),
+                'face_coordinates': face_coordinates,
+                'confidence': float(raw_face.get('confidence') or 0.0),
+                'thumbnail_path': thumbnail_path,
+            }
+        )
+    return detected_faces
+
+
+def _new_thumbnail_crops() -> dict | None:
+    return {} if bool(getattr(settings, 'MEDIA_FACE_THUMBNAIL_SPRITES', False)) else None
+
+
+def _pack_face_thumbnails(
+    media_item_id: str,
+    task_id: str,
+    detected_faces: list,
+    thumbnail_crops: dict | None,
+    generated_thumbnail_paths: list,
+):
+    """Write every crop of a run into one sprite object and point the faces at their box in it."""
+    packed_faces = [face for face in detected_faces if thumbnail_crops and face['face_id'] in thumbnail_crops]
+    if not packed_faces:
+        return
+    sprite_bytes, boxes = pack_thumbnail_sprite([thumbnail_crops[face['face_id']] for face in packed_faces])
+    if not sprite_bytes:
+        return
+    sprite_path = default_storage.save(
+        f'face-thumbnails/{media_item_id}/{task_id}/sprite.jpg',
+        ContentFile(sprite_bytes),
+    )
+    generated_thumbnail_paths.append(sprite_path)
+    for face, box in zip(packed_faces, boxes):
+        if box is not None:
+            face['thumbnail_path'] = sprite_path
+            face['thumbnail_sprite'] = box
+
+
+def _replace_face_embeddings(media_item: MediaItem, face_embeddings: dict):
+    """Swap the item's stored face vectors for the ones from the latest detection run."""
+    with transaction.atomic():
+        FaceEmbedding.objects.filter(media_item_id=media_item.id).delete()
+        FaceEmbedding.objects.bulk_create(
+            [
+                FaceEmbedding(
+                    vault_id=media_item.vault_id,
+                    media_item_id=media_item.id,
+                    face_id=face_id,
+                    file_id=file_id,
+                    model=FACE_EMBEDDING_MODEL,
+                    vector=vector,
+                )
+                for face_id, (file_id, vector) in face_embeddings.items()
+            ]
+        )
+
+
+def _build_face_stage_update(
+    detected_faces: list,
+    total_files: int,
+    processed_image_files: int,
+    warnings: list,
+    now: datetime,
+) -> dict[str, Any]:
+    faces_payload = {
+        'faces': detected_faces,
+        'total_files': total_files,
+        'processed_image_files': processed_image_files,
+        'detected_face_count': len(detected_faces),
+        'warnings': warnings,
+        'model': get_face_detector_model_name(),
+        'processed_at': now.isoformat(),
+    }
+    return {
+        'face_detection_status': (
+            MediaItem.FaceDetectionStatus.COMPLETED
+            if detected_faces
+            else MediaItem.FaceDetectionStatus.NOT_AVAILABLE
+        ),
+        'face_detection_error': '',
+        'face_detection_data': faces_payload,
+        'face_detection_processed_at': now,
+    }
+
+
+def _extract_file_metadata(source_file: dict[str, Any]) -> dict[str, Any]:
+    """EXIF payload of an image, or the container metadata of a video/audio file in the same shape."""
+    if is_av_source(source_file['original_name'], source_file.get('mime_type', '')):
+        return extract_av_metadata_payload(source_file['file_obj'])
+    return extract_exif_payload(source_file['file_obj'])
+
+
+def _analyze_source_file(
+    file_obj: Any,
+    *,
+    detect_faces_enabled: bool = True,
+    perceptual_hash_enabled: bool = False,
+    rotation: int = 0,
+) -> dict[str, Any]:
+    """Open a stored file once and run every per-file analysis on the same handle.
+
+    The dHash describes the stored pixels; faces are found on the image turned by ``rotation``.
+    """
+    exif_payload = {'raw_exif': {}, 'date_taken': None, 'gps': None}
+    image = None
+    perceptual_hash = None
+    try:
+        with open_cached_file(file_obj) as handle, Image.open(handle) as source:
+            exif_payload = extract_exif_from_image(source)
+            if detect_faces_enabled or perceptual_hash_enabled:
+                image = decode_rgb_image(source)
+            if perceptual_hash_enabled:
+                perceptual_hash = compute_dhash(image)
+            if not detect_faces_enabled and image is not None:
+                image.close()
+                image = None
+            elif image is not None:
+                image = apply_display_rotation(image, rotation)
+    except (UnidentifiedImageError, OSError):
+        pass
+
+    return {
+        'exif': exif_payload,
+        'image': image,
+        'perceptual_hash': perceptual_hash,
+    }
+
+
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_jitter=True, retry_kwargs={'max_retries': 3})
 def extract_media_exif_task(self, media_item_id: str):
     task_id = str(getattr(self.request, 'id', '') or '')
@@ -158,15 +484,27 @@ def extract_media_exif_task(self, media_item_id: str):
         exif_error='',
     )
 
+    source_files = list(_iter_media_files(media_item))
+    if _should_fan_out(source_files):
+        chord(
+            [
+                extract_media_file_exif_task.s(str(media_item_id), task_id, source_file['file_id'])
+                for source_file in source_files
+            ]
+        )(finish_media_exif_fanout_task.s(str(media_item_id), task_id))
+        return {'status': 'fanned-out', 'files': len(source_files)}
+
+    media_files = iter(source_files)
     try:
         candidate_items = []
         warnings = []
         total_files = 0
 
-        for source_file in _iter_media_files(media_item):
+        for source_file in media_files:
+            raise_if_superseded(task_id)
             total_files += 1
             try:
-                payload = extract_exif_payload(source_file['file_obj'])
+                payload = _extract_file_metadata(source_file)
             except Exception as exc:  # pragma: no cover - defensive fallback
                 logger.exception(
                     'EXIF extraction failed for media item %s file %s',
@@ -176,25 +514,11 @@ def extract_media_exif_task(self, media_item_id: str):
                 warnings.append(f'{source_file["original_name"]}: {exc}')
                 continue
 
-            raw_exif = payload.get('raw_exif') if isinstance(payload.get('raw_exif'), dict) else {}
-            gps = payload.get('gps') if isinstance(payload.get('gps'), dict) else None
-            date_taken = _parse_iso_datetime(payload.get('date_taken'))
-
-            if not date_taken and not gps:
-                continue
-
-            candidate_items.append(
-                {
-                    'file_id': str(source_file['file_id']),
-                    'original_name': str(source_file['original_name']),
-                    'is_primary': bool(source_file['is_primary']),
-                    'date_taken': date_taken.isoformat() if date_taken else None,
-                    'gps': gps,
-                    'raw_exif': raw_exif,
-                    'extracted_at': str(payload.get('extracted_at') or timezone.now().isoformat()),
-                }
-            )
-        has_candidate = bool(candidate_items)
+            candidate = _build_exif_candidate(source_file, payload)
+            if candidate:
+                candidate_items.append(candidate)
+    except TaskSuperseded:
+        return _abandon_superseded_run(media_files, [], stages_skipped=1)
     except Exception as exc:
         logger.exception('EXIF extraction attempt failed for media item %s', media_item_id)
         if _is_current_task(str(media_item_id), task_id, task_field='exif_task_id'):
@@ -206,47 +530,79 @@ def extract_media_exif_task(self, media_item_id: str):
             )
         raise
 
-    if not _is_current_task(str(media_item_id), task_id, task_field='exif_task_id'):
-        return {'status': 'skipped', 'reason': 'stale-task'}
+    return _complete_exif_extraction(str(media_item_id), task_id, candidate_items, total_files, warnings)
 
-    now = timezone.now()
-    if not has_candidate:
-        exif_payload = {
-            'candidates': [],
-            'selected_file_id': '',
-            'total_files': total_files,
-            'files_with_exif': 0,
-            'warnings': warnings,
-            'extracted_at': now.isoformat(),
-        }
-        MediaItem.objects.filter(pk=media_item_id, exif_task_id=task_id).update(
-            ai_status=MediaItem.AIStatus.COMPLETED,
-            exif_status=MediaItem.ExifStatus.NOT_AVAILABLE,
-            exif_error='',
-            exif_extracted_data=exif_payload,
-            exif_processed_at=now,
-        )
-        return {'status': 'completed', 'reason': 'no-exif-candidate'}
 
-    selected_file_id = str(candidate_items[0].get('file_id') or '')
-    candidate_payload = {
-        'candidates': candidate_items,
-        'selected_file_id': selected_file_id,
-        'total_files': total_files,
-        'files_with_exif': len(candidate_items),
-        'warnings': warnings,
-        'extracted_at': now.isoformat(),
-    }
+def _complete_exif_extraction(
+    media_item_id: str,
+    task_id: str,
+    candidate_items: list,
+    total_files: int,
+    warnings: list,
+) -> dict[str, Any]:
+    if not _is_current_task(media_item_id, task_id, task_field='exif_task_id'):
+        return {'status': 'skipped', 'reason': 'stale-task'}
 
     MediaItem.objects.filter(pk=media_item_id, exif_task_id=task_id).update(
-        ai_status=MediaItem.AIStatus.COMPLETED,
-        exif_status=MediaItem.ExifStatus.AWAITING_CONFIRMATION,
-        exif_error='',
-        exif_extracted_data=candidate_payload,
-        exif_processed_at=now,
-        exif_confirmed_at=None,
+        **_build_exif_stage_update(candidate_items, total_files, warnings, timezone.now())
     )
-    return {'status': 'completed', 'reason': 'awaiting-confirmation'}
+    reason = 'awaiting-confirmation' if candidate_items else 'no-exif-candidate'
+    return {'status': 'completed', 'reason': reason, 'ranged_reads': get_ranged_read_stats()}
+
+
+def _should_fan_out(source_files: list) -> bool:
+    min_files = int(getattr(settings, 'MEDIA_FANOUT_MIN_FILES', 2) or 0)
+    return min_files > 0 and len(source_files) >= min_files
+
+
+def _find_source_file(media_item_id: str, file_id: str) -> dict[str, Any] | None:
+    media_item = MediaItem.objects.filter(pk=media_item_id).first()
+    if not media_item:
+        return None
+    return next((source for source in _iter_media_files(media_item) if source['file_id'] == file_id), None)
+
+
+@shared_task
+def extract_media_file_exif_task(media_item_id: str, task_id: str, file_id: str):
+    """Fan-out part of ``extract_media_exif_task``; never raises, so the chord callback always runs."""
+    entry = {'file_id': file_id, 'candidate': None, 'warning': ''}
+    if not _is_current_task(media_item_id, task_id, task_field='exif_task_id'):
+        return {**entry, 'stale': True}
+    if is_task_superseded(task_id):
+        return {**entry, 'superseded': True}
+
+    source_file = _find_source_file(media_item_id, file_id)
+    if not source_file:
+        return {**entry, 'warning': f'{file_id}: file is no longer attached.'}
+    try:
+        payload = _extract_file_metadata(source_file)
+    except Exception as exc:  # pragma: no cover - defensive fallback
+        logger.exception('EXIF extraction failed for media item %s file %s', media_item_id, file_id)
+        return {**entry, 'warning': f'{source_file["original_name"]}: {exc}'}
+    return {**entry, 'candidate': _build_exif_candidate(source_file, payload)}
+
+
+@shared_task
+def finish_media_exif_fanout_task(results: list, media_item_id: str, task_id: str):
+    """Chord callback: one ``exif_extracted_data`` update from the per-file results, in file order."""
+    entries = [entry for entry in results or [] if isinstance(entry, dict)]
+    try:
+        if any(entry.get('superseded') for entry in entries):
+            return _abandon_superseded_run(
+                (),
+                [],
+                stages_skipped=1,
+                files_skipped=sum(1 for entry in entries if entry.get('superseded')),
+            )
+        return _complete_exif_extraction(
+            media_item_id,
+            task_id,
+            [entry['candidate'] for entry in entries if entry.get('candidate')],
+            len(entries),
+            [entry['warning'] for entry in entries if entry.get('warning')],
+        )
+    finally:
+        release_media_task(task_id)
 
 
 @shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_jitter=True, retry_kwargs={'max_retries': 3})
@@ -264,17 +620,32 @@ def detect_media_faces_task(self, media_item_id: str):
         face_detection_error='',
     )
 
+    source_files = list(_iter_media_files(media_item))
+    if _should_fan_out(source_files):
+        chord(
+            [
+                detect_media_file_faces_task.s(str(media_item_id), task_id, source_file['file_id'])
+                for source_file in source_files
+            ]
+        )(finish_media_faces_fanout_task.s(str(media_item_id), task_id))
+        # The chord callback releases this task's scheduler slot once every file is done.
+        return {'status': 'fanned-out', 'files': len(source_files)}
+
     detected_faces = []
     warnings = []
     total_files = 0
     processed_image_files = 0
     generated_thumbnail_paths = []
+    face_embeddings = {}
+    thumbnail_crops = _new_thumbnail_crops()
 
+    media_files = iter(source_files)
     try:
-        for source_file in _iter_media_files(media_item):
+        for source_file in media_files:
+            raise_if_superseded(task_id)
             total_files += 1
             try:
-                payload = detect_faces(source_file['file_obj'])
+                payload = detect_faces(source_file['file_obj'], rotation=source_file.get('display_rotation', 0))
             except Exception as exc:
                 if isinstance(exc, RuntimeError):
                     raise
@@ -289,34 +660,19 @@ def detect_media_faces_task(self, media_item_id: str):
             if not payload.get('is_image'):
                 continue
             processed_image_files += 1
-
-            raw_faces = payload.get('faces') if isinstance(payload.get('faces'), list) else []
-            for index, raw_face in enumerate(raw_faces):
-                if not isinstance(raw_face, dict):
-                    continue
-                face_coordinates = raw_face.get('face_coordinates')
-                if not isinstance(face_coordinates, dict):
-                    continue
-
-                face_id = _build_face_identifier(str(source_file['file_id']), face_coordinates, index)
-                thumbnail_path = ''
-                thumbnail_bytes = raw_face.get('thumbnail_bytes')
-                if isinstance(thumbnail_bytes, (bytes, bytearray)) and thumbnail_bytes:
-                    candidate_path = f'face-thumbnails/{media_item_id}/{task_id}/{face_id}.jpg'
-                    thumbnail_path = default_storage.save(candidate_path, ContentFile(bytes(thumbnail_bytes)))
-                    generated_thumbnail_paths.append(thumbnail_path)
-
-                detected_faces.append(
-                    {
-                        'face_id': face_id,
-                        'file_id': str(source_file['file_id']),
-                        'original_name': str(source_file['original_name']),
-                        'is_primary': bool(source_file['is_primary']),
-                        'face_coordinates': face_coordinates,
-                        'confidence': float(raw_face.get('confidence') or 0.0),
-                        'thumbnail_path': thumbnail_path,
-                    }
+            detected_faces.extend(
+                _collect_detected_faces(
+                    str(media_item_id),
+                    task_id,
+                    source_file,
+                    payload,
+                    generated_thumbnail_paths,
+                    face_embeddings,
+                    thumbnail_crops,
                 )
+            )
+    except TaskSuperseded:
+        return _abandon_superseded_run(media_files, generated_thumbnail_paths, stages_skipped=1)
     except Exception as exc:
         logger.exception('Face detection attempt failed for media item %s', media_item_id)
         if _is_current_task(str(media_item_id), task_id, task_field='face_detection_task_id'):
@@ -329,43 +685,571 @@ def detect_media_faces_task(self, media_item_id: str):
             _safe_delete_storage_file(thumbnail_path)
         raise
 
-    if not _is_current_task(str(media_item_id), task_id, task_field='face_detection_task_id'):
+    return _complete_face_detection(
+        media_item,
+        task_id,
+        detected_faces,
+        total_files,
+        processed_image_files,
+        warnings,
+        generated_thumbnail_paths,
+        face_embeddings,
+        thumbnail_crops,
+    )
+
+
+def _complete_face_detection(
+    media_item: MediaItem,
+    task_id: str,
+    detected_faces: list,
+    total_files: int,
+    processed_image_files: int,
+    warnings: list,
+    generated_thumbnail_paths: list,
+    face_embeddings: dict,
+    thumbnail_crops: dict | None = None,
+) -> dict[str, Any]:
+    media_item_id = str(media_item.pk)
+    if not _is_current_task(media_item_id, task_id, task_field='face_detection_task_id'):
         for thumbnail_path in generated_thumbnail_paths:
             _safe_delete_storage_file(thumbnail_path)
         return {'status': 'skipped', 'reason': 'stale-task'}
+    _pack_face_thumbnails(media_item_id, task_id, detected_faces, thumbnail_crops, generated_thumbnail_paths)
 
     previous_payload = (
         MediaItem.objects.filter(pk=media_item_id).values_list('face_detection_data', flat=True).first()
     )
     _cleanup_face_thumbnails(previous_payload)
 
-    now = timezone.now()
-    faces_payload = {
-        'faces': detected_faces,
-        'total_files': total_files,
-        'processed_image_files': processed_image_files,
-        'detected_face_count': len(detected_faces),
-        'warnings': warnings,
-        'model': 'opencv-haarcascade-frontalface-default',
-        'processed_at': now.isoformat(),
+    updated_rows = MediaItem.objects.filter(pk=media_item_id, face_detection_task_id=task_id).update(
+        **_build_face_stage_update(
+            detected_faces,
+            total_files,
+            processed_image_files,
+            warnings,
+            timezone.now(),
+        )
+    )
+    if updated_rows:
+        _replace_face_embeddings(media_item, face_embeddings)
+    else:
+        for thumbnail_path in generated_thumbnail_paths:
+            _safe_delete_storage_file(thumbnail_path)
+    if not detected_faces:
+        return {'status': 'completed', 'reason': 'no-face-candidate'}
+    return {'status': 'completed', 'reason': 'faces-detected'}
+
+
+@shared_task(bind=True, max_retries=3)
+def detect_media_file_faces_task(self, media_item_id: str, task_id: str, file_id: str):
+    """Fan-out part of ``detect_media_faces_task``.
+
+    Only a missing detector is retried; once retries run out it is reported in the result instead of
+    raised, so the chord callback always runs and can clean up the other files' thumbnails.
+    """
+    entry = {'file_id': file_id, 'faces': [], 'thumbnail_paths': [], 'embeddings': {}, 'is_image': False, 'warning': ''}
+    if not _is_current_task(media_item_id, task_id, task_field='face_detection_task_id'):
+        return {**entry, 'stale': True}
+    if is_task_superseded(task_id):
+        return {**entry, 'superseded': True}
+
+    source_file = _find_source_file(media_item_id, file_id)
+    if not source_file:
+        return {**entry, 'warning': f'{file_id}: file is no longer attached.'}
+
+    generated_thumbnail_paths = []
+    face_embeddings = {}
+    thumbnail_crops = _new_thumbnail_crops()
+    try:
+        payload = detect_faces(source_file['file_obj'], rotation=source_file.get('display_rotation', 0))
+        if payload.get('is_image'):
+            entry['is_image'] = True
+            entry['faces'] = _collect_detected_faces(
+                media_item_id,
+                task_id,
+                source_file,
+                payload,
+                generated_thumbnail_paths,
+                face_embeddings,
+                thumbnail_crops,
+            )
+    except Exception as exc:
+        for thumbnail_path in generated_thumbnail_paths:
+            _safe_delete_storage_file(thumbnail_path)
+        if isinstance(exc, RuntimeError):
+            if self.request.retries < self.max_retries:
+                raise self.retry(exc=exc, countdown=2 ** self.request.retries)
+            return {**entry, 'error': str(exc)}
+        logger.exception('Face detection failed for media item %s file %s', media_item_id, file_id)
+        return {**entry, 'warning': f'{source_file["original_name"]}: {exc}'}
+
+    entry['thumbnail_paths'] = generated_thumbnail_paths
+    # Results travel through the JSON result backend, so vectors and sprite crops are base64 encoded.
+    entry['embeddings'] = {
+        face_id: [embedding_file_id, base64.b64encode(vector).decode('ascii')]
+        for face_id, (embedding_file_id, vector) in face_embeddings.items()
     }
+    if thumbnail_crops:
+        entry['thumbnail_crops'] = {
+            face_id: base64.b64encode(crop).decode('ascii') for face_id, crop in thumbnail_crops.items()
+        }
+    return entry
 
-    if not detected_faces:
+
+@shared_task
+def finish_media_faces_fanout_task(results: list, media_item_id: str, task_id: str):
+    """Chord callback: one ``face_detection_data`` update from the per-file results, in file order."""
+    entries = [entry for entry in results or [] if isinstance(entry, dict)]
+    generated_thumbnail_paths = [path for entry in entries for path in entry.get('thumbnail_paths') or []]
+    try:
+        media_item = MediaItem.objects.filter(pk=media_item_id).first()
+        if not media_item:
+            for thumbnail_path in generated_thumbnail_paths:
+                _safe_delete_storage_file(thumbnail_path)
+            return {'status': 'skipped', 'reason': 'media-not-found'}
+        if any(entry.get('superseded') for entry in entries):
+            return _abandon_superseded_run(
+                (),
+                generated_thumbnail_paths,
+                stages_skipped=1,
+                files_skipped=sum(1 for entry in entries if entry.get('superseded')),
+            )
+
+        stage_error = next((entry['error'] for entry in entries if entry.get('error')), '')
+        if stage_error:
+            logger.error('Face detection failed for media item %s: %s', media_item_id, stage_error)
+            MediaItem.objects.filter(pk=media_item_id, face_detection_task_id=task_id).update(
+                face_detection_status=MediaItem.FaceDetectionStatus.FAILED,
+                face_detection_error=f'Face detection failed: {stage_error}',
+                face_detection_processed_at=timezone.now(),
+            )
+            for thumbnail_path in generated_thumbnail_paths:
+                _safe_delete_storage_file(thumbnail_path)
+            return {'status': 'failed', 'reason': 'face-detection-error'}
+
+        face_embeddings = {
+            face_id: (embedding_file_id, base64.b64decode(encoded_vector))
+            for entry in entries
+            for face_id, (embedding_file_id, encoded_vector) in (entry.get('embeddings') or {}).items()
+        }
+        thumbnail_crops = {
+            face_id: base64.b64decode(encoded_crop)
+            for entry in entries
+            for face_id, encoded_crop in (entry.get('thumbnail_crops') or {}).items()
+        }
+        return _complete_face_detection(
+            media_item,
+            task_id,
+            [face for entry in entries for face in entry.get('faces') or []],
+            len(entries),
+            sum(1 for entry in entries if entry.get('is_image')),
+            [entry['warning'] for entry in entries if entry.get('warning')],
+            generated_thumbnail_paths,
+            face_embeddings,
+            thumbnail_crops,
+        )
+    finally:
+        release_media_task(task_id)
+
+
+def _resolve_current_analysis_stages(media_item_id: str, task_id: str) -> dict[str, bool]:
+    current_ids = (
+        MediaItem.objects.filter(pk=media_item_id)
+        .values('exif_task_id', 'face_detection_task_id')
+        .first()
+    ) or {}
+    return {
+        'exif': bool(task_id) and str(current_ids.get('exif_task_id') or '') == task_id,
+        'faces': bool(task_id) and str(current_ids.get('face_detection_task_id') or '') == task_id,
+    }
+
+
+def _analyze_media_file(
+    media_item_id: str,
+    task_id: str,
+    source_file: dict[str, Any],
+    *,
+    detect_faces_enabled: bool,
+    generated_thumbnail_paths: list,
+    face_embeddings: dict,
+    thumbnail_crops: dict | None,
+) -> dict[str, Any]:
+    """One file of the combined analysis: its EXIF candidate, faces and, for the primary, the dHash.
+
+    File-specific failures come back as warnings; a missing OpenCV/model comes back as ``face_error``.
+    """
+    entry = {
+        'candidate': None,
+        'warning': '',
+        'faces': [],
+        'is_image': False,
+        'face_warning': '',
+        'face_error': '',
+        'perceptual_hash': None,
+    }
+    try:
+        if is_av_source(source_file['original_name'], source_file.get('mime_type', '')):
+            analysis = {'exif': extract_av_metadata_payload(source_file['file_obj']), 'image': None}
+        else:
+            analysis = _analyze_source_file(
+                source_file['file_obj'],
+                detect_faces_enabled=detect_faces_enabled,
+                perceptual_hash_enabled=bool(source_file['is_primary']),
+                rotation=source_file.get('display_rotation', 0),
+            )
+            if source_file['is_primary']:
+                entry['perceptual_hash'] = analysis['perceptual_hash']
+    except Exception as exc:  # pragma: no cover - defensive fallback
+        logger.exception(
+            'Media analysis failed for media item %s file %s',
+            media_item_id,
+            source_file['file_id'],
+        )
+        entry['warning'] = f'{source_file["original_name"]}: {exc}'
+        return entry
+
+    entry['candidate'] = _build_exif_candidate(source_file, analysis['exif'])
+
+    image = analysis['image']
+    if image is None:
+        return entry
+    try:
+        raise_if_superseded(task_id)
+        face_payload = detect_faces_in_image(image)
+    except RuntimeError as exc:
+        # Missing OpenCV/model is not file specific; the face stage fails but the EXIF pass goes on.
+        entry['face_error'] = str(exc)
+        return entry
+    except Exception as exc:
+        entry['face_warning'] = f'{source_file["original_name"]}: {exc}'
+        logger.exception(
+            'Face detection failed for media item %s file %s',
+            media_item_id,
+            source_file['file_id'],
+        )
+        return entry
+    finally:
+        image.close()
+
+    if face_payload.get('is_image'):
+        entry['is_image'] = True
+        entry['faces'] = _collect_detected_faces(
+            str(media_item_id),
+            task_id,
+            source_file,
+            face_payload,
+            generated_thumbnail_paths,
+            face_embeddings,
+            thumbnail_crops,
+        )
+    return entry
+
+
+def run_media_analysis(media_item_id: str, task_id: str, *, fan_out: bool = False) -> dict[str, Any]:
+    """Run EXIF extraction and face detection in one pass over the item's files.
+
+    Callers store ``task_id`` in ``exif_task_id`` and/or ``face_detection_task_id``;
+    each stage is only written while its own field still points at this run. With ``fan_out``, items
+    with enough files run one subtask per file and a chord callback writes both stages.
+    """
+    media_item = MediaItem.objects.filter(pk=media_item_id).first()
+    if not media_item:
+        return {'status': 'skipped', 'reason': 'media-not-found'}
+
+    current_stages = _resolve_current_analysis_stages(str(media_item_id), task_id)
+    if not any(current_stages.values()):
+        return {'status': 'skipped', 'reason': 'stale-task'}
+
+    if current_stages['exif']:
+        MediaItem.objects.filter(pk=media_item_id, exif_task_id=task_id).update(
+            ai_status=MediaItem.AIStatus.PROCESSING,
+            exif_status=MediaItem.ExifStatus.PROCESSING,
+            exif_error='',
+        )
+    if current_stages['faces']:
         MediaItem.objects.filter(pk=media_item_id, face_detection_task_id=task_id).update(
-            face_detection_status=MediaItem.FaceDetectionStatus.NOT_AVAILABLE,
+            face_detection_status=MediaItem.FaceDetectionStatus.PROCESSING,
             face_detection_error='',
-            face_detection_data=faces_payload,
-            face_detection_processed_at=now,
         )
-        return {'status': 'completed', 'reason': 'no-face-candidate'}
 
-    MediaItem.objects.filter(pk=media_item_id, face_detection_task_id=task_id).update(
-        face_detection_status=MediaItem.FaceDetectionStatus.COMPLETED,
-        face_detection_error='',
-        face_detection_data=faces_payload,
-        face_detection_processed_at=now,
+    source_files = list(_iter_media_files(media_item))
+    if fan_out and _should_fan_out(source_files):
+        chord(
+            [
+                analyze_media_file_task.s(str(media_item_id), task_id, source_file['file_id'])
+                for source_file in source_files
+            ]
+        )(finish_media_analysis_fanout_task.s(str(media_item_id), task_id, sum(current_stages.values())))
+        # The chord callback releases this task's scheduler slot once every file is done.
+        return {'status': 'fanned-out', 'files': len(source_files)}
+
+    candidate_items = []
+    exif_warnings = []
+    detected_faces = []
+    face_warnings = []
+    face_stage_error = ''
+    total_files = 0
+    processed_image_files = 0
+    generated_thumbnail_paths = []
+    face_embeddings = {}
+    thumbnail_crops = _new_thumbnail_crops()
+    perceptual_hash = None
+
+    # Supersession tokens are only set once a run owns no stage, so any checkpoint hit drops the whole pass.
+    media_files = iter(source_files)
+    try:
+        for source_file in media_files:
+            raise_if_superseded(task_id)
+            total_files += 1
+            file_result = _analyze_media_file(
+                str(media_item_id),
+                task_id,
+                source_file,
+                detect_faces_enabled=current_stages['faces'] and not face_stage_error,
+                generated_thumbnail_paths=generated_thumbnail_paths,
+                face_embeddings=face_embeddings,
+                thumbnail_crops=thumbnail_crops,
+            )
+            if file_result['perceptual_hash'] is not None:
+                perceptual_hash = file_result['perceptual_hash']
+            if file_result['candidate']:
+                candidate_items.append(file_result['candidate'])
+            if file_result['warning']:
+                exif_warnings.append(file_result['warning'])
+                face_warnings.append(file_result['warning'])
+            if file_result['face_warning']:
+                face_warnings.append(file_result['face_warning'])
+            face_stage_error = face_stage_error or file_result['face_error']
+            processed_image_files += int(file_result['is_image'])
+            detected_faces.extend(file_result['faces'])
+    except TaskSuperseded:
+        return _abandon_superseded_run(
+            media_files,
+            generated_thumbnail_paths,
+            stages_skipped=sum(current_stages.values()),
+        )
+    except Exception as exc:
+        logger.exception('Media analysis attempt failed for media item %s', media_item_id)
+        current_stages = _resolve_current_analysis_stages(str(media_item_id), task_id)
+        now = timezone.now()
+        if current_stages['exif']:
+            MediaItem.objects.filter(pk=media_item_id, exif_task_id=task_id).update(
+                ai_status=MediaItem.AIStatus.FAILED,
+                exif_status=MediaItem.ExifStatus.FAILED,
+                exif_error=f'EXIF extraction failed: {exc}',
+                exif_processed_at=now,
+            )
+        if current_stages['faces']:
+            MediaItem.objects.filter(pk=media_item_id, face_detection_task_id=task_id).update(
+                face_detection_status=MediaItem.FaceDetectionStatus.FAILED,
+                face_detection_error=f'Face detection failed: {exc}',
+                face_detection_processed_at=now,
+            )
+        for thumbnail_path in generated_thumbnail_paths:
+            _safe_delete_storage_file(thumbnail_path)
+        raise
+
+    return _complete_media_analysis(
+        media_item,
+        task_id,
+        candidate_items=candidate_items,
+        exif_warnings=exif_warnings,
+        detected_faces=detected_faces,
+        face_warnings=face_warnings,
+        face_stage_error=face_stage_error,
+        total_files=total_files,
+        processed_image_files=processed_image_files,
+        generated_thumbnail_paths=generated_thumbnail_paths,
+        face_embeddings=face_embeddings,
+        thumbnail_crops=thumbnail_crops,
+        perceptual_hash=perceptual_hash,
     )
-    return {'status': 'completed', 'reason': 'faces-detected'}
+
+
+def _complete_media_analysis(
+    media_item: MediaItem,
+    task_id: str,
+    *,
+    candidate_items: list,
+    exif_warnings: list,
+    detected_faces: list,
+    face_warnings: list,
+    face_stage_error: str,
+    total_files: int,
+    processed_image_files: int,
+    generated_thumbnail_paths: list,
+    face_embeddings: dict,
+    thumbnail_crops: dict | None,
+    perceptual_hash: int | None,
+) -> dict[str, Any]:
+    """Write both analysis stages in one guarded UPDATE, for the stages this run still owns."""
+    media_item_id = str(media_item.pk)
+    current_stages = _resolve_current_analysis_stages(media_item_id, task_id)
+    if not current_stages['faces'] or face_stage_error:
+        for thumbnail_path in generated_thumbnail_paths:
+            _safe_delete_storage_file(thumbnail_path)
+    if not any(current_stages.values()):
+        return {'status': 'skipped', 'reason': 'stale-task'}
+
+    now = timezone.now()
+    stage_filters = {'pk': media_item_id}
+    stage_updates = {}
+    if perceptual_hash is not None:
+        # Content-derived, so any current stage may write it; near-duplicate lookups read it.
+        stage_updates['perceptual_hash'] = to_stored_hash(perceptual_hash)
+    if current_stages['exif']:
+        stage_filters['exif_task_id'] = task_id
+        stage_updates.update(_build_exif_stage_update(candidate_items, total_files, exif_warnings, now))
+    if current_stages['faces']:
+        stage_filters['face_detection_task_id'] = task_id
+        if face_stage_error:
+            stage_updates.update(
+                {
+                    'face_detection_status': MediaItem.FaceDetectionStatus.FAILED,
+                    'face_detection_error': f'Face detection failed: {face_stage_error}',
+                    'face_detection_processed_at': now,
+                }
+            )
+        else:
+            _pack_face_thumbnails(
+                media_item_id,
+                task_id,
+                detected_faces,
+                thumbnail_crops,
+                generated_thumbnail_paths,
+            )
+            stage_updates.update(
+                _build_face_stage_update(detected_faces, total_files, processed_image_files, face_warnings, now)
+            )
+        previous_payload = (
+            MediaItem.objects.filter(pk=media_item_id).values_list('face_detection_data', flat=True).first()
+        )
+    else:
+        previous_payload = None
+
+    updated_rows = MediaItem.objects.filter(**stage_filters).update(**stage_updates)
+    if not updated_rows:
+        for thumbnail_path in generated_thumbnail_paths:
+            _safe_delete_storage_file(thumbnail_path)
+        return {'status': 'skipped', 'reason': 'stale-task'}
+    if current_stages['faces'] and not face_stage_error:
+        _cleanup_face_thumbnails(previous_payload)
+        _replace_face_embeddings(media_item, face_embeddings)
+
+    return {
+        'status': 'completed',
+        'reason': 'analysis-complete',
+        'files_with_exif': len(candidate_items),
+        'detected_face_count': len(detected_faces),
+        'storage_cache': get_storage_cache_stats(),
+    }
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_jitter=True, retry_kwargs={'max_retries': 3})
+def analyze_media_task(self, media_item_id: str):
+    task_id = str(getattr(self.request, 'id', '') or '')
+    return run_media_analysis(str(media_item_id), task_id, fan_out=True)
+
+
+@shared_task
+def analyze_media_file_task(media_item_id: str, task_id: str, file_id: str):
+    """Fan-out part of ``analyze_media_task``; never raises, so the chord callback always runs."""
+    entry = {'file_id': file_id, 'thumbnail_paths': [], 'embeddings': {}}
+    current_stages = _resolve_current_analysis_stages(media_item_id, task_id)
+    if not any(current_stages.values()):
+        return {**entry, 'stale': True}
+    if is_task_superseded(task_id):
+        return {**entry, 'superseded': True}
+
+    source_file = _find_source_file(media_item_id, file_id)
+    if not source_file:
+        return {**entry, 'warning': f'{file_id}: file is no longer attached.'}
+
+    generated_thumbnail_paths = []
+    face_embeddings = {}
+    thumbnail_crops = _new_thumbnail_crops()
+    try:
+        entry.update(
+            _analyze_media_file(
+                media_item_id,
+                task_id,
+                source_file,
+                detect_faces_enabled=current_stages['faces'],
+                generated_thumbnail_paths=generated_thumbnail_paths,
+                face_embeddings=face_embeddings,
+                thumbnail_crops=thumbnail_crops,
+            )
+        )
+    except TaskSuperseded:
+        for thumbnail_path in generated_thumbnail_paths:
+            _safe_delete_storage_file(thumbnail_path)
+        return {**entry, 'superseded': True}
+    except Exception as exc:
+        for thumbnail_path in generated_thumbnail_paths:
+            _safe_delete_storage_file(thumbnail_path)
+        logger.exception('Media analysis failed for media item %s file %s', media_item_id, file_id)
+        return {**entry, 'warning': f'{source_file["original_name"]}: {exc}'}
+
+    entry['thumbnail_paths'] = generated_thumbnail_paths
+    # Results travel through the JSON result backend, so vectors and sprite crops are base64 encoded.
+    entry['embeddings'] = {
+        face_id: [embedding_file_id, base64.b64encode(vector).decode('ascii')]
+        for face_id, (embedding_file_id, vector) in face_embeddings.items()
+    }
+    if thumbnail_crops:
+        entry['thumbnail_crops'] = {
+            face_id: base64.b64encode(crop).decode('ascii') for face_id, crop in thumbnail_crops.items()
+        }
+    return entry
+
+
+@shared_task
+def finish_media_analysis_fanout_task(results: list, media_item_id: str, task_id: str, stage_count: int = 2):
+    """Chord callback: one guarded update of both analysis stages from the per-file results, in file order."""
+    entries = [entry for entry in results or [] if isinstance(entry, dict)]
+    generated_thumbnail_paths = [path for entry in entries for path in entry.get('thumbnail_paths') or []]
+    try:
+        media_item = MediaItem.objects.filter(pk=media_item_id).first()
+        if not media_item:
+            for thumbnail_path in generated_thumbnail_paths:
+                _safe_delete_storage_file(thumbnail_path)
+            return {'status': 'skipped', 'reason': 'media-not-found'}
+        if any(entry.get('superseded') for entry in entries):
+            return _abandon_superseded_run(
+                (),
+                generated_thumbnail_paths,
+                stages_skipped=stage_count,
+                files_skipped=sum(1 for entry in entries if entry.get('superseded')),
+            )
+
+        file_warnings = [entry['warning'] for entry in entries if entry.get('warning')]
+        return _complete_media_analysis(
+            media_item,
+            task_id,
+            candidate_items=[entry['candidate'] for entry in entries if entry.get('candidate')],
+            exif_warnings=file_warnings,
+            detected_faces=[face for entry in entries for face in entry.get('faces') or []],
+            face_warnings=file_warnings + [entry['face_warning'] for entry in entries if entry.get('face_warning')],
+            face_stage_error=next((entry['face_error'] for entry in entries if entry.get('face_error')), ''),
+            total_files=len(entries),
+            processed_image_files=sum(1 for entry in entries if entry.get('is_image')),
+            generated_thumbnail_paths=generated_thumbnail_paths,
+            face_embeddings={
+                face_id: (embedding_file_id, base64.b64decode(encoded_vector))
+                for entry in entries
+                for face_id, (embedding_file_id, encoded_vector) in (entry.get('embeddings') or {}).items()
+            },
+            thumbnail_crops={
+                face_id: base64.b64decode(encoded_crop)
+                for entry in entries
+                for face_id, encoded_crop in (entry.get('thumbnail_crops') or {}).items()
+            },
+            perceptual_hash=next(
+                (entry['perceptual_hash'] for entry in entries if entry.get('perceptual_hash') is not None), None
+            ),
+        )
+    finally:
+        release_media_task(task_id)
 
 
 @shared_task(bind=True)
@@ -422,30 +1306,74 @@ def restore_media_photo_task(self, media_item_id: str, file_id: str, options: di
         )
         return {'status': 'failed', 'reason': 'file-not-found'}
 
+    content_hash = str(selected_source.get('content_hash') or '')
+    rotation = int(selected_source.get('display_rotation') or 0)
+    options_key = _restoration_options_key(normalized_options, rotation)
     generated_path = ''
     try:
-        restoration_payload = restore_legacy_photo(
-            selected_source['file_obj'],
-            apply_colorize=normalized_options['colorize'],
-            apply_denoise=normalized_options['denoise'],
-        )
+        started_at = time.perf_counter()
+        cached_output = _find_cached_restoration(content_hash, options_key)
+        if cached_output:
+            output_path = cached_output.output.name
+            restoration_payload = {
+                'width': cached_output.width,
+                'height': cached_output.height,
+                'detected_black_and_white': cached_output.detected_black_and_white,
+                'applied': cached_output.applied_options,
+                'colorization_method': cached_output.colorization_method,
+                'warnings': cached_output.warnings,
+                'timings_ms': {'total': round((time.perf_counter() - started_at) * 1000.0, 1)},
+            }
+        else:
+            restoration_payload = restore_legacy_photo(
+                selected_source['file_obj'],
+                apply_colorize=normalized_options['colorize'],
+                apply_denoise=normalized_options['denoise'],
+                rotation=rotation,
+                checkpoint=lambda _stage: raise_if_superseded(task_id),
+            )
+            if not _is_current_task(str(media_item_id), task_id, task_field='restoration_task_id'):
+                return {'status': 'skipped', 'reason': 'stale-task'}
+
+            restored_bytes = restoration_payload.get('image_bytes')
+            if not isinstance(restored_bytes, (bytes, bytearray)) or not restored_bytes:
+                raise RuntimeError('Restoration output is empty.')
+
+            source_name = str(selected_source.get('original_name') or 'memory-file').strip() or 'memory-file'
+            source_stem = Path(source_name).stem or 'memory-file'
+            target_file_name = f'{source_stem}-restored.jpg'
+            generated_path = default_storage.save(
+                f'restored-media/{media_item_id}/{task_id}/{target_file_name}',
+                ContentFile(bytes(restored_bytes)),
+            )
+            output_path = generated_path
         if not _is_current_task(str(media_item_id), task_id, task_field='restoration_task_id'):
+            if generated_path:
+                _safe_delete_storage_file(generated_path)
             return {'status': 'skipped', 'reason': 'stale-task'}
 
-        restored_bytes = restoration_payload.get('image_bytes')
-        if not isinstance(restored_bytes, (bytes, bytearray)) or not restored_bytes:
-            raise RuntimeError('Restoration output is empty.')
-
-        source_name = str(selected_source.get('original_name') or 'memory-file').strip() or 'memory-file'
-        source_stem = Path(source_name).stem or 'memory-file'
-        target_file_name = f'{source_stem}-restored.jpg'
-        generated_path = default_storage.save(
-            f'restored-media/{media_item_id}/{task_id}/{target_file_name}',
-            ContentFile(bytes(restored_bytes)),
+        applied_options = (
+            restoration_payload.get('applied')
+            if isinstance(restoration_payload.get('applied'), dict)
+            else normalized_options
         )
-        if not _is_current_task(str(media_item_id), task_id, task_field='restoration_task_id'):
-            _safe_delete_storage_file(generated_path)
-            return {'status': 'skipped', 'reason': 'stale-task'}
+        output_row = MediaRestorationOutput.objects.filter(
+            media_item_id=media_item_id,
+            file_id=normalized_file_id,
+        ).first() or MediaRestorationOutput(media_item_id=media_item_id, file_id=normalized_file_id)
+        output_row.content_hash = content_hash
+        output_row.options_key = options_key
+        output_row.pipeline_version = RESTORATION_PIPELINE_VERSION
+        output_row.colorization_method = str(restoration_payload.get('colorization_method') or '')
+        output_row.output = output_path
+        output_row.width = int(restoration_payload.get('width') or 0)
+        output_row.height = int(restoration_payload.get('height') or 0)
+        output_row.detected_black_and_white = bool(restoration_payload.get('detected_black_and_white'))
+        output_row.applied_options = applied_options
+        output_row.warnings = list(restoration_payload.get('warnings') or [])
+        # Core signals release the replaced output only when no other row still shares its key.
+        output_row.save()
+        generated_path = ''
 
         current_payload = (
             MediaItem.objects.filter(pk=media_item_id).values_list('restoration_data', flat=True).first()
@@ -456,8 +1384,8 @@ def restore_media_photo_task(self, media_item_id: str, file_id: str, options: di
         previous_path = _normalize_result_path(
             (previous_entry or {}).get('restored_path') or (previous_entry or {}).get('restoredPath')
         )
-        if previous_path and previous_path != _normalize_result_path(generated_path):
-            _safe_delete_storage_file(previous_path)
+        if previous_path and previous_path != _normalize_result_path(output_path):
+            release_restoration_output_path(previous_path)
 
         warnings = restoration_payload.get('warnings')
         normalized_warnings = (
@@ -470,17 +1398,19 @@ def restore_media_photo_task(self, media_item_id: str, file_id: str, options: di
             'file_id': normalized_file_id,
             'original_name': str(selected_source.get('original_name') or 'Memory file'),
             'is_primary': bool(selected_source.get('is_primary')),
-            'restored_path': generated_path,
+            'restored_path': output_path,
+            'output_id': str(output_row.id),
+            'cache_hit': cached_output is not None,
             'task_id': task_id,
             'processed_at': now.isoformat(),
             'width': int(restoration_payload.get('width') or 0),
             'height': int(restoration_payload.get('height') or 0),
             'detected_black_and_white': bool(restoration_payload.get('detected_black_and_white')),
             'requested_options': normalized_options,
-            'applied_options': restoration_payload.get('applied')
-            if isinstance(restoration_payload.get('applied'), dict)
-            else normalized_options,
+            'applied_options': applied_options,
             'warnings': normalized_warnings,
+            'timings_ms': restoration_payload.get('timings_ms') or {},
+            'tiling': restoration_payload.get('tiling') or {},
         }
         next_payload['results'] = results_by_file_id
         next_payload['last_result_file_id'] = normalized_file_id
@@ -493,7 +1423,13 @@ def restore_media_photo_task(self, media_item_id: str, file_id: str, options: di
             restoration_data=next_payload,
             restoration_processed_at=now,
         )
-        return {'status': 'completed', 'reason': 'restoration-ready'}
+        return {
+            'status': 'completed',
+            'reason': 'restoration-reused' if cached_output else 'restoration-ready',
+            'storage_cache': get_storage_cache_stats(),
+        }
+    except TaskSuperseded:
+        return _abandon_superseded_run((), [generated_path] if generated_path else [], stages_skipped=1)
     except Exception as exc:
         logger.exception('Media restoration failed for media item %s file %s', media_item_id, normalized_file_id)
         if generated_path:
@@ -506,3 +1442,722 @@ def restore_media_photo_task(self, media_item_id: str, file_id: str, options: di
                 restoration_task_id='',
             )
         return {'status': 'failed', 'reason': 'restoration-error'}
+
+
+def update_restoration_preview(media_item_id: str, task_id: str, **fields) -> dict[str, Any] | None:
+    """Merge fields into the preview entry of ``restoration_data`` if ``task_id`` still owns it.
+
+    Returns the preview entry as it was before the update, or ``None`` when the task is stale.
+    """
+    with transaction.atomic():
+        current_payload = (
+            MediaItem.objects.select_for_update()
+            .filter(pk=media_item_id)
+            .values_list('restoration_data', flat=True)
+            .first()
+        )
+        next_payload = dict(current_payload) if isinstance(current_payload, dict) else {}
+        previous_preview = next_payload.get('preview') if isinstance(next_payload.get('preview'), dict) else {}
+        if str(previous_preview.get('task_id') or '') != task_id:
+            return None
+        next_payload['preview'] = {**previous_preview, **fields}
+        MediaItem.objects.filter(pk=media_item_id).update(restoration_data=next_payload)
+    return previous_preview
+
+
+@shared_task(bind=True, soft_time_limit=30, time_limit=60)
+def restore_media_preview_task(self, media_item_id: str, file_id: str, options: dict | None = None):
+    task_id = str(getattr(self.request, 'id', '') or '')
+    media_item = MediaItem.objects.filter(pk=media_item_id).first()
+    if not media_item:
+        return {'status': 'skipped', 'reason': 'media-not-found'}
+
+    if update_restoration_preview(str(media_item_id), task_id, status=MediaItem.RestorationStatus.PROCESSING) is None:
+        return {'status': 'skipped', 'reason': 'stale-task'}
+
+    normalized_file_id = str(file_id or '').strip() or f'primary-{media_item.id}'
+    normalized_options = _normalize_restoration_options(options)
+    selected_source = next(
+        (
+            source
+            for source in _iter_media_files(media_item)
+            if str(source.get('file_id') or '').strip() == normalized_file_id
+        ),
+        None,
+    )
+    if media_item.media_type != MediaItem.MediaType.PHOTO or not selected_source:
+        update_restoration_preview(
+            str(media_item_id),
+            task_id,
+            status=MediaItem.RestorationStatus.FAILED,
+            error='Selected file was not found for this memory item.',
+            processed_at=timezone.now().isoformat(),
+        )
+        return {'status': 'failed', 'reason': 'file-not-found'}
+
+    generated_path = ''
+    try:
+        restoration_payload = restore_legacy_photo(
+            selected_source['file_obj'],
+            apply_colorize=normalized_options['colorize'],
+            apply_denoise=normalized_options['denoise'],
+            max_side=max(int(getattr(settings, 'MEDIA_RESTORATION_PREVIEW_MAX_SIDE', 800) or 800), 64),
+            rotation=int(selected_source.get('display_rotation') or 0),
+            checkpoint=lambda _stage: raise_if_superseded(task_id),
+        )
+        restored_bytes = restoration_payload.get('image_bytes')
+        if not isinstance(restored_bytes, (bytes, bytearray)) or not restored_bytes:
+            raise RuntimeError('Restoration preview is empty.')
+
+        generated_path = default_storage.save(
+            f'restored-media/previews/{media_item_id}/{task_id}.jpg',
+            ContentFile(bytes(restored_bytes)),
+        )
+        warnings = restoration_payload.get('warnings')
+        previous_preview = update_restoration_preview(
+            str(media_item_id),
+            task_id,
+            status=MediaItem.RestorationStatus.COMPLETED,
+            error='',
+            restored_path=generated_path,
+            processed_at=timezone.now().isoformat(),
+            width=int(restoration_payload.get('width') or 0),
+            height=int(restoration_payload.get('height') or 0),
+            detected_black_and_white=bool(restoration_payload.get('detected_black_and_white')),
+            applied_options=restoration_payload.get('applied')
+            if isinstance(restoration_payload.get('applied'), dict)
+            else normalized_options,
+            warnings=[str(item).strip() for item in warnings if str(item).strip()] if isinstance(warnings, list) else [],
+            timings_ms=restoration_payload.get('timings_ms') or {},
+        )
+        if previous_preview is None:
+            _safe_delete_storage_file(generated_path)
+            return {'status': 'skipped', 'reason': 'stale-task'}
+        return {'status': 'completed', 'reason': 'preview-ready'}
+    except TaskSuperseded:
+        return _abandon_superseded_run((), [], stages_skipped=1)
+    except Exception as exc:
+        logger.exception('Restoration preview failed for media item %s file %s', media_item_id, normalized_file_id)
+        if generated_path:
+            _safe_delete_storage_file(generated_path)
+        update_restoration_preview(
+            str(media_item_id),
+            task_id,
+            status=MediaItem.RestorationStatus.FAILED,
+            error=f'Restoration preview failed: {exc}',
+            processed_at=timezone.now().isoformat(),
+        )
+        return {'status': 'failed', 'reason': 'restoration-error'}
+
+
+def _copy_document_text_fields(target: MediaDocumentText, source: dict[str, Any] | MediaDocumentText):
+    if isinstance(source, MediaDocumentText):
+        target.page_count = source.page_count
+        target.extracted_page_count = source.extracted_page_count
+        target.text = source.text
+        target.is_truncated = source.is_truncated
+        # Twins share the preview key; core signals only delete it once no row references it.
+        target.preview = source.preview.name if source.preview else ''
+        return
+
+    target.page_count = int(source.get('page_count') or 0)
+    target.extracted_page_count = int(source.get('extracted_page_count') or 0)
+    target.text = str(source.get('text') or '')
+    target.is_truncated = bool(source.get('is_truncated'))
+    target.preview = ''
+
+
+@shared_task(bind=True, autoretry_for=(Exception,), retry_backoff=True, retry_jitter=True, retry_kwargs={'max_retries': 3})
+def extract_media_document_task(self, media_item_id: str):
+    task_id = str(getattr(self.request, 'id', '') or '')
+    media_item = MediaItem.objects.filter(pk=media_item_id).first()
+    if not media_item:
+        return {'status': 'skipped', 'reason': 'media-not-found'}
+
+    if not _is_current_task(str(media_item_id), task_id, task_field='document_task_id'):
+        return {'status': 'skipped', 'reason': 'stale-task'}
+
+    MediaItem.objects.filter(pk=media_item_id, document_task_id=task_id).update(
+        document_status=MediaItem.DocumentStatus.PROCESSING,
+        document_error='',
+    )
+
+    max_pages = int(getattr(settings, 'MEDIA_DOCUMENT_MAX_PAGES', 50) or 50)
+    max_text_chars = int(getattr(settings, 'MEDIA_DOCUMENT_MAX_TEXT_CHARS', 200000) or 200000)
+    preview_max_side = int(getattr(settings, 'MEDIA_DOCUMENT_PREVIEW_MAX_SIDE', 768) or 768)
+    existing_rows = {
+        row.file_id: row
+        for row in MediaDocumentText.objects.filter(media_item_id=media_item_id)
+    }
+    seen_file_ids = set()
+    reused_count = 0
+    extracted_count = 0
+    warnings = []
+
+    media_files = _iter_media_files(media_item)
+    try:
+        for source_file in media_files:
+            if not is_pdf_source(source_file['original_name'], source_file['mime_type']):
+                continue
+            raise_if_superseded(task_id)
+            if not _is_current_task(str(media_item_id), task_id, task_field='document_task_id'):
+                return {'status': 'skipped', 'reason': 'stale-task'}
+
+            file_id = str(source_file['file_id'])
+            content_hash = str(source_file['content_hash'] or '')
+            row = existing_rows.get(file_id) or MediaDocumentText(media_item_id=media_item_id, file_id=file_id)
+            if (
+                not row._state.adding
+                and content_hash
+                and row.content_hash == content_hash
+                and row.extractor_version == DOCUMENT_EXTRACTOR_VERSION
+            ):
+                seen_file_ids.add(file_id)
+                reused_count += 1
+                continue
+
+            twin_row = None
+            if content_hash:
+                twin_row = (
+                    MediaDocumentText.objects.filter(
+                        content_hash=content_hash,
+                        extractor_version=DOCUMENT_EXTRACTOR_VERSION,
+                    )
+                    .exclude(media_item_id=media_item_id, file_id=file_id)
+                    .first()
+                )
+
+            row.original_name = str(source_file['original_name'])
+            row.content_hash = content_hash
+            row.extractor_version = DOCUMENT_EXTRACTOR_VERSION
+            if twin_row:
+                _copy_document_text_fields(row, twin_row)
+                reused_count += 1
+            else:
+                payload = extract_document_payload(
+                    source_file['file_obj'],
+                    max_pages=max_pages,
+                    max_text_chars=max_text_chars,
+                    preview_max_side=preview_max_side,
+                )
+                for warning in payload.get('warnings') or []:
+                    warnings.append(f'{source_file["original_name"]}: {warning}')
+                if not payload.get('is_document'):
+                    warnings.append(f'{source_file["original_name"]}: not a readable PDF document.')
+                    continue
+                _copy_document_text_fields(row, payload)
+                preview_bytes = payload.get('preview_bytes')
+                if isinstance(preview_bytes, (bytes, bytearray)) and preview_bytes:
+                    row.preview.save(f'{media_item_id}/{file_id}.jpg', ContentFile(bytes(preview_bytes)), save=False)
+                extracted_count += 1
+
+            row.save()
+            existing_rows[file_id] = row
+            seen_file_ids.add(file_id)
+    except TaskSuperseded:
+        return _abandon_superseded_run(media_files, [], stages_skipped=1)
+    except Exception as exc:
+        logger.exception('Document processing failed for media item %s', media_item_id)
+        if _is_current_task(str(media_item_id), task_id, task_field='document_task_id'):
+            MediaItem.objects.filter(pk=media_item_id, document_task_id=task_id).update(
+                document_status=MediaItem.DocumentStatus.FAILED,
+                document_error=f'Document processing failed: {exc}',
+                document_processed_at=timezone.now(),
+            )
+        raise
+
+    if not _is_current_task(str(media_item_id), task_id, task_field='document_task_id'):
+        return {'status': 'skipped', 'reason': 'stale-task'}
+
+    # Delete one by one so core signals release preview files of removed attachments.
+    for file_id, row in existing_rows.items():
+        if file_id not in seen_file_ids and not row._state.adding:
+            row.delete()
+
+    now = timezone.now()
+    next_status = (
+        MediaItem.DocumentStatus.COMPLETED if seen_file_ids else MediaItem.DocumentStatus.NOT_AVAILABLE
+    )
+    MediaItem.objects.filter(pk=media_item_id, document_task_id=task_id).update(
+        document_status=next_status,
+        document_error='',
+        document_processed_at=now,
+    )
+    if warnings:
+        logger.info('Document processing warnings for media item %s: %s', media_item_id, warnings)
+    return {
+        'status': 'completed',
+        'reason': 'documents-indexed' if seen_file_ids else 'no-document-candidate',
+        'extracted': extracted_count,
+        'reused': reused_count,
+    }
+
+
+REPROCESS_IDLE_POLL_SECONDS = 5
+# A batch that goes quiet is re-dispatched once under a new id; if that one goes quiet too, it fails.
+REPROCESS_BATCH_MAX_DISPATCHES = 2
+
+
+def build_reprocess_queryset(run: MediaReprocessRun):
+    queryset = MediaItem.objects.filter(media_type=MediaItem.MediaType.PHOTO)
+    if run.vault_id:
+        queryset = queryset.filter(vault_id=run.vault_id)
+    statuses = [str(value) for value in (run.status_filter or []) if str(value).strip()]
+    if statuses:
+        queryset = queryset.filter(Q(face_detection_status__in=statuses) | Q(exif_status__in=statuses))
+    return queryset.order_by('created_at', 'id')
+
+
+def _resolve_reprocess_stages(run: MediaReprocessRun) -> set[str]:
+    valid_stages = {choice[0] for choice in MediaReprocessRun.Stage.choices}
+    stages = {str(value) for value in (run.stages or []) if str(value) in valid_stages}
+    return stages or valid_stages
+
+
+def _reprocess_media_item(media_item_id: str, stages: set[str]) -> dict[str, Any]:
+    current = MediaItem.objects.filter(pk=media_item_id).values('exif_status').first()
+    if not current:
+        return {'status': 'skipped', 'reason': 'media-not-found'}
+
+    task_id = uuid4().hex
+    claimed_fields = {}
+    if MediaReprocessRun.Stage.FACES in stages:
+        claimed_fields.update(
+            face_detection_status=MediaItem.FaceDetectionStatus.QUEUED,
+            face_detection_error='',
+            face_detection_task_id=task_id,
+            face_detection_processed_at=None,
+        )
+    # Uploader decisions on EXIF are final; only unreviewed EXIF is re-extracted.
+    reviewed_exif_statuses = {MediaItem.ExifStatus.CONFIRMED, MediaItem.ExifStatus.REJECTED}
+    if MediaReprocessRun.Stage.EXIF in stages and current['exif_status'] not in reviewed_exif_statuses:
+        claimed_fields.update(
+            exif_status=MediaItem.ExifStatus.QUEUED,
+            exif_error='',
+            exif_task_id=task_id,
+            exif_processed_at=None,
+        )
+    if not claimed_fields:
+        return {'status': 'skipped', 'reason': 'nothing-to-reprocess'}
+
+    previous_task_ids = get_stage_task_ids(media_item_id)
+    MediaItem.objects.filter(pk=media_item_id).update(**claimed_fields)
+    supersede_replaced_stage_tasks(media_item_id, previous_task_ids)
+    return run_media_analysis(str(media_item_id), task_id)
+
+
+@shared_task
+def dispatch_media_tasks_task():
+    from .scheduler import dispatch_pending_media_tasks
+
+    return dispatch_pending_media_tasks()
+
+
+def _schedule_reprocess_dispatch(run_id: str, dispatcher_task_id: str, countdown: float):
+    try:
+        dispatch_media_reprocess_task.apply_async(
+            args=[run_id],
+            task_id=dispatcher_task_id,
+            countdown=max(float(countdown), 0.0),
+        )
+    except Exception as exc:
+        logger.exception('Failed to schedule reprocess dispatcher for run %s', run_id)
+        MediaReprocessRun.objects.filter(pk=run_id, dispatcher_task_id=dispatcher_task_id).update(
+            status=MediaReprocessRun.Status.FAILED,
+            error=f'Unable to schedule dispatcher: {exc}',
+            finished_at=timezone.now(),
+        )
+
+
+def _reprocess_batch_timeout() -> timedelta:
+    return timedelta(seconds=max(int(getattr(settings, 'MEDIA_REPROCESS_BATCH_TIMEOUT_SECONDS', 1800) or 1800), 60))
+
+
+def _recover_lost_reprocess_batches(run: MediaReprocessRun, now: datetime) -> dict[str, list[str]]:
+    """Re-key or fail pending batches that made no progress within the timeout; returns batches to re-dispatch.
+
+    A lost batch (its message dropped, or its worker killed) would otherwise hold an in-flight slot and
+    keep the run from ever completing. The old task, if it is merely slow, stops at its next item once its
+    batch id is gone.
+    """
+    pending_batches = dict(run.pending_batches or {})
+    batch_progress = dict(run.batch_progress or {})
+    cutoff = now - _reprocess_batch_timeout()
+    redispatched = {}
+    for batch_id, item_ids in list(pending_batches.items()):
+        progress = batch_progress.get(batch_id)
+        if not progress:
+            # Batches dispatched before progress was tracked get one full timeout from now.
+            batch_progress[batch_id] = {'progress_at': now.isoformat(), 'attempt': 1}
+            continue
+        if datetime.fromisoformat(progress['progress_at']) > cutoff:
+            continue
+
+        pending_batches.pop(batch_id)
+        batch_progress.pop(batch_id)
+        attempt = int(progress.get('attempt') or 1)
+        if attempt >= REPROCESS_BATCH_MAX_DISPATCHES:
+            logger.warning(
+                'Reprocess batch %s of run %s made no progress; failing %s item(s).', batch_id, run.pk, len(item_ids)
+            )
+            run.failed_items = int(run.failed_items or 0) + len(item_ids)
+            continue
+        logger.warning('Reprocess batch %s of run %s made no progress; re-dispatching it.', batch_id, run.pk)
+        new_batch_id = uuid4().hex
+        pending_batches[new_batch_id] = list(item_ids)
+        batch_progress[new_batch_id] = {'progress_at': now.isoformat(), 'attempt': attempt + 1}
+        redispatched[new_batch_id] = list(item_ids)
+
+    for batch_id in set(batch_progress) - set(pending_batches):
+        batch_progress.pop(batch_id)
+    run.pending_batches = pending_batches
+    run.batch_progress = batch_progress
+    return redispatched
+
+
+def start_reprocess_dispatcher(run: MediaReprocessRun):
+    """Hand the run to a fresh dispatcher chain; any older chain stops at its next tick."""
+    dispatcher_task_id = uuid4().hex
+    MediaReprocessRun.objects.filter(pk=run.pk).update(dispatcher_task_id=dispatcher_task_id)
+    run.dispatcher_task_id = dispatcher_task_id
+    run_id = str(run.pk)
+    transaction.on_commit(lambda: _schedule_reprocess_dispatch(run_id, dispatcher_task_id, 0))
+
+
+@shared_task(bind=True)
+def dispatch_media_reprocess_task(self, run_id: str):
+    task_id = str(getattr(self.request, 'id', '') or '')
+    batch_id = ''
+    batch_item_ids = []
+    next_dispatcher_task_id = uuid4().hex
+
+    with transaction.atomic():
+        run = MediaReprocessRun.objects.select_for_update().filter(pk=run_id).first()
+        if not run:
+            return {'status': 'skipped', 'reason': 'run-not-found'}
+        if run.dispatcher_task_id != task_id:
+            return {'status': 'skipped', 'reason': 'stale-dispatcher'}
+        if run.status != MediaReprocessRun.Status.RUNNING:
+            return {'status': 'stopped', 'reason': run.status.lower()}
+
+        now = timezone.now()
+        redispatched_batches = _recover_lost_reprocess_batches(run, now)
+        pending_batches = dict(run.pending_batches or {})
+        countdown = REPROCESS_IDLE_POLL_SECONDS
+        if len(pending_batches) < max(int(run.max_in_flight or 1), 1):
+            queryset = build_reprocess_queryset(run)
+            if run.checkpoint_created_at is not None and run.checkpoint_item_id is not None:
+                queryset = queryset.filter(
+                    Q(created_at__gt=run.checkpoint_created_at)
+                    | Q(created_at=run.checkpoint_created_at, id__gt=run.checkpoint_item_id)
+                )
+            chunk = list(queryset.values_list('id', 'created_at')[: max(int(run.batch_size or 1), 1)])
+
+            if not chunk and not pending_batches:
+                run.status = MediaReprocessRun.Status.COMPLETED
+                run.finished_at = now
+                run.last_progress_at = now
+                run.dispatcher_task_id = ''
+                run.save(
+                    update_fields=[
+                        'status',
+                        'finished_at',
+                        'last_progress_at',
+                        'dispatcher_task_id',
+                        'pending_batches',
+                        'batch_progress',
+                        'failed_items',
+                        'updated_at',
+                    ]
+                )
+                return {'status': 'completed', 'reason': 'run-finished'}
+
+            if chunk:
+                batch_id = uuid4().hex
+                batch_item_ids = [str(item_id) for item_id, _created_at in chunk]
+                pending_batches[batch_id] = batch_item_ids
+                run.pending_batches = pending_batches
+                run.batch_progress = {**run.batch_progress, batch_id: {'progress_at': now.isoformat(), 'attempt': 1}}
+                run.checkpoint_item_id, run.checkpoint_created_at = chunk[-1]
+                run.dispatched_items = int(run.dispatched_items or 0) + len(batch_item_ids)
+                rate_limit = int(run.rate_limit_per_minute or 0)
+                # Pace dispatch so the run never exceeds its items-per-minute budget.
+                countdown = (60.0 * len(batch_item_ids) / rate_limit) if rate_limit else 0
+
+        run.dispatcher_task_id = next_dispatcher_task_id
+        run.save(
+            update_fields=[
+                'pending_batches',
+                'batch_progress',
+                'failed_items',
+                'checkpoint_item_id',
+                'checkpoint_created_at',
+                'dispatched_items',
+                'dispatcher_task_id',
+                'updated_at',
+            ]
+        )
+
+    for lost_batch_id, item_ids in redispatched_batches.items():
+        dispatch_reprocess_batch(str(run_id), lost_batch_id, item_ids)
+    if batch_id:
+        dispatch_reprocess_batch(str(run_id), batch_id, batch_item_ids)
+    _schedule_reprocess_dispatch(str(run_id), next_dispatcher_task_id, countdown)
+    return {'status': 'dispatched' if batch_id else 'waiting', 'batch_size': len(batch_item_ids)}
+
+
+def dispatch_reprocess_batch(run_id: str, batch_id: str, media_item_ids: list[str]):
+    try:
+        reprocess_media_batch_task.apply_async(
+            args=[run_id, batch_id, media_item_ids],
+            task_id=batch_id,
+        )
+    except Exception:
+        logger.exception('Failed to enqueue reprocess batch %s for run %s', batch_id, run_id)
+        _finish_reprocess_batch(run_id, batch_id, remaining_item_ids=[], failed=len(media_item_ids))
+
+
+def _record_reprocess_batch_progress(run_id: str, batch_id: str, remaining_item_ids: list[str]) -> bool:
+    """Stamp the batch as alive and trim its finished items; False once the batch is no longer pending."""
+    with transaction.atomic():
+        run = MediaReprocessRun.objects.select_for_update().filter(pk=run_id).first()
+        if not run or batch_id not in (run.pending_batches or {}):
+            return False
+        progress = dict((run.batch_progress or {}).get(batch_id) or {'attempt': 1})
+        progress['progress_at'] = timezone.now().isoformat()
+        run.pending_batches = {**run.pending_batches, batch_id: list(remaining_item_ids)}
+        run.batch_progress = {**(run.batch_progress or {}), batch_id: progress}
+        run.save(update_fields=['pending_batches', 'batch_progress', 'updated_at'])
+        return True
+
+
+def _finish_reprocess_batch(run_id: str, batch_id: str, *, remaining_item_ids: list[str], failed: int = 0):
+    with transaction.atomic():
+        run = MediaReprocessRun.objects.select_for_update().filter(pk=run_id).first()
+        if not run:
+            return
+        pending_batches = dict(run.pending_batches or {})
+        batch_progress = dict(run.batch_progress or {})
+        if remaining_item_ids:
+            # Paused mid-batch: keep the rest so resume re-dispatches exactly these items.
+            pending_batches[batch_id] = remaining_item_ids
+        else:
+            pending_batches.pop(batch_id, None)
+            batch_progress.pop(batch_id, None)
+        run.pending_batches = pending_batches
+        run.batch_progress = batch_progress
+        run.failed_items = int(run.failed_items or 0) + failed
+        run.save(update_fields=['pending_batches', 'batch_progress', 'failed_items', 'updated_at'])
+
+
+@shared_task(bind=True)
+def reprocess_media_batch_task(self, run_id: str, batch_id: str, media_item_ids: list[str]):
+    run = MediaReprocessRun.objects.filter(pk=run_id).first()
+    if not run:
+        return {'status': 'skipped', 'reason': 'run-not-found'}
+
+    stages = _resolve_reprocess_stages(run)
+    if MediaReprocessRun.Stage.FACES in stages:
+        warm_face_detector()
+
+    processed = 0
+    failed = 0
+    remaining_item_ids = []
+    for index, media_item_id in enumerate(media_item_ids):
+        run_state = MediaReprocessRun.objects.filter(pk=run_id).values('status', 'pending_batches').first() or {}
+        if batch_id not in (run_state.get('pending_batches') or {}):
+            # A resume re-dispatched this batch under a new id; the newer task owns the rest.
+            return {'status': 'skipped', 'reason': 'superseded-batch', 'processed': processed, 'failed': failed}
+        run_status = run_state.get('status')
+        if run_status != MediaReprocessRun.Status.RUNNING:
+            if run_status == MediaReprocessRun.Status.PAUSED:
+                remaining_item_ids = list(media_item_ids[index:])
+            break
+
+        try:
+            result = _reprocess_media_item(str(media_item_id), stages)
+        except Exception:
+            logger.exception('Reprocessing failed for media item %s in run %s', media_item_id, run_id)
+            result = None
+
+        if result is None:
+            failed += 1
+            MediaReprocessRun.objects.filter(pk=run_id).update(
+                failed_items=F('failed_items') + 1,
+                last_progress_at=timezone.now(),
+            )
+        else:
+            processed += 1
+            MediaReprocessRun.objects.filter(pk=run_id).update(
+                processed_items=F('processed_items') + 1,
+                last_progress_at=timezone.now(),
+            )
+        if not _record_reprocess_batch_progress(str(run_id), batch_id, media_item_ids[index + 1:]):
+            return {'status': 'skipped', 'reason': 'superseded-batch', 'processed': processed, 'failed': failed}
+
+    _finish_reprocess_batch(str(run_id), batch_id, remaining_item_ids=remaining_item_ids)
+    return {
+        'status': 'completed',
+        'processed': processed,
+        'failed': failed,
+        'remaining': len(remaining_item_ids),
+    }
+
+
+HASH_BACKFILL_BATCH_SIZE = 200
+HASH_BACKFILL_LOCK_SECONDS = 15 * 60
+
+
+def _hash_backfill_lock_name(vault_id: str) -> str:
+    return f'hash-backfill:{vault_id}'
+
+
+def schedule_hash_backfill(vault_id: str) -> bool:
+    """Queue one backfill chain per vault; returns False while a chain already holds the lock."""
+    vault_id = str(vault_id)
+    if not acquire_task_lock(_hash_backfill_lock_name(vault_id), HASH_BACKFILL_LOCK_SECONDS):
+        return False
+    transaction.on_commit(lambda: backfill_media_hashes_task.apply_async(args=[vault_id]))
+    return True
+
+
+def _compute_stored_perceptual_hash(file_obj: Any) -> int | None:
+    try:
+        with open_cached_file(file_obj) as handle, Image.open(handle) as source:
+            image = decode_rgb_image(source)
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+    try:
+        return to_stored_hash(compute_dhash(image))
+    finally:
+        image.close()
+
+
+@shared_task(bind=True)
+def backfill_media_hashes_task(self, vault_id: str, after_id: str = ''):
+    """Fill in missing content hashes, signatures and photo dHashes for a vault, one batch per run.
+
+    Each run walks forward by id and re-queues itself for the next batch, so items whose files stay
+    unreadable are visited once per chain instead of forever.
+    """
+    queryset = items_missing_hashes().filter(vault_id=vault_id).order_by('id')
+    if after_id:
+        queryset = queryset.filter(id__gt=after_id)
+    batch = list(queryset.prefetch_related('attachments')[:HASH_BACKFILL_BATCH_SIZE])
+
+    for media_item in batch:
+        try:
+            media_item.ensure_content_hash(persist=True)
+            for attachment in media_item.attachments.all():
+                attachment.ensure_content_hash(persist=True)
+            if media_item.media_type == MediaItem.MediaType.PHOTO and media_item.perceptual_hash is None:
+                perceptual_hash = _compute_stored_perceptual_hash(media_item.file)
+                if perceptual_hash is not None:
+                    MediaItem.objects.filter(pk=media_item.pk).update(perceptual_hash=perceptual_hash)
+        except Exception:
+            logger.exception('Hash backfill failed for media item %s', media_item.pk)
+    sync_duplicate_groups([media_item.pk for media_item in batch])
+
+    if len(batch) < HASH_BACKFILL_BATCH_SIZE:
+        release_task_lock(_hash_backfill_lock_name(vault_id))
+        return {'status': 'completed', 'processed': len(batch)}
+    renew_task_lock(_hash_backfill_lock_name(vault_id), HASH_BACKFILL_LOCK_SECONDS)
+    backfill_media_hashes_task.apply_async(args=[vault_id, str(batch[-1].pk)])
+    return {'status': 'continued', 'processed': len(batch)}
+
+
+DUPLICATE_CLEANUP_GROUPS_PER_TASK = 25
+
+
+def _schedule_duplicate_cleanup(run_id: str, worker_task_id: str):
+    try:
+        cleanup_duplicate_groups_task.apply_async(args=[run_id], task_id=worker_task_id)
+    except Exception as exc:
+        logger.exception('Failed to schedule duplicate cleanup for run %s', run_id)
+        DuplicateCleanupRun.objects.filter(pk=run_id, worker_task_id=worker_task_id).update(
+            status=DuplicateCleanupRun.Status.FAILED,
+            error=f'Unable to schedule cleanup: {exc}',
+            finished_at=timezone.now(),
+        )
+
+
+def start_duplicate_cleanup_worker(run: DuplicateCleanupRun):
+    """Hand the run to a fresh worker chain; any older chain stops before its next group."""
+    worker_task_id = uuid4().hex
+    DuplicateCleanupRun.objects.filter(pk=run.pk).update(worker_task_id=worker_task_id)
+    run.worker_task_id = worker_task_id
+    run_id = str(run.pk)
+    transaction.on_commit(lambda: _schedule_duplicate_cleanup(run_id, worker_task_id))
+
+
+def _next_cleanup_signature(run: DuplicateCleanupRun) -> str | None:
+    groups = DuplicateGroup.objects.filter(vault_id=run.vault_id, signature__gt=run.checkpoint_signature)
+    if run.signatures:
+        groups = groups.filter(signature__in=run.signatures)
+    return groups.order_by('signature').values_list('signature', flat=True).first()
+
+
+@shared_task(bind=True)
+def cleanup_duplicate_groups_task(self, run_id: str):
+    """Merge up to ``DUPLICATE_CLEANUP_GROUPS_PER_TASK`` groups, then hand over to the next task.
+
+    Every group commits in its own transaction together with the run's checkpoint and counters, so
+    a crashed or resumed run continues after the last merged group and never holds locks for more
+    than one group.
+    """
+    task_id = str(getattr(self.request, 'id', '') or '')
+    merged_groups = 0
+    while merged_groups < DUPLICATE_CLEANUP_GROUPS_PER_TASK:
+        try:
+            with transaction.atomic():
+                run = DuplicateCleanupRun.objects.select_for_update().filter(pk=run_id).first()
+                if not run:
+                    return {'status': 'skipped', 'reason': 'run-not-found'}
+                if run.worker_task_id != task_id:
+                    return {'status': 'skipped', 'reason': 'stale-worker'}
+                if run.status != DuplicateCleanupRun.Status.RUNNING:
+                    return {'status': 'stopped', 'reason': run.status.lower()}
+
+                now = timezone.now()
+                signature = _next_cleanup_signature(run)
+                if signature is None:
+                    run.status = DuplicateCleanupRun.Status.COMPLETED
+                    run.finished_at = now
+                    run.last_progress_at = now
+                    run.worker_task_id = ''
+                    run.save(
+                        update_fields=['status', 'finished_at', 'last_progress_at', 'worker_task_id', 'updated_at']
+                    )
+                    return {'status': 'completed', 'groups': merged_groups}
+
+                deleted_items, recovered_bytes = merge_duplicate_group(run.vault_id, signature)
+                run.checkpoint_signature = signature
+                run.processed_groups = int(run.processed_groups or 0) + 1
+                run.deleted_items = int(run.deleted_items or 0) + deleted_items
+                run.recovered_bytes = int(run.recovered_bytes or 0) + recovered_bytes
+                run.last_progress_at = now
+                run.save(
+                    update_fields=[
+                        'checkpoint_signature',
+                        'processed_groups',
+                        'deleted_items',
+                        'recovered_bytes',
+                        'last_progress_at',
+                        'updated_at',
+                    ]
+                )
+        except Exception as exc:
+            logger.exception('Duplicate cleanup failed for run %s', run_id)
+            DuplicateCleanupRun.objects.filter(pk=run_id, worker_task_id=task_id).update(
+                status=DuplicateCleanupRun.Status.FAILED,
+                error=str(exc),
+                finished_at=timezone.now(),
+            )
+            return {'status': 'failed', 'groups': merged_groups}
+        merged_groups += 1
+
+    next_task_id = uuid4().hex
+    if not DuplicateCleanupRun.objects.filter(pk=run_id, worker_task_id=task_id).update(worker_task_id=next_task_id):
+        return {'status': 'skipped', 'reason': 'stale-worker', 'groups': merged_groups}
+    _schedule_duplicate_cleanup(str(run_id), next_task_id)
+    return {'status': 'continued', 'groups': merged_groups}
@@ -3,12 +3,13 @@ from datetime import datetime, time
 from io import BytesIO
 import json
 import mimetypes
+import os
 from pathlib import Path
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db import connection, transaction
 from django.core.files.base import ContentFile
-from django.core.files.storage import default_storage
 from django.db.models import Count, Exists, Max, Min, OuterRef, Q, Sum
 from django.db.models.functions import Coalesce
 from django.utils import timezone
@@ -20,11 +21,23 @@ from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from django.shortcuts import get_object_or_404
 from PIL import Image, ImageOps, UnidentifiedImageError
 
-from .models import MediaAttachment, MediaFavorite, MediaItem, MediaItemLockTarget
-from .serializers import MAX_UPLOAD_BYTES, MAX_UPLOAD_MB, MediaItemSerializer, resolve_attachment_file_type
+from .models import MediaAttachment, MediaFavorite, MediaItem, MediaItemLockTarget, MediaRestorationOutput
+from .serializers import (
+    MAX_UPLOAD_BYTES,
+    MAX_UPLOAD_MB,
+    MediaItemSerializer,
+    normalize_face_thumbnail_sprite,
+    resolve_attachment_file_type,
+)
+from .exif import rotate_jpeg_orientation_in_place
+from .face_rotation import rotate_detected_faces
 from .file_processing import process_uploaded_file_for_storage
 from .natural_language_search import parse_natural_language_query
+from .scheduler import get_task_queue_state
+from .storage_copy import copy_stored_file
 from .services import AIProcessingService
+from .tasks import release_restoration_output_path
+from core.signals import batched_row_deletion
 from core.storage_urls import build_storage_path_url
 from vaults.models import FamilyVault, Membership
 from vaults.permissions import IsVaultMember
@@ -134,6 +147,7 @@ class MediaItemViewSet(viewsets.ModelViewSet):
                 | Q(description__icontains=token)
                 | Q(metadata__icontains=token)
                 | Q(tags__person__full_name__icontains=token)
+                | Q(document_texts__text__icontains=token)
             )
             queryset = queryset.filter(query)
         return queryset
@@ -176,6 +190,7 @@ class MediaItemViewSet(viewsets.ModelViewSet):
                     | Q(description__icontains=search)
                     | Q(metadata__icontains=search)
                     | Q(tags__person__full_name__icontains=search)
+                    | Q(document_texts__text__icontains=search)
                 )
 
             if parsed_search:
@@ -713,6 +728,7 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             'status': media_item.exif_status,
             'error': media_item.exif_error or '',
             'task_id': media_item.exif_task_id or '',
+            'queue': get_task_queue_state(media_item.exif_task_id),
             'processed_at': media_item.exif_processed_at,
             'confirmed_at': media_item.exif_confirmed_at,
             'requires_confirmation': media_item.exif_status == MediaItem.ExifStatus.AWAITING_CONFIRMATION,
@@ -759,6 +775,7 @@ class MediaItemViewSet(viewsets.ModelViewSet):
                 continue
             tags_by_face_id.setdefault(detected_face_id, media_tag)
 
+        thumbnail_urls = {}
         normalized_faces = []
         for raw_face in raw_faces:
             if not isinstance(raw_face, dict):
@@ -779,14 +796,16 @@ class MediaItemViewSet(viewsets.ModelViewSet):
 
             matched_tag = tags_by_face_id.get(face_id)
             person = getattr(matched_tag, 'person', None) if matched_tag else None
+            thumbnail_path = raw_face.get('thumbnail_path') or raw_face.get('thumbnailPath')
+            if thumbnail_path not in thumbnail_urls:
+                thumbnail_urls[thumbnail_path] = self._resolve_face_thumbnail_url(thumbnail_path)
             normalized_faces.append(
                 {
                     'id': face_id,
                     'file_id': file_id,
                     'confidence': round(max(0.0, min(1.0, confidence)), 3),
-                    'thumbnail_url': self._resolve_face_thumbnail_url(
-                        raw_face.get('thumbnail_path') or raw_face.get('thumbnailPath')
-                    ),
+                    'thumbnail_url': thumbnail_urls[thumbnail_path],
+                    'thumbnail_sprite': normalize_face_thumbnail_sprite(raw_face.get('thumbnail_sprite')),
                     'bounding_box': {
                         'x': coordinates['x'],
                         'y': coordinates['y'],
@@ -807,12 +826,40 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             'status': media_item.face_detection_status,
             'error': media_item.face_detection_error or '',
             'task_id': media_item.face_detection_task_id or '',
+            'queue': get_task_queue_state(media_item.face_detection_task_id),
             'processed_at': media_item.face_detection_processed_at,
             'face_count': len(faces),
             'faces': faces,
             'warnings': payload.get('warnings') if isinstance(payload.get('warnings'), list) else [],
         }
 
+    def _serialize_document_status(self, media_item):
+        documents = []
+        for document_text in media_item.document_texts.all():
+            preview_path = document_text.preview.name if document_text.preview else ''
+            documents.append(
+                {
+                    'file_id': document_text.file_id,
+                    'original_name': document_text.original_name,
+                    'page_count': document_text.page_count,
+                    'extracted_page_count': document_text.extracted_page_count,
+                    'text_length': len(document_text.text or ''),
+                    'is_truncated': document_text.is_truncated,
+                    'preview_url': build_storage_path_url(preview_path, request=self.request) if preview_path else None,
+                    'processed_at': document_text.updated_at,
+                }
+            )
+        return {
+            'media_id': str(media_item.id),
+            'status': media_item.document_status,
+            'error': media_item.document_error or '',
+            'task_id': media_item.document_task_id or '',
+            'queue': get_task_queue_state(media_item.document_task_id),
+            'processed_at': media_item.document_processed_at,
+            'document_count': len(documents),
+            'documents': documents,
+        }
+
     def _normalize_restoration_options(self, request):
         apply_colorize = self._parse_bool(request.data.get('colorize'))
         apply_denoise = self._parse_bool(request.data.get('denoise'))
@@ -893,6 +940,42 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             'warnings': normalized_warnings,
         }
 
+    def _normalize_restoration_preview(self, media_item):
+        payload = media_item.restoration_data if isinstance(media_item.restoration_data, dict) else {}
+        raw_preview = payload.get('preview')
+        if not isinstance(raw_preview, dict) or not raw_preview.get('task_id'):
+            return None
+
+        restored_path = str(raw_preview.get('restored_path') or '').strip()
+        options = raw_preview.get('options') if isinstance(raw_preview.get('options'), dict) else {}
+        applied_options = (
+            raw_preview.get('applied_options') if isinstance(raw_preview.get('applied_options'), dict) else {}
+        )
+        warnings = raw_preview.get('warnings')
+        return {
+            'task_id': str(raw_preview.get('task_id') or ''),
+            'file_id': str(raw_preview.get('file_id') or ''),
+            'status': str(raw_preview.get('status') or MediaItem.RestorationStatus.QUEUED),
+            'error': str(raw_preview.get('error') or ''),
+            'requested_at': raw_preview.get('requested_at'),
+            'processed_at': raw_preview.get('processed_at'),
+            'confirmed_at': raw_preview.get('confirmed_at'),
+            'options': {
+                'colorize': bool(options.get('colorize', True)),
+                'denoise': bool(options.get('denoise', True)),
+            },
+            'applied_options': {
+                'colorize': bool(applied_options.get('colorize', False)),
+                'denoise': bool(applied_options.get('denoise', False)),
+            },
+            'restored_path': restored_path,
+            'restored_url': build_storage_path_url(restored_path, request=self.request) if restored_path else '',
+            'width': int(raw_preview.get('width') or 0),
+            'height': int(raw_preview.get('height') or 0),
+            'warnings': [str(item) for item in warnings] if isinstance(warnings, list) else [],
+            'timings_ms': raw_preview.get('timings_ms') if isinstance(raw_preview.get('timings_ms'), dict) else {},
+        }
+
     def _normalize_restoration_results(self, media_item):
         payload = media_item.restoration_data if isinstance(media_item.restoration_data, dict) else {}
         raw_results = payload.get('results') if isinstance(payload.get('results'), dict) else {}
@@ -904,9 +987,14 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             normalized_results[normalized_entry['file_id']] = normalized_entry
         return normalized_results
 
-    def _delete_restoration_output_paths(self, raw_payload):
-        if not isinstance(raw_payload, dict):
-            return
+    def _delete_restoration_outputs(self, media_item):
+        # Delete rows one by one so core signals release outputs no other media item still shares.
+        for output in MediaRestorationOutput.objects.filter(media_item=media_item):
+            output.delete()
+
+        raw_payload = media_item.restoration_data if isinstance(media_item.restoration_data, dict) else {}
+        if isinstance(raw_payload.get('preview'), dict):
+            release_restoration_output_path(raw_payload['preview'].get('restored_path'))
         raw_results = raw_payload.get('results')
         if not isinstance(raw_results, dict):
             return
@@ -914,21 +1002,11 @@ class MediaItemViewSet(viewsets.ModelViewSet):
         for raw_entry in raw_results.values():
             if not isinstance(raw_entry, dict):
                 continue
-            restored_path = str(raw_entry.get('restored_path') or raw_entry.get('restoredPath') or '').strip()
-            if not restored_path:
-                continue
-            normalized_path = restored_path.lstrip('/')
-            try:
-                if default_storage.exists(normalized_path):
-                    default_storage.delete(normalized_path)
-            except Exception:
-                continue
+            release_restoration_output_path(raw_entry.get('restored_path') or raw_entry.get('restoredPath'))
 
     def _reset_restoration_workflow(self, media_item, *, cleanup_existing_outputs=False):
         if cleanup_existing_outputs:
-            self._delete_restoration_output_paths(
-                media_item.restoration_data if isinstance(media_item.restoration_data, dict) else {}
-            )
+            self._delete_restoration_outputs(media_item)
 
         media_item.restoration_status = MediaItem.RestorationStatus.NOT_STARTED
         media_item.restoration_error = ''
@@ -979,6 +1057,7 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             'result': result_entry,
             'results': all_results,
             'warnings': warnings if isinstance(warnings, list) else [],
+            'preview': self._normalize_restoration_preview(media_item),
         }
 
     def _resolve_ordering(self):
@@ -1058,26 +1137,26 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             return 'audio/mpeg'
         return ''
 
-    def _clone_storage_file(self, source_file):
-        if not source_file:
-            raise FileNotFoundError('Source file is missing.')
-
-        source_name = Path(str(getattr(source_file, 'name', '') or '')).name or 'memory-file'
-        file_bytes = b''
+    def _promoted_file_name(self, source_file, media_item):
+        """Storage key the primary file takes over from a promoted attachment, without moving bytes through the API.
 
-        if hasattr(source_file, 'open'):
-            source_file.open('rb')
-        try:
-            if hasattr(source_file, 'read'):
-                file_bytes = source_file.read() or b''
-        finally:
-            if hasattr(source_file, 'close'):
-                try:
-                    source_file.close()
-                except Exception:
-                    pass
+        The item is repointed at the attachment's own key; the attachment row is deleted afterwards and
+        the key stays because the item now references it. With ``MEDIA_PROMOTE_BY_COPY`` the storage
+        copies the object server-side to a fresh key instead.
+        """
+        source_name = str(getattr(source_file, 'name', '') or '').strip()
+        if not source_file or not source_name:
+            raise FileNotFoundError('Source file is missing.')
+        if not source_file.storage.exists(source_name):
+            raise FileNotFoundError(source_name)
+        if not getattr(settings, 'MEDIA_PROMOTE_BY_COPY', False):
+            return source_name
 
-        return ContentFile(file_bytes, name=source_name)
+        target_name = MediaItem._meta.get_field('file').generate_filename(
+            media_item,
+            Path(source_name).name or 'memory-file',
+        )
+        return copy_stored_file(source_file.storage, source_name, target_name)
 
     def _safe_file_size(self, file_obj):
         if not file_obj:
@@ -1141,6 +1220,40 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             raise ValidationError({'fileId': ['Selected attachment file is missing.']})
         return ('attachment', attachment, normalized_file_id)
 
+    def _resolve_rotation_mode(self, request):
+        default_mode = str(getattr(settings, 'MEDIA_ROTATION_MODE', 'pixels') or 'pixels')
+        mode = str(request.data.get('mode') or default_mode).strip().lower()
+        if mode not in ('pixels', 'metadata'):
+            raise ValidationError({'mode': ['Mode must be "pixels" or "metadata".']})
+        return mode
+
+    def _rewrite_jpeg_orientation(self, source_file, degrees):
+        if Path(str(source_file.name or '')).suffix.lower() not in ('.jpg', '.jpeg'):
+            return False
+        try:
+            local_path = source_file.storage.path(source_file.name)
+        except NotImplementedError:
+            # Object storage cannot patch two bytes of an object; fall back to the stored rotation.
+            return False
+        try:
+            if os.stat(local_path).st_nlink > 1:
+                # Hardlinked copies share the inode; patching it would turn the other key as well.
+                return False
+            return rotate_jpeg_orientation_in_place(local_path, degrees)
+        except OSError:
+            return False
+
+    def _rotate_display_orientation(self, target_obj, degrees):
+        """Record a quarter turn without decoding or re-encoding; returns the fields to save."""
+        if getattr(settings, 'MEDIA_ROTATION_EXIF_REWRITE', False) and self._rewrite_jpeg_orientation(
+            target_obj.file, degrees
+        ):
+            # The bytes changed in place; save() hashes them again.
+            target_obj.content_hash = ''
+            return ['content_hash']
+        target_obj.display_rotation = (int(target_obj.display_rotation or 0) + degrees) % 360
+        return ['display_rotation']
+
     def _rotate_image_file_content(self, source_file, degrees):
         source_name = Path(str(getattr(source_file, 'name', '') or 'memory-file.jpg')).name
         suffix = Path(source_name).suffix.lower()
@@ -1303,12 +1416,12 @@ class MediaItemViewSet(viewsets.ModelViewSet):
                 while retained_attachments and not promoted_attachment:
                     candidate_attachment = retained_attachments.pop(0)
                     try:
-                        cloned_file = self._clone_storage_file(candidate_attachment.file)
+                        promoted_file_name = self._promoted_file_name(candidate_attachment.file, media_item)
                     except (FileNotFoundError, OSError):
                         candidate_attachment.delete()
                         continue
 
-                    media_item.file = cloned_file
+                    media_item.file = promoted_file_name
                     candidate_file_type = resolve_attachment_file_type(
                         candidate_attachment.mime_type,
                         file_name=candidate_attachment.original_name or getattr(candidate_attachment.file, 'name', ''),
@@ -1579,6 +1692,11 @@ class MediaItemViewSet(viewsets.ModelViewSet):
         media_item = self.get_object()
         return Response(self._serialize_face_detection_status(media_item))
 
+    @decorators.action(detail=True, methods=['get'], url_path='document-status')
+    def document_status(self, request, pk=None):
+        media_item = self.get_object()
+        return Response(self._serialize_document_status(media_item))
+
     @decorators.action(detail=True, methods=['get'], url_path='restoration-status')
     def restoration_status(self, request, pk=None):
         media_item = self.get_object()
@@ -1593,10 +1711,34 @@ class MediaItemViewSet(viewsets.ModelViewSet):
         if media_item.media_type != MediaItem.MediaType.PHOTO:
             raise ValidationError({'detail': 'Media restoration is only available for photos.'})
 
-        _target_kind, _target_obj, target_file_id = self._resolve_rotation_target(media_item, request)
-        options = self._normalize_restoration_options(request)
-        if not options['colorize'] and not options['denoise']:
-            raise ValidationError({'detail': 'Select at least one tool: colorize or denoise.'})
+        mode = str(request.data.get('mode') or 'full').strip().lower()
+        if mode not in {'full', 'preview', 'confirm'}:
+            raise ValidationError({'mode': ['Mode must be "full", "preview" or "confirm".']})
+
+        if mode == 'confirm':
+            preview = self._normalize_restoration_preview(media_item)
+            if not preview or preview['status'] != MediaItem.RestorationStatus.COMPLETED:
+                raise ValidationError({'detail': 'There is no completed restoration preview to confirm.'})
+            target_file_id = preview['file_id']
+            options = preview['options']
+        else:
+            _target_kind, _target_obj, target_file_id = self._resolve_rotation_target(media_item, request)
+            options = self._normalize_restoration_options(request)
+            if not options['colorize'] and not options['denoise']:
+                raise ValidationError({'detail': 'Select at least one tool: colorize or denoise.'})
+
+        if mode == 'preview':
+            # Previews never touch the full-resolution job, so they may run alongside it.
+            AIProcessingService().enqueue_media_restoration_preview(
+                media_item,
+                file_id=target_file_id,
+                options=options,
+            )
+            media_item.refresh_from_db()
+            return Response(
+                self._serialize_restoration_status(media_item, target_file_id),
+                status=status.HTTP_202_ACCEPTED,
+            )
 
         current_status = media_item.restoration_status
         if current_status in (
@@ -1607,11 +1749,14 @@ class MediaItemViewSet(viewsets.ModelViewSet):
             payload['detail'] = 'A restoration job is already running for this media item.'
             return Response(payload, status=status.HTTP_200_OK)
 
-        AIProcessingService().enqueue_media_restoration(
-            media_item,
-            file_id=target_file_id,
-            options=options,
-        )
+        if mode == 'confirm':
+            AIProcessingService().confirm_media_restoration_preview(media_item, preview)
+        else:
+            AIProcessingService().enqueue_media_restoration(
+                media_item,
+                file_id=target_file_id,
+                options=options,
+            )
         media_item.refresh_from_db()
         return Response(
             self._serialize_restoration_status(media_item, target_file_id),
@@ -1736,40 +1881,51 @@ class MediaItemViewSet(viewsets.ModelViewSet):
         media_item = self.get_object()
         self._enforce_edit_permissions(media_item)
         degrees = self._resolve_rotation_degrees(request)
+        mode = self._resolve_rotation_mode(request)
         target_kind, target_obj, rotated_file_id = self._resolve_rotation_target(media_item, request)
         quota_user = media_item.uploader
 
         with transaction.atomic():
-            self._lock_quota_user(quota_user)
-            if target_kind == 'primary':
-                rotated_content = self._rotate_image_file_content(media_item.file, degrees)
-                media_item.file = rotated_content
-                media_item.content_hash = ''
-                media_item.file_size = self._recalculate_media_total_size(media_item)
-                media_item.save(update_fields=['file', 'file_size', 'content_hash'])
+            if mode == 'metadata':
+                target_obj.save(update_fields=self._rotate_display_orientation(target_obj, degrees))
             else:
-                rotated_content = self._rotate_image_file_content(target_obj.file, degrees)
-                target_obj.file = rotated_content
-                target_obj.save(update_fields=['file', 'file_size'])
-                media_item.file_size = self._recalculate_media_total_size(media_item)
-                media_item.save(update_fields=['file_size'])
-
-            from genealogy.models import MediaTag
-
-            MediaTag.objects.filter(media_item=media_item).update(
-                face_coordinates=None,
-                detected_face_id='',
-                tagged_file_id='',
-            )
-            self._reset_restoration_workflow(media_item, cleanup_existing_outputs=True)
-            self._enforce_user_upload_quota(quota_user)
+                self._lock_quota_user(quota_user)
+                if target_kind == 'primary':
+                    rotated_content = self._rotate_image_file_content(media_item.file, degrees)
+                    media_item.file = rotated_content
+                    media_item.content_hash = ''
+                    media_item.file_size = self._recalculate_media_total_size(media_item)
+                    media_item.save(update_fields=['file', 'file_size', 'content_hash'])
+                else:
+                    rotated_content = self._rotate_image_file_content(target_obj.file, degrees)
+                    target_obj.file = rotated_content
+                    target_obj.save(update_fields=['file', 'file_size'])
+                    media_item.file_size = self._recalculate_media_total_size(media_item)
+                    media_item.save(update_fields=['file_size'])
+
+            # Quarter turns map face boxes exactly; only a detection still in flight forces a fresh pass.
+            faces_carried_over = rotate_detected_faces(media_item, rotated_file_id, degrees)
+            if not faces_carried_over:
+                from genealogy.models import MediaTag
+
+                MediaTag.objects.filter(media_item=media_item).update(
+                    face_coordinates=None,
+                    detected_face_id='',
+                    tagged_file_id='',
+                )
+            # Restored outputs are cached per display rotation, so a metadata turn keeps them for reuse.
+            self._reset_restoration_workflow(media_item, cleanup_existing_outputs=mode == 'pixels')
+            if mode == 'pixels':
+                self._enforce_user_upload_quota(quota_user)
 
-        AIProcessingService().enqueue_face_detection_only(media_item)
+        if not faces_carried_over:
+            AIProcessingService().enqueue_face_detection_only(media_item)
         media_item.refresh_from_db()
         output = self.get_serializer(media_item)
         payload = dict(output.data)
         payload['rotated_file_id'] = rotated_file_id
         payload['applied_rotation'] = degrees
+        payload['rotation_mode'] = mode
         return Response(payload, status=status.HTTP_200_OK)
 
     @decorators.action(detail=False, methods=['get'], url_path='filters')
@@ -1967,3 +2123,8 @@ class MediaItemViewSet(viewsets.ModelViewSet):
         media_item = self.get_object()
         self._enforce_delete_permissions(media_item)
         return super().destroy(request, *args, **kwargs)
+
+    def perform_destroy(self, instance):
+        # Attachments, outputs and previews cascade; their files go to the deletion outbox in one INSERT.
+        with transaction.atomic(), batched_row_deletion():
+            instance.delete()
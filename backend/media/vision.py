@@ -1,14 +1,19 @@
+import hashlib
 import io
 import logging
 import os
 import threading
+import time
 import urllib.request
-from typing import Any
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable
 
 import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter, ImageOps, UnidentifiedImageError
 from django.conf import settings
 
+from .storage_cache import open_cached_file
+
 try:
     import cv2
 except Exception:  # pragma: no cover - import safety
@@ -16,10 +21,50 @@ except Exception:  # pragma: no cover - import safety
 
 
 _FACE_CLASSIFIER = None
+_YUNET_DETECTOR = None
+_YUNET_LOCK = threading.Lock()
+_RESOLVED_FACE_DETECTOR = None
+_FACE_RECOGNIZER = None
+_FACE_RECOGNIZER_LOCK = threading.Lock()
 _COLORIZATION_NET = None
 _COLORIZATION_LOCK = threading.Lock()
+_OPENCV_THREADS = None
 logger = logging.getLogger(__name__)
 
+FACE_DETECTOR_HAAR = 'haar'
+FACE_DETECTOR_YUNET = 'yunet'
+FACE_DETECTOR_MODELS = {
+    FACE_DETECTOR_HAAR: 'opencv-haarcascade-frontalface-default',
+    FACE_DETECTOR_YUNET: 'opencv-yunet-2023mar',
+}
+# Bump whenever restore_legacy_photo output changes so cached restoration outputs are recomputed.
+RESTORATION_PIPELINE_VERSION = 'restore-v2-tiled'
+# fastNlMeans reads searchWindowSize // 2 + templateWindowSize // 2 pixels around each output pixel,
+# so a halo at least this wide makes tiled denoising identical to a single full-frame pass.
+_DENOISE_TEMPLATE_WINDOW = 7
+_DENOISE_SEARCH_WINDOW = 21
+_DENOISE_TILE_HALO = _DENOISE_SEARCH_WINDOW // 2 + _DENOISE_TEMPLATE_WINDOW // 2 + 3
+# Rough peak bytes per tile pixel inside fastNlMeansDenoisingColored (Lab copies, padded borders, accumulators).
+_DENOISE_BYTES_PER_TILE_PIXEL = 24
+_ANALYSIS_SAMPLE_MAX_PIXELS = 4_000_000
+
+FACE_EMBEDDING_MODEL = 'opencv-sface-2021dec'
+FACE_EMBEDDING_DIM = 128
+_SFACE_ASSET = {
+    'file_name': 'face_recognition_sface_2021dec.onnx',
+    'urls': [
+        'https://github.com/opencv/opencv_zoo/raw/main/models/face_recognition_sface/face_recognition_sface_2021dec.onnx',
+        'https://huggingface.co/opencv/face_recognition_sface/resolve/main/face_recognition_sface_2021dec.onnx',
+    ],
+}
+_YUNET_ASSET = {
+    'file_name': 'face_detection_yunet_2023mar.onnx',
+    'urls': [
+        'https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/face_detection_yunet_2023mar.onnx',
+        'https://huggingface.co/opencv/face_detection_yunet/resolve/main/face_detection_yunet_2023mar.onnx',
+    ],
+}
+
 _COLORIZATION_ASSETS = {
     'prototxt': {
         'file_name': 'colorization_deploy_v2.prototxt',
@@ -44,6 +89,13 @@ _COLORIZATION_ASSETS = {
     },
 }
 
+MODEL_CHECKSUM_FILE = 'checksums.sha256'
+MODEL_ASSET_GROUPS = {
+    'colorization': list(_COLORIZATION_ASSETS.values()),
+    'yunet': [_YUNET_ASSET],
+    'sface': [_SFACE_ASSET],
+}
+
 
 def _get_colorization_model_dir():
     configured = str(getattr(settings, 'MEDIA_RESTORATION_MODEL_DIR', '') or '').strip()
@@ -52,11 +104,13 @@ def _get_colorization_model_dir():
     return configured
 
 
-def _ensure_model_asset(path: str, download_urls: Any):
+def _ensure_model_asset(path: str, download_urls: Any, *, allow_download: bool | None = None):
     if os.path.exists(path):
         return
 
-    if not bool(getattr(settings, 'MEDIA_RESTORATION_AUTO_DOWNLOAD', True)):
+    if allow_download is None:
+        allow_download = bool(getattr(settings, 'MEDIA_RESTORATION_AUTO_DOWNLOAD', True))
+    if not allow_download:
         raise FileNotFoundError(f'Missing required model file: {path}')
 
     os.makedirs(os.path.dirname(path), exist_ok=True)
@@ -69,6 +123,7 @@ def _ensure_model_asset(path: str, download_urls: Any):
     if not urls:
         raise RuntimeError(f'No download URLs configured for model asset: {path}')
 
+    expected_sha256 = _load_expected_checksums().get(os.path.basename(path))
     errors = []
     for url in urls:
         try:
@@ -76,8 +131,13 @@ def _ensure_model_asset(path: str, download_urls: Any):
                 data = response.read()
             if not data:
                 raise RuntimeError(f'No data downloaded from {url}')
-            with open(path, 'wb') as model_file:
+            if expected_sha256 and hashlib.sha256(data).hexdigest() != expected_sha256:
+                raise RuntimeError('checksum mismatch')
+            # Write beside the target and rename, so a killed download never leaves a truncated model behind.
+            partial_path = f'{path}.part'
+            with open(partial_path, 'wb') as model_file:
                 model_file.write(data)
+            os.replace(partial_path, path)
             return
         except Exception as exc:
             errors.append(f'{url} ({exc})')
@@ -87,6 +147,104 @@ def _ensure_model_asset(path: str, download_urls: Any):
     raise RuntimeError(f'Failed to download model asset for {path}. Attempts: {joined_errors}')
 
 
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _load_expected_checksums() -> dict[str, str]:
+    """Expected SHA-256 per model file: the model dir manifest, overridden by MEDIA_MODEL_SHA256 pins."""
+    expected = {}
+    manifest_path = os.path.join(_get_colorization_model_dir(), MODEL_CHECKSUM_FILE)
+    try:
+        with open(manifest_path, encoding='utf-8') as manifest:
+            for line in manifest:
+                parts = line.strip().split()
+                if len(parts) == 2:
+                    expected[parts[1].lstrip('*')] = parts[0].lower()
+    except FileNotFoundError:
+        pass
+
+    for entry in str(getattr(settings, 'MEDIA_MODEL_SHA256', '') or '').split(','):
+        file_name, _separator, checksum = entry.strip().partition('=')
+        if file_name and checksum:
+            expected[file_name.strip()] = checksum.strip().lower()
+    return expected
+
+
+def record_model_checksums(file_names: list[str]) -> str:
+    """Add the current hashes of the given model files to the model dir manifest (sha256sum format)."""
+    model_dir = _get_colorization_model_dir()
+    manifest_path = os.path.join(model_dir, MODEL_CHECKSUM_FILE)
+    recorded = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as manifest:
+            for line in manifest:
+                parts = line.strip().split()
+                if len(parts) == 2:
+                    recorded[parts[1].lstrip('*')] = parts[0].lower()
+    for file_name in file_names:
+        path = os.path.join(model_dir, file_name)
+        if os.path.exists(path):
+            recorded[file_name] = _file_sha256(path)
+
+    os.makedirs(model_dir, exist_ok=True)
+    with open(f'{manifest_path}.part', 'w', encoding='utf-8') as manifest:
+        manifest.writelines(f'{checksum}  {file_name}\n' for file_name, checksum in sorted(recorded.items()))
+    os.replace(f'{manifest_path}.part', manifest_path)
+    return manifest_path
+
+
+def verify_model_asset(file_name: str, expected: dict[str, str] | None = None) -> dict[str, Any]:
+    path = os.path.join(_get_colorization_model_dir(), file_name)
+    report = {'file_name': file_name, 'path': path, 'status': 'missing', 'size': 0, 'sha256': ''}
+    if not os.path.exists(path):
+        return report
+
+    expected = _load_expected_checksums() if expected is None else expected
+    report['size'] = os.path.getsize(path)
+    report['sha256'] = _file_sha256(path)
+    if file_name not in expected:
+        report['status'] = 'unpinned'
+    elif expected[file_name] == report['sha256']:
+        report['status'] = 'ok'
+    else:
+        report['status'] = 'mismatch'
+    return report
+
+
+def get_required_model_groups() -> list[str]:
+    groups = ['colorization']
+    if str(getattr(settings, 'MEDIA_FACE_DETECTOR_BACKEND', '') or '').strip().lower() == FACE_DETECTOR_YUNET:
+        groups.append('yunet')
+    if is_face_embedding_enabled():
+        groups.append('sface')
+    return groups
+
+
+def ensure_model_assets(groups: list[str] | None = None, *, download: bool | None = None) -> list[dict[str, Any]]:
+    """Verify every model file of the given groups, (re)downloading missing or corrupt ones when allowed."""
+    expected = _load_expected_checksums()
+    reports = []
+    for group in groups or list(MODEL_ASSET_GROUPS):
+        for asset in MODEL_ASSET_GROUPS[group]:
+            report = verify_model_asset(asset['file_name'], expected)
+            if report['status'] in ('missing', 'mismatch'):
+                try:
+                    if report['status'] == 'mismatch':
+                        logger.error('Model file %s failed checksum verification; discarding it.', report['path'])
+                        os.remove(report['path'])
+                    _ensure_model_asset(report['path'], asset['urls'], allow_download=download)
+                    report = verify_model_asset(asset['file_name'], expected)
+                except Exception as exc:
+                    report = {**verify_model_asset(asset['file_name'], expected), 'error': str(exc)}
+            reports.append({**report, 'group': group})
+    return reports
+
+
 def _resolve_colorization_asset_paths():
     model_dir = _get_colorization_model_dir()
     resolved = {}
@@ -138,26 +296,171 @@ def _get_face_classifier():
     return _FACE_CLASSIFIER
 
 
-def _load_rgb_image(file_obj: Any):
-    opened_here = False
+def _get_yunet_detector():
+    global _YUNET_DETECTOR
+    if cv2 is None:
+        raise RuntimeError('OpenCV is not installed. Install opencv-python-headless to enable face detection.')
+    if not hasattr(cv2, 'FaceDetectorYN'):
+        raise RuntimeError('This OpenCV build does not provide the YuNet face detector.')
+
+    with _YUNET_LOCK:
+        if _YUNET_DETECTOR is not None:
+            return _YUNET_DETECTOR
+        model_path = os.path.join(_get_colorization_model_dir(), _YUNET_ASSET['file_name'])
+        _ensure_model_asset(model_path, _YUNET_ASSET['urls'])
+        _YUNET_DETECTOR = cv2.FaceDetectorYN.create(
+            model_path,
+            '',
+            (320, 320),
+            float(getattr(settings, 'MEDIA_FACE_DETECTION_SCORE_THRESHOLD', 0.7)),
+            0.3,
+            5000,
+        )
+        return _YUNET_DETECTOR
+
+
+def _get_face_recognizer():
+    global _FACE_RECOGNIZER
+    if cv2 is None or not hasattr(cv2, 'FaceRecognizerSF'):
+        raise RuntimeError('This OpenCV build does not provide the SFace face recognizer.')
+
+    with _FACE_RECOGNIZER_LOCK:
+        if _FACE_RECOGNIZER is not None:
+            return _FACE_RECOGNIZER
+        model_path = os.path.join(_get_colorization_model_dir(), _SFACE_ASSET['file_name'])
+        # Fetched by the parent worker (or fetch_media_models); a task never downloads it.
+        _ensure_model_asset(model_path, _SFACE_ASSET['urls'], allow_download=False)
+        _FACE_RECOGNIZER = cv2.FaceRecognizerSF.create(model_path, '')
+        return _FACE_RECOGNIZER
+
+
+def is_face_embedding_enabled() -> bool:
+    """SFace needs YuNet's landmarks for an aligned crop, so embeddings only run with that backend."""
+    configured_backend = str(getattr(settings, 'MEDIA_FACE_DETECTOR_BACKEND', FACE_DETECTOR_HAAR) or '').strip().lower()
+    return configured_backend == FACE_DETECTOR_YUNET and bool(getattr(settings, 'MEDIA_FACE_EMBEDDINGS_ENABLED', True))
+
+
+def _compute_face_embeddings(image: Image.Image, detections: list) -> list:
+    """Return one unit-length float16 SFace vector (as bytes) per detection, or None where it failed.
+
+    Detections without landmarks (Haar boxes, e.g. after a YuNet fallback) get None.
+    """
+    if not is_face_embedding_enabled() or all(landmark_row is None for *_box, landmark_row in detections):
+        return [None] * len(detections)
     try:
-        if hasattr(file_obj, 'open'):
-            file_obj.open('rb')
-            opened_here = True
-        if hasattr(file_obj, 'seek'):
-            file_obj.seek(0)
-
-        with Image.open(file_obj) as source:
-            image = ImageOps.exif_transpose(source).convert('RGB')
-        return image
+        recognizer = _get_face_recognizer()
+    except Exception:
+        logger.warning('SFace recognizer unavailable; storing faces without embeddings.', exc_info=True)
+        return [None] * len(detections)
+
+    bgr = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    embeddings = []
+    for *_box, landmark_row in detections:
+        if landmark_row is None:
+            embeddings.append(None)
+            continue
+        try:
+            with _FACE_RECOGNIZER_LOCK:
+                # YuNet rows carry eye/nose/mouth landmarks, so SFace gets a properly aligned crop.
+                crop = recognizer.alignCrop(bgr, np.asarray(landmark_row, dtype=np.float32))
+                feature = recognizer.feature(crop)
+        except Exception:
+            logger.warning('Unable to compute face embedding.', exc_info=True)
+            embeddings.append(None)
+            continue
+        vector = np.asarray(feature, dtype=np.float32).reshape(-1)
+        norm = float(np.linalg.norm(vector))
+        if vector.size != FACE_EMBEDDING_DIM or norm <= 0:
+            embeddings.append(None)
+            continue
+        embeddings.append((vector / norm).astype(np.float16).tobytes())
+    return embeddings
+
+
+def configure_opencv_threads(worker_concurrency: int | None = None) -> int:
+    """Give this process its share of the cores so prefork children do not oversubscribe them."""
+    global _OPENCV_THREADS
+    configured = int(getattr(settings, 'MEDIA_OPENCV_THREADS', 0) or 0)
+    if configured > 0:
+        threads = configured
+    else:
+        threads = max(1, (os.cpu_count() or 1) // max(int(worker_concurrency or 1), 1))
+    if cv2 is not None:
+        cv2.setNumThreads(threads)
+    _OPENCV_THREADS = threads
+    return threads
+
+
+def warm_media_models() -> dict[str, float]:
+    """Load the configured models and run one tiny inference each; returns milliseconds per model."""
+    timings_ms = {}
+    probe = Image.new('RGB', (320, 240), color=(128, 128, 128))
+
+    def warm(name, callback):
+        started_at = time.perf_counter()
+        try:
+            callback()
+        except Exception:
+            logger.warning('Unable to warm up %s model.', name, exc_info=True)
+            return
+        timings_ms[name] = round((time.perf_counter() - started_at) * 1000.0, 1)
+
+    def assets_present(group):
+        model_dir = _get_colorization_model_dir()
+        return all(os.path.exists(os.path.join(model_dir, asset['file_name'])) for asset in MODEL_ASSET_GROUPS[group])
+
+    # Warmup never downloads: missing files are fetched once by the parent worker, not by every child.
+    configured_backend = str(getattr(settings, 'MEDIA_FACE_DETECTOR_BACKEND', FACE_DETECTOR_HAAR) or '').strip().lower()
+    if configured_backend != FACE_DETECTOR_YUNET or assets_present('yunet'):
+        warm('face_detector', lambda: detect_faces_in_image(probe))
+    if is_face_embedding_enabled() and assets_present('sface'):
+        warm('face_recognizer', _get_face_recognizer)
+    if cv2 is not None and assets_present('colorization'):
+        warm('colorization', lambda: _apply_dnn_colorization(np.asarray(probe)))
+    return timings_ms
+
+
+def get_face_detector_backend() -> str:
+    """The backend this process detects with; resolved once, so a missing YuNet model is not retried per call."""
+    global _RESOLVED_FACE_DETECTOR
+    configured = str(getattr(settings, 'MEDIA_FACE_DETECTOR_BACKEND', FACE_DETECTOR_HAAR) or '').strip().lower()
+    if _RESOLVED_FACE_DETECTOR is not None and _RESOLVED_FACE_DETECTOR[0] == configured:
+        return _RESOLVED_FACE_DETECTOR[1]
+
+    backend = configured if configured in FACE_DETECTOR_MODELS else FACE_DETECTOR_HAAR
+    if backend == FACE_DETECTOR_YUNET:
+        try:
+            _get_yunet_detector()
+        except Exception:
+            logger.warning('YuNet face detector unavailable; falling back to the Haar cascade.', exc_info=True)
+            backend = FACE_DETECTOR_HAAR
+    _RESOLVED_FACE_DETECTOR = (configured, backend)
+    return backend
+
+
+def get_face_detector_model_name() -> str:
+    return FACE_DETECTOR_MODELS[get_face_detector_backend()]
+
+
+def warm_face_detector():
+    """Load the face model once so a batch of items does not pay the load cost per item."""
+    if get_face_detector_backend() == FACE_DETECTOR_YUNET:
+        return _get_yunet_detector()
+    return _get_face_classifier()
+
+
+def _load_rgb_image(file_obj: Any, *, max_side: int | None = None, rotation: int = 0):
+    try:
+        with open_cached_file(file_obj) as handle, Image.open(handle) as source:
+            if max_side:
+                # JPEG decodes straight to 1/2, 1/4 or 1/8 scale, skipping most of the full-size decode.
+                source.draft('RGB', (max_side, max_side))
+            image = decode_rgb_image(source, rotation=rotation)
     except (UnidentifiedImageError, OSError):
         return None
-    finally:
-        if opened_here and hasattr(file_obj, 'close'):
-            try:
-                file_obj.close()
-            except Exception:
-                pass
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return image
 
 
 def _normalize_face_coordinates(x: int, y: int, w: int, h: int, width: int, height: int):
@@ -186,8 +489,168 @@ def _build_face_thumbnail(image: Image.Image, x: int, y: int, w: int, h: int) ->
     return buffer.getvalue()
 
 
-def detect_faces(file_obj: Any, *, min_face_size_px: int = 36, max_faces: int = 30):
-    image = _load_rgb_image(file_obj)
+def pack_thumbnail_sprite(thumbnails: list[bytes]) -> tuple[bytes, list[dict[str, int] | None]]:
+    """Lay face thumbnails out on a near-square grid and encode them as one JPEG sprite.
+
+    Returns the sprite bytes and, per input, its pixel box in the sprite (None for undecodable input).
+    """
+    crops = []
+    for thumbnail in thumbnails:
+        try:
+            with Image.open(io.BytesIO(thumbnail)) as opened:
+                crops.append(opened.convert('RGB'))
+        except (UnidentifiedImageError, OSError):
+            crops.append(None)
+    decoded = [crop for crop in crops if crop is not None]
+    if not decoded:
+        return b'', [None] * len(thumbnails)
+
+    columns = max(1, int(np.ceil(np.sqrt(len(decoded)))))
+    rows = int(np.ceil(len(decoded) / columns))
+    cell_width = max(crop.width for crop in decoded)
+    cell_height = max(crop.height for crop in decoded)
+    sprite = Image.new('RGB', (columns * cell_width, rows * cell_height), (255, 255, 255))
+    boxes = []
+    slot = 0
+    for crop in crops:
+        if crop is None:
+            boxes.append(None)
+            continue
+        x = (slot % columns) * cell_width
+        y = (slot // columns) * cell_height
+        sprite.paste(crop, (x, y))
+        boxes.append({'x': x, 'y': y, 'w': crop.width, 'h': crop.height})
+        slot += 1
+
+    for box in boxes:
+        if box is not None:
+            box.update(sprite_w=sprite.width, sprite_h=sprite.height)
+
+    buffer = io.BytesIO()
+    sprite.save(buffer, format='JPEG', quality=88, optimize=True)
+    return buffer.getvalue(), boxes
+
+
+_CLOCKWISE_TRANSPOSE = {
+    90: Image.Transpose.ROTATE_270,
+    180: Image.Transpose.ROTATE_180,
+    270: Image.Transpose.ROTATE_90,
+}
+
+
+def apply_display_rotation(image: Image.Image, rotation: int) -> Image.Image:
+    """Turn ``image`` clockwise by a stored display rotation; quarter turns are exact pixel moves."""
+    transpose = _CLOCKWISE_TRANSPOSE.get(int(rotation or 0) % 360)
+    if transpose is None:
+        return image
+    rotated = image.transpose(transpose)
+    image.close()
+    return rotated
+
+
+def decode_rgb_image(source: Image.Image, *, rotation: int = 0) -> Image.Image:
+    return apply_display_rotation(ImageOps.exif_transpose(source).convert('RGB'), rotation)
+
+
+def detect_faces(
+    file_obj: Any,
+    *,
+    min_face_size_px: int = 36,
+    max_faces: int = 30,
+    backend: str | None = None,
+    rotation: int = 0,
+):
+    image = _load_rgb_image(file_obj, rotation=rotation)
+    return detect_faces_in_image(image, min_face_size_px=min_face_size_px, max_faces=max_faces, backend=backend)
+
+
+def _detect_haar_boxes(image: Image.Image, *, min_face_size_px: int):
+    classifier = _get_face_classifier()
+    width, height = image.size
+    gray = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
+
+    dynamic_min_face = max(min_face_size_px, int(min(width, height) * 0.06))
+    detections = classifier.detectMultiScale(
+        gray,
+        scaleFactor=1.12,
+        minNeighbors=5,
+        minSize=(dynamic_min_face, dynamic_min_face),
+    )
+
+    boxes = []
+    for raw_x, raw_y, raw_w, raw_h in detections:
+        relative_size = min(int(raw_w), int(raw_h)) / float(max(width, height))
+        # The cascade has no score; keep the historical size-based estimate.
+        confidence = min(0.98, max(0.55, 0.55 + relative_size))
+        boxes.append((int(raw_x), int(raw_y), int(raw_w), int(raw_h), confidence, None))
+    return boxes
+
+
+def _build_pyramid_scales(width: int, height: int) -> list[float]:
+    max_side = max(int(getattr(settings, 'MEDIA_FACE_DETECTION_MAX_SIDE', 1280) or 1280), 160)
+    levels = max(int(getattr(settings, 'MEDIA_FACE_DETECTION_PYRAMID_LEVELS', 2) or 1), 1)
+    scale = min(1.0, max_side / float(max(width, height)))
+    scales = []
+    for _level in range(levels):
+        scales.append(scale)
+        if scale >= 1.0:
+            break
+        scale = min(1.0, scale * 2.0)
+    return scales
+
+
+def _detect_yunet_boxes(image: Image.Image, *, min_face_size_px: int):
+    detector = _get_yunet_detector()
+    width, height = image.size
+    bgr = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    score_threshold = float(getattr(settings, 'MEDIA_FACE_DETECTION_SCORE_THRESHOLD', 0.7))
+
+    rects = []
+    scores = []
+    landmark_rows = []
+    # Coarse levels find large faces cheaply; finer levels recover small faces in group shots.
+    for scale in _build_pyramid_scales(width, height):
+        level_width = max(int(round(width * scale)), 1)
+        level_height = max(int(round(height * scale)), 1)
+        level = bgr if scale >= 1.0 else cv2.resize(bgr, (level_width, level_height), interpolation=cv2.INTER_AREA)
+        with _YUNET_LOCK:
+            detector.setInputSize((level_width, level_height))
+            _retval, detections = detector.detect(level)
+        if detections is None:
+            continue
+        for row in detections:
+            rects.append(
+                [
+                    int(round(row[0] / scale)),
+                    int(round(row[1] / scale)),
+                    int(round(row[2] / scale)),
+                    int(round(row[3] / scale)),
+                ]
+            )
+            scores.append(float(row[-1]))
+            source_row = np.asarray(row, dtype=np.float32).copy()
+            source_row[:14] /= scale
+            landmark_rows.append(source_row)
+
+    if not rects:
+        return []
+    keep = cv2.dnn.NMSBoxes(rects, scores, score_threshold, 0.3)
+    boxes = []
+    for index in np.array(keep).flatten():
+        x, y, w, h = rects[int(index)]
+        if min(w, h) < min_face_size_px:
+            continue
+        boxes.append((x, y, w, h, scores[int(index)], landmark_rows[int(index)]))
+    return boxes
+
+
+def detect_faces_in_image(
+    image: Image.Image | None,
+    *,
+    min_face_size_px: int = 36,
+    max_faces: int = 30,
+    backend: str | None = None,
+):
     if image is None:
         return {
             'is_image': False,
@@ -205,24 +668,18 @@ def detect_faces(file_obj: Any, *, min_face_size_px: int = 36, max_faces: int =
             'faces': [],
         }
 
-    classifier = _get_face_classifier()
-    rgb_array = np.array(image)
-    gray = cv2.cvtColor(rgb_array, cv2.COLOR_RGB2GRAY)
-
-    dynamic_min_face = max(min_face_size_px, int(min(width, height) * 0.06))
-    detections = classifier.detectMultiScale(
-        gray,
-        scaleFactor=1.12,
-        minNeighbors=5,
-        minSize=(dynamic_min_face, dynamic_min_face),
-    )
+    resolved_backend = backend or get_face_detector_backend()
+    if resolved_backend == FACE_DETECTOR_YUNET:
+        detections = _detect_yunet_boxes(image, min_face_size_px=min_face_size_px)
+    else:
+        detections = _detect_haar_boxes(image, min_face_size_px=min_face_size_px)
 
-    candidates = []
-    for raw_x, raw_y, raw_w, raw_h in detections:
+    clipped = []
+    for raw_x, raw_y, raw_w, raw_h, raw_confidence, landmark_row in detections:
         x = max(0, int(raw_x))
         y = max(0, int(raw_y))
-        w = max(1, int(raw_w))
-        h = max(1, int(raw_h))
+        w = max(1, int(raw_w) - (x - int(raw_x)))
+        h = max(1, int(raw_h) - (y - int(raw_y)))
 
         if x + w > width:
             w = width - x
@@ -230,31 +687,46 @@ def detect_faces(file_obj: Any, *, min_face_size_px: int = 36, max_faces: int =
             h = height - y
         if w <= 0 or h <= 0:
             continue
+        clipped.append((x, y, w, h, raw_confidence, landmark_row))
 
-        relative_size = min(w, h) / float(max(width, height))
-        confidence = round(min(0.98, max(0.55, 0.55 + relative_size)), 3)
-        candidates.append(
+    clipped.sort(key=lambda box: box[2] * box[3], reverse=True)
+    clipped = clipped[:max_faces]
+    embeddings = _compute_face_embeddings(image, clipped)
+
+    trimmed = []
+    for (x, y, w, h, raw_confidence, _landmark_row), embedding in zip(clipped, embeddings):
+        trimmed.append(
             {
                 'face_coordinates': _normalize_face_coordinates(x, y, w, h, width, height),
-                'confidence': confidence,
+                'confidence': round(float(raw_confidence), 3),
                 'thumbnail_bytes': _build_face_thumbnail(image, x, y, w, h),
-                'pixel_area': w * h,
+                'embedding': embedding,
             }
         )
 
-    candidates.sort(key=lambda row: row['pixel_area'], reverse=True)
-    trimmed = candidates[:max_faces]
-    for row in trimmed:
-        row.pop('pixel_area', None)
-
     return {
         'is_image': True,
         'width': width,
         'height': height,
         'faces': trimmed,
+        'model': FACE_DETECTOR_MODELS.get(resolved_backend, FACE_DETECTOR_MODELS[FACE_DETECTOR_HAAR]),
     }
 
 
+def _analysis_sample(rgb_array: np.ndarray) -> np.ndarray:
+    """Downscale very large scans for global colour statistics; percentiles barely move."""
+    height, width = rgb_array.shape[:2]
+    pixel_count = height * width
+    if cv2 is None or pixel_count <= _ANALYSIS_SAMPLE_MAX_PIXELS:
+        return rgb_array
+    scale = (_ANALYSIS_SAMPLE_MAX_PIXELS / float(pixel_count)) ** 0.5
+    return cv2.resize(
+        rgb_array,
+        (max(int(width * scale), 1), max(int(height * scale), 1)),
+        interpolation=cv2.INTER_AREA,
+    )
+
+
 def _channel_delta_stats(rgb_array: np.ndarray) -> tuple[float, float, float]:
     red = rgb_array[:, :, 0].astype(np.float32)
     green = rgb_array[:, :, 1].astype(np.float32)
@@ -322,6 +794,19 @@ def _has_strong_color_information(rgb_array: np.ndarray) -> bool:
 
 
 def _estimate_noise_level(rgb_array: np.ndarray) -> float:
+    height, width = rgb_array.shape[:2]
+    if cv2 is not None and height * width > _ANALYSIS_SAMPLE_MAX_PIXELS:
+        # Grain does not survive downscaling, so sample full-resolution crops on a grid instead.
+        crop_side = 512
+        residuals = []
+        for top in np.linspace(0, max(height - crop_side, 0), 4).astype(int):
+            for left in np.linspace(0, max(width - crop_side, 0), 4).astype(int):
+                crop = rgb_array[top:top + crop_side, left:left + crop_side]
+                gray = cv2.cvtColor(np.ascontiguousarray(crop), cv2.COLOR_RGB2GRAY).astype(np.float32)
+                blurred = cv2.GaussianBlur(gray, (0, 0), sigmaX=1.3, sigmaY=1.3)
+                residuals.append(np.abs(gray - blurred).reshape(-1))
+        return float(np.percentile(np.concatenate(residuals), 70))
+
     if cv2 is None:
         gray = np.asarray(Image.fromarray(rgb_array, mode='RGB').convert('L'), dtype=np.float32)
         blurred = np.asarray(
@@ -342,6 +827,7 @@ def _denoise_rgb_array(
     *,
     is_black_and_white: bool,
     noise_level: float,
+    stats: dict | None = None,
 ) -> np.ndarray:
     if cv2 is None:
         image = Image.fromarray(rgb_array, mode='RGB')
@@ -350,32 +836,102 @@ def _denoise_rgb_array(
             image = image.filter(ImageFilter.GaussianBlur(radius=0.8))
         return np.array(image)
 
-    bgr = cv2.cvtColor(rgb_array, cv2.COLOR_RGB2BGR)
     normalized_noise = max(0.0, min(1.0, noise_level / 32.0))
     if is_black_and_white:
-        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
         h_strength = int(round(9 + normalized_noise * 10))
-        denoised_gray = cv2.fastNlMeansDenoising(
-            gray,
-            None,
-            h=h_strength,
-            templateWindowSize=7,
-            searchWindowSize=21,
-        )
-        restored_gray = cv2.cvtColor(denoised_gray, cv2.COLOR_GRAY2RGB)
-        return restored_gray
-
-    h_strength = int(round(6 + normalized_noise * 10))
-    h_color_strength = int(round(6 + normalized_noise * 8))
-    denoised_bgr = cv2.fastNlMeansDenoisingColored(
-        bgr,
-        None,
-        h=h_strength,
-        hColor=h_color_strength,
-        templateWindowSize=7,
-        searchWindowSize=21,
-    )
-    return cv2.cvtColor(denoised_bgr, cv2.COLOR_BGR2RGB)
+
+        def denoise_tile(tile: np.ndarray) -> np.ndarray:
+            gray = cv2.cvtColor(tile, cv2.COLOR_RGB2GRAY)
+            denoised_gray = cv2.fastNlMeansDenoising(
+                gray,
+                None,
+                h=h_strength,
+                templateWindowSize=_DENOISE_TEMPLATE_WINDOW,
+                searchWindowSize=_DENOISE_SEARCH_WINDOW,
+            )
+            return cv2.cvtColor(denoised_gray, cv2.COLOR_GRAY2RGB)
+    else:
+        h_strength = int(round(6 + normalized_noise * 10))
+        h_color_strength = int(round(6 + normalized_noise * 8))
+
+        def denoise_tile(tile: np.ndarray) -> np.ndarray:
+            denoised_bgr = cv2.fastNlMeansDenoisingColored(
+                cv2.cvtColor(tile, cv2.COLOR_RGB2BGR),
+                None,
+                h=h_strength,
+                hColor=h_color_strength,
+                templateWindowSize=_DENOISE_TEMPLATE_WINDOW,
+                searchWindowSize=_DENOISE_SEARCH_WINDOW,
+            )
+            return cv2.cvtColor(denoised_bgr, cv2.COLOR_BGR2RGB)
+
+    return _run_tiled(rgb_array, denoise_tile, stats=stats)
+
+
+def _resolve_tiling_plan(height: int, width: int) -> dict[str, int]:
+    tile_size = max(int(getattr(settings, 'MEDIA_RESTORATION_TILE_SIZE', 1024) or 1024), 128)
+    budget_bytes = max(int(getattr(settings, 'MEDIA_RESTORATION_MEMORY_BUDGET_MB', 768) or 768), 64) * 1024 * 1024
+    configured_workers = int(getattr(settings, 'MEDIA_RESTORATION_TILE_WORKERS', 0) or 0)
+    workers = configured_workers if configured_workers > 0 else min(_OPENCV_THREADS or os.cpu_count() or 1, 4)
+
+    def tile_cost(side: int) -> int:
+        return (side + 2 * _DENOISE_TILE_HALO) ** 2 * _DENOISE_BYTES_PER_TILE_PIXEL
+
+    # Shrink tiles until at least one fits the budget, then cap concurrency by what fits.
+    while tile_size > 128 and tile_cost(tile_size) > budget_bytes:
+        tile_size //= 2
+    workers = max(1, min(workers, budget_bytes // max(tile_cost(tile_size), 1)))
+    tiles = ((height + tile_size - 1) // tile_size) * ((width + tile_size - 1) // tile_size)
+    return {
+        'tile_size': tile_size,
+        'halo': _DENOISE_TILE_HALO,
+        'workers': max(1, min(workers, tiles)),
+        'tiles': tiles,
+    }
+
+
+def _run_tiled(rgb_array: np.ndarray, process_tile, *, stats: dict | None = None) -> np.ndarray:
+    """Apply a local filter tile by tile with a halo, writing only each tile's core into the output."""
+    height, width = rgb_array.shape[:2]
+    plan = _resolve_tiling_plan(height, width)
+    tile_size = plan['tile_size']
+    halo = plan['halo']
+    output = np.empty_like(rgb_array)
+
+    def run(origin):
+        top, left = origin
+        bottom = min(top + tile_size, height)
+        right = min(left + tile_size, width)
+        padded_top = max(top - halo, 0)
+        padded_left = max(left - halo, 0)
+        padded_bottom = min(bottom + halo, height)
+        padded_right = min(right + halo, width)
+        processed = process_tile(np.ascontiguousarray(rgb_array[padded_top:padded_bottom, padded_left:padded_right]))
+        output[top:bottom, left:right] = processed[
+            top - padded_top:bottom - padded_top,
+            left - padded_left:right - padded_left,
+        ]
+
+    origins = [(top, left) for top in range(0, height, tile_size) for left in range(0, width, tile_size)]
+    if plan['workers'] == 1 or len(origins) == 1:
+        for origin in origins:
+            run(origin)
+    else:
+        # OpenCV releases the GIL; bounding in-flight tiles keeps peak memory within the budget.
+        with ThreadPoolExecutor(max_workers=plan['workers'], thread_name_prefix='restore-tile') as executor:
+            pending = set()
+            for origin in origins:
+                if len(pending) >= plan['workers']:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(run, origin))
+            for future in pending:
+                future.result()
+
+    if stats is not None:
+        stats.update(plan)
+    return output
 
 
 def _apply_fallback_warm_colorization(rgb_array: np.ndarray, *, blend_strength: float) -> np.ndarray:
@@ -453,18 +1009,44 @@ def restore_legacy_photo(
     *,
     apply_colorize: bool = True,
     apply_denoise: bool = True,
+    max_side: int | None = None,
+    rotation: int = 0,
+    checkpoint: Callable[[str], None] | None = None,
 ) -> dict[str, Any]:
-    image = _load_rgb_image(file_obj)
+    """Restore a scan; ``max_side`` runs the same pipeline on a downscaled copy for quick previews.
+
+    ``rotation`` is the file's stored display rotation, so the output comes out the way it is shown.
+    ``checkpoint`` is called with each finished stage name and may raise to abandon the run early.
+    """
+    timings_ms = {}
+    started_at = time.perf_counter()
+    stage_started_at = started_at
+
+    def finish_stage(name: str):
+        nonlocal stage_started_at
+        now = time.perf_counter()
+        timings_ms[name] = round((now - stage_started_at) * 1000.0, 1)
+        stage_started_at = now
+        if checkpoint is not None:
+            checkpoint(name)
+
+    image = _load_rgb_image(file_obj, max_side=max_side, rotation=rotation)
     if image is None:
         raise UnidentifiedImageError('The selected file is not a valid image.')
 
     rgb_array = np.array(image)
+    image.close()
     if rgb_array.size == 0:
         raise ValueError('Image has no readable pixel data.')
+    finish_stage('decode')
 
-    is_black_and_white = _is_mostly_black_and_white(rgb_array)
-    has_strong_color = _has_strong_color_information(rgb_array)
+    analysis_sample = _analysis_sample(rgb_array)
+    is_black_and_white = _is_mostly_black_and_white(analysis_sample)
+    has_strong_color = _has_strong_color_information(analysis_sample)
+    del analysis_sample
     noise_level = _estimate_noise_level(rgb_array)
+    finish_stage('analyze')
+    tiling = {}
     warnings = []
     applied_colorize = False
     applied_denoise = False
@@ -476,8 +1058,10 @@ def restore_legacy_photo(
             working_array,
             is_black_and_white=is_black_and_white,
             noise_level=noise_level,
+            stats=tiling,
         )
         applied_denoise = True
+        finish_stage('denoise')
 
     if apply_colorize:
         if is_black_and_white or not has_strong_color:
@@ -503,12 +1087,17 @@ def restore_legacy_photo(
             colorization_method = 'faded-color-enhance'
             applied_colorize = True
 
+        finish_stage('colorize')
+
     working_array = _enhance_restored_rgb(working_array)
+    finish_stage('enhance')
     output_image = Image.fromarray(working_array, mode='RGB')
 
     output_buffer = io.BytesIO()
     output_image.save(output_buffer, format='JPEG', quality=92, optimize=True)
     output_bytes = output_buffer.getvalue()
+    finish_stage('encode')
+    timings_ms['total'] = round((time.perf_counter() - started_at) * 1000.0, 1)
 
     return {
         'image_bytes': output_bytes,
@@ -521,6 +1110,9 @@ def restore_legacy_photo(
         },
         'noise_level': round(float(noise_level), 3),
         'colorization_method': colorization_method,
+        'is_preview': bool(max_side),
+        'timings_ms': timings_ms,
+        'tiling': tiling,
         'warnings': warnings,
         'format': 'JPEG',
         'mime_type': 'image/jpeg',
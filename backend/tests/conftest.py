@@ -3,6 +3,35 @@ from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from unittest.mock import patch, MagicMock
 
+@pytest.fixture(autouse=True)
+def local_media_task_coordination(settings, monkeypatch):
+    from media.supersession import reset_supersession_stats
+
+    # A fresh in-process token store per test; no broker is needed for cancellation or backpressure checks.
+    settings.MEDIA_TASK_CANCELLATION_URL = 'locmem://'
+    settings.MEDIA_TASK_REVOKE_SUPERSEDED = False
+    settings.MEDIA_SCHEDULER_MAX_BROKER_DEPTH = 0
+    monkeypatch.setattr('media.supersession._CLIENT', None)
+    reset_supersession_stats()
+
+
+@pytest.fixture(autouse=True)
+def storage_deletion_drainer():
+    # Files of deleted rows wait in the deletion outbox; tests that check storage drain it themselves.
+    with patch('core.tasks.drain_storage_deletions_task.apply_async') as mocked:
+        yield mocked
+
+
+@pytest.fixture
+def local_storage(settings, tmp_path):
+    # Real files under a per-test directory, for tests that check what lands in (or leaves) storage.
+    settings.STORAGES = {
+        **settings.STORAGES,
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+    }
+    return tmp_path
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
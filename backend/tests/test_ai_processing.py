@@ -110,3 +110,66 @@ class TestAIProcessing:
         # Initially it should be PENDING or PROCESSING (if mock handled it)
         # In our case, the mock just records the call.
         assert mock_ai_service['process'].called
+
+
+@pytest.mark.django_db
+class TestSinglePassAnalysis:
+    def test_analysis_task_reads_each_file_once_and_updates_both_stages(self, settings, tmp_path):
+        from io import BytesIO
+        from unittest.mock import patch
+
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from media import tasks as media_tasks
+        from media.tasks import analyze_media_task
+
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+        }
+        exif = Image.Exif()
+        exif[0x0132] = '1987:06:14 10:30:00'
+        buffer = BytesIO()
+        Image.new('RGB', (64, 48), (200, 180, 160)).save(buffer, format='JPEG', exif=exif)
+        media = MediaItemFactory(
+            file=SimpleUploadedFile('family.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            exif_task_id='analysis-1',
+            face_detection_task_id='analysis-1',
+        )
+
+        with patch.object(media_tasks, 'open_cached_file', wraps=media_tasks.open_cached_file) as mocked_open:
+            result = analyze_media_task.apply(args=[str(media.id)], task_id='analysis-1').get()
+
+        media.refresh_from_db()
+        assert mocked_open.call_count == 1
+        assert result['status'] == 'completed'
+        assert media.exif_status == MediaItem.ExifStatus.AWAITING_CONFIRMATION
+        assert media.exif_extracted_data['candidates'][0]['date_taken'].startswith('1987-06-14T10:30:00')
+        assert media.face_detection_status == MediaItem.FaceDetectionStatus.NOT_AVAILABLE
+        assert media.face_detection_data['processed_image_files'] == 1
+
+    def test_analysis_task_skips_stage_that_was_requeued(self, settings, tmp_path):
+        from io import BytesIO
+
+        from PIL import Image
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from media.tasks import analyze_media_task
+
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+        }
+        buffer = BytesIO()
+        Image.new('RGB', (32, 32), (10, 10, 10)).save(buffer, format='JPEG')
+        media = MediaItemFactory(
+            file=SimpleUploadedFile('plain.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            exif_task_id='analysis-1',
+            face_detection_task_id='face-rerun',
+            face_detection_status=MediaItem.FaceDetectionStatus.QUEUED,
+        )
+
+        analyze_media_task.apply(args=[str(media.id)], task_id='analysis-1').get()
+
+        media.refresh_from_db()
+        assert media.exif_status == MediaItem.ExifStatus.NOT_AVAILABLE
+        assert media.face_detection_status == MediaItem.FaceDetectionStatus.QUEUED
@@ -0,0 +1,144 @@
+import struct
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from mutagen.id3 import ID3, TDRC
+
+from media import tasks as media_tasks
+from media.av_metadata import extract_av_metadata_payload
+from media.models import MediaItem, MediaTaskTicket
+from media.ranged_storage import get_ranged_read_stats, reset_ranged_read_stats
+from media.services import AIProcessingService
+from .factories import MediaItemFactory
+
+
+def _box(box_type, payload):
+    return struct.pack('>I', len(payload) + 8) + box_type + payload
+
+
+def _full_box(box_type, payload):
+    return _box(box_type, bytes(4) + payload)
+
+
+def _apple_metadata(entries):
+    keys = b''.join(_box(b'mdta', name.encode()) for name in entries)
+    items = b''.join(
+        _box(struct.pack('>I', index), _box(b'data', struct.pack('>II', 1, 0) + value.encode()))
+        for index, value in enumerate(entries.values(), start=1)
+    )
+    # QuickTime writes meta as a plain box, unlike the ISO full box.
+    handler = _full_box(b'hdlr', bytes(4) + b'mdta' + bytes(12))
+    return _box(b'meta', handler + _full_box(b'keys', struct.pack('>I', len(entries)) + keys) + _box(b'ilst', items))
+
+
+def _quicktime_movie(mdat_bytes=2 * 1024 * 1024):
+    # mvhd v0: created 1998-07-04 15:30:00 UTC, 600 ticks/s, 90 s long.
+    mvhd = _full_box(b'mvhd', struct.pack('>IIII', 2982068200, 2982068200, 600, 54000) + bytes(80))
+    video_track = _box(
+        b'trak',
+        _box(
+            b'mdia',
+            _full_box(b'hdlr', bytes(4) + b'vide' + bytes(12))
+            + _box(
+                b'minf',
+                _full_box(b'hdlr', bytes(4) + b'alis' + bytes(12))
+                + _box(b'stbl', _full_box(b'stsd', struct.pack('>I', 1) + _box(b'avc1', bytes(78)))),
+            ),
+        ),
+    )
+    location = b'+09.0300+038.7600/'
+    udta = _box(b'udta', _box(b'\xa9xyz', struct.pack('>HH', len(location), 0) + location))
+    metadata = _apple_metadata(
+        {
+            'com.apple.quicktime.creationdate': '1998-07-04T18:30:00+0300',
+            'com.apple.quicktime.make': 'Sony',
+        }
+    )
+    return (
+        _box(b'ftyp', b'qt  ' + bytes(4) + b'qt  ')
+        + _box(b'mdat', bytes(mdat_bytes))
+        + _box(b'moov', mvhd + video_track + udta + metadata)
+    )
+
+
+def _voice_memo():
+    # 40 silent MPEG-1 Layer III frames (128 kbit/s, 44.1 kHz, 417 bytes each) behind an ID3v2 tag.
+    frames = (b'\xff\xfb\x90\x64' + bytes(413)) * 40
+    tag = ID3()
+    tag.add(TDRC(encoding=3, text=['2004-12-25T09:15:00']))
+    buffer = BytesIO()
+    tag.save(buffer)
+    return buffer.getvalue() + frames
+
+
+@pytest.fixture
+def remote_storage(settings, tmp_path):
+    settings.MEDIA_STORAGE_CACHE_ENABLED = True
+    settings.MEDIA_STORAGE_CACHE_DIR = str(tmp_path / 'cache')
+    settings.MEDIA_EXIF_RANGE_READS = True
+    reset_ranged_read_stats()
+    return InMemoryStorage()
+
+
+def _stored_file(storage, name, payload):
+    return SimpleNamespace(storage=storage, name=storage.save(name, ContentFile(payload)), instance=None)
+
+
+class TestAudioVideoMetadata:
+    def test_movie_metadata_is_read_from_moov_behind_the_media_data(self, remote_storage):
+        stored = _stored_file(remote_storage, 'originals/home-movie.mov', _quicktime_movie())
+
+        payload = extract_av_metadata_payload(stored)
+
+        assert payload['date_taken'] == '1998-07-04T18:30:00+03:00'
+        assert payload['gps'] == {'latitude': 9.03, 'longitude': 38.76}
+        assert payload['raw_exif']['VideoCodec'] == 'avc1'
+        assert payload['raw_exif']['DurationSeconds'] == 90.0
+        assert payload['raw_exif']['Make'] == 'Sony'
+        assert get_ranged_read_stats()['bytes_fetched'] < 256 * 1024
+
+    def test_voice_memo_date_and_duration_come_from_id3(self, remote_storage):
+        stored = _stored_file(remote_storage, 'originals/memo.mp3', _voice_memo())
+
+        payload = extract_av_metadata_payload(stored)
+
+        assert payload['date_taken'].startswith('2004-12-25T09:15:00')
+        assert payload['gps'] is None
+        assert payload['raw_exif']['Container'] == 'MP3'
+        assert payload['raw_exif']['DurationSeconds'] == pytest.approx(1.04, abs=0.05)
+
+
+@pytest.mark.django_db
+class TestAudioVideoMetadataStage:
+    def test_video_item_runs_the_metadata_stage_into_confirmation(
+        self, settings, tmp_path, django_capture_on_commit_callbacks
+    ):
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+        }
+        movie = SimpleUploadedFile('home-movie.mov', _quicktime_movie(mdat_bytes=1024), content_type='video/quicktime')
+        media = MediaItemFactory(media_type=MediaItem.MediaType.VIDEO, file=movie)
+
+        with patch.object(media_tasks.extract_media_exif_task, 'apply_async') as mocked_publish:
+            with django_capture_on_commit_callbacks(execute=True):
+                AIProcessingService().enqueue_media_processing(media)
+
+        media.refresh_from_db()
+        assert media.exif_status == MediaItem.ExifStatus.QUEUED
+        assert media.face_detection_status == MediaItem.FaceDetectionStatus.NOT_AVAILABLE
+        assert mocked_publish.call_args.kwargs['task_id'] == media.exif_task_id
+        assert MediaTaskTicket.objects.get(media_item=media).task_name == 'media.tasks.extract_media_exif_task'
+
+        media_tasks.extract_media_exif_task.apply(args=[str(media.id)], task_id=media.exif_task_id).get()
+
+        media.refresh_from_db()
+        candidate = media.exif_extracted_data['candidates'][0]
+        assert media.exif_status == MediaItem.ExifStatus.AWAITING_CONFIRMATION
+        assert candidate['date_taken'] == '1998-07-04T18:30:00+03:00'
+        assert candidate['raw_exif']['DurationSeconds'] == 90.0
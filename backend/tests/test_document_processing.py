@@ -0,0 +1,193 @@
+import io
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PyPDF2 import PdfReader, PdfWriter
+from rest_framework import status
+
+from media.documents import extract_document_payload, is_pdf_source
+from media.models import MediaDocumentText, MediaItem
+from media.tasks import extract_media_document_task
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+def _build_pdf(page_texts):
+    objects = []
+    page_ids = []
+    font_id = 3
+    next_id = 4
+    for text in page_texts:
+        content = f'BT /F1 12 Tf 72 720 Td ({text}) Tj ET'.encode('latin-1')
+        content_id, page_id = next_id, next_id + 1
+        next_id += 2
+        objects.append((content_id, b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content)))
+        objects.append(
+            (
+                page_id,
+                (
+                    f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                    f'/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>'
+                ).encode('latin-1'),
+            )
+        )
+        page_ids.append(page_id)
+
+    kids = ' '.join(f'{page_id} 0 R' for page_id in page_ids)
+    objects.append((1, b'<< /Type /Catalog /Pages 2 0 R >>'))
+    objects.append((2, f'<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>'.encode('latin-1')))
+    objects.append((font_id, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'))
+    objects.sort(key=lambda entry: entry[0])
+
+    buffer = io.BytesIO()
+    buffer.write(b'%PDF-1.4\n')
+    offsets = {}
+    for object_id, body in objects:
+        offsets[object_id] = buffer.tell()
+        buffer.write(b'%d 0 obj\n%s\nendobj\n' % (object_id, body))
+    xref_offset = buffer.tell()
+    buffer.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for object_id in range(1, len(objects) + 1):
+        buffer.write(b'%010d 00000 n \n' % offsets[object_id])
+    buffer.write(b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset))
+    buffer.seek(0)
+    return buffer
+
+
+class TestDocumentExtraction:
+    def test_extracts_text_page_by_page_within_page_cap(self):
+        payload = extract_document_payload(
+            _build_pdf(['Birth certificate', 'Second page', 'Third page']),
+            max_pages=2,
+        )
+
+        assert payload['is_document'] is True
+        assert payload['page_count'] == 3
+        assert payload['extracted_page_count'] == 2
+        assert 'Birth certificate' in payload['text']
+        assert 'Third page' not in payload['text']
+        assert payload['is_truncated'] is True
+
+    def test_text_is_bounded_by_char_cap(self):
+        payload = extract_document_payload(_build_pdf(['A very long letter from grandma']), max_text_chars=10)
+
+        assert len(payload['text']) == 10
+        assert payload['is_truncated'] is True
+
+    def test_password_protected_pdf_is_reported_without_text(self):
+        writer = PdfWriter()
+        writer.append_pages_from_reader(PdfReader(_build_pdf(['Adoption papers'])))
+        writer.encrypt(user_password='family-secret', owner_password='owner-secret')
+        encrypted = io.BytesIO()
+        writer.write(encrypted)
+        encrypted.seek(0)
+
+        payload = extract_document_payload(encrypted)
+
+        assert payload['text'] == ''
+        assert payload['warnings'] == ['Document is password protected.']
+
+    def test_pdf_with_empty_user_password_is_extracted(self):
+        writer = PdfWriter()
+        writer.append_pages_from_reader(PdfReader(_build_pdf(['Adoption papers'])))
+        writer.encrypt(user_password='', owner_password='owner-secret')
+        encrypted = io.BytesIO()
+        writer.write(encrypted)
+        encrypted.seek(0)
+
+        payload = extract_document_payload(encrypted)
+
+        assert 'Adoption papers' in payload['text']
+
+    def test_non_pdf_payload_is_not_a_document(self):
+        payload = extract_document_payload(io.BytesIO(b'not a pdf at all'))
+
+        assert payload['is_document'] is False
+        assert payload['text'] == ''
+
+    def test_pdf_source_detection(self):
+        assert is_pdf_source('letter.PDF') is True
+        assert is_pdf_source('scan.bin', 'application/pdf') is True
+        assert is_pdf_source('photo.jpg', 'image/jpeg') is False
+
+
+@pytest.mark.django_db
+class TestDocumentSearch:
+    def test_search_matches_extracted_document_text(self, api_client):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault)
+        document = MediaItemFactory(
+            vault=vault,
+            uploader=user,
+            title='Old paper',
+            media_type=MediaItem.MediaType.DOCUMENT,
+            document_status=MediaItem.DocumentStatus.COMPLETED,
+        )
+        MediaItemFactory(vault=vault, uploader=user, title='Beach day')
+        MediaDocumentText.objects.create(
+            media_item=document,
+            file_id=f'primary-{document.id}',
+            original_name='certificate.pdf',
+            page_count=1,
+            extracted_page_count=1,
+            text='Certificate of marriage issued in Addis Ababa',
+        )
+
+        api_client.force_authenticate(user=user)
+        response = api_client.get(reverse('media-list'), {'vault': str(vault.id), 'search': 'marriage'})
+
+        assert response.status_code == status.HTTP_200_OK
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        assert [str(item['id']) for item in results] == [str(document.id)]
+
+    def test_document_status_lists_indexed_files(self, api_client):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault)
+        document = MediaItemFactory(
+            vault=vault,
+            uploader=user,
+            media_type=MediaItem.MediaType.DOCUMENT,
+            document_status=MediaItem.DocumentStatus.COMPLETED,
+        )
+        MediaDocumentText.objects.create(
+            media_item=document,
+            file_id=f'primary-{document.id}',
+            original_name='letter.pdf',
+            page_count=4,
+            extracted_page_count=4,
+            text='Dear family',
+        )
+
+        api_client.force_authenticate(user=user)
+        response = api_client.get(reverse('media-document-status', kwargs={'pk': document.id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['status'] == MediaItem.DocumentStatus.COMPLETED
+        assert response.data['document_count'] == 1
+        assert response.data['documents'][0]['page_count'] == 4
+
+
+@pytest.mark.django_db
+class TestDocumentTask:
+    def test_task_indexes_pdf_and_reuses_rows_by_content_hash(self, settings, tmp_path):
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+        }
+        document = MediaItemFactory(
+            media_type=MediaItem.MediaType.DOCUMENT,
+            file=SimpleUploadedFile('will.pdf', _build_pdf(['Last will and testament']).getvalue()),
+            document_task_id='doc-task-1',
+        )
+
+        first_run = extract_media_document_task.apply(args=[str(document.id)], task_id='doc-task-1').get()
+        MediaItem.objects.filter(pk=document.pk).update(document_task_id='doc-task-2')
+        second_run = extract_media_document_task.apply(args=[str(document.id)], task_id='doc-task-2').get()
+
+        document.refresh_from_db()
+        assert first_run['extracted'] == 1
+        assert second_run == {'status': 'completed', 'reason': 'documents-indexed', 'extracted': 0, 'reused': 1}
+        assert document.document_status == MediaItem.DocumentStatus.COMPLETED
+        assert 'testament' in document.document_texts.get().text
@@ -0,0 +1,137 @@
+from unittest.mock import patch
+
+import pytest
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from audit.models import AuditLog
+from core.storage_deletion import drain_storage_deletions
+from genealogy.models import MediaTag, PersonProfile
+from media import tasks as media_tasks
+from media.models import DuplicateCleanupRun, DuplicateGroup, MediaItem
+from vaults.models import Membership
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+@pytest.fixture
+def admin_vault(api_client):
+    user = UserFactory()
+    vault = FamilyVaultFactory(owner=user)
+    MembershipFactory(user=user, vault=vault, role=Membership.Roles.ADMIN)
+    api_client.force_authenticate(user=user)
+    return vault
+
+
+def _upload(name, content=b'same scan bytes'):
+    return SimpleUploadedFile(name, content, content_type='image/jpeg')
+
+
+def _start_cleanup(api_client, vault, django_capture_on_commit_callbacks, payload=None):
+    with patch.object(media_tasks.cleanup_duplicate_groups_task, 'apply_async') as mocked_cleanup:
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                reverse('vaults-cleanup-redundant', kwargs={'pk': vault.id}),
+                payload or {},
+                format='json',
+            )
+    assert response.status_code == status.HTTP_202_ACCEPTED
+    return response, mocked_cleanup.call_args.kwargs
+
+
+def _run_worker(queued, django_capture_on_commit_callbacks):
+    with patch.object(media_tasks.cleanup_duplicate_groups_task, 'apply_async') as mocked_next:
+        with django_capture_on_commit_callbacks(execute=True):
+            result = media_tasks.cleanup_duplicate_groups_task.apply(
+                args=queued['args'],
+                task_id=queued['task_id'],
+            ).get()
+    return result, mocked_next.call_args.kwargs if mocked_next.called else None
+
+
+@pytest.mark.django_db
+class TestDuplicateCleanupRuns:
+    def test_merge_moves_one_tag_per_person_and_batches_side_effects(
+        self, api_client, local_storage, admin_vault, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            primary = MediaItemFactory(vault=admin_vault, file=_upload('a.jpg'), title='', metadata={'tags': ['1950s']})
+            first_copy = MediaItemFactory(
+                vault=admin_vault,
+                file=_upload('b.jpg'),
+                title='Grandma at the lake',
+                metadata={'tags': ['lake'], 'location': 'Lake Tana'},
+                file_size=500,
+            )
+            second_copy = MediaItemFactory(
+                vault=admin_vault,
+                file=_upload('c.jpg'),
+                title='Another title',
+                metadata={'tags': ['summer']},
+                file_size=700,
+            )
+        grandma = PersonProfile.objects.create(vault=admin_vault, full_name='Grandma')
+        uncle = PersonProfile.objects.create(vault=admin_vault, full_name='Uncle')
+        MediaTag.objects.create(media_item=primary, person=uncle)
+        MediaTag.objects.create(media_item=first_copy, person=grandma, face_coordinates={'x': 0.1})
+        MediaTag.objects.create(media_item=second_copy, person=grandma, face_coordinates={'x': 0.2})
+        MediaTag.objects.create(media_item=second_copy, person=uncle)
+
+        response, queued = _start_cleanup(api_client, admin_vault, django_capture_on_commit_callbacks)
+        result, _next = _run_worker(queued, django_capture_on_commit_callbacks)
+
+        assert result['status'] == 'completed'
+        primary.refresh_from_db()
+        assert primary.title == 'Grandma at the lake'
+        assert primary.metadata == {'tags': ['1950s', 'lake', 'summer'], 'location': 'Lake Tana'}
+        assert sorted(
+            MediaTag.objects.filter(media_item=primary).values_list('person__full_name', 'face_coordinates')
+        ) == [('Grandma', {'x': 0.1}), ('Uncle', None)]
+        assert list(MediaItem.objects.filter(vault=admin_vault)) == [primary]
+        assert drain_storage_deletions()['deleted'] == 2
+        stored_files = [
+            path.relative_to(local_storage).as_posix() for path in local_storage.rglob('*') if path.is_file()
+        ]
+        assert stored_files == [primary.file.name]
+        assert AuditLog.objects.filter(
+            content_type=ContentType.objects.get_for_model(MediaItem),
+            action=AuditLog.Action.DELETE,
+            object_id__in=[first_copy.id, second_copy.id],
+        ).count() == 2
+        assert not DuplicateGroup.objects.filter(vault=admin_vault).exists()
+
+        run = DuplicateCleanupRun.objects.get(pk=response.data['id'])
+        assert (run.processed_groups, run.deleted_items, run.recovered_bytes) == (1, 2, 1200)
+
+    def test_runs_resume_after_the_checkpoint(
+        self, api_client, local_storage, admin_vault, django_capture_on_commit_callbacks, monkeypatch
+    ):
+        monkeypatch.setattr(media_tasks, 'DUPLICATE_CLEANUP_GROUPS_PER_TASK', 1)
+        with django_capture_on_commit_callbacks(execute=True):
+            for content in (b'first', b'second', b'third'):
+                MediaItemFactory(vault=admin_vault, file=_upload('a.jpg', content))
+                MediaItemFactory(vault=admin_vault, file=_upload('b.jpg', content))
+
+        response, queued = _start_cleanup(api_client, admin_vault, django_capture_on_commit_callbacks)
+        result, next_queued = _run_worker(queued, django_capture_on_commit_callbacks)
+        assert result == {'status': 'continued', 'groups': 1}
+
+        # The worker died before picking up its successor; a resume starts a new chain and the old
+        # task id no longer owns the run.
+        url = reverse('vaults-cleanup-redundant', kwargs={'pk': admin_vault.id})
+        with patch.object(media_tasks.cleanup_duplicate_groups_task, 'apply_async') as mocked_resume:
+            with django_capture_on_commit_callbacks(execute=True):
+                resumed = api_client.post(url, {'action': 'resume', 'runId': response.data['id']}, format='json')
+        assert resumed.status_code == status.HTTP_202_ACCEPTED
+        assert _run_worker(next_queued, django_capture_on_commit_callbacks)[0]['reason'] == 'stale-worker'
+
+        queued = mocked_resume.call_args.kwargs
+        while queued:
+            _result, queued = _run_worker(queued, django_capture_on_commit_callbacks)
+
+        progress = api_client.get(url).data['runs'][0]
+        assert progress['status'] == DuplicateCleanupRun.Status.COMPLETED
+        assert (progress['groups_processed'], progress['deleted_items_count']) == (3, 3)
+        assert progress['progress_percent'] == 100.0
+        assert MediaItem.objects.filter(vault=admin_vault).count() == 3
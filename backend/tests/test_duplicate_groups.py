@@ -0,0 +1,195 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from core.signals import batched_row_deletion
+from media import signals as media_signals
+from media import tasks as media_tasks
+from media.models import DuplicateCleanupRun, DuplicateGroup, MediaAttachment, MediaItem
+from vaults.models import Membership
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+@pytest.fixture
+def admin_vault(api_client):
+    user = UserFactory()
+    vault = FamilyVaultFactory(owner=user)
+    MembershipFactory(user=user, vault=vault, role=Membership.Roles.ADMIN)
+    api_client.force_authenticate(user=user)
+    return vault
+
+
+def _upload(name, content=b'same scan bytes'):
+    return SimpleUploadedFile(name, content, content_type='image/jpeg')
+
+
+@pytest.mark.django_db
+class TestPersistedDuplicateGroups:
+    def test_groups_follow_hash_changes(self, local_storage, admin_vault, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            original = MediaItemFactory(vault=admin_vault, file=_upload('a.jpg'), file_size=100)
+            copy = MediaItemFactory(vault=admin_vault, file=_upload('b.jpg'), file_size=300)
+            MediaItemFactory(vault=admin_vault, file=_upload('c.jpg', b'another scan'))
+
+        group = DuplicateGroup.objects.get(vault=admin_vault)
+        assert group.primary_id == original.id
+        assert (group.item_count, group.reclaimable_bytes) == (2, 300)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            MediaAttachment.objects.create(media_item=copy, file=_upload('back.jpg', b'back of the photo'))
+        assert not DuplicateGroup.objects.filter(vault=admin_vault).exists()
+
+    def test_deleting_a_copy_drops_its_group(self, local_storage, admin_vault, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            MediaItemFactory(vault=admin_vault, file=_upload('a.jpg'))
+            copy = MediaItemFactory(vault=admin_vault, file=_upload('b.jpg'))
+        assert DuplicateGroup.objects.filter(vault=admin_vault).count() == 1
+
+        with django_capture_on_commit_callbacks(execute=True):
+            copy.delete()
+
+        assert not DuplicateGroup.objects.filter(vault=admin_vault).exists()
+
+    def test_bulk_delete_refreshes_each_group_once_after_the_batch(
+        self, local_storage, admin_vault, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            MediaItemFactory(vault=admin_vault, file=_upload('a.jpg'))
+            copies = [MediaItemFactory(vault=admin_vault, file=_upload(f'copy-{index}.jpg')) for index in range(4)]
+            for copy in copies:
+                MediaAttachment.objects.create(media_item=copy, file=_upload(f'back-{copy.pk}.jpg', b'back'))
+            MediaItemFactory(vault=admin_vault, file=_upload('b.jpg', b'other'))
+            MediaItemFactory(vault=admin_vault, file=_upload('c.jpg', b'other'))
+        assert DuplicateGroup.objects.filter(vault=admin_vault).count() == 2
+
+        refresh_groups = patch('media.signals.refresh_duplicate_groups', wraps=media_signals.refresh_duplicate_groups)
+        sync_groups = patch('media.signals.sync_duplicate_groups', wraps=media_signals.sync_duplicate_groups)
+        with refresh_groups as refresh, sync_groups as sync, django_capture_on_commit_callbacks(execute=True):
+            with batched_row_deletion():
+                MediaItem.objects.filter(pk__in=[copy.pk for copy in copies]).delete()
+
+        assert refresh.call_count == 1
+        assert sync.call_count == 1
+        assert DuplicateGroup.objects.filter(vault=admin_vault).count() == 1
+
+    def test_vault_delete_skips_group_refreshes(
+        self, api_client, local_storage, admin_vault, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            for index in range(3):
+                MediaItemFactory(vault=admin_vault, file=_upload(f'{index}.jpg'))
+
+        with patch('media.signals.refresh_duplicate_groups') as refresh, django_capture_on_commit_callbacks(
+            execute=True
+        ) as callbacks:
+            response = api_client.delete(reverse('vaults-detail', kwargs={'pk': admin_vault.id}))
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        refresh.assert_not_called()
+        assert len(callbacks) == 2  # the outbox drainer and the one deferred group refresh
+
+    def test_saves_that_leave_hashes_alone_do_not_resync(self, admin_vault, django_capture_on_commit_callbacks):
+        media = MediaItemFactory(vault=admin_vault)
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            media.title = 'Renamed'
+            media.save(update_fields=['title'])
+        assert callbacks == []
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            media.save(update_fields=['content_hash'])
+        assert len(callbacks) == 1
+
+    def test_health_analysis_never_hashes_inline_and_queues_a_backfill(
+        self, api_client, local_storage, admin_vault, django_capture_on_commit_callbacks
+    ):
+        items = [MediaItemFactory(vault=admin_vault, file=_upload(f'{index}.jpg')) for index in range(3)]
+        # Rows from before signatures existed: no content hash and no signature.
+        MediaItem.objects.filter(pk__in=[item.pk for item in items]).update(content_hash='', duplicate_signature='')
+        url = reverse('vaults-health-analysis', kwargs={'pk': admin_vault.id})
+
+        with patch('media.models.compute_storage_file_hash') as mocked_hash, patch.object(
+            media_tasks.backfill_media_hashes_task, 'apply_async'
+        ) as mocked_backfill:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['pending_hash_items'] == 3
+        assert response.data['duplicate_groups_count'] == 0
+        mocked_hash.assert_not_called()
+        assert mocked_backfill.call_args.kwargs['args'] == [str(admin_vault.id)]
+
+        media_tasks.backfill_media_hashes_task.apply(args=[str(admin_vault.id)]).get()
+        response = api_client.get(url)
+
+        assert response.data['pending_hash_items'] == 0
+        assert response.data['duplicate_groups_count'] == 1
+        assert response.data['duplicate_items_count'] == 2
+        assert response.data['groups'][0]['primary']['id'] == str(items[0].id)
+
+    def test_backfill_lock_is_shared_between_the_request_and_the_worker(
+        self, admin_vault, django_capture_on_commit_callbacks
+    ):
+        with patch.object(media_tasks.backfill_media_hashes_task, 'apply_async') as mocked_backfill:
+            with django_capture_on_commit_callbacks(execute=True):
+                assert media_tasks.schedule_hash_backfill(admin_vault.id) is True
+            # Another process has its own Django cache; the lock must not live there.
+            cache.clear()
+            assert media_tasks.schedule_hash_backfill(admin_vault.id) is False
+
+            # The worker finishing the chain releases the lock the request took.
+            media_tasks.backfill_media_hashes_task.apply(args=[str(admin_vault.id)]).get()
+            assert media_tasks.schedule_hash_backfill(admin_vault.id) is True
+
+        assert mocked_backfill.call_count == 1
+
+    def test_backfill_lock_uses_redis_set_nx_ex(self, settings, monkeypatch, admin_vault):
+        redis_client = MagicMock()
+        redis_client.set.side_effect = [True, None]
+        settings.MEDIA_TASK_CANCELLATION_URL = 'redis://coordination:6379/0'
+        monkeypatch.setattr('media.supersession._CLIENT', redis_client)
+        monkeypatch.setattr('media.supersession._CLIENT_URL', settings.MEDIA_TASK_CANCELLATION_URL)
+        lock_key = f'legacykeeper:media:lock:hash-backfill:{admin_vault.id}'
+
+        assert media_tasks.schedule_hash_backfill(admin_vault.id) is True
+        assert media_tasks.schedule_hash_backfill(admin_vault.id) is False
+        media_tasks.backfill_media_hashes_task.apply(args=[str(admin_vault.id)]).get()
+
+        redis_client.set.assert_called_with(lock_key, '1', nx=True, ex=media_tasks.HASH_BACKFILL_LOCK_SECONDS)
+        redis_client.delete.assert_called_once_with(lock_key)
+
+    def test_cleanup_reads_selected_groups_from_the_table(
+        self, api_client, local_storage, admin_vault, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            original = MediaItemFactory(vault=admin_vault, file=_upload('a.jpg'))
+            MediaItemFactory(vault=admin_vault, file=_upload('b.jpg'))
+            MediaItemFactory(vault=admin_vault, file=_upload('c.jpg', b'other'))
+            MediaItemFactory(vault=admin_vault, file=_upload('d.jpg', b'other'))
+        signature = DuplicateGroup.objects.get(vault=admin_vault, primary=original).signature
+
+        with patch.object(media_tasks.cleanup_duplicate_groups_task, 'apply_async') as mocked_cleanup:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post(
+                    reverse('vaults-cleanup-redundant', kwargs={'pk': admin_vault.id}),
+                    {'groupHashes': [signature]},
+                    format='json',
+                )
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['groups_selected'] == 1
+        with django_capture_on_commit_callbacks(execute=True):
+            media_tasks.cleanup_duplicate_groups_task.apply(
+                args=mocked_cleanup.call_args.kwargs['args'],
+                task_id=mocked_cleanup.call_args.kwargs['task_id'],
+            ).get()
+
+        run = DuplicateCleanupRun.objects.get(pk=response.data['id'])
+        assert (run.status, run.deleted_items) == (DuplicateCleanupRun.Status.COMPLETED, 1)
+        assert MediaItem.objects.filter(vault=admin_vault).count() == 3
+        assert DuplicateGroup.objects.filter(vault=admin_vault).count() == 1
@@ -0,0 +1,159 @@
+import random
+import struct
+import zlib
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+from PIL import Image
+
+from media.exif import extract_exif_payload
+from media.ranged_storage import get_ranged_read_stats, reset_ranged_read_stats
+
+
+def _exif_bytes():
+    exif = Image.Exif()
+    exif[0x0132] = '1965:03:01 09:00:00'
+    exif[0x010F] = 'Kodak'
+    exif.get_ifd(0x8825).update({1: 'N', 2: (9.0, 1.0, 48.0), 3: 'E', 4: (38.0, 45.0, 36.0)})
+    return exif.tobytes()
+
+
+def _noise_image(side=900):
+    return Image.frombytes('RGB', (side, side), random.Random(side).randbytes(side * side * 3))
+
+
+def _jpeg(**save_options):
+    buffer = BytesIO()
+    _noise_image().save(buffer, format='JPEG', quality=95, exif=_exif_bytes(), **save_options)
+    return buffer.getvalue()
+
+
+def _png_chunk(chunk_type, data):
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+def _png_with_exif_after_image_data():
+    buffer = BytesIO()
+    _noise_image().save(buffer, format='PNG', compress_level=0)
+    payload = buffer.getvalue()
+    image_end = payload.rindex(b'IEND') - 4
+    return payload[:image_end] + _png_chunk(b'eXIf', _exif_bytes()) + payload[image_end:]
+
+
+def _box(box_type, payload):
+    return struct.pack('>I', len(payload) + 8) + box_type + payload
+
+
+def _heic_with_exif():
+    exif_item = struct.pack('>I', 6) + b'Exif\x00\x00' + _exif_bytes()
+    infe = _box(b'infe', bytes([2, 0, 0, 0]) + struct.pack('>HH', 1, 0) + b'Exif' + b'\x00')
+    iinf = _box(b'iinf', bytes(4) + struct.pack('>H', 1) + infe)
+
+    def build(exif_offset):
+        # iloc v0: 4-byte offsets and lengths, no base offset.
+        extent = struct.pack('>HHHHII', 1, 1, 0, 1, exif_offset, len(exif_item))
+        iloc = _box(b'iloc', bytes(4) + bytes([0x44, 0x00]) + extent)
+        return _box(b'ftyp', b'heic' + bytes(4) + b'mif1heic') + _box(b'meta', bytes(4) + iinf + iloc)
+
+    header = build(0)
+    pixel_data = _box(b'mdat', bytes(2 * 1024 * 1024))
+    return build(len(header) + len(pixel_data) + 8) + pixel_data + _box(b'mdat', exif_item)
+
+
+@pytest.fixture
+def remote_storage(settings, tmp_path):
+    settings.MEDIA_STORAGE_CACHE_ENABLED = True
+    settings.MEDIA_STORAGE_CACHE_DIR = str(tmp_path / 'cache')
+    settings.MEDIA_EXIF_RANGE_READS = True
+    settings.MEDIA_EXIF_RANGE_INITIAL_BYTES = 64 * 1024
+    settings.MEDIA_EXIF_RANGE_MAX_BYTES = 512 * 1024
+    reset_ranged_read_stats()
+    return InMemoryStorage()
+
+
+def _stored_file(storage, name, payload):
+    saved_name = storage.save(name, ContentFile(payload))
+    return SimpleNamespace(storage=storage, name=saved_name, instance=SimpleNamespace(content_hash='hash-1'))
+
+
+def _assert_sample_exif(payload):
+    assert payload['date_taken'].startswith('1965-03-01T09:00:00')
+    assert payload['raw_exif']['Make'] == 'Kodak'
+    assert payload['gps'] == {'latitude': 9.03, 'longitude': 38.76}
+
+
+class TestRangedExifReads:
+    @pytest.mark.parametrize(
+        'name, build',
+        [
+            ('scan.jpg', _jpeg),
+            ('scan.png', _png_with_exif_after_image_data),
+            ('scan.heic', _heic_with_exif),
+        ],
+    )
+    def test_only_the_header_is_fetched(self, remote_storage, name, build):
+        content = build()
+        stored = _stored_file(remote_storage, f'originals/{name}', content)
+
+        payload = extract_exif_payload(stored)
+
+        stats = get_ranged_read_stats()
+        _assert_sample_exif(payload)
+        assert len(content) > 900 * 1024
+        assert stats['bytes_fetched'] <= 160 * 1024
+        assert stats['full_read_fallbacks'] == 0
+
+    def test_webp_exif_chunk_is_found_past_the_image_data(self, remote_storage):
+        buffer = BytesIO()
+        _noise_image().save(buffer, format='WEBP', lossless=True, exif=_exif_bytes())
+        stored = _stored_file(remote_storage, 'originals/scan.webp', buffer.getvalue())
+
+        _assert_sample_exif(extract_exif_payload(stored))
+        assert get_ranged_read_stats()['full_read_fallbacks'] == 0
+
+    def test_header_over_budget_falls_back_to_full_read(self, remote_storage, settings):
+        settings.MEDIA_EXIF_RANGE_INITIAL_BYTES = 16 * 1024
+        settings.MEDIA_EXIF_RANGE_MAX_BYTES = 32 * 1024
+        # A large ICC profile spreads the JPEG header over many APP2 segments.
+        stored = _stored_file(remote_storage, 'originals/profiled.jpg', _jpeg(icc_profile=bytes(200 * 1024)))
+
+        _assert_sample_exif(extract_exif_payload(stored))
+        stats = get_ranged_read_stats()
+        assert stats['budget_exceeded'] == 1
+        assert stats['full_read_fallbacks'] == 1
+
+    def test_s3_storage_uses_range_gets(self, remote_storage):
+        content = _jpeg()
+        requested_ranges = []
+
+        class FakeObject:
+            def __init__(self, key):
+                self.key = key
+
+            def get(self, Range):
+                requested_ranges.append((self.key, Range))
+                start, end = (int(token) for token in Range.removeprefix('bytes=').split('-'))
+                return {
+                    'Body': BytesIO(content[start : end + 1]),
+                    'ContentRange': f'bytes {start}-{min(end, len(content) - 1)}/{len(content)}',
+                }
+
+        storage = SimpleNamespace(
+            bucket=SimpleNamespace(Object=FakeObject),
+            _normalize_name=lambda name: f'media/{name}',
+            path=lambda name: (_ for _ in ()).throw(NotImplementedError()),
+        )
+        stored = SimpleNamespace(storage=storage, name='originals/scan.jpg', instance=None)
+
+        _assert_sample_exif(extract_exif_payload(stored))
+        assert requested_ranges == [('media/originals/scan.jpg', 'bytes=0-65535')]
+
+    def test_range_reads_can_be_disabled(self, remote_storage, settings):
+        settings.MEDIA_EXIF_RANGE_READS = False
+        stored = _stored_file(remote_storage, 'originals/scan.jpg', _jpeg())
+
+        _assert_sample_exif(extract_exif_payload(stored))
+        assert get_ranged_read_stats()['header_reads'] == 0
@@ -0,0 +1,103 @@
+import threading
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from media import vision
+
+
+class _FakeYuNet:
+    """Reports one face at source box (200, 100, 100, 100), scaled to whatever input size it is given."""
+
+    def __init__(self, source_width, score=0.93):
+        self.source_width = source_width
+        self.score = score
+        self.input_sizes = []
+
+    def setInputSize(self, size):
+        self.input_sizes.append(tuple(size))
+
+    def detect(self, image):
+        scale = self.input_sizes[-1][0] / self.source_width
+        row = [200 * scale, 100 * scale, 100 * scale, 100 * scale] + [0.0] * 10 + [self.score]
+        return 1, np.array([row], dtype=np.float32)
+
+
+@pytest.fixture
+def yunet_settings(settings, monkeypatch):
+    monkeypatch.setattr(vision, '_RESOLVED_FACE_DETECTOR', None)
+    settings.MEDIA_FACE_DETECTOR_BACKEND = 'yunet'
+    settings.MEDIA_FACE_DETECTION_MAX_SIDE = 500
+    settings.MEDIA_FACE_DETECTION_SCORE_THRESHOLD = 0.6
+    settings.MEDIA_FACE_EMBEDDINGS_ENABLED = False
+    return settings
+
+
+class TestYuNetFaceDetection:
+    def test_boxes_from_downscaled_copy_map_back_to_source(self, yunet_settings):
+        yunet_settings.MEDIA_FACE_DETECTION_PYRAMID_LEVELS = 1
+        detector = _FakeYuNet(source_width=2000)
+        image = Image.new('RGB', (2000, 1000), color=(120, 110, 100))
+
+        with patch.object(vision, '_get_yunet_detector', return_value=detector):
+            payload = vision.detect_faces_in_image(image)
+
+        assert detector.input_sizes == [(500, 250)]
+        assert payload['model'] == vision.FACE_DETECTOR_MODELS['yunet']
+        assert len(payload['faces']) == 1
+        assert payload['faces'][0]['confidence'] == pytest.approx(0.93)
+        assert payload['faces'][0]['face_coordinates'] == {'x': 0.1, 'y': 0.1, 'w': 0.05, 'h': 0.1}
+
+    def test_pyramid_levels_are_merged_into_one_detection(self, yunet_settings):
+        yunet_settings.MEDIA_FACE_DETECTION_PYRAMID_LEVELS = 3
+        detector = _FakeYuNet(source_width=2000)
+        image = Image.new('RGB', (2000, 1000))
+
+        with patch.object(vision, '_get_yunet_detector', return_value=detector):
+            payload = vision.detect_faces_in_image(image)
+
+        assert detector.input_sizes == [(500, 250), (1000, 500), (2000, 1000)]
+        assert len(payload['faces']) == 1
+
+    def test_low_scores_are_dropped(self, yunet_settings):
+        with patch.object(vision, '_get_yunet_detector', return_value=_FakeYuNet(source_width=800, score=0.3)):
+            payload = vision.detect_faces_in_image(Image.new('RGB', (800, 600)))
+
+        assert payload['faces'] == []
+
+    def test_unavailable_model_falls_back_to_haar(self, yunet_settings):
+        with patch.object(vision, '_get_yunet_detector', side_effect=RuntimeError('missing model')):
+            assert vision.get_face_detector_backend() == vision.FACE_DETECTOR_HAAR
+            assert vision.get_face_detector_model_name() == 'opencv-haarcascade-frontalface-default'
+
+    def test_backend_is_resolved_once_per_process(self, yunet_settings):
+        with patch.object(vision, '_get_yunet_detector', side_effect=RuntimeError('missing model')) as mocked_load:
+            for _attempt in range(3):
+                assert vision.get_face_detector_model_name() == 'opencv-haarcascade-frontalface-default'
+        assert mocked_load.call_count == 1
+
+        yunet_settings.MEDIA_FACE_DETECTOR_BACKEND = 'haar'
+        assert vision.get_face_detector_backend() == vision.FACE_DETECTOR_HAAR
+
+    def test_concurrent_first_calls_load_one_detector(self, yunet_settings, monkeypatch):
+        created = []
+
+        def slow_create(*args):
+            time.sleep(0.05)
+            created.append(object())
+            return created[-1]
+
+        monkeypatch.setattr(vision, '_YUNET_DETECTOR', None)
+        monkeypatch.setattr(vision, 'cv2', SimpleNamespace(FaceDetectorYN=SimpleNamespace(create=slow_create)))
+        with patch.object(vision, '_ensure_model_asset'):
+            threads = [threading.Thread(target=vision._get_yunet_detector) for _index in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(created) == 1
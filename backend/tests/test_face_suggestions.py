@@ -0,0 +1,185 @@
+from io import BytesIO
+from unittest.mock import patch
+from uuid import uuid4
+
+import numpy as np
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+
+from genealogy.models import MediaTag, PersonProfile
+from media import tasks as media_tasks
+from media.face_index import FaceVectorIndex, rank_labels
+from media.models import FaceEmbedding
+from media.vision import FACE_EMBEDDING_DIM, FACE_EMBEDDING_MODEL
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+def _unit_vector(seed, noise=0.0, base=None):
+    rng = np.random.default_rng(seed)
+    vector = rng.standard_normal(FACE_EMBEDDING_DIM) if base is None else base + noise * rng.standard_normal(FACE_EMBEDDING_DIM)
+    return (vector / np.linalg.norm(vector)).astype(np.float16)
+
+
+@pytest.fixture
+def face_index_dir(settings, tmp_path):
+    settings.MEDIA_FACE_INDEX_DIR = str(tmp_path / 'face-index')
+    return settings.MEDIA_FACE_INDEX_DIR
+
+
+class TestFaceVectorIndex:
+    def test_appends_are_incremental_and_visible_after_reopen(self, tmp_path):
+        index = FaceVectorIndex(str(tmp_path))
+        first_keys = [uuid4() for _ in range(3)]
+        vectors = np.vstack([_unit_vector(seed) for seed in range(4)])
+
+        assert index.append(first_keys, vectors[:3]) == 3
+        assert index.append(first_keys[:1] + [uuid4()], vectors[[0, 3]]) == 1
+
+        reopened = FaceVectorIndex(str(tmp_path))
+        reopened.refresh()
+        assert len(reopened) == 4
+        assert reopened.rows_for([first_keys[1], uuid4()]).tolist() == [1, -1]
+        assert np.allclose(reopened.take(np.array([2])), vectors[2:3].astype(np.float32))
+
+    def test_rank_labels_uses_best_match_per_label(self, tmp_path):
+        anchor_a = _unit_vector(1).astype(np.float32)
+        anchor_b = _unit_vector(2).astype(np.float32)
+        index = FaceVectorIndex(str(tmp_path))
+        index.append(
+            [uuid4() for _ in range(4)],
+            np.vstack(
+                [
+                    _unit_vector(10, 0.1, anchor_a),
+                    _unit_vector(11, 0.1, anchor_b),
+                    _unit_vector(12, 0.1, anchor_b),
+                    _unit_vector(13, 0.1, anchor_a),
+                ]
+            ),
+        )
+
+        ranked = rank_labels(index, np.array([3]), np.array([0, 1, 2]), np.array(['a', 'b', 'b']), limit=2)
+
+        assert [candidate['label'] for candidate in ranked[0]] == ['a', 'b']
+        assert ranked[0][1]['matched_faces'] == 2
+
+
+@pytest.mark.django_db
+class TestFaceEmbeddingStorage:
+    def test_analysis_stores_and_replaces_face_embeddings(self, settings, tmp_path):
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+        }
+        buffer = BytesIO()
+        Image.new('RGB', (32, 32)).save(buffer, format='JPEG')
+        media = MediaItemFactory(
+            file=SimpleUploadedFile('family.jpg', buffer.getvalue(), content_type='image/jpeg'),
+            exif_task_id='analysis-1',
+            face_detection_task_id='analysis-1',
+        )
+        face_payload = {
+            'is_image': True,
+            'width': 32,
+            'height': 32,
+            'faces': [
+                {
+                    'face_coordinates': {'x': 0.1, 'y': 0.1, 'w': 0.5, 'h': 0.5},
+                    'confidence': 0.9,
+                    'thumbnail_bytes': b'',
+                    'embedding': _unit_vector(1).tobytes(),
+                }
+            ],
+        }
+
+        with patch.object(media_tasks, 'detect_faces_in_image', return_value=face_payload):
+            media_tasks.analyze_media_task.apply(args=[str(media.id)], task_id='analysis-1').get()
+            media.face_detection_task_id = 'analysis-2'
+            media.exif_task_id = 'analysis-2'
+            media.save(update_fields=['face_detection_task_id', 'exif_task_id'])
+            media_tasks.analyze_media_task.apply(args=[str(media.id)], task_id='analysis-2').get()
+
+        media.refresh_from_db()
+        embeddings = list(FaceEmbedding.objects.filter(media_item=media))
+        assert len(embeddings) == 1
+        assert embeddings[0].face_id == media.face_detection_data['faces'][0]['face_id']
+        assert embeddings[0].model == FACE_EMBEDDING_MODEL
+        assert 'embedding' not in media.face_detection_data['faces'][0]
+
+
+@pytest.mark.django_db
+class TestFaceSuggestionApi:
+    def _create_face(self, media, face_id, vector):
+        faces = list((media.face_detection_data or {}).get('faces') or [])
+        faces.append(
+            {
+                'face_id': face_id,
+                'file_id': f'primary-{media.id}',
+                'face_coordinates': {'x': 0.1, 'y': 0.1, 'w': 0.2, 'h': 0.2},
+                'confidence': 0.9,
+            }
+        )
+        media.face_detection_data = {'faces': faces}
+        media.save(update_fields=['face_detection_data'])
+        return FaceEmbedding.objects.create(
+            vault=media.vault,
+            media_item=media,
+            face_id=face_id,
+            file_id=f'primary-{media.id}',
+            model=FACE_EMBEDDING_MODEL,
+            vector=vector.tobytes(),
+        )
+
+    def test_suggests_tagged_person_and_applies_in_batch(self, api_client, face_index_dir):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault)
+        grandma = PersonProfile.objects.create(vault=vault, full_name='Grandma Ruth')
+        uncle = PersonProfile.objects.create(vault=vault, full_name='Uncle Sam')
+        grandma_anchor = _unit_vector(1).astype(np.float32)
+        uncle_anchor = _unit_vector(2).astype(np.float32)
+
+        tagged_media = MediaItemFactory(vault=vault, uploader=user)
+        self._create_face(tagged_media, 'face-grandma', _unit_vector(10, 0.02, grandma_anchor))
+        self._create_face(tagged_media, 'face-uncle', _unit_vector(11, 0.02, uncle_anchor))
+        MediaTag.objects.create(media_item=tagged_media, person=grandma, detected_face_id='face-grandma')
+        MediaTag.objects.create(media_item=tagged_media, person=uncle, detected_face_id='face-uncle')
+
+        new_media = MediaItemFactory(vault=vault, uploader=user)
+        self._create_face(new_media, 'face-unknown', _unit_vector(12, 0.02, grandma_anchor))
+
+        api_client.force_authenticate(user=user)
+        response = api_client.get(reverse('tags-suggestions'), {'media': str(new_media.id)})
+
+        assert response.status_code == status.HTTP_200_OK
+        face = response.data['faces'][0]
+        assert face['face_id'] == 'face-unknown'
+        assert face['suggestions'][0]['person_id'] == str(grandma.id)
+        assert face['suggestions'][0]['score'] > 0.9
+
+        apply_response = api_client.post(
+            reverse('tags-apply-suggestions'),
+            {
+                'items': [
+                    {'media_item': str(new_media.id), 'detected_face_id': 'face-unknown', 'person': str(grandma.id)},
+                    {'media_item': str(new_media.id), 'detected_face_id': 'missing-face', 'person': str(uncle.id)},
+                ]
+            },
+            format='json',
+        )
+
+        assert apply_response.status_code == status.HTTP_200_OK
+        assert len(apply_response.data['applied']) == 1
+        assert apply_response.data['errors'][0]['index'] == 1
+        assert MediaTag.objects.filter(media_item=new_media, person=grandma, detected_face_id='face-unknown').exists()
+
+    def test_suggestions_require_vault_membership(self, api_client, face_index_dir):
+        outsider = UserFactory()
+        media = MediaItemFactory()
+
+        api_client.force_authenticate(user=outsider)
+        response = api_client.get(reverse('tags-suggestions'), {'media': str(media.id)})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
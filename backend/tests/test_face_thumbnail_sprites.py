@@ -0,0 +1,162 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+
+from media import tasks as media_tasks
+from media.models import MediaItem
+from media.vision import pack_thumbnail_sprite
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+def _crop(color, size=(96, 96)):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG', quality=95)
+    return buffer.getvalue()
+
+
+def _source_files(count):
+    return [
+        {
+            'file_id': f'file-{index}',
+            'file_obj': f'file-{index}',
+            'original_name': f'scan-{index}.jpg',
+            'is_primary': index == 0,
+            'mime_type': 'image/jpeg',
+            'content_hash': '',
+        }
+        for index in range(count)
+    ]
+
+
+def _two_face_detection(file_obj, **_options):
+    return {
+        'is_image': True,
+        'faces': [
+            {
+                'face_coordinates': {'x': x, 'y': 0.2, 'w': 0.2, 'h': 0.2},
+                'confidence': 0.9,
+                'thumbnail_bytes': _crop(color),
+            }
+            for x, color in ((0.1, 'red'), (0.6, 'blue'))
+        ],
+    }
+
+
+def _files(count):
+    return lambda media_item: iter(_source_files(count))
+
+
+@pytest.fixture
+def sprite_storage(settings, tmp_path):
+    settings.MEDIA_FACE_THUMBNAIL_SPRITES = True
+    settings.MEDIA_FACE_EMBEDDINGS_ENABLED = False
+    settings.STORAGES = {
+        **settings.STORAGES,
+        'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+    }
+    return tmp_path
+
+
+def _stored_objects(root):
+    return sorted(path.relative_to(root).as_posix() for path in (root / 'face-thumbnails').rglob('*') if path.is_file())
+
+
+class TestPackThumbnailSprite:
+    def test_crops_keep_their_pixels_at_their_boxes(self):
+        sprite_bytes, boxes = pack_thumbnail_sprite([_crop('red'), b'not-an-image', _crop('blue', size=(64, 80))])
+
+        with Image.open(BytesIO(sprite_bytes)) as sprite:
+            sprite = sprite.convert('RGB')
+            assert boxes[1] is None
+            assert {box['sprite_w'] for box in (boxes[0], boxes[2])} == {sprite.width}
+            red = sprite.getpixel((boxes[0]['x'] + 40, boxes[0]['y'] + 40))
+            blue = sprite.getpixel((boxes[2]['x'] + 30, boxes[2]['y'] + 40))
+        assert red[0] > 200 and red[2] < 60
+        assert blue[2] > 200 and blue[0] < 60
+        assert (boxes[2]['w'], boxes[2]['h']) == (64, 80)
+
+
+@pytest.mark.django_db
+class TestFaceThumbnailSprites:
+    def test_serial_run_writes_one_sprite_for_all_faces(self, sprite_storage):
+        media = MediaItemFactory(face_detection_task_id='faces-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(1)), patch.object(
+            media_tasks, 'detect_faces', side_effect=_two_face_detection
+        ):
+            media_tasks.detect_media_faces_task.apply(args=[str(media.id)], task_id='faces-1').get()
+
+        media.refresh_from_db()
+        faces = media.face_detection_data['faces']
+        assert _stored_objects(sprite_storage) == [f'face-thumbnails/{media.id}/faces-1/sprite.jpg']
+        assert {face['thumbnail_path'] for face in faces} == {f'face-thumbnails/{media.id}/faces-1/sprite.jpg'}
+        assert faces[0]['thumbnail_sprite'] != faces[1]['thumbnail_sprite']
+
+        media_tasks._cleanup_face_thumbnails(media.face_detection_data)
+        assert _stored_objects(sprite_storage) == []
+
+    def test_fanout_callback_packs_every_file_into_one_sprite(self, sprite_storage):
+        media = MediaItemFactory(face_detection_task_id='faces-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(2)), patch.object(
+            media_tasks, 'detect_faces', side_effect=_two_face_detection
+        ):
+            results = [
+                media_tasks.detect_media_file_faces_task.apply(args=[str(media.id), 'faces-1', file_id]).get()
+                for file_id in ('file-0', 'file-1')
+            ]
+        media_tasks.finish_media_faces_fanout_task.apply(args=[results, str(media.id), 'faces-1']).get()
+
+        media.refresh_from_db()
+        faces = media.face_detection_data['faces']
+        assert all(entry['thumbnail_paths'] == [] for entry in results)
+        assert len(faces) == 4
+        assert len({face['thumbnail_path'] for face in faces}) == 1
+        assert len({(face['thumbnail_sprite']['x'], face['thumbnail_sprite']['y']) for face in faces}) == 4
+        assert len(_stored_objects(sprite_storage)) == 1
+
+    def test_status_api_returns_sprite_boxes(self, api_client):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault)
+        sprite_box = {'x': 96, 'y': 0, 'w': 96, 'h': 96, 'sprite_w': 192, 'sprite_h': 96}
+        media = MediaItemFactory(
+            vault=vault,
+            uploader=user,
+            face_detection_status=MediaItem.FaceDetectionStatus.COMPLETED,
+            face_detection_data={
+                'faces': [
+                    {
+                        'face_id': 'face_1',
+                        'file_id': 'file-0',
+                        'face_coordinates': {'x': 0.1, 'y': 0.1, 'w': 0.2, 'h': 0.2},
+                        'thumbnail_path': 'face-thumbnails/sprite.jpg',
+                        'thumbnail_sprite': sprite_box,
+                    },
+                    {
+                        'face_id': 'face_2',
+                        'file_id': 'file-0',
+                        'face_coordinates': {'x': 0.5, 'y': 0.1, 'w': 0.2, 'h': 0.2},
+                        'thumbnail_path': 'face-thumbnails/face_2.jpg',
+                    },
+                ]
+            },
+        )
+
+        api_client.force_authenticate(user=user)
+        response = api_client.get(reverse('media-face-detection-status', kwargs={'pk': media.id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['faces'][0]['thumbnail_sprite'] == {
+            'x': 96,
+            'y': 0,
+            'width': 96,
+            'height': 96,
+            'sprite_width': 192,
+            'sprite_height': 96,
+        }
+        assert response.data['faces'][1]['thumbnail_sprite'] is None
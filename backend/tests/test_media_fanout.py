@@ -0,0 +1,210 @@
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from media import tasks as media_tasks
+from media.perceptual_hash import from_stored_hash
+from media.models import FaceEmbedding, MediaItem
+from .factories import MediaItemFactory
+
+
+def _source_files(count):
+    return [
+        {
+            'file_id': f'file-{index}',
+            'file_obj': f'file-{index}',
+            'original_name': f'scan-{index}.jpg',
+            'is_primary': index == 0,
+            'mime_type': 'image/jpeg',
+            'content_hash': '',
+        }
+        for index in range(count)
+    ]
+
+
+def _files(count):
+    return lambda media_item: iter(_source_files(count))
+
+
+def _fake_detection(file_obj, **_options):
+    return {
+        'is_image': True,
+        'faces': [
+            {
+                'face_coordinates': {'x': 0.1, 'y': 0.2, 'w': 0.3, 'h': 0.3},
+                'confidence': 0.9,
+                'thumbnail_bytes': b'thumbnail',
+                'embedding': b'\x01\x02\x03\x04',
+            }
+        ],
+    }
+
+
+@pytest.mark.django_db
+class TestPerFileFanOut:
+    def test_multi_file_item_dispatches_one_subtask_per_file(self):
+        media = MediaItemFactory(face_detection_task_id='faces-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(3)), patch.object(
+            media_tasks, 'chord'
+        ) as mocked_chord, patch.object(media_tasks, 'detect_faces') as mocked_detect:
+            result = media_tasks.detect_media_faces_task.apply(args=[str(media.id)], task_id='faces-1').get()
+
+        header = mocked_chord.call_args.args[0]
+        callback = mocked_chord.return_value.call_args.args[0]
+        assert result == {'status': 'fanned-out', 'files': 3}
+        assert [signature.args for signature in header] == [
+            (str(media.id), 'faces-1', f'file-{index}') for index in range(3)
+        ]
+        assert callback.task == 'media.tasks.finish_media_faces_fanout_task'
+        mocked_detect.assert_not_called()
+
+    def test_single_file_item_keeps_the_serial_loop(self):
+        media = MediaItemFactory(face_detection_task_id='faces-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(1)), patch.object(
+            media_tasks, 'chord'
+        ) as mocked_chord, patch.object(media_tasks, 'detect_faces', return_value={'is_image': True, 'faces': []}):
+            result = media_tasks.detect_media_faces_task.apply(args=[str(media.id)], task_id='faces-1').get()
+
+        mocked_chord.assert_not_called()
+        assert result['reason'] == 'no-face-candidate'
+
+    def test_chord_callback_writes_faces_once_in_file_order(self, local_storage):
+        media = MediaItemFactory(face_detection_task_id='faces-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(2)), patch.object(
+            media_tasks, 'detect_faces', side_effect=_fake_detection
+        ):
+            results = [
+                media_tasks.detect_media_file_faces_task.apply(args=[str(media.id), 'faces-1', file_id]).get()
+                for file_id in ('file-0', 'file-1')
+            ]
+        outcome = media_tasks.finish_media_faces_fanout_task.apply(args=[results, str(media.id), 'faces-1']).get()
+
+        media.refresh_from_db()
+        assert outcome['reason'] == 'faces-detected'
+        assert media.face_detection_status == MediaItem.FaceDetectionStatus.COMPLETED
+        assert [face['file_id'] for face in media.face_detection_data['faces']] == ['file-0', 'file-1']
+        assert media.face_detection_data['processed_image_files'] == 2
+        assert all((local_storage / face['thumbnail_path']).exists() for face in media.face_detection_data['faces'])
+        assert bytes(FaceEmbedding.objects.get(media_item=media, file_id='file-1').vector) == b'\x01\x02\x03\x04'
+
+    def test_stale_callback_removes_every_subtask_thumbnail(self, local_storage):
+        media = MediaItemFactory(face_detection_task_id='faces-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(2)), patch.object(
+            media_tasks, 'detect_faces', side_effect=_fake_detection
+        ):
+            results = [
+                media_tasks.detect_media_file_faces_task.apply(args=[str(media.id), 'faces-1', file_id]).get()
+                for file_id in ('file-0', 'file-1')
+            ]
+        MediaItem.objects.filter(pk=media.pk).update(face_detection_task_id='faces-2')
+        outcome = media_tasks.finish_media_faces_fanout_task.apply(args=[results, str(media.id), 'faces-1']).get()
+
+        thumbnail_paths = [path for entry in results for path in entry['thumbnail_paths']]
+        assert outcome['reason'] == 'stale-task'
+        assert len(thumbnail_paths) == 2
+        assert not any((local_storage / path).exists() for path in thumbnail_paths)
+
+    def test_detector_failure_in_one_file_fails_the_stage_and_cleans_up(self, local_storage):
+        media = MediaItemFactory(face_detection_task_id='faces-1')
+        (local_storage / 'face-thumbnails').mkdir()
+        (local_storage / 'face-thumbnails' / 'ok.jpg').write_bytes(b'thumbnail')
+        results = [
+            {
+                'file_id': 'file-0',
+                'faces': [{'face_id': 'a'}],
+                'thumbnail_paths': ['face-thumbnails/ok.jpg'],
+                'is_image': True,
+            },
+            {'file_id': 'file-1', 'faces': [], 'thumbnail_paths': [], 'error': 'OpenCV is not installed.'},
+        ]
+
+        outcome = media_tasks.finish_media_faces_fanout_task.apply(args=[results, str(media.id), 'faces-1']).get()
+
+        media.refresh_from_db()
+        assert outcome['reason'] == 'face-detection-error'
+        assert media.face_detection_status == MediaItem.FaceDetectionStatus.FAILED
+        assert 'OpenCV is not installed.' in media.face_detection_error
+        assert not (local_storage / 'face-thumbnails' / 'ok.jpg').exists()
+
+    def test_exif_fanout_merges_candidates_in_one_update(self):
+        media = MediaItemFactory(exif_task_id='exif-1')
+        payloads = {
+            'file-0': {'date_taken': '1965-03-01T09:00:00'},
+            'file-1': {},
+        }
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(2)), patch.object(
+            media_tasks, 'extract_exif_payload', side_effect=payloads.get
+        ):
+            results = [
+                media_tasks.extract_media_file_exif_task.apply(args=[str(media.id), 'exif-1', file_id]).get()
+                for file_id in ('file-0', 'file-1')
+            ]
+        outcome = media_tasks.finish_media_exif_fanout_task.apply(args=[results, str(media.id), 'exif-1']).get()
+
+        media.refresh_from_db()
+        assert outcome['reason'] == 'awaiting-confirmation'
+        assert media.exif_status == MediaItem.ExifStatus.AWAITING_CONFIRMATION
+        assert [candidate['file_id'] for candidate in media.exif_extracted_data['candidates']] == ['file-0']
+
+    def test_upload_analysis_dispatches_one_subtask_per_file(self):
+        media = MediaItemFactory(exif_task_id='analysis-1', face_detection_task_id='analysis-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(3)), patch.object(
+            media_tasks, 'chord'
+        ) as mocked_chord, patch.object(media_tasks, '_analyze_source_file') as mocked_analysis:
+            result = media_tasks.analyze_media_task.apply(args=[str(media.id)], task_id='analysis-1').get()
+
+        header = mocked_chord.call_args.args[0]
+        callback = mocked_chord.return_value.call_args.args[0]
+        assert result == {'status': 'fanned-out', 'files': 3}
+        assert [signature.task for signature in header] == ['media.tasks.analyze_media_file_task'] * 3
+        assert callback.task == 'media.tasks.finish_media_analysis_fanout_task'
+        assert callback.args == (str(media.id), 'analysis-1', 2)
+        mocked_analysis.assert_not_called()
+
+    def test_upload_analysis_callback_writes_both_stages_once(self, local_storage):
+        media = MediaItemFactory(exif_task_id='analysis-1', face_detection_task_id='analysis-1')
+
+        def analyze(file_obj, **options):
+            exif = {'date_taken': '1965-03-01T09:00:00'} if file_obj == 'file-1' else {}
+            perceptual_hash = 0xF0F0 if options['perceptual_hash_enabled'] else None
+            return {'exif': exif, 'image': Image.new('RGB', (8, 8)), 'perceptual_hash': perceptual_hash}
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(2)), patch.object(
+            media_tasks, '_analyze_source_file', side_effect=analyze
+        ), patch.object(media_tasks, 'detect_faces_in_image', side_effect=_fake_detection):
+            results = [
+                media_tasks.analyze_media_file_task.apply(args=[str(media.id), 'analysis-1', file_id]).get()
+                for file_id in ('file-0', 'file-1')
+            ]
+        outcome = media_tasks.finish_media_analysis_fanout_task.apply(
+            args=[results, str(media.id), 'analysis-1', 2]
+        ).get()
+
+        media.refresh_from_db()
+        assert outcome['reason'] == 'analysis-complete'
+        assert media.exif_status == MediaItem.ExifStatus.AWAITING_CONFIRMATION
+        assert [candidate['file_id'] for candidate in media.exif_extracted_data['candidates']] == ['file-1']
+        assert media.face_detection_status == MediaItem.FaceDetectionStatus.COMPLETED
+        assert [face['file_id'] for face in media.face_detection_data['faces']] == ['file-0', 'file-1']
+        assert from_stored_hash(media.perceptual_hash) == 0xF0F0
+        assert FaceEmbedding.objects.filter(media_item=media).count() == 2
+
+    def test_reprocessing_keeps_the_analysis_inline(self):
+        media = MediaItemFactory(exif_task_id='analysis-1', face_detection_task_id='analysis-1')
+
+        with patch.object(media_tasks, '_iter_media_files', side_effect=_files(3)), patch.object(
+            media_tasks, 'chord'
+        ) as mocked_chord, patch.object(
+            media_tasks, '_analyze_source_file', return_value={'exif': {}, 'image': None, 'perceptual_hash': None}
+        ):
+            result = media_tasks.run_media_analysis(str(media.id), 'analysis-1')
+
+        mocked_chord.assert_not_called()
+        assert result['reason'] == 'analysis-complete'
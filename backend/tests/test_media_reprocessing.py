@@ -0,0 +1,211 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from media import tasks as media_tasks
+from media.models import MediaItem, MediaReprocessRun
+from media.reprocessing import normalize_reprocess_options, pause_reprocess_run
+from vaults.models import Membership
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+def _create_run(vault, **overrides):
+    options = normalize_reprocess_options({'batch_size': 2, 'rate_limit_per_minute': 60, 'max_in_flight': 1})
+    options.update(overrides)
+    return MediaReprocessRun.objects.create(
+        vault=vault,
+        status=MediaReprocessRun.Status.RUNNING,
+        dispatcher_task_id='dispatcher-1',
+        **options,
+    )
+
+
+class TestReprocessOptions:
+    def test_unknown_stage_is_rejected(self):
+        with pytest.raises(ValueError):
+            normalize_reprocess_options({'stages': 'faces,colorize'})
+
+    def test_defaults_cover_every_stage(self):
+        options = normalize_reprocess_options({'statuses': 'failed'})
+        assert options['stages'] == ['exif', 'faces']
+        assert options['status_filter'] == ['FAILED']
+
+
+@pytest.mark.django_db
+class TestReprocessDispatcher:
+    def test_dispatcher_walks_items_by_keyset_and_completes(self):
+        vault = FamilyVaultFactory()
+        items = [MediaItemFactory(vault=vault) for _ in range(3)]
+        MediaItemFactory(vault=vault, media_type=MediaItem.MediaType.DOCUMENT)
+        expected_order = [
+            str(item_id)
+            for item_id in MediaItem.objects.filter(pk__in=[item.pk for item in items])
+            .order_by('created_at', 'id')
+            .values_list('id', flat=True)
+        ]
+        run = _create_run(vault)
+
+        with patch.object(media_tasks, 'dispatch_reprocess_batch') as mocked_batch, patch.object(
+            media_tasks, '_schedule_reprocess_dispatch'
+        ) as mocked_schedule:
+            result = media_tasks.dispatch_media_reprocess_task.apply(args=[str(run.id)], task_id='dispatcher-1').get()
+            run.refresh_from_db()
+            first_batch = mocked_batch.call_args.args[2]
+            countdown = mocked_schedule.call_args.args[2]
+
+            assert result['status'] == 'dispatched'
+            assert first_batch == expected_order[:2]
+            assert countdown == pytest.approx(2.0)
+            assert run.dispatched_items == 2
+
+            # In-flight cap reached: the next tick waits instead of dispatching.
+            next_task_id = run.dispatcher_task_id
+            result = media_tasks.dispatch_media_reprocess_task.apply(args=[str(run.id)], task_id=next_task_id).get()
+            assert result['status'] == 'waiting'
+
+            run.refresh_from_db()
+            run.pending_batches = {}
+            run.save(update_fields=['pending_batches'])
+            result = media_tasks.dispatch_media_reprocess_task.apply(
+                args=[str(run.id)], task_id=run.dispatcher_task_id
+            ).get()
+            assert mocked_batch.call_args.args[2] == expected_order[2:]
+
+            run.refresh_from_db()
+            run.pending_batches = {}
+            run.save(update_fields=['pending_batches'])
+            result = media_tasks.dispatch_media_reprocess_task.apply(
+                args=[str(run.id)], task_id=run.dispatcher_task_id
+            ).get()
+
+        run.refresh_from_db()
+        assert result['status'] == 'completed'
+        assert run.status == MediaReprocessRun.Status.COMPLETED
+        assert run.dispatched_items == 3
+
+    def test_stale_dispatcher_does_nothing(self):
+        run = _create_run(FamilyVaultFactory())
+        with patch.object(media_tasks, 'dispatch_reprocess_batch') as mocked_batch:
+            result = media_tasks.dispatch_media_reprocess_task.apply(args=[str(run.id)], task_id='old-chain').get()
+        assert result['reason'] == 'stale-dispatcher'
+        mocked_batch.assert_not_called()
+
+    def test_lost_batch_is_redispatched_once_then_failed(self, settings):
+        settings.MEDIA_REPROCESS_BATCH_TIMEOUT_SECONDS = 600
+        vault = FamilyVaultFactory()
+        item_ids = [str(MediaItemFactory(vault=vault).id) for _ in range(2)]
+        stale_at = (timezone.now() - timedelta(minutes=11)).isoformat()
+        run = _create_run(
+            vault,
+            pending_batches={'lost-batch': item_ids},
+            batch_progress={'lost-batch': {'progress_at': stale_at, 'attempt': 1}},
+            checkpoint_created_at=timezone.now() + timedelta(days=1),
+            checkpoint_item_id=item_ids[-1],
+        )
+
+        with patch.object(media_tasks, 'dispatch_reprocess_batch') as mocked_batch, patch.object(
+            media_tasks, '_schedule_reprocess_dispatch'
+        ):
+            media_tasks.dispatch_media_reprocess_task.apply(args=[str(run.id)], task_id='dispatcher-1').get()
+            run.refresh_from_db()
+
+            new_batch_id = mocked_batch.call_args.args[1]
+            assert mocked_batch.call_args.args[2] == item_ids
+            assert run.pending_batches == {new_batch_id: item_ids}
+            assert run.batch_progress[new_batch_id]['attempt'] == 2
+            assert run.status == MediaReprocessRun.Status.RUNNING
+
+            # The re-dispatched batch is lost as well: its items fail and the run can finish.
+            run.batch_progress = {new_batch_id: {'progress_at': stale_at, 'attempt': 2}}
+            run.save(update_fields=['batch_progress'])
+            result = media_tasks.dispatch_media_reprocess_task.apply(
+                args=[str(run.id)], task_id=run.dispatcher_task_id
+            ).get()
+
+        run.refresh_from_db()
+        assert mocked_batch.call_count == 1
+        assert result['status'] == 'completed'
+        assert run.status == MediaReprocessRun.Status.COMPLETED
+        assert run.failed_items == 2
+        assert run.pending_batches == {}
+        assert run.batch_progress == {}
+
+
+@pytest.mark.django_db
+class TestReprocessBatch:
+    def test_batch_reprocesses_items_and_keeps_reviewed_exif(self):
+        vault = FamilyVaultFactory()
+        reviewed = MediaItemFactory(vault=vault, exif_status=MediaItem.ExifStatus.CONFIRMED)
+        failed = MediaItemFactory(vault=vault, exif_status=MediaItem.ExifStatus.FAILED)
+        run = _create_run(vault, pending_batches={'batch-1': [str(reviewed.id), str(failed.id)]})
+
+        with patch.object(media_tasks, 'run_media_analysis', return_value={'status': 'completed'}), patch.object(
+            media_tasks, 'warm_face_detector'
+        ):
+            result = media_tasks.reprocess_media_batch_task.apply(
+                args=[str(run.id), 'batch-1', [str(reviewed.id), str(failed.id)]]
+            ).get()
+
+        run.refresh_from_db()
+        reviewed.refresh_from_db()
+        failed.refresh_from_db()
+        assert result['processed'] == 2
+        assert run.processed_items == 2
+        assert run.pending_batches == {}
+        assert run.batch_progress == {}
+        assert reviewed.exif_status == MediaItem.ExifStatus.CONFIRMED
+        assert reviewed.face_detection_status == MediaItem.FaceDetectionStatus.QUEUED
+        assert failed.exif_status == MediaItem.ExifStatus.QUEUED
+
+    def test_paused_batch_keeps_remaining_items_for_resume(self):
+        vault = FamilyVaultFactory()
+        item_ids = [str(MediaItemFactory(vault=vault).id) for _ in range(2)]
+        run = _create_run(vault, pending_batches={'batch-1': item_ids})
+        pause_reprocess_run(run)
+
+        with patch.object(media_tasks, 'run_media_analysis') as mocked_analysis, patch.object(
+            media_tasks, 'warm_face_detector'
+        ):
+            media_tasks.reprocess_media_batch_task.apply(args=[str(run.id), 'batch-1', item_ids]).get()
+
+        run.refresh_from_db()
+        mocked_analysis.assert_not_called()
+        assert run.pending_batches == {'batch-1': item_ids}
+
+
+@pytest.mark.django_db
+class TestReprocessApi:
+    def test_only_vault_admins_can_start_runs(self, api_client):
+        vault = FamilyVaultFactory()
+        contributor = UserFactory()
+        MembershipFactory(user=contributor, vault=vault)
+        url = reverse('vaults-reprocess-media', kwargs={'pk': vault.id})
+
+        api_client.force_authenticate(user=contributor)
+        response = api_client.post(url, {'action': 'start'}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_admin_can_start_and_list_runs(self, api_client):
+        admin = UserFactory()
+        vault = FamilyVaultFactory(owner=admin)
+        MembershipFactory(user=admin, vault=vault, role=Membership.Roles.ADMIN)
+        MediaItemFactory(vault=vault)
+        url = reverse('vaults-reprocess-media', kwargs={'pk': vault.id})
+        api_client.force_authenticate(user=admin)
+
+        with patch.object(media_tasks, '_schedule_reprocess_dispatch'):
+            response = api_client.post(url, {'action': 'start', 'stages': ['faces']}, format='json')
+            duplicate = api_client.post(url, {'action': 'start'}, format='json')
+
+        assert response.status_code == status.HTTP_202_ACCEPTED
+        assert response.data['total_items'] == 1
+        assert response.data['stages'] == ['faces']
+        assert duplicate.status_code == status.HTTP_400_BAD_REQUEST
+
+        listing = api_client.get(url)
+        assert listing.status_code == status.HTTP_200_OK
+        assert len(listing.data['runs']) == 1
@@ -0,0 +1,199 @@
+from io import BytesIO
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image, ImageOps
+from rest_framework import status
+
+from genealogy.models import MediaTag, PersonProfile
+from media.exif import locate_jpeg_orientation, rotate_jpeg_orientation_in_place
+from media.face_rotation import rotate_normalized_box
+from media.models import MediaItem
+from media.vision import decode_rgb_image
+from vaults.models import Membership
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+def _jpeg(size=(40, 20), orientation=None):
+    image = Image.new('RGB', size, 'white')
+    image.paste((255, 0, 0), (0, 0, size[0] // 4, size[1]))
+    exif = Image.Exif()
+    if orientation is not None:
+        exif[0x0112] = orientation
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=95, exif=exif.tobytes())
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def editor(api_client):
+    user = UserFactory()
+    vault = FamilyVaultFactory(owner=user)
+    MembershipFactory(user=user, vault=vault, role=Membership.Roles.ADMIN)
+    api_client.force_authenticate(user=user)
+    return user
+
+
+class TestDisplayRotation:
+    def test_decode_turns_the_image_clockwise(self):
+        with Image.open(BytesIO(_jpeg())) as source:
+            image = decode_rgb_image(source, rotation=90)
+
+        assert image.size == (20, 40)
+        # The red left edge ends up along the top after a clockwise quarter turn.
+        assert image.getpixel((10, 2))[1] < 80
+        assert image.getpixel((10, 38))[1] > 200
+
+    def test_orientation_rewrite_touches_only_the_tag(self, tmp_path):
+        path = tmp_path / 'scan.jpg'
+        original = _jpeg(orientation=1)
+        path.write_bytes(original)
+
+        assert rotate_jpeg_orientation_in_place(str(path), -90)
+
+        rewritten = path.read_bytes()
+        offset, orientation, _byte_order = locate_jpeg_orientation(rewritten)
+        assert orientation == 8
+        assert len(rewritten) == len(original)
+        assert rewritten[:offset] == original[:offset] and rewritten[offset + 2:] == original[offset + 2:]
+        with Image.open(path) as opened:
+            assert ImageOps.exif_transpose(opened).size == (20, 40)
+
+    def test_mirrored_or_missing_orientation_is_left_alone(self, tmp_path):
+        mirrored = tmp_path / 'mirrored.jpg'
+        mirrored.write_bytes(_jpeg(orientation=2))
+        untagged = tmp_path / 'untagged.jpg'
+        untagged.write_bytes(_jpeg())
+
+        assert not rotate_jpeg_orientation_in_place(str(mirrored), 90)
+        assert not rotate_jpeg_orientation_in_place(str(untagged), 90)
+        assert mirrored.read_bytes() == _jpeg(orientation=2)
+
+    def test_face_boxes_follow_quarter_turns(self):
+        box = {'x': 0.1, 'y': 0.2, 'w': 0.3, 'h': 0.4}
+
+        assert rotate_normalized_box(box, 90) == {'x': 0.4, 'y': 0.1, 'w': 0.4, 'h': 0.3}
+        assert rotate_normalized_box(box, 180) == {'x': 0.6, 'y': 0.4, 'w': 0.3, 'h': 0.4}
+        assert rotate_normalized_box(box, -90) == {'x': 0.2, 'y': 0.6, 'w': 0.4, 'h': 0.3}
+        assert rotate_normalized_box(rotate_normalized_box(box, 90), -90) == box
+
+
+@pytest.mark.django_db
+class TestRotateEndpoint:
+    def _rotate(self, api_client, media, **payload):
+        return api_client.post(reverse('media-rotate', kwargs={'pk': media.id}), payload, format='json')
+
+    def test_metadata_mode_keeps_the_stored_bytes(self, api_client, local_storage, editor, mock_ai_service):
+        content = _jpeg()
+        media = MediaItemFactory(
+            vault=editor.memberships.get().vault,
+            uploader=editor,
+            file=SimpleUploadedFile('scan.jpg', content, content_type='image/jpeg'),
+        )
+        original_hash = media.content_hash
+
+        response = self._rotate(api_client, media, degrees=90, mode='metadata')
+        response = self._rotate(api_client, media, direction='right', mode='metadata')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['rotation_mode'] == 'metadata'
+        assert response.data['files'][0]['display_rotation'] == 180
+        media.refresh_from_db()
+        assert (media.display_rotation, media.content_hash) == (180, original_hash)
+        assert (local_storage / media.file.name).read_bytes() == content
+
+    def test_exif_rewrite_rehashes_local_jpegs(self, api_client, local_storage, editor, mock_ai_service, settings):
+        settings.MEDIA_ROTATION_MODE = 'metadata'
+        settings.MEDIA_ROTATION_EXIF_REWRITE = True
+        media = MediaItemFactory(
+            vault=editor.memberships.get().vault,
+            uploader=editor,
+            file=SimpleUploadedFile('scan.jpg', _jpeg(orientation=1), content_type='image/jpeg'),
+        )
+        original_hash = media.content_hash
+
+        response = self._rotate(api_client, media, degrees=90)
+
+        assert response.status_code == status.HTTP_200_OK
+        media.refresh_from_db()
+        assert media.display_rotation == 0
+        assert media.content_hash not in ('', original_hash)
+        stored = (local_storage / media.file.name).read_bytes()
+        assert locate_jpeg_orientation(stored)[1] == 6
+
+    def test_detected_faces_and_tags_are_rotated_in_place(
+        self, api_client, local_storage, editor, mock_ai_service, django_capture_on_commit_callbacks
+    ):
+        vault = editor.memberships.get().vault
+        media = MediaItemFactory(
+            vault=vault,
+            uploader=editor,
+            file=SimpleUploadedFile('scan.jpg', _jpeg(), content_type='image/jpeg'),
+        )
+        thumbnail = BytesIO()
+        Image.new('RGB', (8, 4), 'white').save(thumbnail, format='JPEG')
+        thumbnail_path = default_storage.save(
+            f'face-thumbnails/{media.id}/run/face-1.jpg', ContentFile(thumbnail.getvalue())
+        )
+        box = {'x': 0.1, 'y': 0.2, 'w': 0.3, 'h': 0.4}
+        MediaItem.objects.filter(pk=media.pk).update(
+            face_detection_status=MediaItem.FaceDetectionStatus.COMPLETED,
+            face_detection_data={
+                'faces': [
+                    {
+                        'face_id': 'face-1',
+                        'file_id': f'primary-{media.id}',
+                        'face_coordinates': box,
+                        'thumbnail_path': thumbnail_path,
+                    }
+                ]
+            },
+        )
+        person = PersonProfile.objects.create(vault=vault, full_name='Grandma')
+        tag = MediaTag.objects.create(
+            media_item=media,
+            person=person,
+            face_coordinates=box,
+            detected_face_id='face-1',
+            tagged_file_id=f'primary-{media.id}',
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = self._rotate(api_client, media, degrees=90, mode='metadata')
+
+        assert response.status_code == status.HTTP_200_OK
+        mock_ai_service['face'].assert_not_called()
+        media.refresh_from_db()
+        face = media.face_detection_data['faces'][0]
+        assert face['face_coordinates'] == {'x': 0.4, 'y': 0.1, 'w': 0.4, 'h': 0.3}
+        assert face['thumbnail_path'] != thumbnail_path
+        assert not (local_storage / thumbnail_path).exists()
+        with Image.open(local_storage / face['thumbnail_path']) as rotated:
+            assert rotated.size == (4, 8)
+        tag.refresh_from_db()
+        assert (tag.face_coordinates, tag.detected_face_id) == (face['face_coordinates'], 'face-1')
+
+    def test_pending_detection_falls_back_to_a_fresh_pass(self, api_client, local_storage, editor, mock_ai_service):
+        vault = editor.memberships.get().vault
+        media = MediaItemFactory(
+            vault=vault,
+            uploader=editor,
+            file=SimpleUploadedFile('scan.jpg', _jpeg(), content_type='image/jpeg'),
+        )
+        MediaItem.objects.filter(pk=media.pk).update(face_detection_status=MediaItem.FaceDetectionStatus.PROCESSING)
+        tag = MediaTag.objects.create(
+            media_item=media,
+            person=PersonProfile.objects.create(vault=vault, full_name='Grandma'),
+            face_coordinates={'x': 0.1, 'y': 0.2, 'w': 0.3, 'h': 0.4},
+            detected_face_id='face-1',
+        )
+
+        response = self._rotate(api_client, media, degrees=90, mode='metadata')
+
+        assert response.status_code == status.HTTP_200_OK
+        mock_ai_service['face'].assert_called_once()
+        tag.refresh_from_db()
+        assert (tag.face_coordinates, tag.detected_face_id) == (None, '')
@@ -0,0 +1,109 @@
+from unittest.mock import patch
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework import status
+
+from media.models import MediaItem, MediaTaskTicket
+from media.scheduler import dispatch_pending_media_tasks, release_media_task
+from media.services import AIProcessingService
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+def _queue_analysis(media_items, capture):
+    with capture(execute=True):
+        for media_item in media_items:
+            AIProcessingService().enqueue_media_processing(media_item)
+
+
+@pytest.mark.django_db
+class TestMediaScheduler:
+    def test_dispatch_is_round_robin_with_per_vault_cap(self, settings, django_capture_on_commit_callbacks):
+        settings.MEDIA_SCHEDULER_VAULT_MAX_IN_FLIGHT = 2
+        busy_vault = FamilyVaultFactory()
+        quiet_vault = FamilyVaultFactory()
+        import_items = [MediaItemFactory(vault=busy_vault) for _ in range(5)]
+        upload = MediaItemFactory(vault=quiet_vault)
+
+        with patch('media.tasks.analyze_media_task.apply_async') as mocked_publish:
+            _queue_analysis(import_items, django_capture_on_commit_callbacks)
+            _queue_analysis([upload], django_capture_on_commit_callbacks)
+
+        published_items = [call.kwargs['args'][0] for call in mocked_publish.call_args_list]
+        assert published_items == [str(import_items[0].id), str(import_items[1].id), str(upload.id)]
+        assert MediaTaskTicket.objects.filter(status=MediaTaskTicket.Status.PENDING).count() == 3
+        assert MediaItem.objects.get(pk=import_items[4].pk).exif_status == MediaItem.ExifStatus.QUEUED
+
+    def test_finished_task_hands_its_slot_to_the_next_pending_task(self, settings, django_capture_on_commit_callbacks):
+        settings.MEDIA_SCHEDULER_VAULT_MAX_IN_FLIGHT = 1
+        vault = FamilyVaultFactory()
+        media_items = [MediaItemFactory(vault=vault) for _ in range(2)]
+
+        with patch('media.tasks.analyze_media_task.apply_async') as mocked_publish:
+            _queue_analysis(media_items, django_capture_on_commit_callbacks)
+            assert mocked_publish.call_count == 1
+
+            first_task_id = MediaItem.objects.get(pk=media_items[0].pk).exif_task_id
+            assert release_media_task(first_task_id)
+
+        assert mocked_publish.call_count == 2
+        assert mocked_publish.call_args.kwargs['args'] == [str(media_items[1].id)]
+        assert MediaTaskTicket.objects.get(task_id=first_task_id).status == MediaTaskTicket.Status.DONE
+
+    def test_deep_broker_defers_dispatch_and_schedules_retry(self, settings, django_capture_on_commit_callbacks):
+        settings.MEDIA_SCHEDULER_MAX_BROKER_DEPTH = 100
+        media_item = MediaItemFactory()
+
+        with patch('media.scheduler.get_broker_depth', return_value=150), patch(
+            'media.tasks.analyze_media_task.apply_async'
+        ) as mocked_publish, patch('media.tasks.dispatch_media_tasks_task.apply_async') as mocked_retry:
+            _queue_analysis([media_item], django_capture_on_commit_callbacks)
+            result = dispatch_pending_media_tasks()
+
+        assert result == {'dispatched': 0, 'deferred': True}
+        mocked_publish.assert_not_called()
+        mocked_retry.assert_called_once()
+        assert MediaTaskTicket.objects.get(media_item=media_item).status == MediaTaskTicket.Status.PENDING
+
+    def test_deferred_dispatches_in_other_processes_share_one_retry(
+        self, settings, django_capture_on_commit_callbacks
+    ):
+        settings.MEDIA_SCHEDULER_MAX_BROKER_DEPTH = 100
+        media_item = MediaItemFactory()
+
+        with patch('media.scheduler.get_broker_depth', return_value=150), patch(
+            'media.tasks.analyze_media_task.apply_async'
+        ), patch('media.tasks.dispatch_media_tasks_task.apply_async') as mocked_retry:
+            _queue_analysis([media_item], django_capture_on_commit_callbacks)
+            dispatch_pending_media_tasks()
+            # A second worker has its own Django cache but sees the same retry lock.
+            cache.clear()
+            dispatch_pending_media_tasks()
+
+        mocked_retry.assert_called_once()
+
+    def test_status_endpoint_reports_queue_position_and_eta(
+        self, api_client, settings, django_capture_on_commit_callbacks
+    ):
+        settings.MEDIA_SCHEDULER_VAULT_MAX_IN_FLIGHT = 1
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault)
+        media_items = [MediaItemFactory(vault=vault, uploader=user) for _ in range(4)]
+
+        with patch('media.tasks.analyze_media_task.apply_async'):
+            _queue_analysis(media_items, django_capture_on_commit_callbacks)
+            release_media_task(MediaItem.objects.get(pk=media_items[0].pk).exif_task_id)
+
+        api_client.force_authenticate(user=user)
+        response = api_client.get(reverse('media-exif-status', kwargs={'pk': media_items[3].id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        # items[1] is running, items[2] waits ahead; one completion in the 600 s window gives the ETA.
+        assert response.data['queue'] == {
+            'state': MediaTaskTicket.Status.PENDING,
+            'position': 2,
+            'vault_position': 2,
+            'eta_seconds': 1200,
+        }
@@ -0,0 +1,79 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from media import vision
+
+
+@pytest.fixture
+def model_dir(settings, tmp_path):
+    settings.MEDIA_RESTORATION_MODEL_DIR = str(tmp_path)
+    settings.MEDIA_MODEL_SHA256 = ''
+    return tmp_path
+
+
+class TestModelAssets:
+    def test_recorded_checksums_detect_corrupt_files(self, model_dir):
+        file_name = vision._YUNET_ASSET['file_name']
+        (model_dir / file_name).write_bytes(b'yunet-weights')
+
+        assert vision.verify_model_asset(file_name)['status'] == 'unpinned'
+        vision.record_model_checksums([file_name])
+        assert vision.verify_model_asset(file_name)['status'] == 'ok'
+
+        (model_dir / file_name).write_bytes(b'truncated')
+        assert vision.verify_model_asset(file_name)['status'] == 'mismatch'
+
+        [report] = vision.ensure_model_assets(['yunet'], download=False)
+        assert report['status'] == 'missing'
+        assert 'Missing required model file' in report['error']
+        assert not (model_dir / file_name).exists()
+
+    def test_download_with_wrong_pinned_checksum_is_rejected(self, model_dir, settings):
+        file_name = vision._SFACE_ASSET['file_name']
+        settings.MEDIA_MODEL_SHA256 = f'{file_name}={"0" * 64}'
+
+        with patch.object(vision.urllib.request, 'urlopen', side_effect=lambda *args, **kwargs: BytesIO(b'tampered')):
+            with pytest.raises(RuntimeError, match='checksum mismatch'):
+                vision._ensure_model_asset(str(model_dir / file_name), ['https://example.invalid/sface.onnx'], allow_download=True)
+
+        assert not list(model_dir.iterdir())
+
+    def test_embeddings_need_yunet_and_never_download_in_a_task(self, model_dir, settings):
+        image = Image.new('RGB', (64, 64))
+        haar_box = (4, 4, 32, 32, 0.9, None)
+        yunet_row = (4, 4, 32, 32, 0.9, np.zeros(15, dtype=np.float32))
+        settings.MEDIA_FACE_EMBEDDINGS_ENABLED = True
+
+        settings.MEDIA_FACE_DETECTOR_BACKEND = 'haar'
+        with patch.object(vision, '_get_face_recognizer') as mocked_recognizer:
+            assert vision._compute_face_embeddings(image, [haar_box]) == [None]
+        mocked_recognizer.assert_not_called()
+        assert vision.get_required_model_groups() == ['colorization']
+
+        settings.MEDIA_FACE_DETECTOR_BACKEND = 'yunet'
+        assert vision.get_required_model_groups() == ['colorization', 'yunet', 'sface']
+        with patch.object(vision.urllib.request, 'urlopen') as mocked_urlopen:
+            with pytest.raises(FileNotFoundError):
+                vision._get_face_recognizer()
+            assert vision._compute_face_embeddings(image, [yunet_row]) == [None]
+        mocked_urlopen.assert_not_called()
+
+    def test_opencv_threads_are_split_across_pool_processes(self, settings):
+        cv2 = pytest.importorskip('cv2')
+        previous_threads = cv2.getNumThreads()
+        settings.MEDIA_OPENCV_THREADS = 0
+        try:
+            with patch.object(vision.os, 'cpu_count', return_value=8):
+                assert vision.configure_opencv_threads(worker_concurrency=4) == 2
+                assert cv2.getNumThreads() == 2
+                assert vision._resolve_tiling_plan(4096, 4096)['workers'] <= 2
+
+            settings.MEDIA_OPENCV_THREADS = 3
+            assert vision.configure_opencv_threads(worker_concurrency=4) == 3
+        finally:
+            vision._OPENCV_THREADS = None
+            cv2.setNumThreads(previous_threads)
@@ -0,0 +1,162 @@
+import random
+from io import BytesIO
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image, ImageFilter
+from rest_framework import status
+
+from media import tasks as media_tasks
+from media.models import MediaItem
+from media.perceptual_hash import (
+    compute_dhash,
+    find_near_duplicate_clusters,
+    find_near_duplicate_pairs,
+    from_stored_hash,
+    hamming_distance,
+    to_stored_hash,
+)
+from vaults.models import Membership
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+def _scene(seed, size=(640, 480)):
+    blocks = Image.frombytes('RGB', (16, 12), random.Random(seed).randbytes(16 * 12 * 3))
+    return blocks.resize(size, Image.Resampling.BILINEAR).filter(ImageFilter.GaussianBlur(6))
+
+
+def _jpeg(image, **options):
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', **options)
+    return buffer.getvalue()
+
+
+class TestPerceptualHash:
+    def test_resized_and_recompressed_copies_stay_close(self):
+        original = _scene(7)
+        with Image.open(BytesIO(_jpeg(original.resize((320, 240)), quality=40))) as recompressed:
+            copy_distance = hamming_distance(compute_dhash(original), compute_dhash(recompressed))
+        other_distance = hamming_distance(compute_dhash(original), compute_dhash(_scene(8)))
+
+        assert copy_distance <= 4
+        assert other_distance > 12
+
+    def test_stored_hash_round_trips_through_the_signed_column(self):
+        for value in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+            stored = to_stored_hash(value)
+            assert -(1 << 63) <= stored < (1 << 63)
+            assert from_stored_hash(stored) == value
+
+    def test_multi_index_lookup_matches_brute_force(self):
+        rng = random.Random(3)
+        hashes = [rng.getrandbits(64) for _ in range(400)]
+        for index in range(0, 400, 4):
+            copy = hashes[index]
+            for _ in range(rng.randint(0, 7)):
+                copy ^= 1 << rng.randrange(64)
+            hashes.append(copy)
+
+        # Repeated hashes pair with the first index carrying them; other pairs link those first indices.
+        first_index = {}
+        for index, value in enumerate(hashes):
+            first_index.setdefault(value, index)
+        representatives = sorted(first_index.values())
+        expected = {
+            (left, right, hamming_distance(hashes[left], hashes[right]))
+            for position, left in enumerate(representatives)
+            for right in representatives[position + 1:]
+            if hamming_distance(hashes[left], hashes[right]) <= 4
+        } | {(first_index[value], index, 0) for index, value in enumerate(hashes) if first_index[value] != index}
+        assert set(find_near_duplicate_pairs(hashes, 4)) == expected
+        assert len(expected) > 50
+
+    def test_identical_hashes_are_collapsed_before_pairing(self):
+        # Blank scans all hash to 0; pairing them with each other would be ~4.5M pairs.
+        hashes = [0] * 3000 + [0b111, (1 << 64) - 1]
+
+        pairs = find_near_duplicate_pairs(hashes, 4)
+
+        assert len(pairs) == 3000
+        assert pairs[:2] == [(0, 1, 0), (0, 2, 0)]
+        assert pairs[-1] == (0, 3000, 3)
+        [cluster] = find_near_duplicate_clusters(list(range(len(hashes))), hashes, max_distance=4)
+        assert cluster['keys'] == list(range(3001))
+        assert cluster['distances'][3000] == 3
+
+    def test_oversized_buckets_are_logged_and_skipped(self, monkeypatch, caplog):
+        monkeypatch.setattr('media.perceptual_hash.MAX_BUCKET_SIZE', 8)
+        # Twenty distinct hashes agreeing on every bit but the top byte share all but one chunk.
+        hashes = [value << 56 for value in range(20)]
+
+        with caplog.at_level('WARNING', logger='media.perceptual_hash'):
+            pairs = find_near_duplicate_pairs(hashes, 1)
+
+        assert 'Skipping 1 perceptual hash bucket(s) of up to 20 hashes' in caplog.text
+        assert pairs == []
+
+    def test_clusters_do_not_chain_past_the_threshold(self):
+        # Each hash is 4 bits from the previous one, so the ends of the chain are 12 bits apart.
+        hashes = [0, 0xF, 0xFF, 0xFFF]
+
+        clusters = find_near_duplicate_clusters(['a', 'b', 'c', 'd'], hashes, max_distance=4)
+
+        assert clusters == [
+            {'keys': ['a', 'b'], 'distances': {'a': 0, 'b': 4}},
+            {'keys': ['c', 'd'], 'distances': {'c': 0, 'd': 4}},
+        ]
+
+    def test_repeated_hashes_join_their_cluster_with_the_link_distance(self):
+        hashes = [0, 0xF, 0, 0xF]
+
+        clusters = find_near_duplicate_clusters(['a', 'b', 'c', 'd'], hashes, max_distance=4)
+
+        assert clusters == [{'keys': ['a', 'b', 'c', 'd'], 'distances': {'a': 0, 'b': 4, 'c': 0, 'd': 4}}]
+
+
+@pytest.mark.django_db
+class TestNearDuplicateDetection:
+    def test_analysis_stores_the_primary_photo_hash(self, settings, tmp_path):
+        settings.STORAGES = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage', 'OPTIONS': {'location': str(tmp_path)}},
+        }
+        content = _jpeg(_scene(7), quality=90)
+        media = MediaItemFactory(
+            file=SimpleUploadedFile('scan.jpg', content, content_type='image/jpeg'),
+            exif_task_id='analysis-1',
+            face_detection_task_id='analysis-1',
+        )
+
+        media_tasks.analyze_media_task.apply(args=[str(media.id)], task_id='analysis-1').get()
+
+        media.refresh_from_db()
+        with Image.open(BytesIO(content)) as decoded:
+            assert from_stored_hash(media.perceptual_hash) == compute_dhash(decoded)
+
+    def test_health_analysis_reports_near_duplicate_clusters(self, api_client):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault, role=Membership.Roles.ADMIN)
+        base_hash = 0xF0F0_1234_ABCD_5678
+        original = MediaItemFactory(vault=vault, content_hash='a' * 64, perceptual_hash=to_stored_hash(base_hash))
+        rescan = MediaItemFactory(
+            vault=vault,
+            content_hash='b' * 64,
+            file_size=2048,
+            perceptual_hash=to_stored_hash(base_hash ^ 0b101),
+        )
+        MediaItemFactory(vault=vault, content_hash='c' * 64, perceptual_hash=to_stored_hash(~base_hash & (2**64 - 1)))
+        MediaItemFactory(vault=vault, content_hash='d' * 64)
+
+        api_client.force_authenticate(user=user)
+        response = api_client.get(reverse('vaults-health-analysis', kwargs={'pk': vault.id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['duplicate_groups_count'] == 0
+        assert response.data['near_duplicate_groups_count'] == 1
+        assert response.data['near_duplicate_reclaimable_bytes'] == 2048
+        group = response.data['near_duplicate_groups'][0]
+        assert group['primary']['id'] == str(original.id)
+        assert [duplicate['id'] for duplicate in group['duplicates']] == [str(rescan.id)]
+        assert group['similarity'] == group['duplicates'][0]['similarity'] == pytest.approx(1 - 2 / 64, abs=1e-4)
@@ -0,0 +1,215 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+
+from core.storage_deletion import drain_storage_deletions
+from media import tasks as media_tasks
+from media import vision
+from media.models import MediaRestorationOutput
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+@pytest.fixture
+def small_tiles(settings):
+    settings.MEDIA_RESTORATION_TILE_SIZE = 128
+    settings.MEDIA_RESTORATION_TILE_WORKERS = 3
+    settings.MEDIA_RESTORATION_AUTO_DOWNLOAD = False
+    return settings
+
+
+class TestTiledRestoration:
+    @pytest.mark.parametrize('is_black_and_white', [False, True])
+    def test_tiled_denoise_matches_single_pass(self, small_tiles, is_black_and_white):
+        rgb_array = np.random.default_rng(3).integers(40, 220, (300, 260, 3), dtype=np.uint8)
+
+        stats = {}
+        tiled = vision._denoise_rgb_array(
+            rgb_array,
+            is_black_and_white=is_black_and_white,
+            noise_level=12.0,
+            stats=stats,
+        )
+        small_tiles.MEDIA_RESTORATION_TILE_SIZE = 4096
+        single_pass = vision._denoise_rgb_array(rgb_array, is_black_and_white=is_black_and_white, noise_level=12.0)
+
+        assert stats['tiles'] == 9
+        assert stats['workers'] == 3
+        assert np.array_equal(tiled, single_pass)
+
+    def test_memory_budget_limits_tile_size_and_concurrency(self, small_tiles):
+        small_tiles.MEDIA_RESTORATION_TILE_SIZE = 4096
+        small_tiles.MEDIA_RESTORATION_MEMORY_BUDGET_MB = 64
+
+        plan = vision._resolve_tiling_plan(6000, 8000)
+
+        tile_bytes = (plan['tile_size'] + 2 * plan['halo']) ** 2 * vision._DENOISE_BYTES_PER_TILE_PIXEL
+        assert plan['tile_size'] < 4096
+        assert tile_bytes * plan['workers'] <= 64 * 1024 * 1024
+
+    def test_restoration_payload_reports_stage_timings(self, small_tiles):
+        buffer = BytesIO()
+        Image.fromarray(np.random.default_rng(5).integers(0, 255, (200, 180, 3), dtype=np.uint8)).save(
+            buffer, format='PNG'
+        )
+        buffer.seek(0)
+
+        payload = vision.restore_legacy_photo(buffer, apply_colorize=False, apply_denoise=True)
+
+        assert set(payload['timings_ms']) == {'decode', 'analyze', 'denoise', 'enhance', 'encode', 'total'}
+        assert payload['tiling']['tiles'] == 4
+
+    def test_preview_runs_on_a_downscaled_copy(self, small_tiles):
+        buffer = BytesIO()
+        Image.new('RGB', (1600, 1200), color=(120, 110, 100)).save(buffer, format='JPEG')
+        buffer.seek(0)
+
+        payload = vision.restore_legacy_photo(buffer, apply_colorize=False, apply_denoise=True, max_side=400)
+
+        assert (payload['width'], payload['height']) == (400, 300)
+        assert payload['is_preview'] is True
+
+
+@pytest.mark.django_db
+class TestRestorationCache:
+    def _restore(self, media, task_id, options):
+        media.restoration_task_id = task_id
+        media.save(update_fields=['restoration_task_id'])
+        media_tasks.restore_media_photo_task.apply(args=[str(media.id), '', options], task_id=task_id).get()
+        media.refresh_from_db()
+        return media.restoration_data['results'][f'primary-{media.id}']
+
+    def _scan(self):
+        return SimpleUploadedFile('scan.jpg', b'not-decoded-by-the-mocked-pipeline', content_type='image/jpeg')
+
+    def test_same_scan_and_options_reuse_the_stored_output(self, local_storage):
+        first = MediaItemFactory(file=self._scan(), content_hash='a' * 64)
+        duplicate = MediaItemFactory(file=self._scan(), content_hash='a' * 64)
+        restored = {
+            'image_bytes': b'restored-jpeg',
+            'width': 64,
+            'height': 48,
+            'applied': {'colorize': True, 'denoise': False},
+            'colorization_method': 'opencv-dnn',
+            'warnings': [],
+        }
+
+        with patch.object(media_tasks, 'restore_legacy_photo', return_value=restored) as restore:
+            first_entry = self._restore(first, 'restore-1', {'colorize': True, 'denoise': False})
+            duplicate_entry = self._restore(duplicate, 'restore-2', {'colorize': True, 'denoise': False})
+            repeat_entry = self._restore(first, 'restore-3', {'colorize': True, 'denoise': False})
+
+        assert restore.call_count == 1
+        assert first_entry['cache_hit'] is False
+        assert duplicate_entry['cache_hit'] is True
+        assert repeat_entry['cache_hit'] is True
+        assert duplicate_entry['restored_path'] == first_entry['restored_path']
+        assert duplicate_entry['width'] == 64
+        assert MediaRestorationOutput.objects.filter(output=first_entry['restored_path']).count() == 2
+
+    def test_shared_output_is_deleted_with_its_last_reference(self, local_storage):
+        first = MediaItemFactory(file=self._scan(), content_hash='b' * 64)
+        duplicate = MediaItemFactory(file=self._scan(), content_hash='b' * 64)
+        restored = {'image_bytes': b'restored-jpeg', 'colorization_method': 'none', 'warnings': []}
+
+        with patch.object(media_tasks, 'restore_legacy_photo', return_value=restored) as restore:
+            shared_path = self._restore(first, 'restore-1', {'colorize': False, 'denoise': True})['restored_path']
+            self._restore(duplicate, 'restore-2', {'colorize': False, 'denoise': True})
+            # Different options on the first item replace its reference with a fresh output.
+            replaced_path = self._restore(first, 'restore-3', {'colorize': True, 'denoise': True})['restored_path']
+
+            assert restore.call_count == 2
+            assert replaced_path != shared_path
+            assert default_storage.exists(shared_path)
+
+            duplicate.delete()
+            assert default_storage.exists(shared_path)
+            drain_storage_deletions()
+            assert not default_storage.exists(shared_path)
+            assert default_storage.exists(replaced_path)
+
+    def test_fallback_colorization_is_not_reused(self, local_storage):
+        first = MediaItemFactory(file=self._scan(), content_hash='c' * 64)
+        duplicate = MediaItemFactory(file=self._scan(), content_hash='c' * 64)
+        restored = {'image_bytes': b'warm-tone', 'colorization_method': 'fallback-warmtone', 'warnings': []}
+
+        with patch.object(media_tasks, 'restore_legacy_photo', return_value=restored) as restore:
+            self._restore(first, 'restore-1', {'colorize': True, 'denoise': True})
+            self._restore(duplicate, 'restore-2', {'colorize': True, 'denoise': True})
+
+        assert restore.call_count == 2
+
+
+@pytest.mark.django_db
+class TestRestorationPreview:
+    def test_preview_then_confirm_starts_full_job_with_preview_options(
+        self, api_client, local_storage, settings, django_capture_on_commit_callbacks
+    ):
+        settings.MEDIA_RESTORATION_PREVIEW_MAX_SIDE = 200
+        settings.MEDIA_RESTORATION_AUTO_DOWNLOAD = False
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault)
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 800), color=(90, 90, 90)).save(buffer, format='JPEG')
+        media = MediaItemFactory(
+            vault=vault,
+            uploader=user,
+            file=SimpleUploadedFile('scan.jpg', buffer.getvalue(), content_type='image/jpeg'),
+        )
+        restore_url = reverse('media-restore-photo', args=[media.id])
+        api_client.force_authenticate(user=user)
+
+        with patch('media.services.restore_media_preview_task.apply_async') as preview_enqueue, patch(
+            'media.services.restore_media_photo_task.apply_async'
+        ) as full_enqueue:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post(
+                    restore_url,
+                    {'mode': 'preview', 'colorize': False, 'denoise': True},
+                    format='json',
+                )
+
+            assert response.status_code == status.HTTP_202_ACCEPTED
+            assert response.data['preview']['status'] == 'QUEUED'
+            assert response.data['status'] == 'NOT_STARTED'
+            preview_call = preview_enqueue.call_args.kwargs
+            # Placement comes from CELERY_TASK_ROUTES, not from the call site.
+            assert 'queue' not in preview_call
+            full_enqueue.assert_not_called()
+
+            media_tasks.restore_media_preview_task.apply(
+                args=preview_call['args'],
+                task_id=preview_call['task_id'],
+            ).get()
+            status_response = api_client.get(reverse('media-restoration-status', args=[media.id]))
+            preview = status_response.data['preview']
+            assert preview['status'] == 'COMPLETED'
+            assert (preview['width'], preview['height']) == (200, 160)
+            assert default_storage.exists(preview['restored_path'])
+
+            with django_capture_on_commit_callbacks(execute=True):
+                confirm_response = api_client.post(restore_url, {'mode': 'confirm'}, format='json')
+
+        assert confirm_response.status_code == status.HTTP_202_ACCEPTED
+        assert confirm_response.data['status'] == 'QUEUED'
+        assert full_enqueue.call_args.kwargs['args'][2] == {'colorize': False, 'denoise': True}
+        media.refresh_from_db()
+        assert media.restoration_data['preview']['confirmed_task_id'] == media.restoration_task_id
+
+    def test_confirm_requires_a_completed_preview(self, api_client):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault)
+        media = MediaItemFactory(vault=vault, uploader=user)
+        api_client.force_authenticate(user=user)
+
+        response = api_client.post(reverse('media-restore-photo', args=[media.id]), {'mode': 'confirm'}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,117 @@
+from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage
+
+from media import storage_cache
+from media.storage_cache import (
+    evict_storage_cache,
+    get_storage_cache_stats,
+    open_cached_file,
+    reset_storage_cache_stats,
+)
+
+
+@pytest.fixture
+def remote_storage(settings, tmp_path):
+    settings.MEDIA_STORAGE_CACHE_ENABLED = True
+    settings.MEDIA_STORAGE_CACHE_DIR = str(tmp_path / 'cache')
+    settings.MEDIA_STORAGE_CACHE_MAX_BYTES = 1024 * 1024
+    reset_storage_cache_stats()
+    return InMemoryStorage()
+
+
+def _stored_file(storage, name, payload, content_hash):
+    saved_name = storage.save(name, ContentFile(payload))
+    return SimpleNamespace(storage=storage, name=saved_name, instance=SimpleNamespace(content_hash=content_hash))
+
+
+class TestStorageCache:
+    def test_second_read_is_served_from_local_cache(self, remote_storage):
+        stored = _stored_file(remote_storage, 'originals/letter.bin', b'grandma' * 100, 'hash-1')
+
+        with open_cached_file(stored) as handle:
+            first_read = handle.read()
+        with open_cached_file(stored) as handle:
+            handle.seek(7)
+            second_read = handle.read(7)
+
+        stats = get_storage_cache_stats(include_disk_usage=True)
+        assert first_read == b'grandma' * 100
+        assert second_read == b'grandma'
+        assert stats['misses'] == 1
+        assert stats['hits'] == 1
+        assert stats['cached_bytes'] == 700
+
+    def test_new_content_hash_is_a_separate_entry(self, remote_storage):
+        stored = _stored_file(remote_storage, 'originals/photo.bin', b'before', 'hash-1')
+        with open_cached_file(stored):
+            pass
+
+        stored.instance.content_hash = 'hash-2'
+        with open_cached_file(stored):
+            pass
+
+        assert get_storage_cache_stats()['misses'] == 2
+
+    def test_least_recently_used_entries_are_evicted_over_budget(self, remote_storage, settings):
+        settings.MEDIA_STORAGE_CACHE_MAX_BYTES = 250
+        older = _stored_file(remote_storage, 'originals/older.bin', b'a' * 200, 'hash-a')
+        newer = _stored_file(remote_storage, 'originals/newer.bin', b'b' * 200, 'hash-b')
+
+        with open_cached_file(older):
+            pass
+        with open_cached_file(newer):
+            pass
+        with open_cached_file(newer):
+            pass
+
+        stats = get_storage_cache_stats(include_disk_usage=True)
+        assert stats['evictions'] == 1
+        assert stats['hits'] == 1
+        assert stats['cached_bytes'] == 200
+        assert evict_storage_cache() == 0
+
+    def test_misses_under_budget_do_not_walk_the_cache(self, remote_storage):
+        stored_files = [
+            _stored_file(remote_storage, f'originals/{index}.bin', b'x' * 100, f'hash-{index}') for index in range(5)
+        ]
+
+        with patch.object(
+            storage_cache, '_iter_cache_entries', wraps=storage_cache._iter_cache_entries
+        ) as mocked_walk, patch.object(storage_cache, 'evict_storage_cache') as mocked_evict:
+            for stored in stored_files:
+                with open_cached_file(stored):
+                    pass
+
+        # One walk seeds the running total; later misses only add to it.
+        assert mocked_walk.call_count == 1
+        mocked_evict.assert_not_called()
+        assert get_storage_cache_stats(include_disk_usage=True)['cached_bytes'] == 500
+
+    def test_running_total_triggers_eviction_and_resyncs_when_stale(self, remote_storage, settings):
+        settings.MEDIA_STORAGE_CACHE_MAX_BYTES = 250
+        settings.MEDIA_STORAGE_CACHE_RESYNC_SECONDS = 0
+        stored_files = [
+            _stored_file(remote_storage, f'originals/{index}.bin', b'x' * 100, f'hash-{index}') for index in range(3)
+        ]
+
+        with patch.object(storage_cache, '_iter_cache_entries', wraps=storage_cache._iter_cache_entries) as mocked_walk:
+            for stored in stored_files:
+                with open_cached_file(stored):
+                    pass
+
+        # With no resync window every miss re-reads the disk, and the third one also evicts.
+        assert mocked_walk.call_count == 4
+        assert get_storage_cache_stats(include_disk_usage=True)['cached_bytes'] == 200
+
+    def test_plain_file_objects_bypass_the_cache(self, remote_storage):
+        with open_cached_file(BytesIO(b'upload')) as handle:
+            assert handle.read() == b'upload'
+
+        stats = get_storage_cache_stats()
+        assert stats['hits'] == 0
+        assert stats['misses'] == 0
@@ -0,0 +1,101 @@
+import os
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from rest_framework import status
+
+from core.storage_deletion import drain_storage_deletions
+from media import storage_copy
+from media.models import MediaAttachment, MediaItem
+from media.storage_copy import copy_stored_file
+from vaults.models import Membership
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+
+class TestCopyStoredFile:
+    def test_filesystem_copies_share_the_inode(self, tmp_path):
+        storage = FileSystemStorage(location=str(tmp_path))
+        source_name = storage.save('uploads/scan.jpg', ContentFile(b'scan bytes'))
+
+        copied_name = copy_stored_file(storage, source_name, 'uploads/scan.jpg')
+
+        assert copied_name != source_name
+        assert os.stat(storage.path(copied_name)).st_ino == os.stat(storage.path(source_name)).st_ino
+
+    def test_backends_without_local_paths_stream_the_object(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(storage_copy, '_local_path', lambda storage, name: '')
+        storage = FileSystemStorage(location=str(tmp_path))
+        source_name = storage.save('uploads/scan.jpg', ContentFile(b'scan bytes'))
+
+        copied_name = copy_stored_file(storage, source_name, 'uploads/copy.jpg')
+
+        assert (tmp_path / copied_name).read_bytes() == b'scan bytes'
+        assert os.stat(tmp_path / copied_name).st_ino != os.stat(tmp_path / source_name).st_ino
+
+
+@pytest.mark.django_db
+class TestAttachmentPromotion:
+    def _remove_primary(self, api_client, media, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.patch(
+                reverse('media-detail', kwargs={'pk': media.id}),
+                {'removeFileIds': [f'primary-{media.id}']},
+                format='json',
+            )
+        drain_storage_deletions()
+        return response
+
+    def _media_with_attachment(self, api_client):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault, role=Membership.Roles.ADMIN)
+        api_client.force_authenticate(user=user)
+        media = MediaItemFactory(
+            vault=vault,
+            uploader=user,
+            file=SimpleUploadedFile('front.jpg', b'front', content_type='image/jpeg'),
+        )
+        attachment = MediaAttachment.objects.create(
+            media_item=media,
+            file=SimpleUploadedFile('back.jpg', b'back', content_type='image/jpeg'),
+            mime_type='image/jpeg',
+            original_name='back.jpg',
+        )
+        return media, attachment
+
+    def test_promotion_repoints_the_primary_at_the_attachment_key(
+        self, api_client, local_storage, django_capture_on_commit_callbacks, mock_ai_service
+    ):
+        media, attachment = self._media_with_attachment(api_client)
+        front_name, back_name = media.file.name, attachment.file.name
+
+        response = self._remove_primary(api_client, media, django_capture_on_commit_callbacks)
+
+        assert response.status_code == status.HTTP_200_OK
+        media.refresh_from_db()
+        assert media.file.name == back_name
+        assert not MediaAttachment.objects.filter(pk=attachment.pk).exists()
+        assert (local_storage / back_name).read_bytes() == b'back'
+        assert not (local_storage / front_name).exists()
+        stored_files = [path.relative_to(local_storage).as_posix() for path in local_storage.rglob('*') if path.is_file()]
+        assert stored_files == [back_name]
+
+    def test_promotion_by_copy_hardlinks_a_fresh_key(
+        self, api_client, local_storage, settings, django_capture_on_commit_callbacks, mock_ai_service
+    ):
+        settings.MEDIA_PROMOTE_BY_COPY = True
+        media, attachment = self._media_with_attachment(api_client)
+        back_name = attachment.file.name
+
+        response = self._remove_primary(api_client, media, django_capture_on_commit_callbacks)
+
+        assert response.status_code == status.HTTP_200_OK
+        media.refresh_from_db()
+        assert media.file.name != back_name
+        assert default_storage.open(media.file.name).read() == b'back'
+        # The attachment's own key goes with its row; the copy is independent of it.
+        assert not (local_storage / back_name).exists()
+        assert MediaItem.objects.get(pk=media.pk).file_size == 4
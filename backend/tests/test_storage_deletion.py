@@ -0,0 +1,131 @@
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from core import signals as core_signals
+from core import storage_deletion
+from core.models import StorageDeletion
+from core.storage_deletion import delete_storage_keys, drain_storage_deletions
+from audit.models import AuditLog
+from media.models import MediaAttachment, MediaItem, MediaItemLockTarget
+from vaults.models import Membership
+from .factories import FamilyVaultFactory, MediaItemFactory, MembershipFactory, UserFactory
+
+User = get_user_model()
+
+
+def _stored_files(root):
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*') if path.is_file())
+
+
+@pytest.mark.django_db
+class TestDeletionOutbox:
+    def test_vault_delete_queues_files_and_the_drainer_removes_them(
+        self, api_client, local_storage, storage_deletion_drainer, django_capture_on_commit_callbacks
+    ):
+        user = UserFactory()
+        vault = FamilyVaultFactory(owner=user)
+        MembershipFactory(user=user, vault=vault, role=Membership.Roles.ADMIN)
+        api_client.force_authenticate(user=user)
+        for index in range(3):
+            media = MediaItemFactory(
+                vault=vault,
+                uploader=user,
+                file=SimpleUploadedFile(f'scan-{index}.jpg', b'scan %d' % index, content_type='image/jpeg'),
+            )
+            MediaAttachment.objects.create(
+                media_item=media,
+                file=SimpleUploadedFile(f'back-{index}.jpg', b'back %d' % index, content_type='image/jpeg'),
+            )
+        assert len(_stored_files(local_storage)) == 6
+
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.delete(reverse('vaults-detail', kwargs={'pk': vault.id}))
+
+        assert response.status_code == status.HTTP_204_NO_CONTENT
+        # The request only wrote outbox rows; storage is untouched until the drainer runs.
+        assert len(_stored_files(local_storage)) == 6
+        assert StorageDeletion.objects.count() == 6
+        storage_deletion_drainer.assert_called_once()
+
+        assert drain_storage_deletions() == {'rows': 6, 'deleted': 6, 'kept': 0, 'failed': 0}
+        assert _stored_files(local_storage) == []
+        assert not StorageDeletion.objects.exists()
+
+    def test_user_delete_batches_its_cascade_into_one_drain(
+        self, local_storage, storage_deletion_drainer, django_capture_on_commit_callbacks
+    ):
+        user = UserFactory(avatar=SimpleUploadedFile('me.jpg', b'avatar', content_type='image/jpeg'))
+        vault = FamilyVaultFactory()
+        MembershipFactory(user=user, vault=vault)
+        upload = MediaItemFactory(
+            vault=vault,
+            uploader=user,
+            file=SimpleUploadedFile('scan.jpg', b'scan', content_type='image/jpeg'),
+        )
+        MediaItemLockTarget.objects.create(media_item=upload, user=user)
+        batches_seen = []
+        queue_file_deletion = core_signals._queue_file_deletion
+
+        def record_batch(*args):
+            batches_seen.append(core_signals.current_deletion_batch())
+            return queue_file_deletion(*args)
+
+        with patch.object(core_signals, '_queue_file_deletion', side_effect=record_batch):
+            with django_capture_on_commit_callbacks(execute=True):
+                user.delete()
+
+        assert not User.objects.filter(email=user.email).exists()
+        assert len(batches_seen) == 1 and batches_seen[0] is not None
+        assert StorageDeletion.objects.count() == 1
+        assert storage_deletion_drainer.call_count == 1
+        assert AuditLog.objects.filter(action=AuditLog.Action.DELETE).count() == 2
+
+        drain_storage_deletions()
+        upload.refresh_from_db()
+        assert upload.uploader is None
+        assert _stored_files(local_storage) == [upload.file.name]
+
+    def test_referenced_keys_are_kept_and_failures_back_off(self, local_storage, settings):
+        settings.STORAGE_DELETION_RETRY_SECONDS = 30
+        kept = MediaItemFactory(file=SimpleUploadedFile('kept.jpg', b'kept', content_type='image/jpeg'))
+        gone = MediaItemFactory(file=SimpleUploadedFile('gone.jpg', b'gone', content_type='image/jpeg'))
+        gone_name = gone.file.name
+        MediaItem.objects.filter(pk=gone.pk).delete()
+        StorageDeletion.objects.create(file_name=kept.file.name, model_label='media.MediaItem', field_name='file')
+
+        with patch.object(storage_deletion, 'delete_storage_keys', return_value={gone_name: 'SlowDown: retry'}):
+            result = drain_storage_deletions()
+
+        assert result == {'rows': 2, 'deleted': 0, 'kept': 1, 'failed': 1}
+        retry = StorageDeletion.objects.get()
+        assert (retry.file_name, retry.attempts, retry.last_error) == (gone_name, 1, 'SlowDown: retry')
+        assert timedelta(seconds=25) < retry.next_attempt_at - timezone.now() <= timedelta(seconds=30)
+        assert drain_storage_deletions()['rows'] == 0
+
+        StorageDeletion.objects.update(next_attempt_at=timezone.now())
+        assert drain_storage_deletions()['deleted'] == 1
+        assert _stored_files(local_storage) == [kept.file.name]
+
+
+class TestDeleteStorageKeys:
+    def test_s3_keys_go_out_in_one_delete_objects_call(self):
+        storage = MagicMock()
+        storage._normalize_name.side_effect = lambda name: f'media/{name}'
+        storage.bucket.delete_objects.return_value = {
+            'Errors': [{'Key': 'media/b.jpg', 'Code': 'AccessDenied', 'Message': 'Denied'}],
+        }
+
+        errors = delete_storage_keys(storage, ['a.jpg', 'b.jpg'])
+
+        assert errors == {'b.jpg': 'AccessDenied: Denied'}
+        storage.bucket.delete_objects.assert_called_once_with(
+            Delete={'Objects': [{'Key': 'media/a.jpg'}, {'Key': 'media/b.jpg'}], 'Quiet': True},
+        )
+        storage.delete.assert_not_called()
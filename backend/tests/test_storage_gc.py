@@ -0,0 +1,95 @@
+import os
+import time
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import MagicMock
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from media.models import MediaItem
+from media.storage_gc import collect_orphaned_objects, iter_stored_objects
+from .factories import MediaItemFactory
+
+
+def _age(root, name, hours=48):
+    stamp = time.time() - hours * 3600
+    os.utime(root / name, (stamp, stamp))
+
+
+def _stored_files(root):
+    return sorted(path.relative_to(root).as_posix() for path in root.rglob('*') if path.is_file())
+
+
+@pytest.mark.django_db
+class TestOrphanedObjectCollection:
+    def test_only_old_unreferenced_objects_are_collected(self, local_storage):
+        media = MediaItemFactory(file=SimpleUploadedFile('scan.jpg', b'scan', content_type='image/jpeg'))
+        thumbnail = default_storage.save(f'face-thumbnails/{media.id}/run/face-1.jpg', ContentFile(b'face'))
+        stale_thumbnail = default_storage.save(f'face-thumbnails/{media.id}/old-run/face-1.jpg', ContentFile(b'old'))
+        preview = default_storage.save(f'restored-media/previews/{media.id}/task.jpg', ContentFile(b'preview'))
+        leftover_upload = default_storage.save('uploads/mediaitem/leftover.jpg', ContentFile(b'leftover'))
+        fresh_upload = default_storage.save('uploads/mediaitem/in-flight.jpg', ContentFile(b'fresh'))
+        MediaItem.objects.filter(pk=media.pk).update(
+            face_detection_data={'faces': [{'face_id': 'face-1', 'thumbnail_path': thumbnail}]},
+            restoration_data={'preview': {'restored_path': preview}},
+        )
+        for name in _stored_files(local_storage):
+            if name != fresh_upload:
+                _age(local_storage, name)
+
+        orphans = []
+        report = collect_orphaned_objects(
+            dry_run=True,
+            batch_size=2,
+            on_orphan=lambda stored: orphans.append(stored.name),
+        )
+
+        assert sorted(orphans) == sorted([stale_thumbnail, leftover_upload])
+        assert report == {
+            'scanned': 6,
+            'recent': 1,
+            'referenced': 3,
+            'orphaned': 2,
+            'orphaned_bytes': len(b'old') + len(b'leftover'),
+            'deleted': 0,
+            'failed': 0,
+        }
+        assert len(_stored_files(local_storage)) == 6
+
+        report = collect_orphaned_objects(dry_run=False)
+
+        assert report['deleted'] == 2
+        assert _stored_files(local_storage) == sorted([media.file.name, thumbnail, preview, fresh_upload])
+
+    def test_prefix_limits_the_scan(self, local_storage):
+        default_storage.save('face-thumbnails/x/face.jpg', ContentFile(b'face'))
+        default_storage.save('uploads/mediaitem/other.jpg', ContentFile(b'other'))
+
+        names = [stored.name for stored in iter_stored_objects(default_storage, 'face-thumbnails')]
+
+        assert names == ['face-thumbnails/x/face.jpg']
+
+
+class TestStoredObjectListing:
+    def test_s3_listing_is_paged_and_relative_to_the_location(self):
+        storage = MagicMock()
+        storage.location = 'media'
+        storage.bucket.name = 'legacykeeper'
+        modified = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+        paginator = storage.bucket.meta.client.get_paginator.return_value
+        paginator.paginate.return_value = iter([
+            {'Contents': [{'Key': 'media/a.jpg', 'Size': 3, 'LastModified': modified}]},
+            {'Contents': [{'Key': 'media/uploads/b.jpg', 'Size': 5, 'LastModified': modified}]},
+        ])
+
+        listed = list(iter_stored_objects(storage))
+
+        assert [(stored.name, stored.size) for stored in listed] == [('a.jpg', 3), ('uploads/b.jpg', 5)]
+        paginator.paginate.assert_called_once_with(
+            Bucket='legacykeeper',
+            Prefix='media/',
+            PaginationConfig={'PageSize': 1000},
+        )
+        assert listed[0].modified_at == modified
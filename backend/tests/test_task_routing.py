@@ -0,0 +1,35 @@
+import pytest
+
+from config.celery import app
+
+
+@pytest.mark.parametrize(
+    ('task_name', 'queue', 'priority'),
+    [
+        ('media.tasks.restore_media_preview_task', 'media.priority', 0),
+        ('media.tasks.extract_media_exif_task', 'media.fast', 2),
+        ('media.tasks.analyze_media_task', 'media.vision', 4),
+        ('media.tasks.analyze_media_file_task', 'media.vision', 4),
+        ('media.tasks.finish_media_analysis_fanout_task', 'media.vision', 4),
+        ('media.tasks.detect_media_faces_task', 'media.vision', 4),
+        ('media.tasks.detect_media_file_faces_task', 'media.vision', 4),
+        ('media.tasks.finish_media_faces_fanout_task', 'media.vision', 4),
+        ('media.tasks.extract_media_file_exif_task', 'media.fast', 2),
+        ('media.tasks.reprocess_media_batch_task', 'media.vision', 8),
+        ('media.tasks.restore_media_photo_task', 'media.restore', 4),
+        ('media.tasks.extract_media_document_task', 'media.documents', 6),
+    ],
+)
+def test_media_tasks_are_routed_by_latency_class(task_name, queue, priority):
+    route = app.amqp.router.route({}, task_name, (), {})
+
+    assert route['queue'].name == queue
+    assert route['priority'] == priority
+
+
+def test_expensive_stages_never_share_a_queue_with_exif():
+    routes = app.conf.task_routes
+    fast_queue = routes['media.tasks.extract_media_exif_task']['queue']
+
+    assert routes['media.tasks.restore_media_photo_task']['queue'] != fast_queue
+    assert routes['media.tasks.analyze_media_task']['queue'] != fast_queue
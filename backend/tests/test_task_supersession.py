@@ -0,0 +1,87 @@
+from io import BytesIO
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+
+from media.models import MediaItem
+from media.services import AIProcessingService
+from media.supersession import TaskSuperseded, get_supersession_stats, is_task_superseded, supersede_tasks
+from .factories import MediaItemFactory
+
+
+@pytest.mark.django_db
+class TestTaskSupersession:
+    def test_requeue_supersedes_only_tasks_that_lost_every_stage(self, django_capture_on_commit_callbacks):
+        media = MediaItemFactory(
+            media_type=MediaItem.MediaType.PHOTO,
+            exif_task_id='analysis-1',
+            face_detection_task_id='analysis-1',
+        )
+
+        with patch('media.services.detect_media_faces_task.apply_async'):
+            with django_capture_on_commit_callbacks(execute=True):
+                AIProcessingService().enqueue_face_detection_only(media)
+            first_face_task_id = MediaItem.objects.get(pk=media.pk).face_detection_task_id
+
+            # The combined run still owns EXIF, so it keeps going.
+            assert not is_task_superseded('analysis-1')
+
+            with django_capture_on_commit_callbacks(execute=True):
+                AIProcessingService().enqueue_face_detection_only(media)
+
+        assert is_task_superseded(first_face_task_id)
+        assert get_supersession_stats()['process']['superseded_tasks'] == 1
+
+    def test_superseded_tasks_are_revoked_when_enabled(self, settings):
+        settings.MEDIA_TASK_REVOKE_SUPERSEDED = True
+
+        with patch('media.supersession._revoke_queued') as mocked_revoke:
+            assert supersede_tasks(['task-b', '', 'task-a', 'task-a']) == 2
+
+        mocked_revoke.assert_called_once_with(['task-a', 'task-b'])
+        assert get_supersession_stats()['total']['revoke_requests'] == 2
+
+    def test_running_analysis_stops_at_next_file_when_superseded(self):
+        from media import tasks as media_tasks
+
+        media = MediaItemFactory(exif_task_id='analysis-1', face_detection_task_id='analysis-1')
+        source_files = [
+            {'file_id': f'file-{index}', 'file_obj': None, 'original_name': f'{index}.jpg', 'is_primary': index == 0}
+            for index in range(4)
+        ]
+
+        def analyze_then_supersede(_file_obj, **_options):
+            supersede_tasks(['analysis-1'])
+            return {'exif': {}, 'image': None, 'perceptual_hash': None}
+
+        with patch.object(media_tasks, '_iter_media_files', return_value=iter(source_files)), patch.object(
+            media_tasks, '_analyze_source_file', side_effect=analyze_then_supersede
+        ) as mocked_analyze:
+            result = media_tasks.run_media_analysis(str(media.id), 'analysis-1')
+
+        media.refresh_from_db()
+        assert mocked_analyze.call_count == 1
+        assert result['reason'] == 'superseded'
+        assert result['files_skipped'] == 3
+        assert result['supersession']['process']['cancelled_runs'] == 1
+        assert result['supersession']['process']['stages_skipped'] == 2
+        assert media.exif_status == MediaItem.ExifStatus.PROCESSING
+
+    def test_restoration_pipeline_checkpoint_abandons_remaining_stages(self):
+        from media.vision import restore_legacy_photo
+
+        buffer = BytesIO()
+        Image.new('RGB', (48, 48), (120, 120, 120)).save(buffer, format='JPEG')
+        buffer.seek(0)
+        finished_stages = []
+
+        def checkpoint(stage):
+            finished_stages.append(stage)
+            if stage == 'analyze':
+                raise TaskSuperseded('restore-1')
+
+        with pytest.raises(TaskSuperseded):
+            restore_legacy_photo(buffer, apply_colorize=True, apply_denoise=True, checkpoint=checkpoint)
+
+        assert finished_stages == ['decode', 'analyze']
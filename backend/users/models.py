@@ -1,5 +1,5 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import models, transaction
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 import uuid
@@ -30,6 +30,14 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
 
+    def delete(self, *args, **kwargs):
+        from core.signals import batched_row_deletion
+
+        # Memberships, favourites and notifications cascade; the avatar and any cascaded files reach
+        # the deletion outbox in one INSERT and the drainer removes them after commit.
+        with transaction.atomic(), batched_row_deletion():
+            return super().delete(*args, **kwargs)
+
     def is_reset_password_token_valid(self, token) -> bool:
         if not self.reset_password_token or not self.reset_password_token_expires_at:
             return False
@@ -5,8 +5,8 @@ import uuid
 from rest_framework import viewsets, permissions, status, decorators, exceptions
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.db import transaction, IntegrityError
-from django.db.models import Q, Sum, Value, BigIntegerField, F, Prefetch
+from django.db import transaction
+from django.db.models import Q, Count, Sum, Value, BigIntegerField, F
 from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib.auth import get_user_model
@@ -25,10 +25,26 @@ from .serializers import (
 )
 from .permissions import IsVaultAdmin
 from core.services import EmailService
+from core.signals import batched_row_deletion
 from core.storage_urls import build_storage_file_url
 from django.conf import settings
-from media.models import MediaAttachment, MediaItem
-from genealogy.models import MediaTag
+from media.duplicates import items_missing_hashes
+from media.duplicate_cleanup import (
+    resume_duplicate_cleanup,
+    serialize_duplicate_cleanup_run,
+    start_duplicate_cleanup,
+)
+from media.models import DuplicateCleanupRun, DuplicateGroup, MediaItem, MediaReprocessRun
+from media.perceptual_hash import find_near_duplicate_clusters, from_stored_hash, hash_similarity
+from media.reprocessing import (
+    cancel_reprocess_run,
+    normalize_reprocess_options,
+    pause_reprocess_run,
+    resume_reprocess_run,
+    serialize_reprocess_run,
+    start_reprocess_run,
+)
+from media.tasks import schedule_hash_backfill
 from users.serializers import serialize_user_payload
 
 User = get_user_model()
@@ -71,96 +87,128 @@ class FamilyVaultViewSet(viewsets.ModelViewSet):
                 role=Membership.Roles.ADMIN
             )
 
+    def perform_destroy(self, instance):
+        # A vault cascades to every media file; the files are queued in the deletion outbox with one
+        # INSERT and removed by the drainer after commit, so the request does no storage calls.
+        with transaction.atomic(), batched_row_deletion():
+            instance.delete()
+
     def _absolute_media_url(self, item):
         if not item.file:
             return None
         return build_storage_file_url(item.file, request=self.request)
 
-    def _normalize_metadata_tags(self, raw_tags):
-        if isinstance(raw_tags, str):
-            raw_tags = [tag.strip() for tag in raw_tags.split(',') if tag.strip()]
-        if not isinstance(raw_tags, list):
-            return []
-        return [str(tag).strip() for tag in raw_tags if str(tag).strip()]
-
     def _resolve_duplicate_groups(self, vault, selected_hashes=None):
-        media_items = list(
-            MediaItem.objects.filter(vault=vault)
-            .only(
-                'id',
-                'title',
-                'description',
-                'date_taken',
-                'metadata',
-                'file',
-                'file_size',
-                'content_hash',
-                'created_at',
-            )
-            .prefetch_related(
-                Prefetch(
-                    'attachments',
-                    queryset=MediaAttachment.objects.only(
-                        'id',
-                        'media_item_id',
-                        'file',
-                        'content_hash',
-                        'created_at',
-                    ).order_by('created_at', 'id'),
+        """Byte-identical groups from the persisted ``DuplicateGroup`` table, largest savings first."""
+        groups = DuplicateGroup.objects.filter(vault=vault)
+        if selected_hashes:
+            groups = groups.filter(signature__in=selected_hashes)
+        return groups
+
+    def _load_duplicate_groups(self, groups):
+        groups = list(groups.select_related('primary'))
+        members_by_signature = defaultdict(list)
+        if groups:
+            members = (
+                MediaItem.objects.filter(
+                    vault_id=groups[0].vault_id,
+                    duplicate_signature__in=[group.signature for group in groups],
+                )
+                .exclude(pk__in=[group.primary_id for group in groups])
+                .only(
+                    'id',
+                    'vault_id',
+                    'title',
+                    'description',
+                    'date_taken',
+                    'metadata',
+                    'file',
+                    'file_size',
+                    'duplicate_signature',
+                    'created_at',
                 )
+                .order_by('created_at', 'id')
             )
-            .order_by('created_at', 'id')
-        )
-
-        grouped = defaultdict(list)
-        for item in media_items:
-            primary_hash = item.content_hash or item.ensure_content_hash(persist=True)
-            if primary_hash:
-                item.content_hash = primary_hash
-
-            component_hashes = [primary_hash] if primary_hash else []
-            for attachment in item.attachments.all():
-                attachment_hash = attachment.content_hash or attachment.ensure_content_hash(persist=True)
-                if attachment_hash:
-                    attachment.content_hash = attachment_hash
-                    component_hashes.append(attachment_hash)
-
-            normalized_hashes = sorted([token for token in component_hashes if token])
-            if not normalized_hashes:
-                continue
-
-            signature_source = '|'.join(normalized_hashes)
-            group_hash = hashlib.sha256(signature_source.encode('utf-8')).hexdigest()
-            if selected_hashes and group_hash not in selected_hashes:
-                continue
+            for item in members:
+                members_by_signature[item.duplicate_signature].append(item)
+        return [
+            {
+                'hash': group.signature,
+                'primary': group.primary,
+                'duplicates': members_by_signature[group.signature],
+                'reclaimable_bytes': int(group.reclaimable_bytes or 0),
+            }
+            for group in groups
+            if members_by_signature[group.signature]
+        ]
 
-            grouped[group_hash].append(item)
+    def _summarize_duplicate_groups(self, groups):
+        totals = groups.aggregate(
+            group_count=Count('id'),
+            item_count=Coalesce(Sum('item_count'), Value(0)),
+            reclaimable_bytes=Coalesce(Sum('reclaimable_bytes'), Value(0), output_field=BigIntegerField()),
+        )
+        return {
+            'groups_count': totals['group_count'],
+            'duplicate_items_count': int(totals['item_count']) - totals['group_count'],
+            'reclaimable_bytes': int(totals['reclaimable_bytes']),
+        }
 
-        duplicate_groups = []
-        for content_hash, items in grouped.items():
-            if len(items) < 2:
+    def _resolve_near_duplicate_groups(self, vault):
+        """Photos that look alike (re-scans, resized or recompressed copies) without sharing bytes."""
+        rows = []
+        seen_signatures = set()
+        for item_id, perceptual_hash, file_size, signature in (
+            MediaItem.objects.filter(vault=vault, perceptual_hash__isnull=False)
+            .order_by('created_at', 'id')
+            .values_list('id', 'perceptual_hash', 'file_size', 'duplicate_signature')
+        ):
+            # Byte-identical copies are reported as exact groups; only their primary takes part here.
+            if signature and signature in seen_signatures:
                 continue
+            seen_signatures.add(signature)
+            rows.append((item_id, perceptual_hash, file_size))
+        file_sizes = {item_id: int(file_size or 0) for item_id, _perceptual_hash, file_size in rows}
+        clusters = find_near_duplicate_clusters(
+            [item_id for item_id, _perceptual_hash, _file_size in rows],
+            [from_stored_hash(perceptual_hash) for _item_id, perceptual_hash, _file_size in rows],
+            max_distance=int(getattr(settings, 'MEDIA_NEAR_DUPLICATE_MAX_DISTANCE', 4)),
+        )
 
-            primary = items[0]
-            duplicates = items[1:]
-            reclaimable_bytes = sum(int(duplicate.file_size or 0) for duplicate in duplicates)
-            duplicate_groups.append(
+        groups = []
+        for cluster in clusters:
+            member_ids = cluster['keys']
+            groups.append(
                 {
-                    'hash': content_hash,
-                    'primary': primary,
-                    'duplicates': duplicates,
-                    'reclaimable_bytes': reclaimable_bytes,
+                    'hash': hashlib.sha256(
+                        ('near|' + '|'.join(str(item_id) for item_id in member_ids)).encode('utf-8')
+                    ).hexdigest(),
+                    'member_ids': member_ids,
+                    'similarities': {
+                        item_id: hash_similarity(distance) for item_id, distance in cluster['distances'].items()
+                    },
+                    'reclaimable_bytes': sum(file_sizes[item_id] for item_id in member_ids[1:]),
                 }
             )
-
-        duplicate_groups.sort(key=lambda group: group['reclaimable_bytes'], reverse=True)
-        return duplicate_groups, len(media_items)
+        groups.sort(key=lambda group: group['reclaimable_bytes'], reverse=True)
+        return groups
+
+    def _load_near_duplicate_members(self, groups):
+        member_ids = {item_id for group in groups for item_id in group['member_ids']}
+        items = MediaItem.objects.filter(pk__in=member_ids).only('id', 'title', 'file', 'file_size', 'created_at')
+        items_by_id = {item.id: item for item in items}
+        for group in groups:
+            members = [items_by_id[item_id] for item_id in group['member_ids'] if item_id in items_by_id]
+            group['primary'] = members[0] if members else None
+            group['duplicates'] = members[1:]
+        return [group for group in groups if group['primary'] is not None and group['duplicates']]
 
     def _serialize_duplicate_group(self, group):
         primary = group['primary']
         duplicates = group['duplicates']
+        similarities = group.get('similarities')
 
-        return {
+        serialized = {
             'hash': group['hash'],
             'reclaimable_bytes': group['reclaimable_bytes'],
             'duplicate_count': len(duplicates),
@@ -182,133 +230,148 @@ class FamilyVaultViewSet(viewsets.ModelViewSet):
                 for item in duplicates
             ],
         }
-
-    def _merge_duplicate_into_primary(self, primary, duplicate):
-        primary_metadata = primary.metadata if isinstance(primary.metadata, dict) else {}
-        duplicate_metadata = duplicate.metadata if isinstance(duplicate.metadata, dict) else {}
-        updated_metadata = dict(primary_metadata)
-
-        primary_tags = self._normalize_metadata_tags(primary_metadata.get('tags'))
-        duplicate_tags = self._normalize_metadata_tags(duplicate_metadata.get('tags'))
-        merged_tags = sorted(set(primary_tags + duplicate_tags))
-        if merged_tags:
-            updated_metadata['tags'] = merged_tags
-
-        primary_location = str(primary_metadata.get('location') or '').strip()
-        duplicate_location = str(duplicate_metadata.get('location') or '').strip()
-        if not primary_location and duplicate_location:
-            updated_metadata['location'] = duplicate_location
-
-        changed_fields = []
-        if updated_metadata != primary_metadata:
-            primary.metadata = updated_metadata
-            changed_fields.append('metadata')
-
-        if (not primary.title or primary.title.lower().startswith('untitled')) and duplicate.title:
-            primary.title = duplicate.title
-            changed_fields.append('title')
-
-        if (not primary.description) and duplicate.description:
-            primary.description = duplicate.description
-            changed_fields.append('description')
-
-        if primary.date_taken is None and duplicate.date_taken is not None:
-            primary.date_taken = duplicate.date_taken
-            changed_fields.append('date_taken')
-
-        if changed_fields:
-            primary.save(update_fields=list(set(changed_fields)))
-
-        duplicate_tags_qs = MediaTag.objects.filter(media_item=duplicate).only(
-            'id',
-            'media_item_id',
-            'person_id',
-            'face_coordinates',
-            'created_by_id',
-        )
-        for tag in duplicate_tags_qs:
-            exists = MediaTag.objects.filter(media_item=primary, person_id=tag.person_id).exists()
-            if exists:
-                tag.delete()
-                continue
-            tag.media_item = primary
-            try:
-                tag.save(update_fields=['media_item'])
-            except IntegrityError:
-                tag.delete()
+        if similarities is not None:
+            serialized['similarity'] = min(similarities[item.id] for item in duplicates)
+            for entry, item in zip(serialized['duplicates'], duplicates):
+                entry['similarity'] = similarities[item.id]
+        return serialized
 
     @decorators.action(detail=True, methods=['get'], url_path='health-analysis', permission_classes=[IsVaultAdmin])
     def health_analysis(self, request, pk=None):
         vault = self.get_object()
-        duplicate_groups, total_items = self._resolve_duplicate_groups(vault)
+        duplicate_groups = self._resolve_duplicate_groups(vault)
+        summary = self._summarize_duplicate_groups(duplicate_groups)
+        near_duplicate_groups = self._resolve_near_duplicate_groups(vault)
 
-        duplicate_count = sum(len(group['duplicates']) for group in duplicate_groups)
-        reclaimable_bytes = sum(group['reclaimable_bytes'] for group in duplicate_groups)
+        # Hashes are filled in by a background job; the report covers what is hashed so far.
+        pending_hash_items = items_missing_hashes(perceptual=False).filter(vault=vault).count()
+        if pending_hash_items:
+            schedule_hash_backfill(vault.id)
 
         return Response(
             {
                 'vault_id': str(vault.id),
                 'generated_at': timezone.now(),
-                'total_items': total_items,
-                'duplicate_groups_count': len(duplicate_groups),
-                'duplicate_items_count': duplicate_count,
-                'reclaimable_bytes': reclaimable_bytes,
-                'groups': [self._serialize_duplicate_group(group) for group in duplicate_groups[:100]],
+                'total_items': MediaItem.objects.filter(vault=vault).count(),
+                'pending_hash_items': pending_hash_items,
+                'duplicate_groups_count': summary['groups_count'],
+                'duplicate_items_count': summary['duplicate_items_count'],
+                'reclaimable_bytes': summary['reclaimable_bytes'],
+                'groups': [
+                    self._serialize_duplicate_group(group)
+                    for group in self._load_duplicate_groups(duplicate_groups[:100])
+                ],
+                'near_duplicate_groups_count': len(near_duplicate_groups),
+                'near_duplicate_items_count': sum(len(group['member_ids']) - 1 for group in near_duplicate_groups),
+                'near_duplicate_reclaimable_bytes': sum(group['reclaimable_bytes'] for group in near_duplicate_groups),
+                'near_duplicate_groups': [
+                    self._serialize_duplicate_group(group)
+                    for group in self._load_near_duplicate_members(near_duplicate_groups[:100])
+                ],
             }
         )
 
-    @decorators.action(detail=True, methods=['post'], url_path='cleanup-redundant', permission_classes=[IsVaultAdmin])
+    @decorators.action(
+        detail=True,
+        methods=['get', 'post'],
+        url_path='cleanup-redundant',
+        permission_classes=[IsVaultAdmin],
+    )
     def cleanup_redundant(self, request, pk=None):
         vault = self.get_object()
-        raw_hashes = request.data.get('groupHashes') or []
-        selected_hashes = {str(value).strip() for value in raw_hashes if str(value).strip()}
+        runs = DuplicateCleanupRun.objects.filter(vault=vault).order_by('-created_at')
 
-        dry_run_raw = request.data.get('dryRun', False)
-        dry_run = str(dry_run_raw).strip().lower() in ('true', '1', 'yes')
+        if request.method.lower() == 'get':
+            return Response({'runs': [serialize_duplicate_cleanup_run(run) for run in runs[:20]]})
 
-        duplicate_groups, _ = self._resolve_duplicate_groups(
-            vault,
-            selected_hashes=selected_hashes if selected_hashes else None,
-        )
+        action_name = str(request.data.get('action') or 'start').strip().lower()
+        if action_name == 'resume':
+            run_id = str(request.data.get('run_id', request.data.get('runId')) or '').strip()
+            if not run_id:
+                raise exceptions.ValidationError({'runId': 'This field is required.'})
+            try:
+                run = resume_duplicate_cleanup(get_object_or_404(runs, pk=run_id))
+            except ValueError as exc:
+                raise exceptions.ValidationError({'detail': str(exc)})
+            return Response(serialize_duplicate_cleanup_run(run), status=status.HTTP_202_ACCEPTED)
+        if action_name != 'start':
+            raise exceptions.ValidationError({'action': 'Use one of: start, resume.'})
+
+        # The camel-case parser hands these over as snake_case keys.
+        raw_hashes = request.data.get('group_hashes', request.data.get('groupHashes')) or []
+        selected_hashes = {str(value).strip() for value in raw_hashes if str(value).strip()}
 
-        duplicate_count = sum(len(group['duplicates']) for group in duplicate_groups)
-        reclaimable_bytes = sum(group['reclaimable_bytes'] for group in duplicate_groups)
+        dry_run_raw = request.data.get('dry_run', request.data.get('dryRun', False))
+        dry_run = str(dry_run_raw).strip().lower() in ('true', '1', 'yes')
 
         if dry_run:
+            duplicate_groups = self._resolve_duplicate_groups(
+                vault,
+                selected_hashes=selected_hashes if selected_hashes else None,
+            )
+            summary = self._summarize_duplicate_groups(duplicate_groups)
             return Response(
                 {
                     'dry_run': True,
-                    'groups_selected': len(duplicate_groups),
-                    'duplicate_items_count': duplicate_count,
-                    'reclaimable_bytes': reclaimable_bytes,
-                    'groups': [self._serialize_duplicate_group(group) for group in duplicate_groups[:100]],
+                    'groups_selected': summary['groups_count'],
+                    'duplicate_items_count': summary['duplicate_items_count'],
+                    'reclaimable_bytes': summary['reclaimable_bytes'],
+                    'groups': [
+                        self._serialize_duplicate_group(group)
+                        for group in self._load_duplicate_groups(duplicate_groups[:100])
+                    ],
                 }
             )
 
-        deleted_items = 0
-        recovered_bytes = 0
+        # Merging runs in the background, one group per transaction; GET reports its progress.
+        try:
+            run = start_duplicate_cleanup(vault=vault, requested_by=request.user, signatures=selected_hashes)
+        except ValueError as exc:
+            raise exceptions.ValidationError({'detail': str(exc)})
+        return Response(serialize_duplicate_cleanup_run(run), status=status.HTTP_202_ACCEPTED)
 
-        with transaction.atomic():
-            for group in duplicate_groups:
-                primary = group['primary']
-                for duplicate in group['duplicates']:
-                    self._merge_duplicate_into_primary(primary, duplicate)
-                    recovered_bytes += int(duplicate.file_size or 0)
-                    duplicate.delete()
-                    deleted_items += 1
+    @decorators.action(detail=True, methods=['get', 'post'], url_path='reprocess-media', permission_classes=[IsVaultAdmin])
+    def reprocess_media(self, request, pk=None):
+        vault = self.get_object()
+        runs = MediaReprocessRun.objects.filter(vault=vault).order_by('-created_at')
 
-        remaining_groups, _ = self._resolve_duplicate_groups(vault)
+        if request.method.lower() == 'get':
+            return Response({'runs': [serialize_reprocess_run(run) for run in runs[:20]]})
 
-        return Response(
-            {
-                'dry_run': False,
-                'groups_processed': len(duplicate_groups),
-                'deleted_items_count': deleted_items,
-                'recovered_bytes': recovered_bytes,
-                'remaining_duplicate_groups': len(remaining_groups),
-                'message': 'Redundant files cleanup completed.',
+        action_name = str(request.data.get('action') or 'start').strip().lower()
+        run_id = str(request.data.get('run_id', request.data.get('runId')) or '').strip()
+        try:
+            if action_name == 'start':
+                run_options = normalize_reprocess_options(
+                    {
+                        'stages': request.data.get('stages'),
+                        'statuses': request.data.get('statuses'),
+                        'batch_size': request.data.get('batch_size', request.data.get('batchSize')),
+                        'rate_limit_per_minute': request.data.get(
+                            'rate_limit_per_minute',
+                            request.data.get('rateLimitPerMinute'),
+                        ),
+                        'max_in_flight': request.data.get('max_in_flight', request.data.get('maxInFlight')),
+                    }
+                )
+                run = start_reprocess_run(vault=vault, requested_by=request.user, options=run_options)
+                return Response(serialize_reprocess_run(run), status=status.HTTP_202_ACCEPTED)
+
+            handlers = {
+                'pause': pause_reprocess_run,
+                'resume': resume_reprocess_run,
+                'cancel': cancel_reprocess_run,
             }
-        )
+            handler = handlers.get(action_name)
+            if handler is None:
+                raise exceptions.ValidationError({'action': 'Use one of: start, pause, resume, cancel.'})
+            if not run_id:
+                raise exceptions.ValidationError({'runId': 'This field is required.'})
+            run = get_object_or_404(runs, pk=run_id)
+            run = handler(run)
+        except ValueError as exc:
+            raise exceptions.ValidationError({'detail': str(exc)})
+        return Response(serialize_reprocess_run(run))
 
     @decorators.action(detail=True, methods=['post'], permission_classes=[IsVaultAdmin])
     def invite(self, request, pk=None):
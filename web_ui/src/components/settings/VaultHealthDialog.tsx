@@ -1,6 +1,6 @@
 import React, { useMemo, useState } from 'react';
 import { AlertTriangle, RefreshCw, ShieldCheck, Trash2, X } from 'lucide-react';
-import type { VaultHealthReport } from '../../types';
+import type { ApiVaultCleanupRun, VaultHealthReport } from '../../types';
 import ConfirmModal from '../ui/ConfirmModal';
 
 interface VaultHealthDialogProps {
@@ -12,6 +12,7 @@ interface VaultHealthDialogProps {
     duplicateItemsCount?: number;
     reclaimableBytes?: number;
   } | null;
+  cleanupProgress?: ApiVaultCleanupRun | null;
   selectedHashes: string[];
   onToggleHash: (hash: string) => void;
   onSelectAll: () => void;
@@ -40,6 +41,7 @@ const VaultHealthDialog: React.FC<VaultHealthDialogProps> = ({
   isLoading,
   isCleaning,
   preview,
+  cleanupProgress,
   selectedHashes,
   onToggleHash,
   onSelectAll,
@@ -141,6 +143,15 @@ const VaultHealthDialog: React.FC<VaultHealthDialogProps> = ({
             </div>
           </div>
 
+          {cleanupProgress && (
+            <div className="mx-6 mt-4 p-4 rounded-2xl border border-amber-200 dark:border-amber-900/40 bg-amber-50/70 dark:bg-amber-950/20 text-xs text-amber-700 dark:text-amber-300">
+              Cleaning: {cleanupProgress.groupsProcessed} of {cleanupProgress.groupsSelected} groups merged,{' '}
+              {cleanupProgress.deletedItemsCount} duplicate files removed and{' '}
+              {formatBytes(cleanupProgress.recoveredBytes)} recovered so far (
+              {Math.round(cleanupProgress.progressPercent)}%).
+            </div>
+          )}
+
           {preview && (
             <div className="mx-6 mt-4 p-4 rounded-2xl border border-blue-200 dark:border-blue-900/40 bg-blue-50/70 dark:bg-blue-950/20 text-xs text-blue-700 dark:text-blue-300">
               Preview: {preview.duplicateItemsCount || 0} duplicate files can be cleaned, recovering{' '}
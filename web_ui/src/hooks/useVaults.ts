@@ -2,7 +2,7 @@ import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { vaultApi } from '../services/vaultApi';
 import { toast } from 'sonner';
 import { getApiErrorMessage } from '../services/httpError';
-import type { CreateVaultRequest, UpdateVaultRequest } from '../types/api.types';
+import type { ApiVaultCleanupRun, CreateVaultRequest, UpdateVaultRequest } from '../types/api.types';
 
 export const useVaults = () => {
   return useQuery({
@@ -63,6 +63,22 @@ export const useVaultHealthAnalysis = (vaultId: string, enabled = true) => {
   });
 };
 
+export const useVaultCleanupRun = (vaultId: string, runId: string | null) => {
+  return useQuery({
+    queryKey: ['vaultCleanupRun', vaultId, runId],
+    queryFn: async () => {
+      const runs = await vaultApi.getVaultCleanupRuns(vaultId);
+      return runs.find((run) => run.id === runId) ?? null;
+    },
+    enabled: Boolean(vaultId) && Boolean(runId),
+    refetchInterval: (query) => {
+      const run = query.state.data as ApiVaultCleanupRun | null | undefined;
+      if (run === null) return false;
+      return !run || run.status === 'RUNNING' ? 2500 : false;
+    },
+  });
+};
+
 export const useCleanupVaultRedundant = () => {
   const queryClient = useQueryClient();
 
@@ -82,7 +98,7 @@ export const useCleanupVaultRedundant = () => {
       if (variables.dryRun) {
         toast.success('Redundancy preview generated');
       } else {
-        toast.success('Redundant files cleanup complete');
+        toast.success('Redundant files cleanup started');
       }
     },
     onError: (error) => {
@@ -40,6 +40,7 @@ import {
   useCleanupVaultRedundant,
   useUpdateVault,
   useVault,
+  useVaultCleanupRun,
   useVaultHealthAnalysis,
 } from '@/hooks/useVaults';
 import { useTranslation } from '@/i18n/LanguageContext';
@@ -70,6 +71,9 @@ const Settings = () => {
     activeVaultId || '',
     activeTab === 'vault' && currentUser?.role === UserRole.ADMIN
   );
+  const [cleanupRunId, setCleanupRunId] = useState<string | null>(null);
+  const cleanupRunQuery = useVaultCleanupRun(activeVaultId || '', cleanupRunId);
+  const cleanupRun = cleanupRunId ? cleanupRunQuery.data : null;
   const { data: membersData } = useMembers(
     { status: MemberStatus.ACTIVE },
     { enabled: activeTab === 'vault' }
@@ -244,6 +248,7 @@ const Settings = () => {
       { vaultId: activeVaultId, groupHashes: selectedHealthHashes, dryRun: true },
       {
         onSuccess: (result) => {
+          if (!result.dryRun) return;
           setHealthPreview({
             duplicateItemsCount: result.duplicateItemsCount || 0,
             reclaimableBytes: result.reclaimableBytes || 0,
@@ -259,16 +264,32 @@ const Settings = () => {
       { vaultId: activeVaultId, groupHashes: selectedHealthHashes, dryRun: false },
       {
         onSuccess: (result) => {
-          setHealthPreview({
-            duplicateItemsCount: result.deletedItemsCount || 0,
-            reclaimableBytes: result.recoveredBytes || 0,
-          });
-          void healthAnalysisQuery.refetch();
+          if (result.dryRun) return;
+          // Merging runs in the background; the run is polled until it finishes.
+          setHealthPreview(null);
+          setCleanupRunId(result.id);
         },
       }
     );
   };
 
+  useEffect(() => {
+    if (!cleanupRun || cleanupRun.status === 'RUNNING') return;
+    setCleanupRunId(null);
+    setHealthPreview({
+      duplicateItemsCount: cleanupRun.deletedItemsCount,
+      reclaimableBytes: cleanupRun.recoveredBytes,
+    });
+    void healthAnalysisQuery.refetch();
+    if (cleanupRun.status === 'FAILED') {
+      toast.error('Redundant files cleanup stopped', {
+        description: cleanupRun.error || 'Please try again.',
+      });
+    } else {
+      toast.success('Redundant files cleanup complete');
+    }
+  }, [cleanupRun]);
+
   const fileInputRef = useRef<HTMLInputElement>(null);
 
   const handleSaveProfile = (e: FormEvent) => {
@@ -580,8 +601,9 @@ const Settings = () => {
         isOpen={isHealthDialogOpen}
         report={healthAnalysisQuery.data}
         isLoading={healthAnalysisQuery.isLoading || healthAnalysisQuery.isFetching}
-        isCleaning={cleanupRedundantMutation.isPending}
+        isCleaning={cleanupRedundantMutation.isPending || Boolean(cleanupRunId)}
         preview={healthPreview}
+        cleanupProgress={cleanupRun?.status === 'RUNNING' ? cleanupRun : null}
         selectedHashes={selectedHealthHashes}
         onToggleHash={toggleHealthHash}
         onSelectAll={() =>
@@ -2,6 +2,7 @@ import axiosClient from './axiosClient';
 import type {
   ApiVault,
   ApiVaultCleanupResult,
+  ApiVaultCleanupRun,
   ApiVaultHealthReport,
   CreateVaultRequest,
   PaginatedApiResponse,
@@ -143,13 +144,21 @@ export const vaultApi = {
   cleanupVaultRedundant: async (
     vaultId: string,
     payload?: { groupHashes?: string[]; dryRun?: boolean }
-  ): Promise<ApiVaultCleanupResult> => {
-    const response = await axiosClient.post<ApiVaultCleanupResult>(
+  ): Promise<ApiVaultCleanupResult | ApiVaultCleanupRun> => {
+    // A dry run answers with the preview; a real cleanup answers 202 with a background run to poll.
+    const response = await axiosClient.post<ApiVaultCleanupResult | ApiVaultCleanupRun>(
       `${VAULTS_ENDPOINT}${vaultId}/cleanup-redundant/`,
       payload || {}
     );
     return response.data;
   },
+
+  getVaultCleanupRuns: async (vaultId: string): Promise<ApiVaultCleanupRun[]> => {
+    const response = await axiosClient.get<{ runs: ApiVaultCleanupRun[] }>(
+      `${VAULTS_ENDPOINT}${vaultId}/cleanup-redundant/`
+    );
+    return response.data.runs || [];
+  },
 };
 
 export type { ApiVault };
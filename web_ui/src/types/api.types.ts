@@ -70,18 +70,31 @@ export interface ApiVaultHealthReport {
 }
 
 export interface ApiVaultCleanupResult {
-  dryRun: boolean;
+  dryRun: true;
   groupsSelected?: number;
-  groupsProcessed?: number;
   duplicateItemsCount?: number;
-  deletedItemsCount?: number;
   reclaimableBytes?: number;
-  recoveredBytes?: number;
-  remainingDuplicateGroups?: number;
-  message?: string;
   groups?: ApiVaultHealthGroup[];
 }
 
+export type ApiVaultCleanupRunStatus = 'RUNNING' | 'COMPLETED' | 'FAILED';
+
+export interface ApiVaultCleanupRun {
+  id: string;
+  vaultId: string;
+  dryRun: false;
+  status: ApiVaultCleanupRunStatus;
+  groupsSelected: number;
+  groupsProcessed: number;
+  deletedItemsCount: number;
+  recoveredBytes: number;
+  progressPercent: number;
+  startedAt?: string | null;
+  finishedAt?: string | null;
+  lastProgressAt?: string | null;
+  error?: string;
+}
+
 export interface ApiMediaItem {
   id: string;
   vault: string;